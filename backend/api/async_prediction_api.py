@@ -139,7 +139,8 @@ async def get_job_status(job_id: str) -> JobStatusResponse:
     try:
         # Get job directly from Firestore
         from google.cloud import firestore
-        db_client = firestore.Client()
+        from config.gcp_clients import get_firestore_client
+        db_client = get_firestore_client()
 
         job_doc = db_client.collection("jobs").document(job_id).get()
         if not job_doc.exists:
@@ -183,7 +184,8 @@ async def get_batch_status(batch_id: str) -> Dict[str, Any]:
     """
     try:
         from google.cloud import firestore
-        db_client = firestore.Client()
+        from config.gcp_clients import get_firestore_client
+        db_client = get_firestore_client()
         
         # Get batch document
         batch_doc = db_client.collection("batches").document(batch_id).get()
@@ -235,7 +237,8 @@ async def list_jobs(user_id: Optional[str] = None, limit: int = 20) -> Dict[str,
     """
     try:
         from google.cloud import firestore
-        db_client = firestore.Client()
+        from config.gcp_clients import get_firestore_client
+        db_client = get_firestore_client()
         
         query = db_client.collection("jobs").order_by("created_at", direction=firestore.Query.DESCENDING)
         
@@ -276,7 +279,8 @@ async def cancel_job(job_id: str) -> Dict[str, Any]:
     """
     try:
         from google.cloud import firestore
-        db_client = firestore.Client()
+        from config.gcp_clients import get_firestore_client
+        db_client = get_firestore_client()
         
         # Update job status to cancelled
         job_ref = db_client.collection("jobs").document(job_id)
@@ -6,10 +6,11 @@ FROM: 101 scattered endpoints across v2/v3/legacy
 TO: 11 core endpoints with unified job model
 """
 
-from fastapi import APIRouter, HTTPException, Query, Path, BackgroundTasks, Depends
+from fastapi import APIRouter, HTTPException, Query, Path, BackgroundTasks, Depends, Request, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime
+import asyncio
 import logging
 
 # Import our services
@@ -41,6 +42,7 @@ logger = logging.getLogger(__name__)
 # Import Firestore for migration
 try:
     from google.cloud import firestore
+    from config.gcp_clients import get_firestore_client
     FIRESTORE_AVAILABLE = True
 except ImportError:
     FIRESTORE_AVAILABLE = False
@@ -100,6 +102,17 @@ class BatchPredictionRequest(BaseModel):
     # Model parameters
     parameters: Optional[Dict[str, Any]] = Field(default_factory=dict)
 
+class GCSBatchPredictionRequest(BaseModel):
+    """Batch prediction request whose ligand library is read from GCS"""
+    gcs_uri: str = Field(..., description="gs://bucket/path of the ligand library")
+    format: Literal["csv", "smi", "sdf", "ndjson"] = Field(default="csv", description="Library file format")
+    protein_sequence: str = Field(..., description="Protein sequence in FASTA format")
+    protein_name: str = Field(default="Target", description="Protein name")
+    batch_name: str = Field(..., description="Human-readable batch name")
+    user_id: str = Field(default="default", description="User identifier")
+    use_msa: bool = Field(default=True)
+    use_potentials: bool = Field(default=False)
+
 class JobResponse(BaseModel):
     """Unified job response"""
     job_id: str
@@ -364,6 +377,107 @@ async def submit_batch_prediction(
         logger.error(f"Batch submission failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Background GCS ingestions (strong references so tasks are not collected mid-stream)
+_ingestion_tasks = set()
+
+def _stream_batch_request(batch_name: str, protein_name: str, protein_sequence: str,
+                          user_id: str, use_msa: bool, use_potentials: bool):
+    """Build the unified processor request for a streamed ligand library"""
+    from services.unified_batch_processor import BatchSubmissionRequest
+    
+    return BatchSubmissionRequest(
+        job_name=batch_name,
+        protein_sequence=protein_sequence,
+        protein_name=protein_name,
+        ligands=[],
+        user_id=user_id or DEPLOYMENT_USER_ID,
+        use_msa=use_msa,
+        use_potentials=use_potentials
+    )
+
+@router.post("/predict/batch/stream")
+async def submit_streamed_batch_prediction(
+    request: Request,
+    batch_name: str = Query(..., description="Human-readable batch name"),
+    protein_sequence: str = Query(..., description="Protein sequence"),
+    protein_name: str = Query("Target", description="Protein name"),
+    format: Literal["csv", "smi", "sdf", "ndjson"] = Query("csv", description="Library file format"),
+    user_id: str = Query("default", description="User identifier"),
+    use_msa: bool = Query(True),
+    use_potentials: bool = Query(False)
+) -> Dict[str, Any]:
+    """
+    Submit a Boltz-2 batch from a raw ligand library upload (CSV, SMILES, SDF or NDJSON)
+    
+    The request body is parsed as it arrives and each chunk's child jobs are
+    created and dispatched before the next chunk is read, so the raw library
+    never has to be held in one JSON body and the batch starts running while
+    it uploads. Invalid ligands are skipped and counted.
+    """
+    from services.batch_ingestion import LigandStreamStats, iter_ligand_chunks
+    from services.service_registry import service_registry
+    unified_batch_processor = service_registry.get("unified_batch_processor")
+    
+    stats = LigandStreamStats()
+    result = await unified_batch_processor.submit_batch_stream(
+        _stream_batch_request(batch_name, protein_name, protein_sequence, user_id, use_msa, use_potentials),
+        iter_ligand_chunks(request.stream(), format, stats),
+        stats
+    )
+    
+    if not result['success']:
+        raise HTTPException(status_code=400, detail=result)
+    return result
+
+@router.post("/predict/batch/from-gcs")
+async def submit_gcs_batch_prediction(request: GCSBatchPredictionRequest) -> Dict[str, Any]:
+    """
+    Submit a Boltz-2 batch from a ligand library already stored in GCS
+    
+    Ingestion continues in the background; the response returns as soon as
+    the batch parent exists so the batch can be polled immediately.
+    """
+    from services.batch_ingestion import LigandStreamStats, iter_gcs_object, iter_ligand_chunks
+    from services.service_registry import service_registry
+    unified_batch_processor = service_registry.get("unified_batch_processor")
+    
+    if not request.gcs_uri.startswith("gs://"):
+        raise HTTPException(status_code=400, detail=f"Invalid GCS URI: {request.gcs_uri}")
+    
+    loop = asyncio.get_event_loop()
+    batch_created: asyncio.Future = loop.create_future()
+    stats = LigandStreamStats()
+    
+    def on_batch_created(batch_id: str) -> None:
+        if not batch_created.done():
+            batch_created.set_result(batch_id)
+    
+    ingestion = asyncio.create_task(unified_batch_processor.submit_batch_stream(
+        _stream_batch_request(request.batch_name, request.protein_name, request.protein_sequence,
+                              request.user_id, request.use_msa, request.use_potentials),
+        iter_ligand_chunks(iter_gcs_object(request.gcs_uri), request.format, stats),
+        stats,
+        on_batch_created=on_batch_created
+    ))
+    _ingestion_tasks.add(ingestion)
+    ingestion.add_done_callback(_ingestion_tasks.discard)
+    
+    # Either the parent is created or ingestion finishes (typically with an error) first
+    await asyncio.wait({batch_created, ingestion}, return_when=asyncio.FIRST_COMPLETED)
+    
+    if batch_created.done():
+        return {
+            'success': True,
+            'batch_id': batch_created.result(),
+            'status': 'ingesting',
+            'message': f"Streaming ligands from {request.gcs_uri}"
+        }
+    
+    result = ingestion.result()
+    if not result['success']:
+        raise HTTPException(status_code=400, detail=result)
+    return result
+
 # ===== JOB MANAGEMENT ENDPOINTS =====
 
 @router.get("/jobs/{job_id}", response_model=JobResponse)
@@ -378,7 +492,7 @@ async def get_job(job_id: str = Path(..., description="Job ID")):
         input_data = None
         if FIRESTORE_AVAILABLE:
             try:
-                db = firestore.Client(project='om-models')
+                db = get_firestore_client('om-models')
                 job_ref = db.collection('jobs').document(job_id)
                 firestore_doc = job_ref.get()
                 
@@ -632,6 +746,146 @@ async def list_batches(
         logger.error(f"List batches failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+STREAM_HEARTBEAT_SECONDS = 15
+
+@router.get("/batches/{batch_id}/events")
+async def stream_batch_events(request: Request, batch_id: str = Path(..., description="Batch ID")):
+    """
+    Stream batch progress as Server-Sent Events instead of polling /batches/{batch_id}
+    
+    Events: snapshot, progress, child (a child finished) and complete, after
+    which the stream ends. All viewers of a batch on this instance share one
+    upstream subscription.
+    """
+    from fastapi.responses import StreamingResponse
+    from services.batch_progress_hub import batch_progress_hub, format_sse
+    
+    batch = await job_manager.get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    async def event_stream():
+        subscription = batch_progress_hub.subscribe(batch_id)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await subscription.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    break
+                yield format_sse(event)
+        finally:
+            subscription.close()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/batches/{batch_id}/ws")
+async def batch_events_websocket(websocket: WebSocket, batch_id: str):
+    """
+    WebSocket variant of /batches/{batch_id}/events; each message is one event as JSON
+    
+    Idle streams get a keepalive event every STREAM_HEARTBEAT_SECONDS; a client
+    that disconnects or stops reading releases its subscription.
+    """
+    from services.batch_progress_hub import batch_progress_hub, relay_events
+    
+    batch = await job_manager.get_batch(batch_id)
+    if not batch:
+        await websocket.close(code=4404)
+        return
+    
+    await websocket.accept()
+    subscription = batch_progress_hub.subscribe(batch_id)
+    try:
+        if await relay_events(subscription, websocket.send_json, websocket.receive, STREAM_HEARTBEAT_SECONDS):
+            await websocket.close()
+    except (WebSocketDisconnect, asyncio.TimeoutError):
+        logger.debug(f"WebSocket viewer of batch {batch_id} went away")
+    finally:
+        subscription.close()
+
+@router.get("/batches/{batch_id}/results")
+async def query_batch_results(
+    batch_id: str = Path(..., description="Batch ID"),
+    sort_by: Literal["affinity", "affinity_probability", "confidence", "ptm", "iptm", "plddt", "batch_index"] = Query(
+        default="affinity", description="Sort key"),
+    order: Optional[Literal["asc", "desc"]] = Query(
+        default=None, description="Sort direction (default: best first, i.e. ascending affinity)"),
+    limit: int = Query(default=50, ge=1, le=500, description="Rows per page"),
+    cursor: Optional[str] = Query(default=None, description="next_cursor from the previous page"),
+    status: Optional[str] = Query(default=None, description="Only children with this status"),
+    columns: Optional[str] = Query(default=None, description="Comma-separated columns to return"),
+    min_affinity: Optional[float] = Query(default=None),
+    max_affinity: Optional[float] = Query(default=None),
+    min_confidence: Optional[float] = Query(default=None),
+    max_confidence: Optional[float] = Query(default=None),
+    min_ptm: Optional[float] = Query(default=None),
+    max_ptm: Optional[float] = Query(default=None),
+    min_iptm: Optional[float] = Query(default=None),
+    max_iptm: Optional[float] = Query(default=None),
+    min_plddt: Optional[float] = Query(default=None),
+    max_plddt: Optional[float] = Query(default=None)
+):
+    """
+    One page of a batch's results, sorted and filtered server-side
+
+    Served from the batch's compact results table, so the response carries
+    only the requested columns of one page however large the screen is.
+    Follow next_cursor (with the same sort) for the next page.
+    """
+    from services.batch_results_service import batch_results_service
+
+    filters = {
+        'affinity': (min_affinity, max_affinity),
+        'confidence': (min_confidence, max_confidence),
+        'ptm': (min_ptm, max_ptm),
+        'iptm': (min_iptm, max_iptm),
+        'plddt': (min_plddt, max_plddt),
+    }
+    selected = [name.strip() for name in columns.split(",") if name.strip()] if columns else None
+
+    try:
+        page = await batch_results_service.query_batch_results(
+            batch_id, sort_by=sort_by, order=order, filters=filters, status=status,
+            columns=selected, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Query batch results failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if page is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return page
+
+@router.get("/batches/{batch_id}/results/statistics")
+async def get_batch_results_statistics(
+    batch_id: str = Path(..., description="Batch ID"),
+    bins: int = Query(default=20, ge=1, le=200, description="Histogram bins per score")
+):
+    """Per-score statistics, histograms and the best hits, computed from the batch's results table"""
+    from services.batch_results_service import batch_results_service
+
+    try:
+        statistics = await batch_results_service.get_batch_statistics(batch_id, bins=bins)
+    except Exception as e:
+        logger.error(f"Batch results statistics failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if statistics is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return statistics
+
 @router.delete("/batches/{batch_id}")
 async def delete_batch(batch_id: str = Path(..., description="Batch ID")):
     """Delete a batch and all its jobs"""
@@ -741,6 +995,8 @@ async def export_batch(
 @router.get("/system/status")
 async def get_system_status():
     """Get detailed system status and health"""
+    from services.near_cache import coherence_bus
+    
     try:
         # Check system components
         db_healthy = await job_manager.health_check()
@@ -757,6 +1013,7 @@ async def get_system_status():
                 "storage": "healthy" if storage_healthy else "unhealthy"
             },
             "statistics": stats,
+            "caches": coherence_bus.status(),
             "api_version": "v1"
         }
         
@@ -785,7 +1042,7 @@ async def migrate_all_jobs_to_deployment_user():
     
     try:
         # Initialize Firestore
-        db = firestore.Client(project='om-models')
+        db = get_firestore_client('om-models')
         jobs_collection = db.collection('jobs')
         
         # Track statistics
@@ -921,7 +1178,7 @@ async def _enrich_job_with_firestore_data(job: Dict[str, Any]) -> Dict[str, Any]
         return job
     
     try:
-        db = firestore.Client(project='om-models')
+        db = get_firestore_client('om-models')
         job_ref = db.collection('jobs').document(job["id"])
         firestore_doc = job_ref.get()
         
@@ -211,7 +211,8 @@ async def get_batch_children(
     """
     try:
         from google.cloud import firestore
-        db = firestore.Client()
+        from config.gcp_clients import get_firestore_client
+        db = get_firestore_client()
         
         # Build query
         query = db.collection('jobs').where('batch_parent_id', '==', batch_id)
@@ -315,8 +316,9 @@ async def get_queue_statistics() -> Dict[str, Any]:
     """
     try:
         from google.cloud import tasks_v2
+        from services.io_budget import instrument_cloud_tasks_client
         
-        client = tasks_v2.CloudTasksClient()
+        client = instrument_cloud_tasks_client(tasks_v2.CloudTasksClient())
         project_id = "om-models"
         location = "us-central1"
         
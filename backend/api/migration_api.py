@@ -5,6 +5,7 @@ Add this to your main.py to enable migration endpoint
 
 from fastapi import APIRouter, HTTPException
 from google.cloud import firestore
+from config.gcp_clients import get_firestore_client
 import logging
 from typing import Dict, Any
 
@@ -24,7 +25,7 @@ async def migrate_all_jobs_to_deployment_user() -> Dict[str, Any]:
     
     try:
         # Initialize Firestore
-        db = firestore.Client(project=PROJECT_ID)
+        db = get_firestore_client(PROJECT_ID)
         jobs_collection = db.collection('jobs')
         
         # Track statistics
@@ -108,7 +109,7 @@ async def verify_migration_status() -> Dict[str, Any]:
     """
     
     try:
-        db = firestore.Client(project=PROJECT_ID)
+        db = get_firestore_client(PROJECT_ID)
         jobs_collection = db.collection('jobs')
         
         # Count deployment user jobs
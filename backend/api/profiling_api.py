@@ -0,0 +1,77 @@
+"""
+Profiling API endpoints (admin only)
+On-demand sampling profiles, event-loop lag and stalls, loop-blocking storage
+calls, offload pool usage and per-function attribution for the pod serving the request
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from auth import require_admin_role
+from monitoring.profiler import (
+    MAX_PROFILE_SECONDS, ProfilerBusyError, function_profiler, loop_blocking_detector, loop_lag_monitor,
+    sampling_profiler
+)
+from services.io_budget import loop_blocking_calls
+from services.offload import offload_executor
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/api/v1/admin/profiling",
+    tags=["Profiling"],
+    dependencies=[Depends(require_admin_role)]
+)
+
+@router.get("/profile")
+async def get_sampling_profile(
+    seconds: float = Query(10.0, gt=0, le=MAX_PROFILE_SECONDS),
+    interval_ms: float = Query(5.0, ge=1.0, le=100.0),
+    idle: bool = Query(False, description="Include threads parked in select/wait/queue.get"),
+    format: Literal["collapsed", "json"] = "collapsed"
+):
+    """
+    Sample every thread's stack on this pod for `seconds`
+
+    The collapsed output ("thread;frame;...;frame count" per line) feeds
+    flamegraph.pl or speedscope directly. One profile runs at a time per pod.
+    """
+    logger.info(f"🔬 Sampling profile requested: {seconds}s at {interval_ms}ms")
+    try:
+        profile = await asyncio.to_thread(
+            sampling_profiler.profile, seconds, interval_ms / 1000, idle, loop_lag_monitor.loop_thread_id
+        )
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if format == "collapsed":
+        return PlainTextResponse(profile['collapsed'] + "\n")
+    return profile
+
+@router.get("/status")
+async def get_profiling_status(
+    limit: int = Query(25, ge=1, le=200),
+    sort_by: Literal["loop", "cpu", "wall", "calls"] = "loop"
+) -> Dict[str, Any]:
+    """Event-loop lag and stalls, sync storage calls made on the loop, offload pool and traced functions"""
+    return {
+        'timestamp': datetime.utcnow().isoformat() + "Z",
+        'event_loop': loop_lag_monitor.snapshot(),
+        'loop_stalls': loop_blocking_detector.snapshot(limit),
+        'loop_blocking_calls': loop_blocking_calls.snapshot(limit),
+        'offload': offload_executor.stats(),
+        'functions': function_profiler.snapshot(sort_by, limit)
+    }
+
+@router.delete("/status")
+async def reset_profiling_counters() -> Dict[str, Any]:
+    """Clear accumulated stall, blocking-call and per-function counters"""
+    loop_blocking_detector.reset()
+    loop_blocking_calls.reset()
+    function_profiler.reset()
+    return {'reset': True, 'timestamp': datetime.utcnow().isoformat() + "Z"}
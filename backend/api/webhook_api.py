@@ -86,7 +86,8 @@ async def list_webhooks(
     """
     try:
         from google.cloud import firestore
-        db = firestore.Client()
+        from config.gcp_clients import get_firestore_client
+        db = get_firestore_client()
         
         webhooks_ref = db.collection('users').document(current_user_id)\
             .collection('webhooks')
@@ -123,7 +124,8 @@ async def delete_webhook(
     """
     try:
         from google.cloud import firestore
-        db = firestore.Client()
+        from config.gcp_clients import get_firestore_client
+        db = get_firestore_client()
         
         webhook_ref = db.collection('users').document(current_user_id)\
             .collection('webhooks').document(webhook_id)
@@ -158,7 +160,8 @@ async def toggle_webhook(
     """
     try:
         from google.cloud import firestore
-        db = firestore.Client()
+        from config.gcp_clients import get_firestore_client
+        db = get_firestore_client()
         
         webhook_ref = db.collection('users').document(current_user_id)\
             .collection('webhooks').document(webhook_id)
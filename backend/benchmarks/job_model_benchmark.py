@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Job Model Benchmark
+Memory and conversion cost of batch child representations (EnhancedJobData vs JobFrame)
+
+Usage:
+    python benchmarks/job_model_benchmark.py [--children 10000] [--repeats 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.enhanced_job_model import EnhancedJobData, JobStatus
+from models.job_frame import JobFrame
+
+_STATUS_CYCLE = ["completed"] * 6 + ["failed", "running", "pending", "cancelled"]
+
+def make_child_docs(count: int) -> List[Dict[str, Any]]:
+    """Firestore-shaped batch child documents"""
+    now = time.time()
+    docs = []
+    for index in range(count):
+        status = _STATUS_CYCLE[index % len(_STATUS_CYCLE)]
+        docs.append({
+            'id': f"child-{index:06d}",
+            'name': f"Ligand {index}",
+            'job_type': "batch_child",
+            'task_type': "protein_ligand_binding",
+            'status': status,
+            'created_at': now - 3600,
+            'started_at': now - 3000,
+            'completed_at': now - 3000 + (index % 300) if status == "completed" else None,
+            'updated_at': now,
+            'input_data': {'ligand_smiles': "CC(=O)Oc1ccccc1C(=O)O", 'ligand_name': f"lig_{index}"},
+            'user_id': "benchmark",
+            'batch_parent_id': "batch-benchmark",
+            'batch_index': index,
+        })
+    return docs
+
+def _time(fn: Callable[[], Any], repeats: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {'median_ms': round(statistics.median(samples), 2), 'min_ms': round(min(samples), 2)}
+
+def _memory(build: Callable[[], Any]) -> Dict[str, float]:
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    keep = build()
+    current = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in current.compare_to(baseline, 'filename'))
+    del keep
+    return {'retained_mb': round(size / 1_000_000, 2)}
+
+def run(children: int, repeats: int) -> Dict[str, Any]:
+    docs = make_child_docs(children)
+
+    def build_objects():
+        return [EnhancedJobData.from_job_data(doc) for doc in docs]
+
+    objects = build_objects()
+    frame = JobFrame.from_job_data(docs)
+    parent = EnhancedJobData.from_job_data({
+        'id': "batch-benchmark", 'name': "Benchmark", 'job_type': "batch_parent",
+        'task_type': "batch_protein_ligand_screening", 'status': "running"
+    })
+
+    return {
+        'children': children,
+        'objects': {
+            'build': _time(build_objects, repeats),
+            'memory': _memory(build_objects),
+            'progress': _time(lambda: parent.calculate_batch_progress([job.status for job in objects]), repeats),
+            'to_firestore_dict': _time(lambda: [job.to_firestore_dict() for job in objects], repeats),
+        },
+        'frame': {
+            'build': _time(lambda: JobFrame.from_job_data(docs), repeats),
+            'memory': _memory(lambda: JobFrame.from_job_data(docs)),
+            'progress': _time(frame.progress, repeats),
+            'completed_durations': _time(lambda: frame.durations(JobStatus.COMPLETED), repeats),
+        },
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--children", type=int, default=10_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.children, args.repeats), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Logging Benchmark
+Caller-side cost per log line of the previous formatter vs the log pipeline
+
+Usage:
+    python benchmarks/logging_benchmark.py [--lines 20000] [--repeats 5]
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.log_pipeline import (
+    ORJSON_AVAILABLE, AsyncQueueHandler, LogRateLimiter, StructuredFormatter
+)
+
+class LegacyStructuredFormatter(logging.Formatter):
+    """The formatter as it was: new dicts, four getenv calls and json.dumps per record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        log_entry = {
+            'timestamp': datetime.fromtimestamp(record.created).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'function': record.funcName,
+            'line': record.lineno
+        }
+        log_entry['service'] = {
+            'name': os.getenv('SERVICE_NAME', 'omtx-hub-api'),
+            'version': os.getenv('SERVICE_VERSION', '1.0.0'),
+            'environment': os.getenv('ENVIRONMENT', 'development'),
+            'instance': os.getenv('HOSTNAME', 'unknown')
+        }
+        for field in ('request_id', 'user_id', 'job_id'):
+            if hasattr(record, field):
+                log_entry[field] = getattr(record, field)
+        if hasattr(record, 'extra_data'):
+            log_entry.update(record.extra_data)
+        return json.dumps(log_entry, default=str)
+
+def _logger(name: str, handler: logging.Handler) -> logging.Logger:
+    log = logging.getLogger(f"benchmark.{name}")
+    log.handlers[:] = [handler]
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    return log
+
+def _per_line(log: logging.Logger, lines: int, repeats: int, drain: Callable[[], None] = lambda: None) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for index in range(lines):
+            log.info("✅ Downloaded from GCP: %s", f"jobs/job-{index}/results.json")
+        samples.append((time.perf_counter() - start) / lines * 1_000_000)
+        drain()
+    return {'median_us': round(statistics.median(samples), 2), 'min_us': round(min(samples), 2)}
+
+def run(lines: int, repeats: int) -> Dict[str, Any]:
+    devnull = open(os.devnull, 'w')
+
+    def stream(formatter: logging.Formatter) -> logging.Handler:
+        handler = logging.StreamHandler(devnull)
+        handler.setFormatter(formatter)
+        return handler
+
+    results: Dict[str, Any] = {'lines': lines, 'orjson': ORJSON_AVAILABLE}
+    results['legacy_sync'] = _per_line(_logger("legacy", stream(LegacyStructuredFormatter())), lines, repeats)
+    results['pipeline_sync'] = _per_line(_logger("sync", stream(StructuredFormatter())), lines, repeats)
+
+    # Caller cost only: the listener drains the queue (formatting and writes) after each timed run
+    log_queue: queue.Queue = queue.Queue()
+    output = stream(StructuredFormatter())
+
+    def drain():
+        listener = logging.handlers.QueueListener(log_queue, output)
+        listener.start()
+        listener.stop()
+
+    results['pipeline_async_caller'] = _per_line(_logger("async", AsyncQueueHandler(log_queue)), lines, repeats, drain)
+
+    limited = AsyncQueueHandler(log_queue)
+    limited.addFilter(LogRateLimiter({'benchmark': (20.0, 100.0)}))
+    results['pipeline_rate_limited_caller'] = _per_line(_logger("limited", limited), lines, repeats, drain)
+
+    devnull.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, default=20_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.lines, args.repeats), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -45,6 +45,14 @@ REQUIRED_INDEXES = [
         ],
         "description": "Batch children lookup by parent"
     },
+    {
+        "collection": "jobs",
+        "fields": [
+            {"field": "batch_parent_id", "order": "ASCENDING"},
+            {"field": "status", "order": "ASCENDING"}
+        ],
+        "description": "Batch child counts and running-child reconciliation by status"
+    },
     {
         "collection": "jobs",
         "fields": [
@@ -62,6 +70,25 @@ REQUIRED_INDEXES = [
         ],
         "description": "User jobs filtered by type"
     },
+    {
+        "collection": "jobs",
+        "fields": [
+            {"field": "user_id", "order": "ASCENDING"},
+            {"field": "job_type", "order": "ASCENDING"},
+            {"field": "status", "order": "ASCENDING"},
+            {"field": "created_at", "order": "DESCENDING"}
+        ],
+        "description": "User jobs filtered by type and status"
+    },
+    {
+        "collection": "jobs",
+        "fields": [
+            {"field": "user_id", "order": "ASCENDING"},
+            {"field": "task_type", "order": "ASCENDING"},
+            {"field": "created_at", "order": "DESCENDING"}
+        ],
+        "description": "User jobs filtered by task type"
+    },
     {
         "collection": "jobs",
         "fields": [
@@ -70,6 +97,14 @@ REQUIRED_INDEXES = [
             {"field": "__name__", "order": "ASCENDING"}
         ],
         "description": "User jobs with document name for pagination cursors"
+    },
+    {
+        "collection": "admin_batches",
+        "fields": [
+            {"field": "status", "order": "ASCENDING"},
+            {"field": "queued_at", "order": "ASCENDING"}
+        ],
+        "description": "Fleet-packing batches left queued past the pack window (restart recovery)"
     }
 ]
 
@@ -0,0 +1,106 @@
+"""
+Shared GCP Clients
+One Firestore and one Storage client per process, created on first use.
+
+Each google-cloud client owns its own credentials refresh, HTTP/gRPC channel and
+connection pool, so constructing one per service multiplies cold-start cost and
+open sockets. Services declare `db = SharedFirestoreClient()` /
+`storage_client = SharedStorageClient()` at class level instead of building
+clients in __init__; assigning the attribute on an instance still overrides it.
+"""
+
+import os
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Optional, Dict, Tuple, Any
+
+logger = logging.getLogger(__name__)
+
+_clients: Dict[Tuple[str, Optional[str]], Any] = {}
+_lock = threading.Lock()
+
+def _credentials(prefer_workload_identity: bool = False):
+    """
+    Service account credentials from GCP_CREDENTIALS_JSON, or None for ADC.
+
+    Firestore prefers the GKE node service account when running in Kubernetes;
+    Storage always honours GCP_CREDENTIALS_JSON when it is set.
+    """
+    gcp_creds_json = os.getenv('GCP_CREDENTIALS_JSON')
+    if not gcp_creds_json:
+        return None
+    if prefer_workload_identity and os.getenv('KUBERNETES_SERVICE_HOST'):
+        return None
+    from google.oauth2 import service_account
+    return service_account.Credentials.from_service_account_info(json.loads(gcp_creds_json))
+
+def _get_or_create(kind: str, project: Optional[str], factory):
+    key = (kind, project)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = factory()
+                _clients[key] = client
+                logger.info(f"🔌 Created shared {kind} client (project={project or 'default'})")
+    return client
+
+def get_firestore_client(project: Optional[str] = None):
+    """Process-wide Firestore client"""
+    def factory():
+        from google.cloud import firestore
+        from services.io_budget import instrument_firestore
+        instrument_firestore()
+        credentials = _credentials(prefer_workload_identity=True)
+        if credentials is not None:
+            return firestore.Client(project=project, credentials=credentials)
+        return firestore.Client(project=project)
+    return _get_or_create("firestore", project, factory)
+
+def get_storage_client(project: Optional[str] = None):
+    """Process-wide Cloud Storage client"""
+    def factory():
+        from google.cloud import storage
+        from services.io_budget import instrument_storage_client
+        credentials = _credentials()
+        if credentials is not None:
+            return instrument_storage_client(storage.Client(project=project, credentials=credentials))
+        return instrument_storage_client(storage.Client(project=project))
+    return _get_or_create("storage", project, factory)
+
+class _SharedClient(ABC):
+    """Non-data descriptor resolving to a shared client on first attribute access"""
+
+    def __init__(self, project_attr: Optional[str] = None):
+        self.project_attr = project_attr
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    @abstractmethod
+    def _create(self, project: Optional[str]):
+        """Return the shared client for a project"""
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        project = getattr(instance, self.project_attr, None) if self.project_attr else None
+        client = self._create(project)
+        # Cache on the instance so later lookups bypass the descriptor
+        instance.__dict__[self.name] = client
+        return client
+
+class SharedFirestoreClient(_SharedClient):
+    """Class attribute resolving to the shared Firestore client"""
+
+    def _create(self, project: Optional[str]):
+        return get_firestore_client(project)
+
+class SharedStorageClient(_SharedClient):
+    """Class attribute resolving to the shared Storage client"""
+
+    def _create(self, project: Optional[str]):
+        return get_storage_client(project)
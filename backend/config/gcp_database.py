@@ -7,60 +7,67 @@ import os
 import json
 import time
 import logging
+import threading
 from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timezone
 from google.cloud import firestore
-from google.oauth2 import service_account
 from functools import lru_cache
 
+from config.gcp_clients import get_firestore_client
+
 logger = logging.getLogger(__name__)
 
 class GCPDatabaseManager:
     """Manages GCP Firestore operations - Complete Supabase replacement"""
     
     def __init__(self):
-        self.db = None
-        self.available = False
+        self._db = None
+        self._available = False
         self.project_id = os.getenv('GOOGLE_CLOUD_PROJECT', 'om-models')
+        self._initialized = False
+        self._init_lock = threading.Lock()
         
         # Simple in-memory cache for performance
         self._cache = {}
         self._cache_ttl = 120  # 2 minutes default TTL
         
-        # Initialize if credentials are available
-        self._initialize()
+        # Connection (and its test query) is deferred to first use so
+        # importing this module costs no network round trips
+    
+    @property
+    def db(self):
+        self._ensure_initialized()
+        return self._db
+    
+    @property
+    def available(self) -> bool:
+        self._ensure_initialized()
+        return self._available
+    
+    def _ensure_initialized(self):
+        if self._initialized:
+            return
+        with self._init_lock:
+            if not self._initialized:
+                self._initialize()
+                self._initialized = True
     
     def _initialize(self):
         """Initialize Firestore client"""
         try:
-            # Option 1: Default credentials (for GCP environment) - PRIORITIZED
-            # This uses the service account attached to the GKE node pool
-            if os.getenv('KUBERNETES_SERVICE_HOST'):  # Running in Kubernetes
-                logger.info("🔧 Using GKE default credentials for Firestore")
-                self.db = firestore.Client(project=self.project_id)
-            else:
-                # Option 2: Service account JSON for local development
-                gcp_creds_json = os.getenv('GCP_CREDENTIALS_JSON')
-                if gcp_creds_json:
-                    logger.info("🔧 Using service account JSON for Firestore")
-                    creds_dict = json.loads(gcp_creds_json)
-                    credentials = service_account.Credentials.from_service_account_info(creds_dict)
-                    self.db = firestore.Client(project=self.project_id, credentials=credentials)
-                else:
-                    # Option 3: Default credentials (for local development)
-                    logger.info("🔧 Using local default credentials for Firestore")
-                    self.db = firestore.Client(project=self.project_id)
+            # Shared client: GKE/local default credentials, or GCP_CREDENTIALS_JSON
+            self._db = get_firestore_client(self.project_id)
             
             # Test connection
-            collections_ref = self.db.collections()
+            collections_ref = self._db.collections()
             list(collections_ref)  # Try to list collections to test connection
             
-            self.available = True
+            self._available = True
             logger.info(f"✅ Connected to GCP Firestore: {self.project_id}")
             
         except Exception as e:
             logger.error(f"❌ Failed to connect to GCP Firestore: {e}")
-            self.available = False
+            self._available = False
     
     def _get_cache_key(self, prefix: str, **kwargs) -> str:
         """Generate cache key from prefix and parameters"""
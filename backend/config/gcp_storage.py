@@ -6,10 +6,13 @@ Handles all job file operations
 
 import os
 import json
+import base64
+import hashlib
 import logging
-from typing import Optional, Dict, Any, List
-from google.cloud import storage
-from google.oauth2 import service_account
+import threading
+from typing import Optional, Dict, Any, List, Tuple
+
+from config.gcp_clients import get_storage_client
 
 logger = logging.getLogger(__name__)
 
@@ -17,46 +20,63 @@ class GCPStorageManager:
     """Manages GCP bucket operations for job files"""
     
     def __init__(self):
-        self.client = None
-        self.bucket = None
+        self._client = None
+        self._bucket = None
         self.bucket_name = os.getenv('GCP_BUCKET_NAME', 'hub-job-files')
-        self.available = False
+        self._available = False
+        self._initialized = False
+        self._init_lock = threading.Lock()
         
-        # Initialize if credentials are available
-        self._initialize()
+        # Connection (and the bucket existence check) is deferred to first use
+        # so importing this module costs no network round trips
+    
+    @property
+    def client(self):
+        self._ensure_initialized()
+        return self._client
+    
+    @property
+    def bucket(self):
+        self._ensure_initialized()
+        return self._bucket
+    
+    @property
+    def available(self) -> bool:
+        self._ensure_initialized()
+        return self._available
+    
+    def _ensure_initialized(self):
+        if self._initialized:
+            return
+        with self._init_lock:
+            if not self._initialized:
+                self._initialize()
+                self._initialized = True
     
     def _initialize(self):
         """Initialize GCP client and bucket"""
         try:
-            # Option 1: Service account JSON from environment variable
-            gcp_creds_json = os.getenv('GCP_CREDENTIALS_JSON')
-            if gcp_creds_json:
-                creds_dict = json.loads(gcp_creds_json)
-                credentials = service_account.Credentials.from_service_account_info(creds_dict)
-                self.client = storage.Client(credentials=credentials)
-            else:
-                # Option 2: Default credentials (for local development or GCP environment)
-                self.client = storage.Client()
+            self._client = get_storage_client()
             
             # Get or create bucket
             try:
-                self.bucket = self.client.bucket(self.bucket_name)
-                if not self.bucket.exists():
-                    self.bucket = self.client.create_bucket(self.bucket_name, location="us-central1")
+                self._bucket = self._client.bucket(self.bucket_name)
+                if not self._bucket.exists():
+                    self._bucket = self._client.create_bucket(self.bucket_name, location="us-central1")
                     logger.info(f"✅ Created GCP bucket: {self.bucket_name}")
                 else:
                     logger.info(f"✅ Connected to GCP bucket: {self.bucket_name}")
                     
-                self.available = True
+                self._available = True
                 
             except Exception as e:
                 logger.error(f"❌ Failed to access/create bucket: {e}")
-                self.available = False
+                self._available = False
                 
         except Exception as e:
             logger.warning(f"⚠️ GCP Storage not configured: {e}")
             logger.info("GCP Storage unavailable - storage operations will fail")
-            self.available = False
+            self._available = False
     
     def upload_file(self, file_path: str, content: bytes, content_type: str = "application/octet-stream") -> bool:
         """Upload file to GCP bucket"""
@@ -72,6 +92,111 @@ class GCPStorageManager:
             logger.error(f"❌ GCP upload failed: {e}")
             return False
     
+    def copy_file(self, source_path: str, destination_path: str) -> bool:
+        """Server-side copy within the bucket (no bytes pass through this host)"""
+        if not self.available:
+            return False
+            
+        try:
+            self.bucket.copy_blob(self.bucket.blob(source_path), self.bucket, destination_path)
+            logger.info(f"✅ Copied in GCP: {source_path} -> {destination_path}")
+            return True
+        except Exception as e:
+            logger.error(f"❌ GCP copy failed: {e}")
+            return False
+    
+    def write_object(self, file_path: str, content: bytes, content_type: str = "application/octet-stream",
+                     if_generation_match: Optional[int] = None,
+                     metadata: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Upload with end-to-end checksums and an optional generation precondition
+        
+        CRC32C is verified by the client library and MD5 against the object
+        GCS stored. if_generation_match=0 means "only if absent". Raises on
+        failure (including PreconditionFailed) so callers can tell conflicts apart.
+        """
+        if not self.available:
+            raise RuntimeError("GCP Storage not available")
+        
+        blob = self.bucket.blob(file_path)
+        if metadata:
+            blob.metadata = metadata
+        
+        kwargs = {'content_type': content_type, 'checksum': 'crc32c'}
+        if if_generation_match is not None:
+            kwargs['if_generation_match'] = if_generation_match
+        blob.upload_from_string(content, **kwargs)
+        
+        expected_md5 = base64.b64encode(hashlib.md5(content).digest()).decode()
+        if blob.md5_hash and blob.md5_hash != expected_md5:
+            raise ValueError(f"MD5 mismatch after upload of {file_path}")
+        
+        return self._object_info(blob)
+    
+    def get_object_info(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """Object metadata (generation, size, checksums) or None if absent"""
+        if not self.available:
+            return None
+        blob = self.bucket.get_blob(file_path)
+        return self._object_info(blob) if blob is not None else None
+    
+    def read_object(self, file_path: str, generation: Optional[int] = None) -> Optional[bytes]:
+        """Download a specific generation (or the live one); None if it no longer exists"""
+        if not self.available:
+            return None
+        try:
+            return self.bucket.blob(file_path, generation=generation).download_as_bytes()
+        except Exception as e:
+            logger.debug(f"Could not read {file_path}@{generation}: {e}")
+            return None
+    
+    def delete_object(self, file_path: str, if_generation_match: Optional[int] = None) -> bool:
+        """Delete an object, optionally only if it is still the given generation"""
+        if not self.available:
+            return False
+        try:
+            self.bucket.blob(file_path).delete(if_generation_match=if_generation_match)
+            return True
+        except Exception as e:
+            logger.debug(f"Did not delete {file_path}@{if_generation_match}: {e}")
+            return False
+    
+    def list_objects(self, prefix: str) -> List[Dict[str, Any]]:
+        """List objects under a prefix with generations and custom metadata"""
+        if not self.available:
+            return []
+        return [self._object_info(blob) for blob in self.bucket.list_blobs(prefix=prefix)]
+    
+    def list_object_index(self, prefix: str, page_size: int = 1000) -> Dict[str, Tuple[int, int]]:
+        """
+        Paged listing of a prefix as {path: (generation, size)}
+        
+        Requests only the fields it needs, so listing 10k+ objects stays a few
+        small responses rather than full object resources.
+        """
+        if not self.available:
+            return {}
+        blobs = self.bucket.list_blobs(
+            prefix=prefix, page_size=page_size, fields="items(name,generation,size),nextPageToken"
+        )
+        index = {}
+        for page in blobs.pages:
+            for blob in page:
+                index[blob.name] = (int(blob.generation or 0), int(blob.size or 0))
+        return index
+    
+    @staticmethod
+    def _object_info(blob) -> Dict[str, Any]:
+        return {
+            'path': blob.name,
+            'generation': blob.generation,
+            'size': blob.size,
+            'crc32c': blob.crc32c,
+            'md5_hash': blob.md5_hash,
+            'updated': blob.updated.isoformat() if blob.updated else None,
+            'metadata': blob.metadata or {}
+        }
+    
     def download_file(self, file_path: str) -> Optional[bytes]:
         """Download file from GCP bucket"""
         if not self.available:
@@ -6,7 +6,7 @@ Handles all job operations using GCP Firestore + Cloud Storage
 import os
 import json
 import logging
-from typing import Optional, Dict, Any, List, Union
+from typing import Callable, Optional, Dict, Any, List, Sequence, Tuple, Union
 from datetime import datetime, timezone
 from google.cloud import firestore
 from config.gcp_database import gcp_database
@@ -128,6 +128,65 @@ class GCPJobManager:
             logger.error(f"❌ Failed to get jobs for user {user_id}: {e}")
             return []
     
+    def _build_job_query(self, plan):
+        """Apply the pushed-down clauses of a JobQueryPlan to the jobs collection"""
+        query = self.db.db.collection('jobs')
+        for field_name, value in plan.equality:
+            query = query.where(field_name, '==', value)
+        if plan.membership:
+            field_name, values = plan.membership
+            query = query.where(field_name, 'in', values)
+        return query
+    
+    def query_jobs(self, plan, limit: int, start_after: Any = None,
+                   offset: int = 0) -> Tuple[List[Dict[str, Any]], Any]:
+        """
+        Run a planned jobs query ordered by created_at DESC.
+        
+        start_after may be a document ID or a snapshot from a previous call;
+        returns the jobs plus the last snapshot so callers can keep paging.
+        """
+        if not self.available:
+            return [], None
+        
+        try:
+            query = (self._build_job_query(plan)
+                    .order_by('created_at', direction=firestore.Query.DESCENDING))
+            
+            if isinstance(start_after, str):
+                snapshot = self.db.db.collection('jobs').document(start_after).get()
+                start_after = snapshot if snapshot.exists else None
+            if start_after is not None:
+                query = query.start_after(start_after)
+            elif offset:
+                query = query.offset(offset)
+            
+            jobs = []
+            last_snapshot = None
+            for doc in query.limit(limit).stream():
+                job_data = doc.to_dict()
+                job_data['id'] = doc.id
+                jobs.append(job_data)
+                last_snapshot = doc
+            
+            return jobs, last_snapshot
+            
+        except Exception as e:
+            logger.error(f"❌ Failed to query jobs ({plan.describe()}): {e}")
+            return [], None
+    
+    def count_jobs(self, plan) -> Optional[int]:
+        """Server-side count of jobs matching the pushed-down clauses"""
+        if not self.available:
+            return None
+        
+        try:
+            result = self._build_job_query(plan).count(alias='total').get()
+            return int(result[0][0].value)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to count jobs ({plan.describe()}): {e}")
+            return None
+    
     def add_gallery_item(self, gallery_data: Dict[str, Any]) -> Optional[str]:
         """Add item to gallery"""
         return self.db.add_gallery_item(gallery_data)
@@ -204,6 +263,87 @@ class GCPJobManager:
             logger.error(f"❌ Failed to get batch jobs for {batch_id}: {e}")
             return []
     
+    def get_batch_children(self, batch_parent_id: str, limit: Optional[int] = None,
+                           after_index: Optional[int] = None, status: Optional[str] = None,
+                           fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Indexed lookup of a batch's children by batch_parent_id.
+        
+        Pages are ordered by batch_index (after_index continues a page) unless
+        a status filter is given; fields projects away large output data.
+        """
+        if not self.available:
+            return []
+        
+        try:
+            query = self.db.db.collection('jobs').where('batch_parent_id', '==', batch_parent_id)
+            if status:
+                query = query.where('status', '==', status)
+            else:
+                query = query.order_by('batch_index')
+                if after_index is not None:
+                    query = query.start_after({'batch_index': after_index})
+            if fields:
+                query = query.select(list(fields))
+            if limit:
+                query = query.limit(limit)
+            
+            jobs = []
+            for doc in query.stream():
+                job_data = doc.to_dict()
+                job_data['id'] = doc.id
+                jobs.append(job_data)
+            return jobs
+            
+        except Exception as e:
+            logger.error(f"❌ Failed to get children for batch {batch_parent_id}: {e}")
+            return []
+    
+    def watch_batch_children(self, batch_parent_id: str,
+                             callback: Callable[[List[Dict[str, Any]]], None]) -> Optional[Any]:
+        """
+        Listen to a batch's children; callback gets the changed child dicts.
+        
+        The first callback carries every current child. Returns the Firestore
+        watch (call .unsubscribe() to stop) or None if listeners are unavailable.
+        """
+        if not self.available:
+            return None
+        
+        def on_snapshot(docs, changes, read_time):
+            children = []
+            for change in changes:
+                if change.type.name == 'REMOVED':
+                    continue
+                job_data = change.document.to_dict()
+                job_data['id'] = change.document.id
+                children.append(job_data)
+            callback(children)
+        
+        try:
+            query = self.db.db.collection('jobs').where('batch_parent_id', '==', batch_parent_id)
+            return query.on_snapshot(on_snapshot)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not watch children of batch {batch_parent_id}: {e}")
+            return None
+    
+    def count_batch_children(self, batch_parent_id: str, statuses: Sequence[str]) -> Optional[Dict[str, int]]:
+        """Server-side child counts (total and per status) for a batch, or None if unavailable"""
+        if not self.available:
+            return None
+        
+        try:
+            children = self.db.db.collection('jobs').where('batch_parent_id', '==', batch_parent_id)
+            counts = {'total': int(children.count(alias='n').get()[0][0].value)}
+            for status in statuses:
+                result = children.where('status', '==', status).count(alias='n').get()
+                counts[status] = int(result[0][0].value)
+            return counts
+            
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to count children for batch {batch_parent_id}: {e}")
+            return None
+    
     def update_batch_progress(self, batch_id: str) -> bool:
         """Update batch job progress based on individual job completions"""
         if not self.available:
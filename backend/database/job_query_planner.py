@@ -0,0 +1,108 @@
+"""
+Job Query Planner
+Maps job list filters onto Firestore queries backed by the composite indexes in
+config/firestore_indexes.py, with opaque start_after cursors for pagination.
+
+Filters an index cannot serve (or that Firestore cannot combine, such as a
+second `in` clause) are kept as residual filters applied while streaming, so a
+query is always valid and the common combinations run entirely server-side.
+
+Legacy jobs written before user_id was stored belong to the default
+'current_user'; scripts/backfill_job_user_ids.py stores that value on them so
+the user_id filter is always pushed down like any other equality.
+"""
+
+import base64
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from config.firestore_indexes import validate_index_coverage
+
+ORDER_FIELD = "created_at"
+
+@dataclass
+class JobQueryPlan:
+    """Server-side clauses plus the filters left to apply in Python"""
+    equality: List[Tuple[str, Any]] = field(default_factory=list)
+    membership: Optional[Tuple[str, List[Any]]] = None
+    residual: Dict[str, Set[Any]] = field(default_factory=dict)
+
+    @property
+    def exact(self) -> bool:
+        """True when Firestore alone returns exactly the matching jobs"""
+        return not self.residual
+
+    @property
+    def indexed_fields(self) -> List[str]:
+        fields = [name for name, _ in self.equality]
+        if self.membership:
+            fields.append(self.membership[0])
+        return fields
+
+    def matches(self, job_data: Dict[str, Any]) -> bool:
+        """Apply residual filters to a raw job document"""
+        return all(job_data.get(name) in allowed for name, allowed in self.residual.items())
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'equality': [name for name, _ in self.equality],
+            'membership': self.membership[0] if self.membership else None,
+            'residual': sorted(self.residual),
+            'exact': self.exact
+        }
+
+def plan_job_query(
+    user_id: Optional[str] = None,
+    job_types: Optional[Sequence[str]] = None,
+    status: Optional[str] = None,
+    task_types: Optional[Sequence[str]] = None
+) -> JobQueryPlan:
+    """
+    Choose which filters to push down, most selective first.
+
+    A filter is pushed down only if the resulting field set (plus the
+    created_at ordering) is covered by a composite index; at most one
+    multi-valued filter becomes an `in` clause.
+    """
+    candidates: List[Tuple[str, List[Any]]] = []
+    if user_id and user_id != "all":
+        candidates.append(("user_id", [user_id]))
+    if status:
+        candidates.append(("status", [status]))
+    if job_types:
+        candidates.append(("job_type", list(dict.fromkeys(job_types))))
+    if task_types:
+        candidates.append(("task_type", list(dict.fromkeys(task_types))))
+
+    plan = JobQueryPlan()
+    for name, values in candidates:
+        fields = plan.indexed_fields + [name]
+        single = len(values) == 1
+        can_push = validate_index_coverage(fields, ORDER_FIELD) and (single or plan.membership is None)
+        # Firestore caps `in` clauses at 30 values
+        if can_push and not single and len(values) > 30:
+            can_push = False
+
+        if not can_push:
+            plan.residual[name] = set(values)
+        elif single:
+            plan.equality.append((name, values[0]))
+        else:
+            plan.membership = (name, values)
+
+    return plan
+
+def encode_cursor(doc_id: str) -> str:
+    """Opaque page token for the last document of a page"""
+    return base64.urlsafe_b64encode(json.dumps({'after': doc_id}).encode()).decode().rstrip("=")
+
+def decode_cursor(token: Optional[str]) -> Optional[str]:
+    """Document ID encoded in a page token (None for the first page or a bad token)"""
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))['after']
+    except (ValueError, KeyError, TypeError):
+        return None
@@ -3,13 +3,25 @@ Database schema extensions for Boltz-2 post-processing results.
 Adds derived scientific metrics while maintaining backward compatibility.
 """
 
-from typing import Dict, List, Optional, Any
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from datetime import datetime
+from collections import Counter
+import asyncio
+import hashlib
 import json
 import logging
+import math
+import zlib
 
 logger = logging.getLogger(__name__)
 
+# Live analytics are spread over shard documents to stay under Firestore's
+# sustained per-document write rate when many children complete at once
+INCREMENTAL_ANALYTICS_SHARDS = 8
+
+# Children of one batch can finish together; allow more retries than the default 5
+CLUSTER_STATE_TRANSACTION_ATTEMPTS = 10
+
 class PostProcessingSchema:
     """
     Manages database schema for post-processed Boltz-2 results.
@@ -62,9 +74,22 @@ class PostProcessingSchema:
             "cluster_summary": "JSON",  # Clustering analysis summary
             "total_jobs": "INTEGER",  # Total jobs in batch
             "processed_jobs": "INTEGER",  # Successfully processed jobs
+            "stage_timings": "JSON",  # Seconds spent per processing stage
             "processing_completed_at": "TIMESTAMP",
             "processing_version": "VARCHAR(50)"
         }
+    
+    @staticmethod
+    def get_binding_mode_cluster_schema() -> Dict[str, str]:
+        """
+        Returns schema for persisted binding-mode clustering state.
+        Lets late-completing jobs be assigned without re-clustering the batch.
+        """
+        return {
+            "batch_id": "VARCHAR(255) PRIMARY KEY",
+            "state": "JSON",  # Residue vocabulary, centroids and cluster sizes
+            "updated_at": "TIMESTAMP"
+        }
 
 class JobPostProcessingModel:
     """
@@ -132,6 +157,7 @@ class BatchAnalysisModel:
         self.cluster_summary: Dict[str, Any] = {}
         self.total_jobs: int = 0
         self.processed_jobs: int = 0
+        self.stage_timings: Dict[str, float] = {}
         self.processing_completed_at: Optional[datetime] = None
         self.processing_version: str = "1.0"
     
@@ -145,6 +171,7 @@ class BatchAnalysisModel:
             "cluster_summary": json.dumps(self.cluster_summary),
             "total_jobs": self.total_jobs,
             "processed_jobs": self.processed_jobs,
+            "stage_timings": json.dumps(self.stage_timings),
             "processing_completed_at": self.processing_completed_at.isoformat() if self.processing_completed_at else None,
             "processing_version": self.processing_version
         }
@@ -155,7 +182,7 @@ class BatchAnalysisModel:
         instance = cls(data["batch_id"])
         
         # Parse JSON fields
-        json_fields = ["hotspot_residues", "binding_mode_counts", "scaffold_diversity", "cluster_summary"]
+        json_fields = ["hotspot_residues", "binding_mode_counts", "scaffold_diversity", "cluster_summary", "stage_timings"]
         for field in json_fields:
             if field in data and data[field]:
                 try:
@@ -173,6 +200,111 @@ class BatchAnalysisModel:
         
         return instance
 
+class IncrementalBatchAnalyticsModel:
+    """
+    Running batch analytics updated as each child completes.
+    
+    Each shard document holds hotspot counters, compact scaffold hashes and
+    streaming sum/sum-of-squares/min/max per metric. Shards are merged on
+    read, so reads and updates are both independent of batch size.
+    """
+    
+    METRICS = ("affinity", "confidence")
+    
+    def __init__(self, batch_id: str):
+        self.batch_id = batch_id
+        self.completed_jobs: int = 0
+        self.contact_jobs: int = 0
+        self.hotspot_counts: Counter = Counter()
+        self.scaffold_hashes: set = set()
+        self.scaffold_compounds: int = 0
+        self.metric_stats: Dict[str, Dict[str, float]] = {}
+    
+    @staticmethod
+    def shard_for(job_id: str) -> int:
+        """Stable shard index for a job"""
+        return zlib.crc32(job_id.encode()) % INCREMENTAL_ANALYTICS_SHARDS
+    
+    @staticmethod
+    def residue_key(contact: Iterable) -> str:
+        """Flatten a (segid, resname, resid) contact into a map key"""
+        segid, resname, resid = contact
+        return f"{segid}:{resname}:{resid}"
+    
+    @staticmethod
+    def scaffold_hash(scaffold_smiles: str) -> str:
+        """Short stable hash used to count unique scaffolds compactly"""
+        return hashlib.blake2b(scaffold_smiles.encode(), digest_size=6).hexdigest()
+    
+    def merge_shard(self, data: Dict[str, Any]) -> None:
+        """Fold one shard document into the merged view"""
+        self.completed_jobs += data.get("completed_jobs", 0)
+        self.contact_jobs += data.get("contact_jobs", 0)
+        self.scaffold_compounds += data.get("scaffold_compounds", 0)
+        self.hotspot_counts.update(data.get("hotspots", {}))
+        self.scaffold_hashes.update(data.get("scaffolds", []))
+        
+        for metric, stats in data.get("stats", {}).items():
+            merged = self.metric_stats.get(metric)
+            if merged is None:
+                self.metric_stats[metric] = dict(stats)
+                continue
+            merged["count"] = merged.get("count", 0) + stats.get("count", 0)
+            merged["sum"] = merged.get("sum", 0.0) + stats.get("sum", 0.0)
+            merged["sum_sq"] = merged.get("sum_sq", 0.0) + stats.get("sum_sq", 0.0)
+            merged["min"] = min(merged.get("min", math.inf), stats.get("min", math.inf))
+            merged["max"] = max(merged.get("max", -math.inf), stats.get("max", -math.inf))
+    
+    def summarize_metrics(self) -> Dict[str, Dict[str, float]]:
+        """Mean, standard deviation and range per tracked metric"""
+        summary = {}
+        for metric, stats in self.metric_stats.items():
+            count = stats.get("count", 0)
+            if not count:
+                continue
+            mean = stats["sum"] / count
+            variance = max(stats["sum_sq"] / count - mean * mean, 0.0)
+            summary[metric] = {
+                "count": count,
+                "mean": round(mean, 4),
+                "std": round(math.sqrt(variance), 4),
+                "min": stats.get("min"),
+                "max": stats.get("max")
+            }
+        return summary
+    
+    def to_analysis_dict(self, total_jobs: Optional[int] = None) -> Dict[str, Any]:
+        """Render in the same shape as the final batch analysis"""
+        hotspots = []
+        for residue_key, count in self.hotspot_counts.most_common(10):
+            segid, resname, resid = residue_key.split(":", 2)
+            hotspots.append({
+                "residue": f"{resname}{resid}",
+                "chain": segid,
+                "count": count,
+                "percentage": round(count / max(self.contact_jobs, 1) * 100, 1),
+                "residue_key": residue_key
+            })
+        
+        unique_scaffolds = len(self.scaffold_hashes)
+        return {
+            "hotspot_residues": hotspots,
+            "binding_modes": {},
+            "scaffold_diversity": {
+                "total_compounds": self.completed_jobs,
+                "valid_smiles": self.scaffold_compounds,
+                "unique_scaffolds": unique_scaffolds,
+                "scaffold_diversity": unique_scaffolds / max(self.scaffold_compounds, 1)
+            },
+            "cluster_summary": {},
+            "metric_summary": self.summarize_metrics(),
+            "processing_stats": {
+                "total_jobs": total_jobs if total_jobs is not None else self.completed_jobs,
+                "processed_jobs": self.completed_jobs,
+                "partial": True
+            }
+        }
+
 # GCP Firestore integration helpers
 class FirestorePostProcessingService:
     """
@@ -184,6 +316,9 @@ class FirestorePostProcessingService:
         self.db = firestore_client
         self.jobs_collection = "jobs"
         self.batch_analysis_collection = "batch_analysis"
+        self.binding_mode_collection = "binding_mode_clusters"
+        self.incremental_analytics_collection = "batch_analytics_live"
+        self.incremental_counted_collection = "batch_analytics_counted"
     
     async def store_job_post_processing(self, job_id: str, results: Dict[str, Any]) -> bool:
         """
@@ -230,6 +365,7 @@ class FirestorePostProcessingService:
             model.cluster_summary = analysis_results.get("cluster_summary", {})
             model.total_jobs = analysis_results.get("total_jobs", 0)
             model.processed_jobs = analysis_results.get("processed_jobs", 0)
+            model.stage_timings = analysis_results.get("stage_timings", {})
             model.processing_completed_at = datetime.now()
             
             # Store batch analysis
@@ -259,6 +395,201 @@ class FirestorePostProcessingService:
             logger.error(f"Failed to retrieve batch analysis for batch {batch_id}: {e}")
             return None
 
+    async def store_cluster_state(self, batch_id: str, state: Dict[str, Any]) -> bool:
+        """
+        Store binding-mode clustering state for incremental assignment.
+        """
+        try:
+            state_ref = self.db.collection(self.binding_mode_collection).document(batch_id)
+            await state_ref.set({
+                "batch_id": batch_id,
+                "state": json.dumps(state),
+                "updated_at": datetime.now().isoformat()
+            })
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to store cluster state for batch {batch_id}: {e}")
+            return False
+    
+    async def get_cluster_state(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Retrieve binding-mode clustering state.
+        """
+        try:
+            state_ref = self.db.collection(self.binding_mode_collection).document(batch_id)
+            doc = await state_ref.get()
+            
+            if doc.exists:
+                return json.loads(doc.to_dict()["state"])
+            
+            return None
+            
+        except Exception as e:
+            logger.error(f"Failed to retrieve cluster state for batch {batch_id}: {e}")
+            return None
+    
+    async def update_cluster_state(
+        self,
+        batch_id: str,
+        update: Callable[[Dict[str, Any]], Tuple[Dict[str, Any], Any]]
+    ) -> Optional[Any]:
+        """
+        Read-modify-write the clustering state in a transaction.
+        
+        `update` receives the current state and returns (new_state, result).
+        Concurrent children of one batch would otherwise overwrite each other's
+        centroid and count updates; on contention Firestore retries the
+        transaction, so `update` may run more than once. Returns None if the
+        batch has not been clustered yet.
+        """
+        try:
+            from google.cloud import firestore
+            
+            state_ref = self.db.collection(self.binding_mode_collection).document(batch_id)
+            
+            @firestore.async_transactional
+            async def apply(transaction):
+                doc = await state_ref.get(transaction=transaction)
+                if not doc.exists:
+                    return None
+                state, result = update(json.loads(doc.to_dict()["state"]))
+                transaction.set(state_ref, {
+                    "batch_id": batch_id,
+                    "state": json.dumps(state),
+                    "updated_at": datetime.now().isoformat()
+                })
+                return result
+            
+            return await apply(self.db.transaction(max_attempts=CLUSTER_STATE_TRANSACTION_ATTEMPTS))
+            
+        except Exception as e:
+            logger.error(f"Failed to update cluster state for batch {batch_id}: {e}")
+            return None
+    
+    async def update_job_clusters(self, assignments: Dict[str, Dict[str, Any]]) -> bool:
+        """
+        Write cluster_id/cluster_label onto job documents.
+        Uses batched writes (Firestore allows 500 operations per batch).
+        """
+        try:
+            items = list(assignments.items())
+            for start in range(0, len(items), 500):
+                write_batch = self.db.batch()
+                for job_id, cluster in items[start:start + 500]:
+                    job_ref = self.db.collection(self.jobs_collection).document(job_id)
+                    write_batch.update(job_ref, {
+                        "cluster_id": cluster["cluster_id"],
+                        "cluster_label": cluster["cluster_label"]
+                    })
+                await write_batch.commit()
+            
+            logger.info(f"Updated cluster assignments for {len(items)} jobs")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to update job cluster assignments: {e}")
+            return False
+
+    async def record_incremental_analytics(
+        self,
+        batch_id: str,
+        job_id: str,
+        contacts: List[Iterable],
+        scaffold_smiles: Optional[str],
+        metrics: Dict[str, float]
+    ) -> bool:
+        """
+        Fold one completed child into the live batch analytics, at most once.
+        
+        Server-side transforms keep the update O(1). They run in a transaction
+        with a per-child "counted" marker, so a redelivered or retried
+        completion is skipped instead of counted twice. Returns False if the
+        child was already counted or the write failed.
+        """
+        try:
+            from google.cloud import firestore
+            
+            update: Dict[str, Any] = {
+                "batch_id": batch_id,
+                "completed_jobs": firestore.Increment(1),
+                "updated_at": datetime.now().isoformat()
+            }
+            
+            if contacts:
+                update["contact_jobs"] = firestore.Increment(1)
+                update["hotspots"] = {
+                    IncrementalBatchAnalyticsModel.residue_key(contact): firestore.Increment(1)
+                    for contact in contacts
+                }
+            
+            if scaffold_smiles is not None:
+                update["scaffold_compounds"] = firestore.Increment(1)
+                update["scaffolds"] = firestore.ArrayUnion(
+                    [IncrementalBatchAnalyticsModel.scaffold_hash(scaffold_smiles)]
+                )
+            
+            stats_update = {}
+            for metric, value in metrics.items():
+                if metric not in IncrementalBatchAnalyticsModel.METRICS or value is None:
+                    continue
+                value = float(value)
+                stats_update[metric] = {
+                    "count": firestore.Increment(1),
+                    "sum": firestore.Increment(value),
+                    "sum_sq": firestore.Increment(value * value),
+                    "min": firestore.Minimum(value),
+                    "max": firestore.Maximum(value)
+                }
+            if stats_update:
+                update["stats"] = stats_update
+            
+            shard = IncrementalBatchAnalyticsModel.shard_for(job_id)
+            shard_ref = self.db.collection(self.incremental_analytics_collection).document(f"{batch_id}_{shard}")
+            marker_ref = self.db.collection(self.incremental_counted_collection).document(f"{batch_id}_{job_id}")
+            
+            @firestore.async_transactional
+            async def apply(transaction) -> bool:
+                marker = await marker_ref.get(transaction=transaction)
+                if marker.exists:
+                    return False
+                transaction.set(shard_ref, update, merge=True)
+                transaction.set(marker_ref, {"batch_id": batch_id, "job_id": job_id, "shard": shard})
+                return True
+            
+            counted = await apply(self.db.transaction())
+            if not counted:
+                logger.debug(f"Job {job_id} already counted in live analytics for batch {batch_id}")
+            return counted
+            
+        except Exception as e:
+            logger.error(f"Failed to record incremental analytics for job {job_id} in batch {batch_id}: {e}")
+            return False
+    
+    async def get_incremental_analytics(self, batch_id: str) -> Optional[IncrementalBatchAnalyticsModel]:
+        """
+        Merge the live analytics shards for a batch.
+        """
+        try:
+            collection = self.db.collection(self.incremental_analytics_collection)
+            docs = await asyncio.gather(*(
+                collection.document(f"{batch_id}_{shard}").get()
+                for shard in range(INCREMENTAL_ANALYTICS_SHARDS)
+            ))
+            
+            model = IncrementalBatchAnalyticsModel(batch_id)
+            found = False
+            for doc in docs:
+                if doc.exists:
+                    model.merge_shard(doc.to_dict())
+                    found = True
+            
+            return model if found else None
+            
+        except Exception as e:
+            logger.error(f"Failed to retrieve incremental analytics for batch {batch_id}: {e}")
+            return None
+
 # Migration script for existing databases
 FIRESTORE_MIGRATION_SCRIPT = """
 # Add these fields to existing job documents:
@@ -283,4 +614,10 @@ FIRESTORE_MIGRATION_SCRIPT = """
 
 # Create new collection: batch_analysis
 # Documents will be created as batches are processed
+
+# Create new collection: batch_analytics_live
+# Sharded documents ({batch_id}_{shard}) updated as each child completes
+
+# Create new collection: batch_analytics_counted
+# One marker document ({batch_id}_{job_id}) per child already folded into the live analytics
 """
\ No newline at end of file
@@ -4,8 +4,9 @@ Provides a consistent interface for job operations using GCP Firestore + Cloud S
 """
 
 import logging
-from typing import Optional, Dict, Any, List, Union
+from typing import Callable, Optional, Dict, Any, List, Sequence, Tuple, Union
 from database.gcp_job_manager import gcp_job_manager
+from services.offload import run_sync
 
 logger = logging.getLogger(__name__)
 
@@ -88,6 +89,21 @@ class UnifiedJobManager:
         """Get all jobs in a batch"""
         return self.primary_backend.get_batch_jobs(batch_id)
     
+    def get_batch_children(self, batch_parent_id: str, limit: Optional[int] = None,
+                           after_index: Optional[int] = None, status: Optional[str] = None,
+                           fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Get a page of batch children by parent index"""
+        return self.primary_backend.get_batch_children(batch_parent_id, limit, after_index, status, fields)
+    
+    def count_batch_children(self, batch_parent_id: str, statuses: Sequence[str]) -> Optional[Dict[str, int]]:
+        """Count batch children per status"""
+        return self.primary_backend.count_batch_children(batch_parent_id, statuses)
+    
+    def watch_batch_children(self, batch_parent_id: str,
+                             callback: Callable[[List[Dict[str, Any]]], None]) -> Optional[Any]:
+        """Listen to batch child changes (None if the backend has no listeners)"""
+        return self.primary_backend.watch_batch_children(batch_parent_id, callback)
+    
     def update_batch_progress(self, batch_id: str) -> bool:
         """Update batch job progress"""
         return self.primary_backend.update_batch_progress(batch_id)
@@ -103,8 +119,9 @@ class UnifiedJobManager:
     def get_user_batch_parents(self, user_id: str, limit: int = 200) -> List[Dict[str, Any]]:
         """Get batch parent jobs for a user - CRITICAL for My Batches visibility"""
         try:
-            from config.gcp_database import gcp_database
             from models.enhanced_job_model import JobType
+            from services.service_registry import service_registry
+            gcp_database = service_registry.get("gcp_database")
             
             logger.info(f"🔍 Searching for batch parents for user {user_id}")
             
@@ -134,30 +151,39 @@ class UnifiedJobManager:
         """Get jobs for a specific user"""
         return self.primary_backend.get_user_jobs(user_id, limit)
     
-    # Legacy async methods for backward compatibility
+    def query_jobs(self, plan, limit: int, start_after: Any = None,
+                   offset: int = 0) -> Tuple[List[Dict[str, Any]], Any]:
+        """Run a planned, index-backed jobs query"""
+        return self.primary_backend.query_jobs(plan, limit, start_after, offset)
+    
+    def count_jobs(self, plan) -> Optional[int]:
+        """Count jobs matching a planned query"""
+        return self.primary_backend.count_jobs(plan)
+    
+    # Async methods; the Firestore calls run on the shared offload pool, not the event loop
     async def create_job_async(self, job_data: Dict[str, Any]) -> str:
         """Async wrapper for create_job"""
-        return self.create_job(job_data)
+        return await run_sync(self.create_job, job_data)
     
     async def get_job_async(self, job_id: str) -> Optional[Dict[str, Any]]:
         """Async wrapper for get_job"""
-        return self.get_job(job_id)
+        return await run_sync(self.get_job, job_id)
     
     async def get_all_jobs(self, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
         """Get all jobs with pagination"""
-        jobs = self.get_recent_jobs(limit)
+        jobs = await run_sync(self.get_recent_jobs, limit)
         # Apply offset if needed
         return jobs[offset:] if offset > 0 else jobs
     
     async def update_job_status_async(self, job_id: str, status: str, 
                                      result_data: Optional[Dict[str, Any]] = None) -> bool:
         """Async wrapper for update_job_status"""
-        return self.update_job_status(job_id, status, result_data)
+        return await run_sync(self.update_job_status, job_id, status, result_data)
     
     async def update_job_results(self, job_id: str, results: Dict[str, Any], 
                                 status: str) -> bool:
         """Update job results and status"""
-        return self.update_job_status(job_id, status, results)
+        return await run_sync(self.update_job_status, job_id, status, results)
     
     async def delete_job(self, job_id: str) -> bool:
         """Delete a job - not implemented for safety"""
@@ -166,12 +192,12 @@ class UnifiedJobManager:
     
     async def get_jobs_by_status_async(self, status: str) -> List[Dict[str, Any]]:
         """Async wrapper for get_jobs_by_status"""
-        return self.get_jobs_by_status(status)
+        return await run_sync(self.get_jobs_by_status, status)
     
     async def get_job_count(self) -> int:
         """Get total job count"""
         try:
-            stats = self.get_job_stats()
+            stats = await run_sync(self.get_job_stats)
             return stats.get('total', 0)
         except Exception as e:
             logger.error(f"❌ Error getting job count: {e}")
@@ -179,7 +205,7 @@ class UnifiedJobManager:
     
     async def get_recent_jobs_async(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Async wrapper for get_recent_jobs"""
-        return self.get_recent_jobs(limit)
+        return await run_sync(self.get_recent_jobs, limit)
     
     def get_status(self) -> Dict[str, Any]:
         """Get manager status"""
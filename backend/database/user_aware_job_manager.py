@@ -12,6 +12,7 @@ from datetime import datetime, timedelta
 
 from google.cloud import firestore
 from google.cloud.firestore import FieldFilter, Query
+from config.gcp_clients import get_firestore_client
 import uuid
 
 logger = logging.getLogger(__name__)
@@ -42,7 +43,7 @@ class UserAwareJobManager:
     def __init__(self):
         # Initialize Firestore client with error handling
         try:
-            self.db = firestore.Client()
+            self.db = get_firestore_client()
             print("✅ UserAwareJobManager: Firestore client initialized")
         except Exception as e:
             print(f"⚠️ UserAwareJobManager: Firestore initialization failed: {e}")
@@ -7,9 +7,15 @@ AFTER: 11 clean, unified endpoints with consistent patterns
 """
 
 import os
+import sys
+import time
+import asyncio
 import logging
 from pathlib import Path
 
+# Cold-start reference point (import of this module through app ready)
+_IMPORT_STARTED = time.perf_counter()
+
 # Initialize logging service first
 logger = logging.getLogger(__name__)
 
@@ -53,6 +59,7 @@ from api.job_orchestration_api import router as jobs_router
 from api.auth_api import router as auth_router
 from api.webhook_api import router as webhook_router
 from api.async_prediction_api import router as async_api_router
+from api.profiling_api import router as profiling_router
 
 # Initialize logging service first (optional)
 try:
@@ -114,6 +121,7 @@ app.include_router(webhook_router)   # Webhook management API
 app.include_router(async_api_router) # Async prediction API (Cloud Run Jobs)
 app.include_router(jobs_router)      # Job orchestration API  
 app.include_router(api_v1_router)    # General consolidated API
+app.include_router(profiling_router) # Admin-only profiling
 
 # Add migration API for consolidating all jobs under deployment user
 try:
@@ -191,28 +199,42 @@ async def startup_event():
     logger.info("🎯 API version: v1")
     logger.info("📚 Documentation: /docs")
     
-    # Validate critical services on startup
-    try:
-        # Test database connection
-        from database.unified_job_manager import unified_job_manager
-        status = unified_job_manager.get_status()
-        logger.info(f"🗄️ DB status: {status}")
-        db_healthy = status.get("available", False)
-        
-        if db_healthy:
-            logger.info("✅ Database connection healthy")
-        else:
-            logger.warning("⚠️ Database connection issues detected")
-            
-    except Exception as e:
-        logger.error(f"❌ Startup health check failed: {e}")
+    logger.info(f"⏱️ Cold start: app ready {time.perf_counter() - _IMPORT_STARTED:.2f}s after import")
+    
+    # Event-loop lag tracking and stall attribution (one timer per interval; cheap enough to leave on)
+    if os.getenv("ENABLE_LOOP_LAG_MONITOR", "true").lower() == "true":
+        from monitoring.profiler import loop_blocking_detector, loop_lag_monitor
+        loop_lag_monitor.start()
+        loop_blocking_detector.start()
+    
+    # Connect and validate services after the port opens instead of before it
+    WARM_SERVICES_ON_STARTUP = os.getenv("WARM_SERVICES_ON_STARTUP", "true").lower() == "true"
+    if WARM_SERVICES_ON_STARTUP:
+        app.state.warm_task = asyncio.create_task(_warm_services())
+    
+    # Keep near caches coherent across replicas (needs Redis; caches stay local without it)
+    if os.getenv("REDIS_URL"):
+        try:
+            from services.near_cache import coherence_bus
+            await coherence_bus.start()
+        except Exception as e:
+            logger.error(f"❌ Failed to start cache coherence bus: {e}")
+    
+    # Re-pack fleet-packing batches stranded in 'queued' by a restart
+    if os.getenv("CLOUD_RUN_FLEET_PACKING", "false").lower() == "true":
+        try:
+            from services.service_registry import service_registry
+            processor = service_registry.get("cloud_run_batch_processor")
+            app.state.pack_recovery_task = asyncio.create_task(processor.run_queue_recovery())
+        except Exception as e:
+            logger.error(f"❌ Failed to start queued batch recovery: {e}")
     
     # Start job monitoring service (optional for Cloud Run)
     ENABLE_JOB_MONITORING = os.getenv("ENABLE_JOB_MONITORING", "false").lower() == "true"
     if ENABLE_JOB_MONITORING:
         try:
-            from services.job_monitoring_service import job_monitoring_service
-            await job_monitoring_service.start_monitoring()
+            from services.service_registry import service_registry
+            await service_registry.get("job_monitoring_service").start_monitoring()
             logger.info("✅ Job monitoring service started")
         except Exception as e:
             logger.error(f"❌ Failed to start job monitoring service: {e}")
@@ -223,14 +245,33 @@ async def startup_event():
     ENABLE_SYSTEM_MONITORING = os.getenv("ENABLE_SYSTEM_MONITORING", "false").lower() == "true"
     if ENABLE_SYSTEM_MONITORING:
         try:
-            from services.monitoring_service import monitoring_service
-            await monitoring_service.start_monitoring()
+            from services.service_registry import service_registry
+            await service_registry.get("monitoring_service").start_monitoring()
             logger.info("✅ Monitoring service started")
         except Exception as e:
             logger.error(f"❌ Failed to start monitoring service: {e}")
     else:
         logger.info("ℹ️ System monitoring service disabled (ENABLE_SYSTEM_MONITORING=false)")
 
+async def _warm_services():
+    """Warm lazily created services in the background and validate the database"""
+    from services.service_registry import service_registry
+    
+    await service_registry.warm_up_async()
+    
+    # Validate critical services
+    try:
+        status = service_registry.get("unified_job_manager").get_status()
+        logger.info(f"🗄️ DB status: {status}")
+        
+        if status.get("available", False):
+            logger.info("✅ Database connection healthy")
+        else:
+            logger.warning("⚠️ Database connection issues detected")
+            
+    except Exception as e:
+        logger.error(f"❌ Startup health check failed: {e}")
+
 # Shutdown event
 @app.on_event("shutdown") 
 async def shutdown_event():
@@ -241,12 +282,39 @@ async def shutdown_event():
     ENABLE_JOB_MONITORING = os.getenv("ENABLE_JOB_MONITORING", "false").lower() == "true"
     if ENABLE_JOB_MONITORING:
         try:
-            from services.job_monitoring_service import job_monitoring_service
-            await job_monitoring_service.stop_monitoring()
+            from services.service_registry import service_registry
+            await service_registry.get("job_monitoring_service").stop_monitoring()
             logger.info("✅ Job monitoring service stopped")
         except Exception as e:
             logger.error(f"❌ Failed to stop job monitoring service: {e}")
     
+    # Flush queued webhook deliveries and close the pooled HTTP session
+    if 'services.webhook_service' in sys.modules:
+        try:
+            from services.webhook_service import webhook_service
+            await webhook_service.close()
+        except Exception as e:
+            logger.error(f"❌ Failed to close webhook service: {e}")
+    
+    # Write results-table rows still waiting for their coalesced flush
+    if 'services.batch_results_service' in sys.modules:
+        try:
+            from services.batch_results_service import batch_results_service
+            await batch_results_service.flush_results_tables()
+        except Exception as e:
+            logger.error(f"❌ Failed to flush batch results tables: {e}")
+    
+    if 'services.near_cache' in sys.modules:
+        from services.near_cache import coherence_bus
+        await coherence_bus.stop()
+    
+    from monitoring.profiler import loop_blocking_detector, loop_lag_monitor
+    await loop_lag_monitor.stop()
+    loop_blocking_detector.stop()
+    
+    from services.offload import offload_executor
+    offload_executor.shutdown(wait=False)
+    
     logger.info("✅ Clean shutdown completed")
 
 # Development server
@@ -13,6 +13,7 @@ from datetime import datetime, timedelta
 from fastapi import Request, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from google.cloud import firestore
+from config.gcp_clients import get_firestore_client
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +25,7 @@ class AuthMiddleware:
     def __init__(self):
         # Initialize Firestore client with error handling
         try:
-            self.db = firestore.Client()
+            self.db = get_firestore_client()
             print("✅ Firestore client initialized")
         except Exception as e:
             print(f"⚠️ Firestore initialization failed: {e}")
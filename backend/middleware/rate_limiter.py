@@ -21,6 +21,8 @@ from collections import defaultdict, deque
 from fastapi import Request, HTTPException, status
 from fastapi.responses import JSONResponse
 
+from services.io_budget import instrument_redis_client
+
 logger = logging.getLogger(__name__)
 
 # Redis integration (optional dependency)
@@ -186,6 +188,7 @@ class RedisRateLimiter:
                 socket_connect_timeout=5,
                 socket_timeout=5
             )
+            instrument_redis_client(self.redis_client)
             
             # Test connection
             await self.redis_client.ping()
@@ -8,17 +8,20 @@ import os
 import json
 import time
 import logging
+import random
 import subprocess
 import tempfile
 import base64
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 
 import torch
 import yaml
 import jwt
+from google.api_core.exceptions import PreconditionFailed
 from google.cloud import storage
 from google.cloud import firestore
+from services.ligand_cost import ligand_cost_size, lpt_assign
 
 # Configure logging
 logging.basicConfig(
@@ -27,6 +30,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+WORK_QUEUE_MAX_ATTEMPTS = 20
+# A claimed ligand not released within this long (its task hung or died) goes back on the queue
+WORK_QUEUE_LEASE_SECONDS = float(os.getenv("WORK_QUEUE_LEASE_SECONDS", "900"))
+
 class Boltz2CloudRunner:
     """L4-optimized Boltz-2 execution engine for Cloud Run with user validation"""
     
@@ -40,9 +47,14 @@ class Boltz2CloudRunner:
         self.output_path = os.getenv("OUTPUT_PATH")
         self.gpu_type = os.getenv("GPU_TYPE", "L4")
         self.auth_token = os.getenv("AUTH_TOKEN")  # JWT token for user validation
+        self.processing_mode = os.getenv("PROCESSING_MODE", "batch")
+        self.pack_id = os.getenv("PACK_ID")  # Fleet packs mix ligands from several users' batches
         
         # Validate required environment variables
-        if not all([self.user_id, self.job_id, self.input_path, self.output_path]):
+        if self.processing_mode == "packed":
+            if not all([self.pack_id, self.input_path]):
+                raise ValueError("Missing required environment variables")
+        elif not all([self.user_id, self.job_id, self.input_path, self.output_path]):
             raise ValueError("Missing required environment variables")
         
         # JWT Configuration for validation
@@ -53,16 +65,20 @@ class Boltz2CloudRunner:
         self.storage_client = storage.Client()
         self.db = firestore.Client()
         
-        # Validate user authorization before proceeding
-        self._validate_user_authorization()
+        # Validate user authorization before proceeding (pack entries are validated per batch)
+        if self.processing_mode != "packed":
+            self._validate_user_authorization()
         
         # L4 GPU optimizations
         self._configure_l4_optimizations()
         
         logger.info(f"🎮 Boltz2CloudRunner initialized for L4 GPU")
         logger.info(f"   Task: {self.task_index}/{self.task_count}")
-        logger.info(f"   User: {self.user_id} (validated)")
-        logger.info(f"   Job: {self.job_id}")
+        if self.processing_mode == "packed":
+            logger.info(f"   Pack: {self.pack_id}")
+        else:
+            logger.info(f"   User: {self.user_id} (validated)")
+            logger.info(f"   Job: {self.job_id}")
     
     def _validate_user_authorization(self):
         """Validate user authorization before processing"""
@@ -158,37 +174,54 @@ class Boltz2CloudRunner:
             input_data = self._load_input_data()
             
             # 2. Get ligands for this task (sharding)
-            my_ligands = self._get_task_ligands(input_data['ligands'])
+            protein_sequence, my_ligands = self._get_task_shard(input_data)
+            if self.processing_mode == "packed":
+                my_ligands = self._validate_pack_ligands(my_ligands)
+            
+            work_queue = input_data.get('work_queue') if self.processing_mode != "packed" else None
             
-            if not my_ligands:
+            if not my_ligands and not work_queue:
                 logger.info(f"📭 No ligands assigned to task {self.task_index}")
                 self._update_task_status("completed", {"message": "No ligands to process"})
                 return
             
             logger.info(f"🧪 Processing {len(my_ligands)} ligands in task {self.task_index}")
             
-            # 3. Process each ligand
+            # 3. Process each ligand (claimed through the shared queue when work stealing is on)
             results = []
-            for i, ligand in enumerate(my_ligands):
-                logger.info(f"🔬 Processing ligand {i+1}/{len(my_ligands)}: {ligand['name']}")
+            results_count = 0
+            ligand_source = (
+                self._claim_ligands(input_data) if work_queue
+                else ((None, ligand) for ligand in my_ligands)
+            )
+            for i, (queue_index, ligand) in enumerate(ligand_source):
+                logger.info(f"🔬 Processing ligand {i+1}/{max(len(my_ligands), i+1)}: {ligand['name']}")
                 
-                result = self._process_ligand(
-                    input_data['protein_sequence'],
-                    ligand
-                )
-                results.append(result)
+                result = self._process_ligand(protein_sequence, ligand)
+                for key in ('user_id', 'batch_id', 'ligand_index', 'job_id', 'output_path'):
+                    if key in ligand:
+                        result[key] = ligand[key]
+                results_count += 1
+                
+                if queue_index is not None:
+                    # Stored before the claim is released by the next claim, so a
+                    # crash or timeout never loses a ligand that left the queue
+                    self._save_results([result], results_name=f"queue_{queue_index}")
+                else:
+                    results.append(result)
                 
                 # Update progress in Firestore
-                progress = (i + 1) / len(my_ligands) * 100
+                progress = min(100.0, (i + 1) / max(len(my_ligands), 1) * 100)
                 self._update_progress(ligand['name'], result, progress)
             
-            # 4. Save results to GCS
-            self._save_results(results)
+            # 4. Save results to GCS (claimed ligands are already stored)
+            if results:
+                self._save_results(results)
             
             # 5. Update final status
             execution_time = time.time() - start_time
             self._update_task_status("completed", {
-                "results_count": len(results),
+                "results_count": results_count,
                 "execution_time_seconds": execution_time,
                 "gpu_type": self.gpu_type
             })
@@ -233,15 +266,139 @@ class Boltz2CloudRunner:
             logger.error(f"❌ Failed to load input data: {str(e)}")
             raise
     
+    def _get_task_shard(self, input_data: Dict[str, Any]) -> Tuple[str, List[Dict[str, Any]]]:
+        """Protein and ligands for this task from the shard manifest, falling back to round-robin"""
+        
+        shards = input_data.get('shards')
+        if not shards:
+            return input_data['protein_sequence'], self._get_task_ligands(input_data['ligands'])
+        if self.task_index >= len(shards):
+            return input_data.get('protein_sequence', ''), []
+        
+        shard = shards[self.task_index]
+        if isinstance(shard, dict):
+            # Fleet pack: protein and ligands travel with the shard
+            return shard['protein_sequence'], shard['ligands']
+        return input_data['protein_sequence'], [input_data['ligands'][i] for i in shard]
+    
+    def _validate_pack_ligands(self, ligands: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Keep only pack entries whose batch was assigned to this pack by the backend"""
+        
+        allowed = {}
+        valid = []
+        for ligand in ligands:
+            key = (ligand.get('user_id'), ligand.get('batch_id'))
+            if key not in allowed:
+                batch_doc = self.db.collection('users').document(key[0] or '_')\
+                    .collection('batches').document(key[1] or '_').get()
+                allowed[key] = batch_doc.exists and batch_doc.to_dict().get('pack_id') == self.pack_id
+                if not allowed[key]:
+                    logger.warning(f"⚠️ Batch {key[1]} is not part of pack {self.pack_id}, skipping its ligands")
+            if allowed[key]:
+                valid.append(ligand)
+        return valid
+    
     def _get_task_ligands(self, all_ligands: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Get ligands assigned to this task using round-robin sharding"""
+        """
+        Get ligands assigned to this task for inputs without a shard manifest.
         
-        my_ligands = []
-        for i, ligand in enumerate(all_ligands):
-            if i % self.task_count == self.task_index:
-                my_ligands.append(ligand)
+        Every task runs the same deterministic longest-processing-time-first
+        assignment over per-ligand cost estimates, so tasks agree on the split
+        without coordinating and no task draws all the large ligands.
+        """
         
-        return my_ligands
+        costs = [ligand_cost_size(ligand) for ligand in all_ligands]
+        assignment = lpt_assign(costs, self.task_count)
+        if self.task_index >= len(assignment):
+            return []
+        return [all_ligands[i] for i in assignment[self.task_index]]
+    
+    def _claim_ligands(self, input_data: Dict[str, Any]):
+        """
+        Yield (queue index, ligand) pairs claimed from the shared work queue
+        until it is empty.
+        
+        Each claim is released together with the next claim, i.e. only after
+        the caller has processed the ligand and stored its result.
+        """
+        
+        bucket_name = self.input_path.split('/')[2]
+        blob = self.storage_client.bucket(bucket_name).blob(input_data['work_queue'])
+        index = None
+        while True:
+            index = self._claim_from_queue(blob, release=index)
+            if index is None:
+                return
+            yield index, input_data['ligands'][index]
+    
+    def _requeue_claims(self, queue: Dict[str, Any], now: float) -> None:
+        """
+        Put back claims whose lease lapsed, plus any held under this task
+        index: a task releases each claim before taking the next, so such a
+        claim belongs to a crashed attempt of this task that Cloud Run retried.
+        """
+        
+        own_task = str(self.task_index)
+        for key, claim in list(queue['claims'].items()):
+            if claim['task'] == own_task or now - claim['claimed_at'] > WORK_QUEUE_LEASE_SECONDS:
+                del queue['claims'][key]
+                queue['tasks'].setdefault(own_task, []).insert(0, int(key))
+                logger.warning(f"♻️ Task {own_task} requeued ligand {key} claimed by task {claim['task']}")
+    
+    def _claim_from_queue(self, blob, release: Optional[int] = None) -> Optional[int]:
+        """
+        Release `release` and claim the next ligand index for this task from
+        the GCS work queue.
+        
+        Own shard first (largest ligands first); once it is empty, steal from
+        the tail of the task with the most estimated work left, leaving the
+        owner its large ligands. Claims record their task and time and lapse
+        after WORK_QUEUE_LEASE_SECONDS, so ligands held by a task that hung or
+        died are picked up by the next task to claim. Writes are
+        compare-and-swap on the object generation, so each ligand is held by
+        one task at a time.
+        """
+        
+        own_task = str(self.task_index)
+        for attempt in range(WORK_QUEUE_MAX_ATTEMPTS):
+            blob.reload()
+            generation = blob.generation
+            queue = json.loads(blob.download_as_text(if_generation_match=generation))
+            queue.setdefault('claims', {})
+            tasks, costs = queue['tasks'], queue.get('costs') or []
+            now = time.time()
+            
+            if release is not None:
+                queue['claims'].pop(str(release), None)
+            self._requeue_claims(queue, now)
+            
+            index = None
+            if tasks.get(own_task):
+                index = tasks[own_task].pop(0)
+            else:
+                victim = max(
+                    (task for task, indices in tasks.items() if indices),
+                    key=lambda task: sum(costs[i] if i < len(costs) else 1.0 for i in tasks[task]),
+                    default=None
+                )
+                if victim is not None:
+                    index = tasks[victim].pop()
+                    logger.info(f"🔀 Task {own_task} stole ligand {index} from task {victim}")
+            
+            if index is None and release is None:
+                return None
+            if index is not None:
+                queue['claims'][str(index)] = {'task': own_task, 'claimed_at': now}
+            
+            try:
+                blob.upload_from_string(json.dumps(queue), content_type="application/json",
+                                        if_generation_match=generation)
+                return index
+            except PreconditionFailed:
+                # Another task claimed concurrently; back off and re-read
+                time.sleep(random.uniform(0.05, 0.25) * (attempt + 1))
+        
+        raise RuntimeError(f"Could not claim work from queue after {WORK_QUEUE_MAX_ATTEMPTS} attempts")
     
     def _process_ligand(self, protein_sequence: str, ligand: Dict[str, Any]) -> Dict[str, Any]:
         """Process single ligand with Boltz-2 optimized for L4"""
@@ -368,34 +525,42 @@ class Boltz2CloudRunner:
                 "task_index": self.task_index
             }
     
-    def _save_results(self, results: List[Dict[str, Any]]):
-        """Save results to GCS"""
+    def _save_results(self, results: List[Dict[str, Any]], results_name: Optional[str] = None):
+        """Save results to GCS, per batch output path for fleet packs"""
         
         try:
-            # Parse output path
-            if self.output_path.startswith("gs://"):
-                bucket_name = self.output_path.split('/')[2]
-                blob_prefix = '/'.join(self.output_path.split('/')[3:])
-            else:
-                raise ValueError(f"Invalid GCS output path: {self.output_path}")
-            
-            bucket = self.storage_client.bucket(bucket_name)
-            
-            # Save task results as JSON
-            task_results_blob = bucket.blob(f"{blob_prefix}/task_{self.task_index}_results.json")
-            task_results_blob.upload_from_string(
-                json.dumps(results, indent=2),
-                content_type="application/json"
-            )
-            
-            # Save individual structure files
+            by_output: Dict[str, List[Dict[str, Any]]] = {}
             for result in results:
-                if result.get('structure_base64') and result['status'] == 'completed':
-                    structure_blob = bucket.blob(
-                        f"{blob_prefix}/structures/{result['ligand_name']}.cif"
-                    )
-                    structure_content = base64.b64decode(result['structure_base64'])
-                    structure_blob.upload_from_string(structure_content)
+                by_output.setdefault(result.get('output_path') or self.output_path, []).append(result)
+            
+            for output_path, output_results in by_output.items():
+                # Parse output path
+                if output_path and output_path.startswith("gs://"):
+                    bucket_name = output_path.split('/')[2]
+                    blob_prefix = '/'.join(output_path.split('/')[3:])
+                else:
+                    raise ValueError(f"Invalid GCS output path: {output_path}")
+                
+                bucket = self.storage_client.bucket(bucket_name)
+                
+                # Save task results as JSON
+                name = results_name or (
+                    f"pack_{self.pack_id}_task_{self.task_index}" if self.pack_id else f"task_{self.task_index}"
+                )
+                task_results_blob = bucket.blob(f"{blob_prefix}/{name}_results.json")
+                task_results_blob.upload_from_string(
+                    json.dumps(output_results, indent=2),
+                    content_type="application/json"
+                )
+                
+                # Save individual structure files
+                for result in output_results:
+                    if result.get('structure_base64') and result['status'] == 'completed':
+                        structure_blob = bucket.blob(
+                            f"{blob_prefix}/structures/{result['ligand_name']}.cif"
+                        )
+                        structure_content = base64.b64decode(result['structure_base64'])
+                        structure_blob.upload_from_string(structure_content)
             
             logger.info(f"💾 Saved {len(results)} results to GCS")
             
@@ -407,8 +572,13 @@ class Boltz2CloudRunner:
         """Update job progress in Firestore"""
         
         try:
-            job_ref = self.db.collection('users').document(self.user_id)\
-                .collection('jobs').document(self.job_id)
+            if result.get('batch_id'):
+                # Fleet pack entries report to their own batch
+                job_ref = self.db.collection('users').document(result['user_id'])\
+                    .collection('batches').document(result['batch_id'])
+            else:
+                job_ref = self.db.collection('users').document(self.user_id)\
+                    .collection('jobs').document(self.job_id)
             
             # Update with task-specific progress
             job_ref.update({
@@ -432,8 +602,11 @@ class Boltz2CloudRunner:
         """Update task status in Firestore"""
         
         try:
-            job_ref = self.db.collection('users').document(self.user_id)\
-                .collection('jobs').document(self.job_id)
+            if self.processing_mode == "packed":
+                job_ref = self.db.collection('shard_packs').document(self.pack_id)
+            else:
+                job_ref = self.db.collection('users').document(self.user_id)\
+                    .collection('jobs').document(self.job_id)
             
             update_data = {
                 f'task_status.task_{self.task_index}': {
@@ -3,13 +3,17 @@ Enhanced Job Model for OMTX-Hub Unified Architecture
 Provides consistent data structures for individual, batch parent, and batch child jobs
 """
 
-from dataclasses import dataclass, asdict, field
-from typing import Dict, Any, List, Optional
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Any, List, Optional
 from enum import Enum
 import time
 import uuid
 import logging
 
+if TYPE_CHECKING:
+    from models.job_frame import JobFrame
+
 logger = logging.getLogger(__name__)
 
 class JobType(str, Enum):
@@ -40,9 +44,33 @@ class TaskType(str, Enum):
     EPITOPE_TARGETED_DESIGN = "epitope_targeted_design"
     ANTIBODY_DE_NOVO_DESIGN = "antibody_de_novo_design"
 
-@dataclass
+# Enum lookups by stored value; JobType/JobStatus are str enums so members hash like their values
+_JOB_TYPES = {member.value: member for member in JobType}
+_JOB_STATUSES = {member.value: member for member in JobStatus}
+
+def _to_timestamp(value: Any) -> Optional[float]:
+    """Normalize Firestore timestamps, datetimes and ISO strings to epoch seconds"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if hasattr(value, 'timestamp'):
+        return value.timestamp()
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            return None
+    return None
+
+@dataclass(slots=True)
 class EnhancedJobData:
-    """Enhanced job data structure for unified handling"""
+    """
+    Enhanced job data structure for unified handling.
+    
+    Slotted to keep per-instance overhead low when batch endpoints load
+    thousands of children; see models/job_frame.py for bulk status reads.
+    """
     
     # Core identification
     id: str
@@ -109,24 +137,21 @@ class EnhancedJobData:
         
         Senior Principal Engineering Note: Firestore has 1MB document limit.
         We store only lightweight metadata in Firestore and keep large data in GCP Storage.
-        """
-        data = asdict(self)
-        
-        # Convert enums to strings
-        data['job_type'] = self.job_type.value
-        data['status'] = self.status.value
-        
-        # ✅ CRITICAL FIX: Exclude large fields that can exceed 1MB Firestore limit
-        large_fields_to_exclude = [
-            'output_data',  # Can be >1MB with structure files and detailed prediction data
-        ]
         
+        Nested containers (input_data, batch_metadata, ...) are shared with
+        the job rather than deep-copied; output_data is never touched.
+        """
         # Keep only lightweight metadata for Firestore
         cleaned_data = {}
-        for key, value in data.items():
-            if value is not None and key not in large_fields_to_exclude:
+        for key in _FIRESTORE_FIELDS:
+            value = getattr(self, key)
+            if value is not None:
                 cleaned_data[key] = value
         
+        # Convert enums to strings
+        cleaned_data['job_type'] = self.job_type.value
+        cleaned_data['status'] = self.status.value
+        
         # Add lightweight indicators for API compatibility
         cleaned_data['has_results'] = self.output_data is not None
         cleaned_data['results_in_gcp'] = bool(self.gcp_storage_path)
@@ -159,9 +184,9 @@ class EnhancedJobData:
         
         # Convert string enums back to enum objects
         if 'job_type' in data:
-            data['job_type'] = JobType(data['job_type'])
+            data['job_type'] = _JOB_TYPES.get(data['job_type']) or JobType(data['job_type'])
         if 'status' in data:
-            data['status'] = JobStatus(data['status'])
+            data['status'] = _JOB_STATUSES.get(data['status']) or JobStatus(data['status'])
         
         # Handle missing fields with defaults
         data.setdefault('created_at', time.time())
@@ -190,9 +215,8 @@ class EnhancedJobData:
             return None
         
         # Validate job_type is valid
-        try:
-            job_type = JobType(job_type_str)
-        except ValueError:
+        job_type = _JOB_TYPES.get(job_type_str)
+        if job_type is None:
             # Invalid job_type value = corrupted or legacy, ignore it
             return None
         
@@ -205,25 +229,8 @@ class EnhancedJobData:
             return None
         
         # Validate status is valid
-        try:
-            status = JobStatus(job_data.get('status', 'pending'))
-        except ValueError:
-            return None
-        
-        # Convert timestamp fields properly
-        def convert_timestamp(value):
-            if value is None:
-                return None
-            if isinstance(value, (int, float)):
-                return value
-            if hasattr(value, 'timestamp'):
-                return value.timestamp()
-            if isinstance(value, str):
-                from datetime import datetime
-                try:
-                    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
-                except:
-                    return None
+        status = _JOB_STATUSES.get(job_data.get('status', 'pending'))
+        if status is None:
             return None
         
         # Build the enhanced job with validated data
@@ -234,10 +241,10 @@ class EnhancedJobData:
                 job_type=job_type,
                 task_type=job_data['task_type'],
                 status=status,
-                created_at=convert_timestamp(job_data.get('created_at')) or time.time(),
-                started_at=convert_timestamp(job_data.get('started_at')),
-                completed_at=convert_timestamp(job_data.get('completed_at')),
-                updated_at=convert_timestamp(job_data.get('updated_at')),
+                created_at=_to_timestamp(job_data.get('created_at')) or time.time(),
+                started_at=_to_timestamp(job_data.get('started_at')),
+                completed_at=_to_timestamp(job_data.get('completed_at')),
+                updated_at=_to_timestamp(job_data.get('updated_at')),
                 input_data=job_data.get('input_data', {}),
                 output_data=job_data.get('output_data'),
                 error_message=job_data.get('error_message'),
@@ -365,6 +372,26 @@ class EnhancedJobData:
         if progress['total'] > 0:
             self.batch_completion_rate = progress['completed'] / progress['total']
     
+    def update_batch_progress_from_frame(self, frame: 'JobFrame') -> None:
+        """Update batch progress from a columnar JobFrame of children"""
+        if self.job_type != JobType.BATCH_PARENT:
+            return
+        
+        progress = frame.progress()
+        self.batch_progress = progress
+        
+        if progress['total'] == 0:
+            self.batch_estimated_completion = None
+        elif progress['completed'] + progress['failed'] + progress['cancelled'] >= progress['total']:
+            self.batch_estimated_completion = 0.0
+        else:
+            self.batch_estimated_completion = self._estimate_remaining_time(
+                progress, progress['completed'], frame.durations(JobStatus.COMPLETED)
+            )
+        
+        if progress['total'] > 0:
+            self.batch_completion_rate = progress['completed'] / progress['total']
+    
     def _update_batch_intelligence(self, children_data: List['EnhancedJobData'], 
                                  progress: Dict[str, Any]) -> None:
         """Update batch metadata with intelligent insights"""
@@ -411,21 +438,26 @@ class EnhancedJobData:
         
         # Calculate average execution time from completed children
         completed_children = [child for child in children_data if child.status == JobStatus.COMPLETED]
-        if not completed_children:
-            # Use default estimation if no completed children
-            remaining_jobs = progress['running'] + progress['pending']
-            return remaining_jobs * 300.0  # 5 minutes per job default
         
         # Calculate based on actual performance
         durations = [child._calculate_duration() for child in completed_children 
                     if child._calculate_duration() is not None]
         
+        return self._estimate_remaining_time(progress, len(completed_children), durations)
+    
+    @staticmethod
+    def _estimate_remaining_time(progress: Dict[str, Any], completed_count: int,
+                                 durations: List[float]) -> Optional[float]:
+        """Project remaining batch time from observed child durations"""
+        remaining_jobs = progress['running'] + progress['pending']
+        if not completed_count:
+            # Use default estimation if no completed children
+            return remaining_jobs * 300.0  # 5 minutes per job default
+        
         if durations:
             avg_duration = sum(durations) / len(durations)
             # Add 20% buffer for variance and apply to remaining jobs
-            remaining_jobs = progress['running'] + progress['pending']
-            estimated_time = remaining_jobs * avg_duration * 1.2
-            return estimated_time
+            return remaining_jobs * avg_duration * 1.2
         
         return None
     
@@ -578,6 +610,10 @@ class EnhancedJobData:
         return recommendations
 
 
+# Everything except output_data, which can exceed the 1MB Firestore limit
+_FIRESTORE_FIELDS = tuple(f.name for f in fields(EnhancedJobData) if f.name != 'output_data')
+
+
 def create_individual_job(name: str, task_type: str, input_data: Dict[str, Any], 
                          model_name: str = "boltz2", user_id: str = "current_user") -> EnhancedJobData:
     """Factory function for creating individual jobs"""
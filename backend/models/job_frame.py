@@ -0,0 +1,116 @@
+"""
+Job Frame for OMTX-Hub Batch Endpoints
+Column-oriented view over batch child jobs for status and progress reads
+"""
+
+import math
+from array import array
+from typing import Any, Dict, Iterable, List, Optional
+
+from models.enhanced_job_model import EnhancedJobData, JobStatus, JobType, _to_timestamp
+
+_STATUSES = list(JobStatus)
+_STATUS_CODES = {status.value: code for code, status in enumerate(_STATUSES)}
+_JOB_TYPE_VALUES = {member.value for member in JobType}
+_NAN = math.nan
+
+def _timestamp_or_nan(value: Any) -> float:
+    timestamp = _to_timestamp(value)
+    return _NAN if timestamp is None else float(timestamp)
+
+class JobFrame:
+    """
+    Columnar child-job set: statuses as one byte per job, timestamps as packed
+    doubles (NaN when unset). Status counts and progress are computed over the
+    columns; EnhancedJobData objects are only built for rows that are read.
+
+    Rows follow the input order (get_batch_jobs already sorts by batch_index)
+    and keep a reference to the source document, so input/output payloads are
+    never decoded unless a row is materialized.
+    """
+
+    __slots__ = ('ids', 'batch_index', 'status', 'created_at', 'started_at', 'completed_at', '_rows')
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.batch_index = array('q')
+        self.status = array('b')
+        self.created_at = array('d')
+        self.started_at = array('d')
+        self.completed_at = array('d')
+        self._rows: List[Dict[str, Any]] = []
+
+    @classmethod
+    def from_job_data(cls, docs: Iterable[Dict[str, Any]]) -> 'JobFrame':
+        """Build a frame from Firestore job documents, skipping legacy-format jobs"""
+        frame = cls()
+        for doc in docs:
+            code = _STATUS_CODES.get(doc.get('status', 'pending'))
+            if (code is None or doc.get('job_type') not in _JOB_TYPE_VALUES
+                    or not doc.get('id') or not doc.get('name') or not doc.get('task_type')):
+                continue
+
+            index = doc.get('batch_index')
+            frame.ids.append(doc['id'])
+            frame.batch_index.append(index if isinstance(index, int) else -1)
+            frame.status.append(code)
+            frame.created_at.append(_timestamp_or_nan(doc.get('created_at')))
+            frame.started_at.append(_timestamp_or_nan(doc.get('started_at')))
+            frame.completed_at.append(_timestamp_or_nan(doc.get('completed_at')))
+            frame._rows.append(doc)
+        return frame
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def status_counts(self) -> Dict[str, int]:
+        """Number of jobs per status value"""
+        codes = self.status.tobytes()
+        return {status.value: codes.count(code) for code, status in enumerate(_STATUSES)}
+
+    def progress(self) -> Dict[str, Any]:
+        """Same shape as EnhancedJobData.calculate_batch_progress"""
+        counts = self.status_counts()
+        total = len(self)
+        if not total:
+            return {'total': 0, 'completed': 0, 'failed': 0, 'running': 0, 'pending': 0, 'progress_percentage': 0}
+
+        completed = counts[JobStatus.COMPLETED.value]
+        failed = counts[JobStatus.FAILED.value]
+        cancelled = counts[JobStatus.CANCELLED.value]
+        return {
+            'total': total,
+            'completed': completed,
+            'failed': failed,
+            'running': counts[JobStatus.RUNNING.value],
+            'pending': counts[JobStatus.PENDING.value],
+            'cancelled': cancelled,
+            'progress_percentage': (completed + failed + cancelled) / total * 100,
+            'success_rate': (completed / (completed + failed) * 100) if (completed + failed) > 0 else 0
+        }
+
+    def indices(self, status: JobStatus) -> List[int]:
+        """Row positions of jobs in the given status"""
+        code = _STATUS_CODES[status.value]
+        return [i for i, value in enumerate(self.status) if value == code]
+
+    def durations(self, status: Optional[JobStatus] = None) -> List[float]:
+        """Execution durations of finished rows, optionally for one status"""
+        rows = self.indices(status) if status else range(len(self))
+        started, completed = self.started_at, self.completed_at
+        durations = []
+        for i in rows:
+            duration = completed[i] - started[i]
+            if not math.isnan(duration):
+                durations.append(duration)
+        return durations
+
+    def job(self, position: int) -> Optional[EnhancedJobData]:
+        """Materialize one row as an EnhancedJobData"""
+        return EnhancedJobData.from_job_data(self._rows[position])
+
+    def jobs(self, positions: Optional[Iterable[int]] = None) -> List[EnhancedJobData]:
+        """Materialize selected rows (all rows by default)"""
+        if positions is None:
+            positions = range(len(self))
+        return [job for job in (self.job(i) for i in positions) if job is not None]
@@ -22,6 +22,8 @@ from enum import Enum
 
 import json
 
+from monitoring.profiler import function_profiler
+
 # Integration with our new architecture components
 try:
     from middleware.rate_limiter import rate_limiter
@@ -1055,14 +1057,14 @@ def trace_operation(operation_name: str = None):
                     'args_count': len(args),
                     'kwargs_count': len(kwargs)
                 })
-                return await func(*args, **kwargs)
+                return await function_profiler.run(operation_name, func(*args, **kwargs))
         
         def sync_wrapper(*args, **kwargs):
             # For sync functions, we'll use a simplified approach
             import uuid
             start_time = time.time()
             try:
-                result = func(*args, **kwargs)
+                result = function_profiler.call(operation_name, func, *args, **kwargs)
                 duration_ms = (time.time() - start_time) * 1000
                 apm_service.profiler.record_call(operation_name, duration_ms)
                 apm_service.record_metric(f"operation.{operation_name}.duration_ms", duration_ms)
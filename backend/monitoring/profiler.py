@@ -0,0 +1,473 @@
+"""
+Profiler
+Low-overhead profiling for API and GPU-worker pods.
+
+- SamplingProfiler: on-demand wall-clock sampling of every thread's Python
+  stack (sys._current_frames) for N seconds, returned in the collapsed-stack
+  format flamegraph.pl / speedscope read. Nothing runs between requests.
+- LoopLagMonitor: one timer per interval measuring how late the event loop
+  wakes up, with recent stalls above a threshold.
+- FunctionProfiler: per-function wall, CPU and loop-held time for functions
+  decorated with trace_operation. Coroutines are stepped so CPU and loop time
+  only cover this coroutine's own steps, not other tasks running while it
+  awaits; loop-held time well above CPU time means blocking I/O on the loop.
+
+- LoopBlockingDetector: a watchdog thread that notices the loop stuck in one
+  step longer than a threshold, snapshots the loop thread's stack while it is
+  stuck and attributes the stall to the application call site.
+
+Blocking GCS/Firestore calls made from async code are also counted by call
+site in services.io_budget (loop_blocking_calls); services.offload is the fix.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.io_budget import frame_site
+
+logger = logging.getLogger(__name__)
+
+MAX_PROFILE_SECONDS = 60.0
+MAX_STACK_DEPTH = 128
+
+# Leaf frames of threads that are parked rather than working
+IDLE_FRAMES = frozenset({
+    ('selectors.py', 'select'),
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker'),
+    ('socket.py', 'accept'),
+})
+
+_LIBRARY_MARKERS = ('/site-packages/', '/dist-packages/', '/backend/')
+
+class ProfilerBusyError(RuntimeError):
+    """A sampling profile is already running in this process"""
+
+def _short_path(filename: str) -> str:
+    for marker in _LIBRARY_MARKERS:
+        index = filename.rfind(marker)
+        if index >= 0:
+            return filename[index + len(marker):]
+    return os.path.basename(filename)
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * percent / 100), len(sorted_values) - 1)]
+
+class SamplingProfiler:
+    """On-demand sampling of all thread stacks into collapsed-stack counts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._labels: Dict[Any, str] = {}
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = (
+                f"{getattr(code, 'co_qualname', code.co_name)} ({_short_path(code.co_filename)})"
+            )
+        return label
+
+    def collapse(self, frame, include_idle: bool = False) -> Optional[str]:
+        """Root-first 'a;b;c' stack for one frame, or None for an idle thread"""
+        code = frame.f_code
+        if not include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+            return None
+        labels = []
+        while frame is not None and len(labels) < MAX_STACK_DEPTH:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        labels.reverse()
+        return ";".join(labels)
+
+    def profile(self, seconds: float, interval: float = 0.005, include_idle: bool = False,
+                loop_thread_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Sample every thread for `seconds`; blocks the calling thread (run it
+        with asyncio.to_thread). Raises ProfilerBusyError if one is running.
+        """
+        seconds = min(max(seconds, interval), MAX_PROFILE_SECONDS)
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running")
+        try:
+            own_thread = threading.get_ident()
+            names: Dict[int, str] = {}
+            stacks: Counter = Counter()
+            samples = 0
+            started = time.perf_counter()
+            deadline = started + seconds
+
+            while True:
+                tick = time.perf_counter()
+                if tick >= deadline:
+                    break
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_thread:
+                        continue
+                    stack = self.collapse(frame, include_idle)
+                    if stack is None:
+                        continue
+                    name = names.get(ident)
+                    if name is None:
+                        thread = next((t for t in threading.enumerate() if t.ident == ident), None)
+                        name = names[ident] = (
+                            "event-loop" if ident == loop_thread_id
+                            else (thread.name if thread else f"thread-{ident}").replace(";", ",")
+                        )
+                    stacks[f"{name};{stack}"] += 1
+                samples += 1
+                time.sleep(max(0.0, interval - (time.perf_counter() - tick)))
+
+            elapsed = time.perf_counter() - started
+        finally:
+            self._lock.release()
+
+        leaves: Counter = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(stacks.values()) or 1
+        return {
+            'duration_seconds': round(elapsed, 3),
+            'interval_ms': round(interval * 1000, 3),
+            'samples': samples,
+            'threads': sorted(set(names.values())),
+            'top_functions': [
+                {'function': function, 'samples': count, 'percent': round(100 * count / total, 1)}
+                for function, count in leaves.most_common(20)
+            ],
+            'collapsed': "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+        }
+
+class LoopLagMonitor:
+    """Measures event-loop scheduling lag with one timer per interval"""
+
+    def __init__(self, interval: float = 0.25, threshold: float = 0.1, history: int = 2400):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags: deque = deque(maxlen=history)
+        self.stalls: deque = deque(maxlen=100)
+        self.stall_count = 0
+        self.max_lag = 0.0
+        self.loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start measuring the running loop (call from a coroutine on that loop)"""
+        if self.running:
+            return
+        self.loop_thread_id = threading.get_ident()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"⏱️ Event-loop lag monitor started (interval {self.interval}s, threshold {self.threshold * 1000:.0f}ms)")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, time.monotonic() - expected))
+
+    def record(self, lag: float):
+        self.lags.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+        if lag >= self.threshold:
+            self.stall_count += 1
+            self.stalls.append({'at': datetime.utcnow().isoformat() + "Z", 'lag_ms': round(lag * 1000, 1)})
+
+    def snapshot(self) -> Dict[str, Any]:
+        lags = sorted(self.lags)
+        return {
+            'running': self.running,
+            'interval_ms': self.interval * 1000,
+            'threshold_ms': self.threshold * 1000,
+            'samples': len(lags),
+            'p50_ms': round(_percentile(lags, 50) * 1000, 2),
+            'p99_ms': round(_percentile(lags, 99) * 1000, 2),
+            'max_ms': round(self.max_lag * 1000, 2),
+            'stalls': self.stall_count,
+            'recent_stalls': list(self.stalls)[-10:]
+        }
+
+class LoopBlockingDetector:
+    """
+    Watchdog for event-loop stalls, attributed to where the loop is stuck
+
+    The loop bumps a heartbeat every poll interval; a daemon thread checks it
+    and, once the heartbeat is `threshold` overdue, reads the loop thread's
+    current frame from sys._current_frames. The stall is recorded when the
+    loop comes back, with its full duration, under the nearest application
+    call site and the module the loop was blocked in. Costs one timer per
+    poll interval on the loop and nothing on the request path.
+    """
+
+    def __init__(self, threshold: float = 0.1, max_sites: int = 200, history: int = 50):
+        self.threshold = threshold
+        self.poll_interval = max(threshold / 4, 0.005)
+        self.max_sites = max_sites
+        self.stall_count = 0
+        self.stalled_seconds = 0.0
+        self.recent: deque = deque(maxlen=history)
+        self.loop_thread_id: Optional[int] = None
+        self._sites: Dict[Tuple[str, str], List[Any]] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._beat = 0.0
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._current: Optional[Tuple[str, str]] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start watching the running loop (call from a coroutine on that loop)"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self._stopping.clear()
+        self._heartbeat()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"🐕 Event-loop blocking detector started (threshold {self.threshold * 1000:.0f}ms)")
+
+    def stop(self):
+        self._stopping.set()
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _heartbeat(self):
+        self._beat = time.monotonic()
+        self._handle = self._loop.call_later(self.poll_interval, self._heartbeat)
+
+    def _watch(self):
+        stalled_beat, stack = None, None
+        while not self._stopping.wait(self.poll_interval):
+            if self._loop.is_closed():
+                break
+            beat = self._beat
+            if stalled_beat is not None:
+                if beat != stalled_beat:
+                    self.record(*self._current, max(0.0, beat - stalled_beat - self.poll_interval), stack)
+                    stalled_beat, self._current = None, None
+                continue
+            if time.monotonic() - beat - self.poll_interval < self.threshold or not self._loop.is_running():
+                continue
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            stalled_beat = beat
+            self._current = (frame_site(frame), frame.f_globals.get('__name__', '?'))
+            stack = sampling_profiler.collapse(frame, include_idle=True)
+            del frame
+
+    def record(self, site: str, blocked_in: str, seconds: float, stack: Optional[str] = None):
+        with self._lock:
+            self.stall_count += 1
+            self.stalled_seconds += seconds
+            self.recent.append({
+                'at': datetime.utcnow().isoformat() + "Z", 'duration_ms': round(seconds * 1000, 1),
+                'site': site, 'blocked_in': blocked_in
+            })
+            entry = self._sites.get((site, blocked_in))
+            if entry is None and len(self._sites) < self.max_sites:
+                entry = self._sites[(site, blocked_in)] = [0, 0.0, 0.0, None]
+            if entry is not None:
+                entry[0] += 1
+                entry[1] += seconds
+                if seconds >= entry[2]:
+                    entry[2], entry[3] = seconds, stack
+        logger.warning(f"🐢 Event loop blocked {seconds * 1000:.0f}ms at {site} (in {blocked_in})")
+
+    def snapshot(self, limit: int = 25) -> Dict[str, Any]:
+        with self._lock:
+            sites = sorted(self._sites.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+            current = self._current
+            return {
+                'running': self.running,
+                'threshold_ms': self.threshold * 1000,
+                'stalls': self.stall_count,
+                'stalled_seconds': round(self.stalled_seconds, 3),
+                'blocked_now': {'site': current[0], 'blocked_in': current[1]} if current else None,
+                'sites': [
+                    {'site': site, 'blocked_in': blocked_in, 'stalls': stalls,
+                     'seconds_total': round(total, 3), 'max_ms': round(longest * 1000, 1), 'stack': stack}
+                    for (site, blocked_in), (stalls, total, longest, stack) in sites
+                ],
+                'recent': list(self.recent)[-10:]
+            }
+
+    def reset(self):
+        with self._lock:
+            self._sites.clear()
+            self.recent.clear()
+            self.stall_count = 0
+            self.stalled_seconds = 0.0
+
+class FunctionStats:
+    """Accumulated timings for one traced function"""
+
+    __slots__ = ('calls', 'errors', 'wall', 'cpu', 'loop', 'max_loop_step')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.loop = 0.0
+        self.max_loop_step = 0.0
+
+    def to_dict(self, name: str) -> Dict[str, Any]:
+        calls = self.calls or 1
+        return {
+            'function': name,
+            'calls': self.calls,
+            'errors': self.errors,
+            'wall_ms_total': round(self.wall * 1000, 2),
+            'cpu_ms_total': round(self.cpu * 1000, 2),
+            'loop_ms_total': round(self.loop * 1000, 2),
+            'wall_ms_avg': round(self.wall * 1000 / calls, 3),
+            'cpu_ms_avg': round(self.cpu * 1000 / calls, 3),
+            'max_loop_step_ms': round(self.max_loop_step * 1000, 2)
+        }
+
+class _SteppedCoroutine:
+    """Drives a coroutine step by step, timing only the steps (not the awaits)"""
+
+    __slots__ = ('coro', 'cpu', 'loop', 'max_step')
+
+    def __init__(self, coro):
+        self.coro = coro
+        self.cpu = 0.0
+        self.loop = 0.0
+        self.max_step = 0.0
+
+    def _add(self, started: float, cpu_started: float):
+        step = time.perf_counter() - started
+        self.cpu += time.thread_time() - cpu_started
+        self.loop += step
+        if step > self.max_step:
+            self.max_step = step
+
+    def __await__(self):
+        coro = self.coro
+        value, error = None, None
+        while True:
+            cpu_started, started = time.thread_time(), time.perf_counter()
+            try:
+                yielded = coro.throw(error) if error is not None else coro.send(value)
+            except StopIteration as stop:
+                self._add(started, cpu_started)
+                return stop.value
+            except BaseException:
+                self._add(started, cpu_started)
+                raise
+            self._add(started, cpu_started)
+            try:
+                value, error = (yield yielded), None
+            except BaseException as e:
+                value, error = None, e
+
+class FunctionProfiler:
+    """Wall/CPU/loop-held attribution per traced function"""
+
+    def __init__(self, max_functions: int = 1000):
+        self.max_functions = max_functions
+        self._stats: Dict[str, FunctionStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, wall: float, cpu: float, loop: float = 0.0,
+               max_loop_step: float = 0.0, error: bool = False):
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                if len(self._stats) >= self.max_functions:
+                    return
+                stats = self._stats[name] = FunctionStats()
+            stats.calls += 1
+            stats.errors += int(error)
+            stats.wall += wall
+            stats.cpu += cpu
+            stats.loop += loop
+            stats.max_loop_step = max(stats.max_loop_step, max_loop_step)
+
+    def call(self, name: str, func: Callable, *args, **kwargs):
+        """Run a sync function and record its wall and CPU time"""
+        cpu_started, started = time.thread_time(), time.perf_counter()
+        error = False
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            error = True
+            raise
+        finally:
+            wall = time.perf_counter() - started
+            try:
+                asyncio.get_running_loop()
+                on_loop = True
+            except RuntimeError:
+                on_loop = False
+            self.record(name, wall, time.thread_time() - cpu_started,
+                        loop=wall if on_loop else 0.0, max_loop_step=wall if on_loop else 0.0, error=error)
+
+    async def run(self, name: str, coro: Awaitable):
+        """Await a coroutine and record its wall time and per-step CPU/loop time"""
+        stepped = _SteppedCoroutine(coro)
+        started = time.perf_counter()
+        error = False
+        try:
+            return await stepped
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(name, time.perf_counter() - started, stepped.cpu, stepped.loop, stepped.max_step, error)
+
+    def snapshot(self, sort_by: str = 'loop', limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = list(self._stats.items())
+        items.sort(key=lambda item: getattr(item[1], sort_by), reverse=True)
+        return [stats.to_dict(name) for name, stats in items[:limit]]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+# Global instances
+sampling_profiler = SamplingProfiler()
+loop_lag_monitor = LoopLagMonitor(
+    interval=float(os.getenv('LOOP_LAG_INTERVAL_SECONDS', '0.25')),
+    threshold=float(os.getenv('LOOP_LAG_THRESHOLD_MS', '100')) / 1000
+)
+loop_blocking_detector = LoopBlockingDetector(
+    threshold=float(os.getenv('LOOP_BLOCK_THRESHOLD_MS', '100')) / 1000
+)
+function_profiler = FunctionProfiler()
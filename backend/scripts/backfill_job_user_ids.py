@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Job user_id Backfill
+
+One-off migration that stores user_id='current_user' on legacy job documents
+written before user_id was recorded. Firestore equality never matches a
+missing field, so until this has run the default user's job list cannot be
+filtered server-side.
+
+Usage:
+    python3 scripts/backfill_job_user_ids.py            # Dry run, counts only
+    python3 scripts/backfill_job_user_ids.py --apply    # Write the backfill
+"""
+
+import os
+import sys
+import argparse
+from typing import Dict
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.cloud import firestore
+
+from config.gcp_database import gcp_database
+
+DEFAULT_USER_ID = "current_user"
+# Firestore batched writes are capped at 500 operations
+PAGE_SIZE = 500
+
+def backfill_job_user_ids(db, apply: bool = False, page_size: int = PAGE_SIZE) -> Dict[str, int]:
+    """Scan the jobs collection in document-ID pages and backfill missing user_id fields"""
+
+    stats = {'scanned': 0, 'missing': 0, 'updated': 0}
+    collection = db.collection('jobs')
+    last_doc = None
+
+    while True:
+        query = (collection.select(['user_id'])
+                 .order_by(firestore.FieldPath.document_id())
+                 .limit(page_size))
+        if last_doc is not None:
+            query = query.start_after(last_doc)
+
+        docs = list(query.stream())
+        if not docs:
+            break
+
+        batch = db.batch()
+        missing = 0
+        for doc in docs:
+            if not (doc.to_dict() or {}).get('user_id'):
+                missing += 1
+                batch.update(doc.reference, {'user_id': DEFAULT_USER_ID})
+
+        if missing and apply:
+            batch.commit()
+            stats['updated'] += missing
+
+        stats['scanned'] += len(docs)
+        stats['missing'] += missing
+        print(f"📋 Scanned {stats['scanned']} jobs, {stats['missing']} without user_id")
+
+        if len(docs) < page_size:
+            break
+        last_doc = docs[-1]
+
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill user_id on legacy job documents")
+    parser.add_argument('--apply', action='store_true', help='Write the backfill (default is a dry run)')
+    args = parser.parse_args()
+
+    if not gcp_database.available:
+        print("❌ Database not available")
+        sys.exit(1)
+
+    print(f"🚀 Backfilling job user_id (apply={args.apply})")
+    stats = backfill_job_user_ids(gcp_database.db, apply=args.apply)
+
+    print(f"\n📊 SUMMARY:")
+    print(f"   📋 Scanned: {stats['scanned']}")
+    print(f"   ⚠️ Missing user_id: {stats['missing']}")
+    print(f"   ✅ Updated: {stats['updated']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Import-Time Profile for API Cold Start
+Runs `python -X importtime -c "import main"` in a clean interpreter and reports
+the slowest modules by cumulative and self time.
+
+Usage:
+    python scripts/profile_imports.py [--module main] [--top 25] [--json report.json]
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import List, Dict, Any
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S.*)$")
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Parse -X importtime output into records (times in milliseconds)"""
+    records = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        records.append({
+            "module": module.strip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+            "depth": (len(indent) - 1) // 2
+        })
+    return records
+
+def profile_import(module: str) -> Dict[str, Any]:
+    """Import module in a subprocess and collect timings"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True
+    )
+    wall_seconds = time.perf_counter() - started
+    records = parse_importtime(result.stderr)
+
+    return {
+        "module": module,
+        "success": result.returncode == 0,
+        "error": result.stderr.strip().splitlines()[-1] if result.returncode != 0 and result.stderr.strip() else None,
+        "wall_seconds": round(wall_seconds, 3),
+        "modules_imported": len(records),
+        "records": records
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile import time of the API entrypoint")
+    parser.add_argument("--module", default="main", help="Module to import (default: main)")
+    parser.add_argument("--top", type=int, default=25, help="Rows to show per table")
+    parser.add_argument("--json", dest="json_path", help="Write the full report to this file")
+    args = parser.parse_args()
+
+    report = profile_import(args.module)
+    records = report["records"]
+
+    print(f"📦 import {args.module}: {report['wall_seconds']:.2f}s wall, {report['modules_imported']} modules")
+    if not report["success"]:
+        print(f"❌ Import failed: {report['error']}")
+
+    top_level = sorted((r for r in records if r["depth"] == 0), key=lambda r: r["cumulative_ms"], reverse=True)
+    print(f"\n🔝 Top-level imports by cumulative time")
+    for record in top_level[:args.top]:
+        print(f"  {record['cumulative_ms']:9.1f} ms  {record['module']}")
+
+    print(f"\n🐢 Modules by self time")
+    for record in sorted(records, key=lambda r: r["self_ms"], reverse=True)[:args.top]:
+        print(f"  {record['self_ms']:9.1f} ms  {record['module']}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Full report written to {args.json_path}")
+
+    return 0 if report["success"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
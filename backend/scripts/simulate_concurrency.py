@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Offline Simulation of Adaptive Batch Concurrency
+Runs the AIMD controller against synthetic backends of different capacities and
+compares it with a fixed concurrency limit.
+
+Usage:
+    python scripts/simulate_concurrency.py [--jobs 1000] [--capacity 5 20 60] [--fixed 5] [--seeds 3]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.adaptive_concurrency import AdaptiveConcurrencyController, simulate
+
+def run(jobs: int, capacities, fixed: int, seeds: int, initial: int, max_limit: int):
+    rows = []
+    for capacity in capacities:
+        for seed in range(seeds):
+            adaptive = simulate(AdaptiveConcurrencyController(initial, max_limit, max_limit),
+                                jobs=jobs, capacity=capacity, seed=seed)
+            static = simulate(AdaptiveConcurrencyController(fixed, fixed, fixed),
+                              jobs=jobs, capacity=capacity, seed=seed)
+            rows.append({
+                'capacity': capacity,
+                'seed': seed,
+                'adaptive_makespan': round(adaptive.makespan),
+                'adaptive_errors': adaptive.errors,
+                'adaptive_final_limit': adaptive.final_limit,
+                'adaptive_peak_in_flight': adaptive.peak_in_flight,
+                'fixed_makespan': round(static.makespan),
+                'fixed_errors': static.errors,
+            })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate adaptive batch concurrency")
+    parser.add_argument("--jobs", type=int, default=1000)
+    parser.add_argument("--capacity", type=int, nargs="+", default=[5, 20, 60])
+    parser.add_argument("--fixed", type=int, default=5, help="Static limit to compare against")
+    parser.add_argument("--seeds", type=int, default=3)
+    parser.add_argument("--initial", type=int, default=5)
+    parser.add_argument("--max-limit", type=int, default=100)
+    args = parser.parse_args()
+
+    rows = run(args.jobs, args.capacity, args.fixed, args.seeds, args.initial, args.max_limit)
+    print(json.dumps(rows, indent=2))
+
+if __name__ == "__main__":
+    main()
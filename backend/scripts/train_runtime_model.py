@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Train the Shared Runtime Model
+Fits wall-time and peak-memory coefficients per GPU type from completed-job
+telemetry and writes a versioned artifact for services/runtime_estimator.py.
+
+Telemetry comes from a JSONL file of rows (protein_length, ligand_size,
+use_msa, use_potentials, sampling_steps, gpu_type, wall_seconds,
+peak_memory_gb) or from completed jobs in Firestore.
+
+Usage:
+    python scripts/train_runtime_model.py --input telemetry.jsonl [--output config/runtime_model.json]
+    python scripts/train_runtime_model.py --from-firestore --limit 20000 --version 2026-10-18
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.runtime_estimator import (
+    DEFAULT_MODEL_PATH, RuntimeModel, fit_runtime_model, telemetry_row
+)
+
+def load_jsonl(path: str) -> List[Dict[str, Any]]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def load_firestore(limit: int) -> List[Dict[str, Any]]:
+    from config.gcp_database import gcp_database
+
+    query = gcp_database.db.collection('jobs').where('status', '==', 'completed').limit(limit)
+    rows = []
+    for doc in query.stream():
+        row = telemetry_row({**doc.to_dict(), 'id': doc.id})
+        if row:
+            rows.append(row)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the shared runtime model")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="JSONL telemetry rows")
+    source.add_argument("--from-firestore", action="store_true", help="Read completed jobs from Firestore")
+    parser.add_argument("--limit", type=int, default=20000, help="Max Firestore jobs to read")
+    parser.add_argument("--base", help="Artifact to start from (defaults to the built-in prior)")
+    parser.add_argument("--output", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--version", help="Artifact version (defaults to a timestamp)")
+    parser.add_argument("--ridge", type=float, default=1e-3)
+    args = parser.parse_args()
+
+    rows = load_jsonl(args.input) if args.input else load_firestore(args.limit)
+    base = RuntimeModel.load(args.base) if args.base else None
+    model = fit_runtime_model(rows, version=args.version, base=base, ridge=args.ridge)
+    model.save(args.output)
+
+    print(f"Trained runtime model {model.version} on {len(rows)} rows -> {args.output}")
+    print(json.dumps(model.artifact["metrics"], indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""
+Adaptive Concurrency for Batch Execution
+Feedback-driven in-flight limits and learned job durations.
+
+AIMDLimiter raises its limit additively while jobs complete cleanly (after an
+optional slow-start phase) and cuts it multiplicatively on errors, timeouts or
+latency well above the observed baseline. AdaptiveConcurrencyController pairs a
+global limiter with one per batch and treats a backed-up Cloud Tasks queue as
+congestion; job slots are held until the job reaches a terminal status, so the
+limits bound running jobs and learn from job runtimes. DurationEstimator learns per-job durations for execution plans,
+and simulate() drives a controller against a synthetic backend so tuning can
+be checked offline.
+"""
+
+import asyncio
+import heapq
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class AIMDLimiter:
+    """Additive-increase / multiplicative-decrease in-flight limit"""
+
+    def __init__(self, initial_limit: int = 5, min_limit: int = 1, max_limit: int = 100,
+                 increase: float = 1.0, backoff: float = 0.7, latency_tolerance: float = 2.0,
+                 baseline_drift: float = 0.01, slow_start_limit: Optional[int] = None):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.baseline_drift = baseline_drift
+
+        self.in_flight = 0
+        self.baseline_latency: Optional[float] = None
+        # Grow quickly up to this limit unless congestion shows up first. Off by
+        # default: probing past a backend already at capacity costs more in
+        # overload and retries than it wins (see scripts/simulate_concurrency.py)
+        self.slow_start_limit = slow_start_limit if slow_start_limit is not None else initial_limit
+        self._samples_since_decrease = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self._condition_loop = None
+
+    @property
+    def current(self) -> int:
+        return max(self.min_limit, min(self.max_limit, int(self.limit)))
+
+    def has_capacity(self) -> bool:
+        return self.in_flight < self.current
+
+    def try_acquire(self) -> bool:
+        """Take a slot without waiting"""
+        if not self.has_capacity():
+            return False
+        self.in_flight += 1
+        return True
+
+    def release_sample(self, latency: float, success: bool = True, timed_out: bool = False) -> None:
+        """Return a slot and feed its outcome back into the limit"""
+        self.on_sample(latency, success, timed_out)
+        self.in_flight = max(0, self.in_flight - 1)
+
+    def on_sample(self, latency: float, success: bool = True, timed_out: bool = False) -> None:
+        self._samples_since_decrease += 1
+
+        if success and not timed_out:
+            if self.baseline_latency is None or latency < self.baseline_latency:
+                self.baseline_latency = latency
+            else:
+                # Let the baseline follow genuine workload shifts, slowly
+                self.baseline_latency += (latency - self.baseline_latency) * self.baseline_drift
+
+        slow = self.baseline_latency is not None and latency > self.baseline_latency * self.latency_tolerance
+        if not success or timed_out or slow:
+            # One decrease per window of samples, so a single overload is not counted repeatedly
+            if self._samples_since_decrease >= self.current:
+                self.on_congestion()
+        elif self.in_flight * 2 >= self.current:
+            # Only grow while the current limit is actually being used; below the
+            # slow-start limit grow per sample (doubling every window)
+            slow_start = self.limit < self.slow_start_limit
+            step = self.increase if slow_start else self.increase / self.current
+            self.limit = min(float(self.max_limit), self.limit + step)
+
+    def on_congestion(self) -> None:
+        self.limit = max(float(self.min_limit), self.limit * self.backoff)
+        self.slow_start_limit = min(self.slow_start_limit, self.limit)
+        self._samples_since_decrease = 0
+
+    def _get_condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._condition_loop is not loop:
+            self._condition = asyncio.Condition()
+            self._condition_loop = loop
+        return self._condition
+
+    async def acquire(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(self.has_capacity)
+            self.in_flight += 1
+
+    async def release(self, latency: float, success: bool = True, timed_out: bool = False) -> None:
+        condition = self._get_condition()
+        async with condition:
+            self.release_sample(latency, success, timed_out)
+            condition.notify_all()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'limit': self.current,
+            'in_flight': self.in_flight,
+            'baseline_latency': self.baseline_latency
+        }
+
+class AdaptiveConcurrencyController:
+    """Global and per-batch AIMD limits with queue-depth backpressure"""
+
+    def __init__(self, initial_limit: int = 5, max_limit: int = 100, per_batch_max: int = 50,
+                 queue_depth_target: int = 200, held_timeout: float = 3600.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.global_limiter = AIMDLimiter(initial_limit, max_limit=max_limit)
+        self.initial_limit = initial_limit
+        self.per_batch_max = per_batch_max
+        self.queue_depth_target = queue_depth_target
+        self.queue_depth: Optional[int] = None
+        self.held_timeout = held_timeout
+        self.clock = clock
+        self._batches: Dict[str, AIMDLimiter] = {}
+        # job_id -> (batch_id, acquired_at) for slots held until the job finishes
+        self._held: Dict[str, Tuple[Optional[str], float]] = {}
+        self._retired: set = set()
+        self.stats = {'samples': 0, 'errors': 0, 'timeouts': 0}
+
+    def batch_limiter(self, batch_id: str) -> AIMDLimiter:
+        limiter = self._batches.get(batch_id)
+        if limiter is None:
+            limiter = AIMDLimiter(min(self.initial_limit, self.per_batch_max), max_limit=self.per_batch_max)
+            self._batches[batch_id] = limiter
+        return limiter
+
+    def forget_batch(self, batch_id: str) -> None:
+        """Drop a batch's limiter, deferred until no job holds one of its slots"""
+        if any(held_batch == batch_id for held_batch, _ in self._held.values()):
+            self._retired.add(batch_id)
+        else:
+            self._batches.pop(batch_id, None)
+
+    def _limiters(self, batch_id: Optional[str]) -> List[AIMDLimiter]:
+        # Batch first, so waiting on a busy batch never holds a global slot
+        limiters = [self.batch_limiter(batch_id)] if batch_id is not None else []
+        limiters.append(self.global_limiter)
+        return limiters
+
+    def update_queue_depth(self, depth: Optional[int]) -> None:
+        """Record the dispatch queue depth; a backlog above target counts as congestion"""
+        self.queue_depth = depth
+        if depth is not None and depth > self.queue_depth_target:
+            self.global_limiter.on_congestion()
+
+    def limit_for(self, batch_id: Optional[str] = None) -> int:
+        limit = self.global_limiter.current
+        if batch_id is not None:
+            limit = min(limit, self.batch_limiter(batch_id).current)
+        return limit
+
+    def available(self, batch_id: Optional[str] = None) -> int:
+        """Slots that could be taken right now without waiting"""
+        return max(0, min(limiter.current - limiter.in_flight for limiter in self._limiters(batch_id)))
+
+    def try_acquire(self, batch_id: Optional[str] = None) -> bool:
+        """Take a batch slot and a global slot without waiting (used by simulate)"""
+        batch = self.batch_limiter(batch_id) if batch_id is not None else None
+        if batch is not None and not batch.try_acquire():
+            return False
+        if not self.global_limiter.try_acquire():
+            if batch is not None:
+                batch.in_flight -= 1
+            return False
+        return True
+
+    def release(self, batch_id: Optional[str], latency: float, success: bool = True,
+                timed_out: bool = False) -> None:
+        if batch_id is not None:
+            self.batch_limiter(batch_id).release_sample(latency, success, timed_out)
+        self.global_limiter.release_sample(latency, success, timed_out)
+        self._count(success, timed_out)
+
+    async def acquire_job(self, batch_id: Optional[str], job_id: str) -> None:
+        """
+        Take a batch slot and a global slot for job_id, held until release_job
+        reports the job finished rather than just dispatched.
+        """
+        await self.expire_jobs()
+        for limiter in self._limiters(batch_id):
+            await limiter.acquire()
+        self._held[job_id] = (batch_id, self.clock())
+
+    async def release_job(self, job_id: str, success: bool = True, timed_out: bool = False) -> Optional[float]:
+        """Return a held job's slots with its runtime as the sample; None if job_id holds no slot"""
+        held = self._held.pop(job_id, None)
+        if held is None:
+            return None
+        batch_id, acquired_at = held
+        runtime = self.clock() - acquired_at
+        for limiter in self._limiters(batch_id):
+            await limiter.release(runtime, success, timed_out)
+        self._count(success, timed_out)
+        if batch_id in self._retired and all(held_batch != batch_id for held_batch, _ in self._held.values()):
+            self._retired.discard(batch_id)
+            self._batches.pop(batch_id, None)
+        return runtime
+
+    async def expire_jobs(self) -> int:
+        """Release slots held past held_timeout as timeouts; their completion was never reported"""
+        cutoff = self.clock() - self.held_timeout
+        stale = [job_id for job_id, (_, acquired_at) in self._held.items() if acquired_at < cutoff]
+        for job_id in stale:
+            await self.release_job(job_id, success=False, timed_out=True)
+        return len(stale)
+
+    @asynccontextmanager
+    async def slot(self, batch_id: Optional[str] = None):
+        """
+        Hold a batch slot and a global slot for one job.
+
+        Yields a dict the caller can mark with success=False for failures that
+        do not raise; exceptions are recorded as errors (timeouts separately).
+        """
+        limiters = self._limiters(batch_id)
+        for limiter in limiters:
+            await limiter.acquire()
+
+        outcome = {'success': True, 'timed_out': False}
+        started = self.clock()
+        try:
+            yield outcome
+        except asyncio.TimeoutError:
+            outcome.update(success=False, timed_out=True)
+            raise
+        except Exception:
+            outcome['success'] = False
+            raise
+        finally:
+            latency = self.clock() - started
+            for limiter in limiters:
+                await limiter.release(latency, outcome['success'], outcome['timed_out'])
+            self._count(outcome['success'], outcome['timed_out'])
+
+    def _count(self, success: bool, timed_out: bool) -> None:
+        self.stats['samples'] += 1
+        if timed_out:
+            self.stats['timeouts'] += 1
+        elif not success:
+            self.stats['errors'] += 1
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'global': self.global_limiter.status(),
+            'batches': {batch_id: limiter.status() for batch_id, limiter in self._batches.items()},
+            'queue_depth': self.queue_depth,
+            'held_jobs': len(self._held),
+            **self.stats
+        }
+
+class DurationEstimator:
+    """Exponentially weighted per-key job durations"""
+
+    def __init__(self, alpha: float = 0.2, min_samples: int = 3):
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self._estimates: Dict[str, Tuple[float, int]] = {}
+
+    def observe(self, key: str, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        current = self._estimates.get(key)
+        if current is None:
+            self._estimates[key] = (seconds, 1)
+        else:
+            mean, count = current
+            self._estimates[key] = (mean + (seconds - mean) * self.alpha, count + 1)
+
+    def estimate(self, key: str, default: float) -> float:
+        """Learned duration once enough samples exist, otherwise the default"""
+        current = self._estimates.get(key)
+        if current is None or current[1] < self.min_samples:
+            return default
+        return current[0]
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {key: {'mean_seconds': mean, 'samples': count} for key, (mean, count) in self._estimates.items()}
+
+@dataclass
+class SimulationResult:
+    """Outcome of a simulate() run"""
+    completed: int
+    attempts: int
+    errors: int
+    makespan: float
+    peak_in_flight: int
+    limit_trace: List[Tuple[float, int]] = field(default_factory=list)
+
+    @property
+    def final_limit(self) -> int:
+        return self.limit_trace[-1][1] if self.limit_trace else 0
+
+def simulate(controller: AdaptiveConcurrencyController, jobs: int = 200, capacity: int = 20,
+             base_latency: float = 60.0, overload_latency: float = 3.0, overload_error_rate: float = 0.5,
+             timeout: Optional[float] = None, batch_id: str = "simulated-batch", seed: int = 0,
+             max_attempts: int = 10_000) -> SimulationResult:
+    """
+    Discrete-event run of one batch against a backend with `capacity` workers.
+
+    Beyond capacity each job's latency grows by `overload_latency` per unit of
+    relative overload and fails with probability `overload_error_rate` per
+    unit; failed jobs are retried. No real time passes.
+    """
+    rng = random.Random(seed)
+    now = 0.0
+    pending = jobs
+    running: List[Tuple[float, int, float, bool]] = []  # (finish_time, seq, latency, success)
+    result = SimulationResult(completed=0, attempts=0, errors=0, makespan=0.0, peak_in_flight=0)
+    seq = 0
+
+    while (pending or running) and result.attempts < max_attempts:
+        while pending and controller.try_acquire(batch_id):
+            in_flight = controller.global_limiter.in_flight
+            overload = max(0, in_flight - capacity) / capacity
+            latency = base_latency * (1 + overload * overload_latency) * rng.uniform(0.9, 1.1)
+            success = rng.random() >= min(0.95, overload * overload_error_rate)
+            heapq.heappush(running, (now + latency, seq, latency, success))
+            seq += 1
+            pending -= 1
+            result.attempts += 1
+            result.peak_in_flight = max(result.peak_in_flight, in_flight)
+
+        if not running:
+            break
+
+        now, _, latency, success = heapq.heappop(running)
+        timed_out = timeout is not None and latency > timeout
+        controller.release(batch_id, latency, success and not timed_out, timed_out)
+        if success and not timed_out:
+            result.completed += 1
+        else:
+            result.errors += 1
+            pending += 1
+        result.limit_trace.append((now, controller.limit_for(batch_id)))
+
+    result.makespan = now
+    return result
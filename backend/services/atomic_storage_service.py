@@ -1,6 +1,15 @@
 """
 Atomic Storage Service - Hierarchical storage with atomic operations
 Provides robust, transactional storage for job results and batch data
+
+Commit protocol: every file is written once, with CRC32C/MD5 verification, to a
+path under versions/<transaction_id>/ next to the manifest, with
+if_generation_match=0 so it can only create the object. A small manifest
+listing each file's path and generation is then published with a
+compare-and-swap on the previous manifest's generation; that single write is
+the commit point. A committed object is never overwritten, so pinned reads and
+rollbacks do not depend on bucket versioning. Readers resolve the manifest, and
+sweep_orphans() removes superseded versions and files left by crashed writers.
 """
 
 import asyncio
@@ -9,7 +18,7 @@ import logging
 import time
 import base64
 from typing import Dict, Any, Optional, List, Tuple
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
 import hashlib
 
@@ -25,6 +34,9 @@ class StorageTransaction:
         self.operations: List[Dict[str, Any]] = []
         self.temp_files: List[str] = []
         self.final_files: List[str] = []
+        self.generations: Dict[str, int] = {}  # path -> generation written by this transaction
+        self.versions: Dict[str, str] = {}  # logical path -> versioned path written for it
+        self.manifest_path: Optional[str] = None
         self.committed = False
         self.rolled_back = False
     
@@ -40,10 +52,11 @@ class StorageTransaction:
 
 class AtomicStorageService:
     """
-    Atomic storage operations with temp → finalize pattern
+    Atomic storage operations with write-once files and a manifest commit point
     
     Key features:
-    - Atomic writes (all succeed or all fail)
+    - Atomic writes (all succeed or all fail; the manifest is the commit point)
+    - Checksummed, create-only uploads to per-transaction version paths (no temp copies)
     - Hierarchical organization (jobs/, batches/, archive/)
     - Automatic rollback on failures
     - Duplicate detection and deduplication
@@ -60,7 +73,7 @@ class AtomicStorageService:
             'batch_jobs': 'batches/{batch_id}/jobs/{job_id}/',
             'results': 'batches/{batch_id}/results/',
             'archive': 'archive/{date}/{batch_id}/',
-            'temp': 'temp/{transaction_id}/',
+            'manifest': '{base_path}/manifest.json',
             'index': 'index/'
         }
         
@@ -85,7 +98,7 @@ class AtomicStorageService:
         storage_type: str = 'individual'
     ) -> Dict[str, str]:
         """
-        Store job result atomically with temp → finalize pattern
+        Store job result atomically: write files once, then publish the manifest
         
         Args:
             job_id: Unique job identifier
@@ -105,15 +118,16 @@ class AtomicStorageService:
             
             # Determine storage paths
             storage_paths = self._determine_storage_paths(job_id, batch_id, storage_type)
+            manifest_path = storage_paths['manifest']
+            previous_manifest = await self.resolve_manifest(manifest_path)
             
-            # Write all files to temporary location
-            temp_files = await self._write_temp_files(transaction, result_data, storage_paths)
-            
-            # Validate all temporary files
-            await self._validate_temp_files(temp_files)
+            # Write every file once, to this transaction's version paths
+            files = self._prepare_job_files(result_data, storage_paths)
+            written = await self._write_files(transaction, files, manifest_path)
             
-            # Atomic move to final locations
-            final_files = await self._finalize_files(transaction, temp_files, storage_paths)
+            # Commit point: a single manifest write
+            manifest = await self._publish_manifest(transaction, manifest_path, written, previous_manifest)
+            final_files = self._committed_paths(manifest)
             
             # Update indexes if needed
             await self._update_indexes(job_id, batch_id, final_files, result_data)
@@ -157,6 +171,7 @@ class AtomicStorageService:
                 'metadata': f"batches/{batch_id}/metadata.json",
                 'index': f"batches/{batch_id}/job_index.json"
             }
+            manifest_path = f"batches/{batch_id}/batch_manifest.json"
             
             # Write metadata
             metadata_content = json.dumps(batch_metadata, indent=2)
@@ -164,7 +179,8 @@ class AtomicStorageService:
                 transaction,
                 storage_paths['metadata'],
                 metadata_content.encode('utf-8'),
-                'application/json'
+                'application/json',
+                manifest_path=manifest_path
             )
             
             # Write job index
@@ -183,14 +199,14 @@ class AtomicStorageService:
                 transaction,
                 storage_paths['index'],
                 index_content.encode('utf-8'),
-                'application/json'
+                'application/json',
+                manifest_path=manifest_path
             )
             
-            # Finalize transaction
-            final_files = {}
-            for file_type, path in storage_paths.items():
-                final_files[file_type] = path
-                transaction.final_files.append(path)
+            # Commit point
+            manifest = await self._publish_manifest(transaction, manifest_path, dict(storage_paths),
+                                                    await self.resolve_manifest(manifest_path))
+            final_files = self._committed_paths(manifest)
             
             await self._commit_transaction(transaction)
             
@@ -224,6 +240,7 @@ class AtomicStorageService:
                 'csv_export': f"batches/{batch_id}/results/batch_results.csv",
                 'top_performers': f"batches/{batch_id}/results/top_performers.json"
             }
+            manifest_path = f"batches/{batch_id}/results/manifest.json"
             
             # Write aggregated files
             files_written = {}
@@ -234,7 +251,8 @@ class AtomicStorageService:
                 transaction,
                 storage_paths['batch_results'],
                 batch_results_content.encode('utf-8'),
-                'application/json'
+                'application/json',
+                manifest_path=manifest_path
             )
             files_written['batch_results'] = storage_paths['batch_results']
             
@@ -244,7 +262,8 @@ class AtomicStorageService:
                 transaction,
                 storage_paths['summary'],
                 summary_content.encode('utf-8'),
-                'application/json'
+                'application/json',
+                manifest_path=manifest_path
             )
             files_written['summary'] = storage_paths['summary']
             
@@ -254,7 +273,8 @@ class AtomicStorageService:
                 transaction,
                 storage_paths['csv_export'],
                 csv_content.encode('utf-8'),
-                'text/csv'
+                'text/csv',
+                manifest_path=manifest_path
             )
             files_written['csv_export'] = storage_paths['csv_export']
             
@@ -264,10 +284,16 @@ class AtomicStorageService:
                 transaction,
                 storage_paths['top_performers'],
                 top_performers_content.encode('utf-8'),
-                'application/json'
+                'application/json',
+                manifest_path=manifest_path
             )
             files_written['top_performers'] = storage_paths['top_performers']
             
+            # Commit point
+            manifest = await self._publish_manifest(transaction, manifest_path, files_written,
+                                                    await self.resolve_manifest(manifest_path))
+            files_written = self._committed_paths(manifest)
+            
             await self._commit_transaction(transaction)
             
             logger.info(f"✅ Created batch aggregation for {batch_id} ({len(files_written)} files)")
@@ -301,30 +327,22 @@ class AtomicStorageService:
             'metadata': f"{base_path}/metadata.json",
             'structure_primary': f"{base_path}/structure.cif",
             'structure_models': f"{base_path}/structures/",
-            'logs': f"{base_path}/logs.txt"
+            'logs': f"{base_path}/logs.txt",
+            'manifest': f"{base_path}/manifest.json"
         }
     
-    async def _write_temp_files(
+    def _prepare_job_files(
         self,
-        transaction: StorageTransaction,
         result_data: Dict[str, Any],
         storage_paths: Dict[str, str]
-    ) -> Dict[str, str]:
-        """Write all files to temporary location"""
+    ) -> Dict[str, Tuple[str, bytes, str]]:
+        """Encode every job file once: file_type -> (final path, bytes, content type)"""
         
-        temp_files = {}
-        temp_base = f"temp/{transaction.transaction_id}"
+        files = {}
         
         # Main results file
         results_content = json.dumps(result_data, indent=2)
-        temp_results_path = f"{temp_base}/results.json"
-        await self._write_file_to_transaction(
-            transaction,
-            temp_results_path,
-            results_content.encode('utf-8'),
-            'application/json'
-        )
-        temp_files['results'] = temp_results_path
+        files['results'] = (storage_paths['results'], results_content.encode('utf-8'), 'application/json')
         
         # Metadata file
         metadata = {
@@ -332,58 +350,72 @@ class AtomicStorageService:
             'processed_at': datetime.utcnow().isoformat(),
             'model_version': result_data.get('parameters', {}).get('model', 'boltz2'),
             'execution_time': result_data.get('execution_time'),
-            'storage_version': '2.0.0',
-            'file_checksums': {}
+            'storage_version': '3.0.0'
         }
-        
-        metadata_content = json.dumps(metadata, indent=2)
-        temp_metadata_path = f"{temp_base}/metadata.json"
-        await self._write_file_to_transaction(
-            transaction,
-            temp_metadata_path,
-            metadata_content.encode('utf-8'),
-            'application/json'
-        )
-        temp_files['metadata'] = temp_metadata_path
+        files['metadata'] = (storage_paths['metadata'], json.dumps(metadata, indent=2).encode('utf-8'), 'application/json')
         
         # Structure files
         if 'structure_file_base64' in result_data:
             structure_data = base64.b64decode(result_data['structure_file_base64'])
-            temp_structure_path = f"{temp_base}/structure.cif"
-            await self._write_file_to_transaction(
-                transaction,
-                temp_structure_path,
-                structure_data,
-                'chemical/x-cif'
-            )
-            temp_files['structure_primary'] = temp_structure_path
+            files['structure_primary'] = (storage_paths['structure_primary'], structure_data, 'chemical/x-cif')
         
         # Additional structure models
         if 'all_structures' in result_data:
             for i, struct_data in enumerate(result_data['all_structures']):
                 if 'base64' in struct_data:
-                    structure_data = base64.b64decode(struct_data['base64'])
-                    temp_model_path = f"{temp_base}/structure_model_{i}.cif"
-                    await self._write_file_to_transaction(
-                        transaction,
-                        temp_model_path,
-                        structure_data,
+                    files[f'structure_model_{i}'] = (
+                        f"{storage_paths['structure_models']}model_{i}.cif",
+                        base64.b64decode(struct_data['base64']),
                         'chemical/x-cif'
                     )
-                    temp_files[f'structure_model_{i}'] = temp_model_path
         
-        return temp_files
+        return files
+    
+    async def _write_files(
+        self,
+        transaction: StorageTransaction,
+        files: Dict[str, Tuple[str, bytes, str]],
+        manifest_path: str
+    ) -> Dict[str, str]:
+        """Write all files concurrently; returns file_type -> logical path"""
+        
+        async def write(file_type: str, path: str, data: bytes, content_type: str):
+            await self._write_file_to_transaction(transaction, path, data, content_type,
+                                                  manifest_path=manifest_path)
+            return file_type, path
+        
+        written = await asyncio.gather(*(
+            write(file_type, path, data, content_type)
+            for file_type, (path, data, content_type) in files.items()
+        ))
+        return dict(written)
+    
+    @staticmethod
+    def _versioned_path(path: str, manifest_path: str, transaction_id: str) -> str:
+        """Where a transaction writes a logical path: versions/<transaction_id>/ beside the manifest"""
+        
+        base = manifest_path.rsplit('/', 1)[0]
+        relative = path[len(base) + 1:] if path.startswith(base + '/') else path
+        return f"{base}/versions/{transaction_id}/{relative}"
+    
+    @staticmethod
+    def _committed_paths(manifest: Dict[str, Any]) -> Dict[str, str]:
+        return {file_type: entry['path'] for file_type, entry in manifest['files'].items()}
     
     async def _write_file_to_transaction(
         self,
         transaction: StorageTransaction,
         path: str,
         data: bytes,
-        content_type: str
+        content_type: str,
+        manifest_path: str
     ):
-        """Write a file as part of a transaction"""
+        """Write a file as part of a transaction (checksummed, create-only, single write)"""
         
         try:
+            transaction.manifest_path = manifest_path
+            versioned_path = self._versioned_path(path, manifest_path, transaction.transaction_id)
+            
             # Apply compression if configured
             filename = Path(path).name
             config = self.file_configs.get(filename, {})
@@ -393,58 +425,139 @@ class AtomicStorageService:
                 data = gzip.compress(data)
                 content_type = 'application/gzip'
             
-            # Write to storage
-            await self.storage.upload_file(path, data, content_type=content_type)
+            # Tag the object so orphan sweeping can find writes that never committed
+            object_metadata = {
+                'atomic_transaction': transaction.transaction_id,
+                'atomic_manifest': manifest_path
+            }
+            
+            # Generation 0: the object must not exist yet, so nothing committed is ever replaced
+            info = await self.storage.upload_file(
+                versioned_path, data,
+                content_type=content_type,
+                if_generation_match=0,
+                metadata=object_metadata
+            )
             
             # Track in transaction
-            transaction.temp_files.append(path)
-            transaction.add_operation('write', '', path, len(data))
+            transaction.final_files.append(versioned_path)
+            transaction.versions[path] = versioned_path
+            transaction.generations[versioned_path] = (info or {}).get('generation')
+            transaction.add_operation('write', path, versioned_path, len(data))
+            return info
             
         except Exception as e:
             logger.error(f"❌ Failed to write file {path}: {e}")
             raise
     
-    async def _validate_temp_files(self, temp_files: Dict[str, str]):
-        """Validate all temporary files were written correctly"""
-        
-        for file_type, path in temp_files.items():
-            try:
-                # Check if file exists and is readable
-                exists = await self.storage.file_exists(path)
-                if not exists:
-                    raise ValueError(f"Temporary file not found: {path}")
-                
-                # Basic integrity check
-                file_info = await self.storage.get_file_info(path)
-                if file_info.get('size', 0) == 0:
-                    raise ValueError(f"Temporary file is empty: {path}")
-                
-            except Exception as e:
-                logger.error(f"❌ Validation failed for {path}: {e}")
-                raise
-    
-    async def _finalize_files(
+    async def _publish_manifest(
         self,
         transaction: StorageTransaction,
-        temp_files: Dict[str, str],
-        storage_paths: Dict[str, str]
-    ) -> Dict[str, str]:
-        """Move files from temp to final locations atomically"""
-        
-        final_files = {}
-        
-        for file_type, temp_path in temp_files.items():
-            if file_type in storage_paths:
-                final_path = storage_paths[file_type]
-                
-                # Atomic copy (GCS copy operation is atomic)
-                await self.storage.copy_file(temp_path, final_path)
-                
-                final_files[file_type] = final_path
-                transaction.final_files.append(final_path)
-                transaction.add_operation('copy', temp_path, final_path)
-        
-        return final_files
+        manifest_path: str,
+        files: Dict[str, str],
+        previous_manifest: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Publish the manifest with a compare-and-swap on the previous generation (the commit point)"""
+        
+        versioned = {file_type: transaction.versions.get(path, path) for file_type, path in files.items()}
+        manifest = {
+            'transaction_id': transaction.transaction_id,
+            'committed_at': datetime.utcnow().isoformat(),
+            'storage_version': '3.1.0',
+            'files': {
+                file_type: {'path': path, 'generation': transaction.generations.get(path)}
+                for file_type, path in versioned.items()
+            }
+        }
+        
+        expected_generation = previous_manifest['_generation'] if previous_manifest else 0
+        await self.storage.upload_file(
+            manifest_path,
+            json.dumps(manifest, indent=2).encode('utf-8'),
+            content_type='application/json',
+            if_generation_match=expected_generation
+        )
+        transaction.add_operation('commit', '', manifest_path)
+        return manifest
+    
+    async def resolve_manifest(self, manifest_path: str) -> Optional[Dict[str, Any]]:
+        """Current committed manifest (with its own '_generation'), or None"""
+        
+        info = await self.storage.get_file_info(manifest_path)
+        if not info:
+            return None
+        
+        content = await self.storage.download_file(manifest_path, info['generation'])
+        if not content:
+            return None
+        
+        manifest = json.loads(content)
+        manifest['_generation'] = info['generation']
+        return manifest
+    
+    async def read_committed_file(self, manifest_path: str, file_type: str) -> Optional[bytes]:
+        """
+        Read the committed version of one file through its manifest
+        
+        The read is pinned to the manifest's generation, so a writer that has
+        overwritten the object but not yet committed is never observed.
+        """
+        
+        manifest = await self.resolve_manifest(manifest_path)
+        entry = (manifest or {}).get('files', {}).get(file_type)
+        if not entry:
+            return None
+        
+        content = await self.storage.download_file(entry['path'], entry.get('generation'))
+        if content and content[:2] == b'\x1f\x8b':  # gzip magic
+            import gzip
+            content = gzip.decompress(content)
+        return content
+    
+    async def sweep_orphans(
+        self,
+        prefix: str,
+        older_than_seconds: float = 3600,
+        dry_run: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Delete files written by transactions that never committed
+        
+        Only objects tagged by this service are considered, so legacy files are
+        never touched. A tagged object is an orphan when it is older than the
+        grace period and its manifest is missing or does not reference its path;
+        that covers both crashed writers and versions superseded by a later commit.
+        """
+        
+        cutoff = time.time() - older_than_seconds
+        manifests: Dict[str, Optional[Dict[str, Any]]] = {}
+        report = {'scanned': 0, 'orphans': [], 'inconsistent': [], 'deleted': 0}
+        
+        for obj in await self.storage.list_files(prefix):
+            report['scanned'] += 1
+            manifest_path = obj.get('metadata', {}).get('atomic_manifest')
+            if not manifest_path or not obj.get('updated'):
+                continue
+            if datetime.fromisoformat(obj['updated']).replace(tzinfo=timezone.utc).timestamp() > cutoff:
+                continue  # Possibly an in-flight writer
+            
+            if manifest_path not in manifests:
+                manifests[manifest_path] = await self.resolve_manifest(manifest_path)
+            manifest = manifests[manifest_path]
+            
+            entries = {entry['path']: entry for entry in (manifest or {}).get('files', {}).values()}
+            entry = entries.get(obj['path'])
+            if entry is None:
+                report['orphans'].append(obj['path'])
+                if not dry_run and await self.storage.delete_file(obj['path'], if_generation_match=obj['generation']):
+                    report['deleted'] += 1
+            elif entry.get('generation') != obj['generation']:
+                # Committed path overwritten by a writer that never committed
+                report['inconsistent'].append(obj['path'])
+        
+        logger.info(f"🧹 Orphan sweep of {prefix}: {len(report['orphans'])} orphans, "
+                    f"{report['deleted']} deleted, {len(report['inconsistent'])} inconsistent")
+        return report
     
     async def _update_indexes(
         self,
@@ -615,16 +728,9 @@ class AtomicStorageService:
         """Commit a storage transaction"""
         
         try:
-            # All files should already be in their final locations
+            # Files were written in place and the manifest is published; nothing to clean up
             transaction.committed = True
             
-            # Clean up temporary files
-            for temp_file in transaction.temp_files:
-                try:
-                    await self.storage.delete_file(temp_file)
-                except Exception as e:
-                    logger.warning(f"⚠️ Failed to cleanup temp file {temp_file}: {e}")
-            
             # Remove from active transactions
             self.active_transactions.pop(transaction.transaction_id, None)
             
@@ -644,14 +750,18 @@ class AtomicStorageService:
         try:
             transaction.rolled_back = True
             
-            # Delete all files created during this transaction
-            cleanup_tasks = []
-            
-            for temp_file in transaction.temp_files:
-                cleanup_tasks.append(self.storage.delete_file(temp_file))
-            
-            for final_file in transaction.final_files:
-                cleanup_tasks.append(self.storage.delete_file(final_file))
+            # A manifest write that errored may still have landed; never delete
+            # anything the committed manifest references
+            committed = set()
+            if transaction.manifest_path:
+                manifest = await self.resolve_manifest(transaction.manifest_path)
+                committed = {entry['path'] for entry in (manifest or {}).get('files', {}).values()}
+            
+            # Delete this transaction's own version paths, only at the generations it wrote
+            cleanup_tasks = [
+                self.storage.delete_file(path, if_generation_match=transaction.generations.get(path))
+                for path in transaction.final_files if path not in committed
+            ]
             
             # Execute cleanup in parallel
             await asyncio.gather(*cleanup_tasks, return_exceptions=True)
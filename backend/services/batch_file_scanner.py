@@ -1,13 +1,22 @@
 """
 Batch File Scanner Service
 Efficiently scans GCP storage for individual job result files to determine actual completion status
+
+The batch prefix (batches/{batch_id}/jobs/) is listed once, page by page, and
+only payloads that exist are downloaded, pinned to their listed generation.
+Jobs missing from the listing fall back to probing the legacy jobs/ path.
+Results are remembered per batch by generation, so a rescan downloads only
+what changed.
 """
 
 import asyncio
 import logging
 import json
-from typing import Dict, List, Any, Tuple, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Any, Tuple, Optional
 
 from services.gcp_storage_service import gcp_storage_service
 
@@ -16,9 +25,26 @@ logger = logging.getLogger(__name__)
 class BatchFileScanner:
     """Efficiently scans batch job files in GCP storage for real completion status"""
     
-    def __init__(self):
-        self.max_workers = 10  # Concurrent file checks
-        
+    def __init__(self, storage=None):
+        self._storage = storage
+        self.max_workers = int(os.getenv("BATCH_SCAN_CONCURRENCY", "64"))  # Concurrent downloads
+        self.legacy_fallback = os.getenv("BATCH_SCAN_LEGACY_FALLBACK", "true").lower() == "true"
+        # Incremental rescans: batch_id -> {job_id: (results_generation, metadata_generation, job_result)}
+        self.cache_max_bytes = int(os.getenv("BATCH_SCAN_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+        self._scan_cache: "OrderedDict[str, Dict[str, Tuple[int, Optional[int], Dict[str, Any]]]]" = OrderedDict()
+        self._cache_bytes: Dict[str, int] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+    
+    @property
+    def storage(self):
+        return self._storage if self._storage is not None else gcp_storage_service.storage
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="batch-scan")
+        return self._executor
+    
     async def scan_batch_files(self, batch_id: str, job_ids: List[str]) -> Dict[str, Any]:
         """
         Scan GCP storage files for a batch to determine actual completion status
@@ -31,47 +57,25 @@ class BatchFileScanner:
                 'total_scanned': int,
                 'files_found': int,
                 'files_missing': int,
-                'scan_time_ms': float
+                'scan_time_ms': float,
+                'listed_objects': int,
+                'downloaded': int,
+                'reused': int,
+                'legacy_probes': int
             }
         }
         """
-        import time
         start_time = time.time()
         
         logger.info(f"🔍 Scanning {len(job_ids)} jobs for batch {batch_id}")
         
-        # Check both possible storage locations
-        storage_paths = [
-            f"batches/{batch_id}/jobs/",  # New batch hierarchy
-            f"jobs/"                      # Legacy individual jobs
-        ]
-        
+        stats = {'listed_objects': 0, 'downloaded': 0, 'reused': 0, 'legacy_probes': 0}
         completed_jobs = []
-        failed_jobs = []
+        async for job_result in self.iter_batch_files(batch_id, job_ids, stats):
+            completed_jobs.append(job_result)
         
-        # Use ThreadPoolExecutor for concurrent file checks
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # Submit all file check tasks
-            future_to_job = {}
-            
-            for job_id in job_ids:
-                future = executor.submit(self._check_job_files, batch_id, job_id, storage_paths)
-                future_to_job[future] = job_id
-            
-            # Process results as they complete
-            for future in as_completed(future_to_job):
-                job_id = future_to_job[future]
-                try:
-                    job_result = future.result()
-                    if job_result:
-                        completed_jobs.append(job_result)
-                        logger.debug(f"✅ Found results for job {job_id[:8]}")
-                    else:
-                        failed_jobs.append(job_id)
-                        logger.debug(f"❌ No results for job {job_id[:8]}")
-                except Exception as e:
-                    logger.error(f"❌ Error checking job {job_id[:8]}: {e}")
-                    failed_jobs.append(job_id)
+        found = {job_result['job_id'] for job_result in completed_jobs}
+        failed_jobs = [job_id for job_id in job_ids if job_id not in found]
         
         scan_time = (time.time() - start_time) * 1000
         
@@ -79,10 +83,12 @@ class BatchFileScanner:
             'total_scanned': len(job_ids),
             'files_found': len(completed_jobs),
             'files_missing': len(failed_jobs),
-            'scan_time_ms': round(scan_time, 2)
+            'scan_time_ms': round(scan_time, 2),
+            **stats
         }
         
-        logger.info(f"📊 Scan complete: {len(completed_jobs)} completed, {len(failed_jobs)} failed in {scan_time:.0f}ms")
+        logger.info(f"📊 Scan complete: {len(completed_jobs)} completed, {len(failed_jobs)} failed in {scan_time:.0f}ms "
+                    f"({stats['downloaded']} downloaded, {stats['reused']} unchanged)")
         
         return {
             'completed_jobs': completed_jobs,
@@ -90,38 +96,133 @@ class BatchFileScanner:
             'scan_summary': scan_summary
         }
     
+    async def iter_batch_files(self, batch_id: str, job_ids: List[str],
+                               stats: Optional[Dict[str, int]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield job results as their downloads finish (unchanged ones first)
+        
+        One paged listing of the batch prefix decides which payloads exist;
+        downloads run concurrently on the scanner's pool.
+        """
+        stats = stats if stats is not None else {'listed_objects': 0, 'downloaded': 0, 'reused': 0, 'legacy_probes': 0}
+        loop = asyncio.get_running_loop()
+        prefix = f"batches/{batch_id}/jobs/"
+        
+        try:
+            listing = await loop.run_in_executor(self.executor, self.storage.list_object_index, prefix)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not list {prefix}, probing every job instead: {e}")
+            listing = {}
+        stats['listed_objects'] = len(listing)
+        
+        previous = self._scan_cache.get(batch_id, {})
+        current: Dict[str, Tuple[int, Optional[int], Dict[str, Any]]] = {}
+        current_bytes = 0
+        pending = []
+        
+        for job_id in job_ids:
+            results_path = f"{prefix}{job_id}/results.json"
+            metadata_path = f"{prefix}{job_id}/metadata.json"
+            if results_path in listing:
+                results_generation, results_size = listing[results_path]
+                metadata_generation = listing.get(metadata_path, (None, 0))[0]
+                current_bytes += results_size
+                cached = previous.get(job_id)
+                if cached and cached[0] == results_generation and cached[1] == metadata_generation:
+                    stats['reused'] += 1
+                    current[job_id] = cached
+                    yield cached[2]
+                    continue
+                pending.append(loop.run_in_executor(
+                    self.executor, self._load_job_files, job_id,
+                    results_path, results_generation, metadata_path, metadata_generation
+                ))
+            elif self.legacy_fallback:
+                stats['legacy_probes'] += 1
+                pending.append(loop.run_in_executor(
+                    self.executor, self._check_job_files, batch_id, job_id, ["jobs/"]
+                ))
+        
+        for future in asyncio.as_completed(pending):
+            try:
+                job_result = await future
+            except Exception as e:
+                logger.error(f"❌ Error loading job files: {e}")
+                continue
+            if not job_result:
+                continue
+            if 'generation' in job_result:
+                stats['downloaded'] += 1
+                current[job_result['job_id']] = (job_result.pop('generation'), job_result.pop('metadata_generation'), job_result)
+            yield job_result
+        
+        self._remember(batch_id, current, current_bytes)
+    
+    def _remember(self, batch_id: str, results: Dict[str, Tuple[int, Optional[int], Dict[str, Any]]], size: int) -> None:
+        """Keep a batch's results for incremental rescans, within the byte budget (LRU by batch)"""
+        self._scan_cache.pop(batch_id, None)
+        self._cache_bytes.pop(batch_id, None)
+        if not results or size > self.cache_max_bytes:
+            return
+        self._scan_cache[batch_id] = results
+        self._cache_bytes[batch_id] = size
+        while sum(self._cache_bytes.values()) > self.cache_max_bytes:
+            oldest = next(iter(self._scan_cache))
+            self._scan_cache.pop(oldest)
+            self._cache_bytes.pop(oldest, None)
+    
+    def _load_job_files(self, job_id: str, results_path: str, results_generation: int,
+                        metadata_path: str, metadata_generation: Optional[int]) -> Optional[Dict[str, Any]]:
+        """Download and parse a listed job's files at their listed generations"""
+        storage = self.storage
+        results_data = storage.read_object(results_path, results_generation)
+        if not results_data:
+            return None
+        results = json.loads(results_data)
+        
+        metadata = {}
+        if metadata_generation is not None:
+            try:
+                metadata_data = storage.read_object(metadata_path, metadata_generation)
+                if metadata_data:
+                    metadata = json.loads(metadata_data)
+            except ValueError:
+                pass  # Metadata is optional
+        
+        return {
+            'job_id': job_id,
+            'results': results,
+            'metadata': metadata,
+            'storage_path': results_path,
+            'has_results': True,
+            'status': 'completed',
+            'generation': results_generation,
+            'metadata_generation': metadata_generation
+        }
+    
     def _check_job_files(self, batch_id: str, job_id: str, storage_paths: List[str]) -> Optional[Dict[str, Any]]:
-        """Check if job files exist and load results if found"""
+        """Probe job files at explicit paths (jobs missing from the batch listing, e.g. legacy jobs/)"""
+        
+        storage = self.storage
         
         # Try each storage location
         for base_path in storage_paths:
-            if base_path.startswith("batches/"):
-                results_path = f"{base_path}{job_id}/results.json"
-                metadata_path = f"{base_path}{job_id}/metadata.json"
-            else:
-                # Legacy path
-                results_path = f"{base_path}{job_id}/results.json"
-                metadata_path = f"{base_path}{job_id}/metadata.json"
+            results_path = f"{base_path}{job_id}/results.json"
+            metadata_path = f"{base_path}{job_id}/metadata.json"
             
             try:
-                # Check for results.json
-                results_data = gcp_storage_service.storage.download_file(results_path)
+                # A missing object reads as None, so no separate exists() round trip
+                results_data = storage.read_object(results_path)
                 if results_data:
-                    # File exists - parse and return the data
-                    if isinstance(results_data, bytes):
-                        results_data = results_data.decode('utf-8')
-                    
                     results = json.loads(results_data)
                     
                     # Also try to get metadata if available
                     metadata = {}
                     try:
-                        metadata_data = gcp_storage_service.storage.download_file(metadata_path)
+                        metadata_data = storage.read_object(metadata_path)
                         if metadata_data:
-                            if isinstance(metadata_data, bytes):
-                                metadata_data = metadata_data.decode('utf-8')
                             metadata = json.loads(metadata_data)
-                    except:
+                    except ValueError:
                         pass  # Metadata is optional
                     
                     # Return combined job data
@@ -135,7 +236,7 @@ class BatchFileScanner:
                     }
                     
             except Exception as e:
-                logger.debug(f"Path {results_path} not found: {e}")
+                logger.debug(f"Path {results_path} not readable: {e}")
                 continue
         
         # No files found in any location
@@ -0,0 +1,254 @@
+"""
+Streaming Batch Ingestion
+Generator pipeline that turns chunked uploads or GCS objects into ligand chunks
+with bounded memory, so very large libraries never sit in one JSON body.
+
+Pipeline: bytes chunks -> lines -> ligand records (CSV / SMILES / SDF / NDJSON)
+-> validated ligand chunks consumed by UnifiedBatchProcessor.submit_batch_stream.
+Each stage pulls from the previous one on demand, so a slow consumer applies
+back-pressure all the way to the upload socket or the GCS reader.
+"""
+
+import asyncio
+import codecs
+import csv
+import json
+import logging
+import os
+from collections import deque
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Ligands per chunk handed to the batch processor (children created + enqueued per chunk)
+INGESTION_CHUNK_SIZE = int(os.getenv("BATCH_INGESTION_CHUNK_SIZE", "500"))
+
+# Upper bound for a streamed batch (the JSON endpoint keeps its own lower limit)
+MAX_STREAMED_LIGANDS = int(os.getenv("BATCH_INGESTION_MAX_LIGANDS", "200000"))
+
+# Bytes read per GCS round trip
+GCS_READ_SIZE = 1 << 20
+
+SUPPORTED_FORMATS = ("csv", "smi", "sdf", "ndjson")
+
+@dataclass
+class LigandStreamStats:
+    """Single-pass statistics gathered while ligands stream through"""
+    accepted: int = 0
+    rejected: int = 0
+    total_smiles_length: int = 0
+    rejection_samples: List[str] = field(default_factory=list)
+
+    @property
+    def avg_smiles_length(self) -> float:
+        return self.total_smiles_length / self.accepted if self.accepted else 0.0
+
+    def accept(self, ligand: Dict[str, Any]) -> None:
+        self.accepted += 1
+        self.total_smiles_length += len(ligand['smiles'])
+
+    def reject(self, reason: str) -> None:
+        self.rejected += 1
+        if len(self.rejection_samples) < 100:
+            self.rejection_samples.append(reason)
+
+def validate_ligand(ligand: Any, index: int) -> Optional[str]:
+    """Validate one ligand record; returns an error message or None"""
+    if not isinstance(ligand, dict):
+        return f'Ligand {index+1} must be a dictionary'
+
+    if 'smiles' not in ligand:
+        return f'Ligand {index+1} missing SMILES string'
+
+    smiles = (ligand.get('smiles') or '').strip()
+    if not smiles or len(smiles) < 3:
+        return f'Ligand {index+1} has invalid SMILES string'
+
+    return None
+
+async def iter_lines(chunks: AsyncIterator[bytes], encoding: str = "utf-8") -> AsyncIterator[str]:
+    """Split an async stream of byte chunks into text lines"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+async def iter_gcs_object(gcs_uri: str, storage_client=None) -> AsyncIterator[bytes]:
+    """Stream a gs://bucket/path object in fixed-size reads off the event loop"""
+    if not gcs_uri.startswith("gs://") or "/" not in gcs_uri[5:]:
+        raise ValueError(f"Invalid GCS URI: {gcs_uri}")
+
+    bucket_name, blob_name = gcs_uri[5:].split("/", 1)
+    if storage_client is None:
+        from services.service_registry import service_registry
+        storage_client = service_registry.get("gcp_storage").client
+    if storage_client is None:
+        raise RuntimeError("GCP Storage not configured")
+
+    loop = asyncio.get_event_loop()
+    blob = storage_client.bucket(bucket_name).blob(blob_name)
+    reader = await loop.run_in_executor(None, blob.open, "rb")
+    try:
+        while True:
+            data = await loop.run_in_executor(None, reader.read, GCS_READ_SIZE)
+            if not data:
+                break
+            yield data
+    finally:
+        await loop.run_in_executor(None, reader.close)
+
+def _record_from_row(row: Dict[str, str], index: int) -> Dict[str, Any]:
+    """Normalize a CSV/NDJSON row onto the ligand {name, smiles} shape"""
+    lowered = {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+    smiles = lowered.get('smiles') or lowered.get('canonical_smiles') or lowered.get('ligand_smiles') or ''
+    name = lowered.get('name') or lowered.get('id') or lowered.get('ligand_name') or f'Ligand_{index+1}'
+    return {'name': str(name).strip(), 'smiles': str(smiles).strip()}
+
+class _LineFeed:
+    """Resumable line iterator, so one csv.reader can consume an async line stream"""
+
+    def __init__(self):
+        self.lines: Deque[str] = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+async def _parse_csv(lines: AsyncIterator[str]) -> AsyncIterator[Dict[str, Any]]:
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    header = None
+    index = 0
+    quotes = 0
+    async for line in lines:
+        feed.lines.append(line + "\n")
+        quotes += line.count('"')
+        if quotes % 2:
+            continue  # Inside a quoted field; the record continues on the next line
+        quotes = 0
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            if header is None:
+                header = [column.strip() for column in row]
+                continue
+            yield _record_from_row(dict(zip(header, row)), index)
+            index += 1
+
+    if feed.lines and header is not None:
+        # Unterminated quote at end of input: parse what is left as a final record
+        for row in reader:
+            if any(cell.strip() for cell in row):
+                yield _record_from_row(dict(zip(header, row)), index)
+                index += 1
+
+async def _parse_smi(lines: AsyncIterator[str]) -> AsyncIterator[Dict[str, Any]]:
+    index = 0
+    async for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        parts = line.split(None, 1)
+        yield {'smiles': parts[0], 'name': parts[1].strip() if len(parts) > 1 else f'Ligand_{index+1}'}
+        index += 1
+
+async def _parse_ndjson(lines: AsyncIterator[str]) -> AsyncIterator[Any]:
+    index = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            yield None  # Rejected by validation with its position
+        else:
+            yield _record_from_row(record, index) if isinstance(record, dict) else record
+        index += 1
+
+def _smiles_from_molblock(molblock: str) -> str:
+    """SMILES for an SDF record without a SMILES data field (requires RDKit)"""
+    try:
+        from rdkit import Chem
+    except ImportError:
+        return ''
+    mol = Chem.MolFromMolBlock(molblock)
+    return Chem.MolToSmiles(mol) if mol is not None else ''
+
+async def _parse_sdf(lines: AsyncIterator[str]) -> AsyncIterator[Dict[str, Any]]:
+    record_lines: List[str] = []
+    index = 0
+    async for line in lines:
+        if line.strip() != '$$$$':
+            record_lines.append(line)
+            continue
+
+        molblock_end = next((i for i, l in enumerate(record_lines) if l.strip() == 'M  END'), len(record_lines))
+        data_fields: Dict[str, str] = {}
+        current = None
+        for data_line in record_lines[molblock_end + 1:]:
+            if data_line.startswith('>'):
+                start, end = data_line.find('<'), data_line.find('>', 1 + data_line.find('<'))
+                current = data_line[start + 1:end].strip().lower() if start != -1 and end != -1 else None
+            elif current and data_line.strip():
+                data_fields.setdefault(current, data_line.strip())
+
+        smiles = data_fields.get('smiles') or _smiles_from_molblock("\n".join(record_lines[:molblock_end + 1]))
+        title = record_lines[0].strip() if record_lines else ''
+        name = data_fields.get('name') or data_fields.get('id') or title or f'Ligand_{index+1}'
+        yield {'name': name, 'smiles': smiles}
+
+        record_lines = []
+        index += 1
+
+_PARSERS = {
+    "csv": _parse_csv,
+    "smi": _parse_smi,
+    "sdf": _parse_sdf,
+    "ndjson": _parse_ndjson,
+}
+
+async def iter_ligand_chunks(
+    chunks: AsyncIterator[bytes],
+    file_format: str,
+    stats: LigandStreamStats,
+    chunk_size: int = INGESTION_CHUNK_SIZE,
+    max_ligands: int = MAX_STREAMED_LIGANDS
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Parse and validate ligands from a byte stream, yielding bounded chunks.
+    Invalid records are counted in stats and skipped rather than failing the batch.
+    """
+    if file_format not in _PARSERS:
+        raise ValueError(f"Unsupported ligand format '{file_format}' (expected one of {', '.join(SUPPORTED_FORMATS)})")
+
+    chunk: List[Dict[str, Any]] = []
+    position = 0
+    async for ligand in _PARSERS[file_format](iter_lines(chunks)):
+        error = validate_ligand(ligand, position)
+        position += 1
+        if error:
+            stats.reject(error)
+            continue
+
+        if stats.accepted >= max_ligands:
+            raise ValueError(f"Too many ligands (max {max_ligands} per streamed batch)")
+
+        stats.accept(ligand)
+        chunk.append({'name': ligand.get('name') or f'Ligand_{position}', 'smiles': ligand['smiles'].strip()})
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
@@ -11,6 +11,7 @@ from typing import Dict, Any, List, Optional
 from datetime import datetime
 from google.cloud import firestore
 from google.cloud import storage
+from config.gcp_clients import SharedFirestoreClient, SharedStorageClient
 
 from .cloud_tasks_service import CloudTasksService
 
@@ -19,18 +20,22 @@ logger = logging.getLogger(__name__)
 class BatchMonitorService:
     """Service to monitor and orchestrate batch job execution"""
     
+    db = SharedFirestoreClient("project_id")
+    storage_client = SharedStorageClient("project_id")
+    
     def __init__(self):
         self.project_id = os.getenv("GOOGLE_CLOUD_PROJECT", os.getenv("GCP_PROJECT_ID", "om-models"))
         self.bucket_name = os.getenv("GCP_BUCKET_NAME", "hub-job-files")
         
-        # Initialize clients
-        self.db = firestore.Client(project=self.project_id)
-        self.storage_client = storage.Client(project=self.project_id)
-        self.bucket = self.storage_client.bucket(self.bucket_name)
+        # Shared Firestore/Storage clients are resolved on first use
         self.tasks_service = CloudTasksService()
         
         logger.info(f"✅ Batch Monitor Service initialized for project: {self.project_id}")
     
+    @property
+    def bucket(self):
+        return self.storage_client.bucket(self.bucket_name)
+    
     async def on_job_completed(self, job_id: str, status: str) -> None:
         """Handle job completion and update batch progress"""
         try:
@@ -0,0 +1,356 @@
+"""
+Batch Progress Hub
+Per-pod fan-out of batch progress to streaming (SSE/WebSocket) viewers.
+
+Each batch with at least one viewer gets exactly one upstream subscription
+(a Firestore listener on its children, or a polling loop where listeners are
+unavailable). Child updates are folded into per-batch counts and pushed to
+every viewer as events:
+
+    snapshot  - current aggregate, sent when a viewer joins (or catches up)
+    progress  - aggregate after counts changed
+    child     - summary of a child that just reached a terminal status
+    complete  - final aggregate; the stream ends after it
+
+WebSocket viewers are relayed by relay_events, which also sends a keepalive
+event on idle streams and drops viewers that close or stop reading.
+
+Viewers have bounded queues. A viewer that falls behind has its backlog
+replaced by a fresh snapshot instead of slowing the upstream down.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
+SUMMARY_RESULT_KEYS = ('affinity', 'affinity_probability', 'confidence', 'ptm', 'iptm', 'plddt')
+
+ChildCallback = Callable[[List[Dict[str, Any]]], None]
+SourceOpener = Callable[[str, ChildCallback], Any]
+
+def summarize_child(child: Dict[str, Any]) -> Dict[str, Any]:
+    """Small, stream-friendly view of a child job (no structure files or raw output)"""
+    input_data = child.get('input_data') or {}
+    results = child.get('results') or child.get('output_data') or {}
+    if isinstance(results, dict) and isinstance(results.get('affinity'), dict):
+        results = {**results, **results['affinity']}
+
+    summary = {
+        'job_id': child.get('id'),
+        'batch_index': child.get('batch_index'),
+        'ligand_name': input_data.get('ligand_name') or child.get('name'),
+        'status': child.get('status'),
+    }
+    if isinstance(results, dict):
+        summary.update({key: results[key] for key in SUMMARY_RESULT_KEYS
+                        if isinstance(results.get(key), (int, float))})
+    if child.get('error_message'):
+        summary['error'] = str(child['error_message'])[:500]
+    return summary
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Server-Sent Events frame for a hub event"""
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+async def _until_closed(receive: Callable[[], Awaitable[Any]]) -> None:
+    """Drain client messages until the client disconnects"""
+    while True:
+        message = await receive()
+        if isinstance(message, dict) and message.get('type') == 'websocket.disconnect':
+            return
+
+async def relay_events(subscription: 'BatchSubscription', send: Callable[[Dict[str, Any]], Awaitable[None]],
+                       receive: Callable[[], Awaitable[Any]], heartbeat_seconds: float) -> bool:
+    """
+    Relay a subscription to a WebSocket client.
+
+    A receive task notices the client going away while the batch is idle, an
+    idle stream gets a keepalive event every heartbeat_seconds, and a send that
+    does not finish within heartbeat_seconds raises asyncio.TimeoutError.
+    Returns True when the stream ended, False when the client left first.
+    """
+    receiver = asyncio.ensure_future(_until_closed(receive))
+    getter: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if getter is None:
+                getter = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait({getter, receiver}, timeout=heartbeat_seconds,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                return False
+            if getter in done:
+                event, getter = getter.result(), None
+                if event is None:
+                    return True
+            else:
+                event = {'event': 'keepalive', 'id': None, 'data': None}
+            await asyncio.wait_for(send(event), heartbeat_seconds)
+    finally:
+        for task in (getter, receiver):
+            if task is not None:
+                task.cancel()
+        if receiver.done() and not receiver.cancelled():
+            receiver.exception()
+
+class BatchSubscription:
+    """One viewer's event queue; iterate with `async for`"""
+
+    def __init__(self, hub: 'BatchProgressHub', batch_id: str, queue_size: int):
+        self.hub = hub
+        self.batch_id = batch_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.closed = False
+
+    def push(self, event: Optional[Dict[str, Any]]) -> None:
+        """Enqueue an event (None ends the stream); on overflow resync with a snapshot"""
+        if self.closed:
+            return
+        if event is None:
+            self.closed = True
+        try:
+            self.queue.put_nowait(event)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.dropped += 1
+        channel = self.hub._channels.get(self.batch_id)
+        if event is not None and event['event'] != 'complete' and channel is not None:
+            event = channel.event('snapshot')
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next event, None at the end of the stream; raises asyncio.TimeoutError on timeout"""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        event = await self.queue.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.hub._unsubscribe(self)
+
+class _BatchChannel:
+    """Upstream subscription and folded state for one batch"""
+
+    def __init__(self, batch_id: str):
+        self.batch_id = batch_id
+        self.statuses: Dict[str, str] = {}
+        self.viewers: List[BatchSubscription] = []
+        self.handle: Any = None
+        self.ready = False
+        self.finished = False
+        self.sequence = 0
+        self.linger: Optional[asyncio.TimerHandle] = None
+
+    def counts(self) -> Dict[str, Any]:
+        values = list(self.statuses.values())
+        total = len(values)
+        completed = values.count('completed')
+        failed = values.count('failed')
+        running = values.count('running')
+        finished = sum(1 for status in values if status in TERMINAL_STATUSES)
+        return {
+            'batch_id': self.batch_id,
+            'total_jobs': total,
+            'completed_jobs': completed,
+            'failed_jobs': failed,
+            'running_jobs': running,
+            'pending_jobs': total - finished - running,
+            'progress_percentage': round(finished / total * 100, 1) if total else 0.0,
+        }
+
+    def event(self, kind: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        self.sequence += 1
+        return {'event': kind, 'id': self.sequence, 'data': data if data is not None else self.counts()}
+
+class BatchProgressHub:
+    """Shares one upstream child subscription per batch across all local viewers"""
+
+    def __init__(self, open_source: SourceOpener, queue_size: int = 256, linger_seconds: float = 30.0):
+        self.open_source = open_source
+        self.queue_size = queue_size
+        self.linger_seconds = linger_seconds
+        self._channels: Dict[str, _BatchChannel] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {'subscriptions': 0, 'upstreams_opened': 0, 'updates': 0, 'events': 0}
+
+    # === Viewer side ===
+
+    def subscribe(self, batch_id: str) -> BatchSubscription:
+        """Join a batch's stream, opening its upstream if this is the first viewer"""
+        self._loop = asyncio.get_running_loop()
+        channel = self._channels.get(batch_id)
+        if channel is None:
+            channel = self._channels[batch_id] = _BatchChannel(batch_id)
+            channel.handle = self.open_source(batch_id, lambda children: self.publish_threadsafe(batch_id, children))
+            self.stats['upstreams_opened'] += 1
+            logger.info(f"📡 Opened progress upstream for batch {batch_id}")
+        if channel.linger is not None:
+            channel.linger.cancel()
+            channel.linger = None
+
+        subscription = BatchSubscription(self, batch_id, self.queue_size)
+        channel.viewers.append(subscription)
+        self.stats['subscriptions'] += 1
+        if channel.ready:
+            subscription.push(channel.event('snapshot'))
+        return subscription
+
+    def _unsubscribe(self, subscription: BatchSubscription) -> None:
+        channel = self._channels.get(subscription.batch_id)
+        if channel is None or subscription not in channel.viewers:
+            return
+        channel.viewers.remove(subscription)
+        if not channel.viewers and channel.linger is None:
+            # Keep the upstream briefly so reconnecting clients don't reopen it
+            channel.linger = asyncio.get_running_loop().call_later(
+                self.linger_seconds, self._close_channel, channel.batch_id
+            )
+
+    def _close_channel(self, batch_id: str) -> None:
+        channel = self._channels.get(batch_id)
+        if channel is None or channel.viewers:
+            return
+        self._channels.pop(batch_id, None)
+        if channel.linger is not None:
+            channel.linger.cancel()
+        handle = channel.handle
+        try:
+            if hasattr(handle, 'unsubscribe'):
+                handle.unsubscribe()
+            elif hasattr(handle, 'cancel'):
+                handle.cancel()
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to close progress upstream for batch {batch_id}: {e}")
+        logger.info(f"📴 Closed progress upstream for batch {batch_id}")
+
+    # === Upstream side ===
+
+    def publish_threadsafe(self, batch_id: str, children: List[Dict[str, Any]]) -> None:
+        """Entry point for upstream callbacks, which may run on a listener thread"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is loop:
+            self.publish(batch_id, children)
+        else:
+            loop.call_soon_threadsafe(self.publish, batch_id, children)
+
+    def publish(self, batch_id: str, children: List[Dict[str, Any]]) -> None:
+        """Fold changed children into the batch state and fan events out to its viewers"""
+        channel = self._channels.get(batch_id)
+        if channel is None or channel.finished:
+            return
+        self.stats['updates'] += 1
+
+        events: List[Dict[str, Any]] = []
+        before = channel.counts()
+        for child in children:
+            child_id = child.get('id')
+            if not child_id:
+                continue
+            status = child.get('status', 'pending')
+            previous = channel.statuses.get(child_id)
+            channel.statuses[child_id] = status
+            # The first delivery is the current state, not news
+            if channel.ready and status in TERMINAL_STATUSES and previous not in TERMINAL_STATUSES:
+                events.append(channel.event('child', summarize_child(child)))
+
+        after = channel.counts()
+        if not channel.ready:
+            channel.ready = True
+            events.append(channel.event('snapshot'))
+        elif after != before:
+            events.append(channel.event('progress'))
+
+        if after['total_jobs'] and after['pending_jobs'] == 0 and after['running_jobs'] == 0:
+            channel.finished = True
+            events.append(channel.event('complete'))
+
+        for viewer in list(channel.viewers):
+            for event in events:
+                viewer.push(event)
+            if channel.finished:
+                viewer.push(None)
+        self.stats['events'] += len(events) * len(channel.viewers)
+
+        if channel.finished:
+            channel.viewers.clear()
+            self._close_channel(batch_id)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'active_batches': len(self._channels),
+            'viewers': sum(len(channel.viewers) for channel in self._channels.values()),
+        }
+
+class PollingChildSource:
+    """Upstream for backends without listeners: one poll loop per batch, not per viewer"""
+
+    def __init__(self, fetch: Callable[[str], List[Dict[str, Any]]], batch_id: str,
+                 on_children: ChildCallback, interval: float = 5.0):
+        self.fetch = fetch
+        self.batch_id = batch_id
+        self.on_children = on_children
+        self.interval = interval
+        self._seen: Dict[str, Any] = {}
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        first = True
+        while True:
+            try:
+                children = await asyncio.to_thread(self.fetch, self.batch_id)
+                changed = [child for child in children if self._seen.get(child.get('id')) != child.get('status')]
+                self._seen.update({child.get('id'): child.get('status') for child in changed})
+                if changed or first:
+                    self.on_children(changed)
+                first = False
+            except Exception as e:
+                logger.warning(f"⚠️ Progress poll failed for batch {self.batch_id}: {e}")
+            await asyncio.sleep(self.interval)
+
+    def cancel(self) -> None:
+        self._task.cancel()
+
+def _open_child_source(batch_id: str, on_children: ChildCallback) -> Any:
+    """Firestore listener on the batch's children, falling back to polling the child index"""
+    from services.service_registry import service_registry
+    unified_job_manager = service_registry.get("unified_job_manager")
+
+    watch = unified_job_manager.watch_batch_children(batch_id, on_children)
+    if watch is not None:
+        return watch
+    return PollingChildSource(
+        lambda bid: unified_job_manager.get_batch_children(bid),
+        batch_id, on_children,
+        interval=float(os.getenv("BATCH_PROGRESS_POLL_SECONDS", "5"))
+    )
+
+# Global instance
+batch_progress_hub = BatchProgressHub(
+    _open_child_source,
+    linger_seconds=float(os.getenv("BATCH_PROGRESS_LINGER_SECONDS", "30"))
+)
@@ -10,6 +10,9 @@ from typing import Dict, Any, List, Optional
 from datetime import datetime
 from database.unified_job_manager import unified_job_manager
 from services.gcp_storage_service import gcp_storage_service
+from services.batch_results_query import BatchResultsTable, column_stats, summary_row, top_rows
+from services.near_cache import NearCache, batch_scope
+from services.offload import offload, run_sync
 
 logger = logging.getLogger(__name__)
 
@@ -17,7 +20,9 @@ class BatchRelationshipManager:
     """Manages parent-child relationships for batch jobs"""
     
     def __init__(self):
-        self.relationship_cache = {}  # In-memory cache for active batches
+        # Batch indexes for active batches: local LRU in front of Redis, and every
+        # write supersedes the copies other replicas hold
+        self.relationship_cache = NearCache("batch_index", max_entries=500, ttl=3600)
     
     def _get_standardized_batch_structure(self, batch_id: str) -> Dict[str, str]:
         """Get standardized batch storage structure"""
@@ -41,9 +46,10 @@ class BatchRelationshipManager:
             'logs': f"batches/{batch_id}/jobs/{job_id}/logs.txt"
         }
     
-    async def _store_child_results_unified(self, storage_paths: Dict[str, str], 
-                                          job_id: str, results: Dict[str, Any], 
-                                          task_type: str) -> bool:
+    @offload
+    def _store_child_results_unified(self, storage_paths: Dict[str, str], 
+                                    job_id: str, results: Dict[str, Any], 
+                                    task_type: str) -> bool:
         """Store child results in unified standardized location"""
         try:
             # Store main results file
@@ -117,7 +123,7 @@ class BatchRelationshipManager:
             # Store batch index
             success = await self._store_batch_index(batch_id, batch_index)
             if success:
-                self.relationship_cache[batch_id] = batch_index
+                await self._cache_batch_index(batch_id, batch_index)
                 logger.info(f"✅ Created batch structure: {batch_id}")
             
             return success
@@ -130,6 +136,11 @@ class BatchRelationshipManager:
                                 child_metadata: Dict[str, Any]) -> bool:
         """Register a child job with its parent batch"""
         
+        return await self.register_child_jobs(batch_id, {child_job_id: child_metadata})
+    
+    async def register_child_jobs(self, batch_id: str, children: Dict[str, Dict[str, Any]]) -> bool:
+        """Register many child jobs (job_id -> metadata) with one batch index read and write"""
+        
         try:
             # Get or create batch index
             batch_index = await self._get_batch_index(batch_id)
@@ -137,27 +148,27 @@ class BatchRelationshipManager:
                 logger.error(f"❌ Batch {batch_id} not found for child registration")
                 return False
             
-            # Add child job to batch index with STANDARDIZED paths
-            child_entry = {
-                'job_id': child_job_id,
-                'registered_at': datetime.utcnow().isoformat(),
-                'metadata': child_metadata,
-                'status': 'registered',
-                'storage_paths': self._get_standardized_job_paths(batch_id, child_job_id)
-            }
-            
-            batch_index['individual_jobs'].append(child_entry)
+            # Add child jobs to batch index with STANDARDIZED paths
+            registered_at = datetime.utcnow().isoformat()
+            for child_job_id, child_metadata in children.items():
+                batch_index['individual_jobs'].append({
+                    'job_id': child_job_id,
+                    'registered_at': registered_at,
+                    'metadata': child_metadata,
+                    'status': 'registered',
+                    'storage_paths': self._get_standardized_job_paths(batch_id, child_job_id)
+                })
             
             # Update batch index
             success = await self._store_batch_index(batch_id, batch_index)
             if success:
-                self.relationship_cache[batch_id] = batch_index
-                logger.info(f"✅ Registered child job {child_job_id} with batch {batch_id}")
+                await self._cache_batch_index(batch_id, batch_index)
+                logger.info(f"✅ Registered {len(children)} child jobs with batch {batch_id}")
             
             return success
             
         except Exception as e:
-            logger.error(f"❌ Failed to register child job {child_job_id} with batch {batch_id}: {e}")
+            logger.error(f"❌ Failed to register {len(children)} child jobs with batch {batch_id}: {e}")
             return False
     
     async def store_child_results(self, batch_id: str, child_job_id: str, 
@@ -174,9 +185,11 @@ class BatchRelationshipManager:
             
             # Find child job entry
             child_entry = None
-            for job in batch_index['individual_jobs']:
+            batch_index_position = None
+            for position, job in enumerate(batch_index['individual_jobs']):
                 if job['job_id'] == child_job_id:
                     child_entry = job
+                    batch_index_position = position
                     break
             
             if not child_entry:
@@ -185,6 +198,7 @@ class BatchRelationshipManager:
                 await self.register_child_job(batch_id, child_job_id, {'task_type': task_type})
                 batch_index = await self._get_batch_index(batch_id)
                 child_entry = batch_index['individual_jobs'][-1]
+                batch_index_position = len(batch_index['individual_jobs']) - 1
             
             # Store results in SINGLE standardized location
             storage_paths = child_entry['storage_paths']
@@ -205,7 +219,14 @@ class BatchRelationshipManager:
             
             # Update batch index
             await self._store_batch_index(batch_id, batch_index)
-            self.relationship_cache[batch_id] = batch_index
+            await self._cache_batch_index(batch_id, batch_index)
+            
+            # Append the child's row to the batch's columnar results table
+            from services.batch_results_service import batch_results_service
+            batch_results_service.record_child_result(
+                batch_id, child_job_id, 'completed', child_entry.get('metadata'), results,
+                batch_index_position
+            )
             
             # Check if batch is complete and trigger aggregation
             await self._check_batch_completion(batch_id, batch_index)
@@ -277,7 +298,7 @@ class BatchRelationshipManager:
             
             # Update cache
             if success:
-                self.relationship_cache[batch_id] = batch_index
+                await self._cache_batch_index(batch_id, batch_index)
             
             logger.info(f"✅ Updated batch progress: {batch_id} - {completed}/{total_jobs} completed, {failed} failed")
             return success
@@ -354,7 +375,8 @@ class BatchRelationshipManager:
             logger.error(f"❌ Failed to get batch results {batch_id}: {e}")
             return None
     
-    async def _cache_batch_results(self, batch_id: str, batch_results: Dict[str, Any]) -> bool:
+    @offload
+    def _cache_batch_results(self, batch_id: str, batch_results: Dict[str, Any]) -> bool:
         """Cache batch results for future retrieval"""
         try:
             # Store as aggregated results
@@ -392,19 +414,26 @@ class BatchRelationshipManager:
         """Get batch index from cache or storage"""
         
         # Check cache first
-        if batch_id in self.relationship_cache:
-            return self.relationship_cache[batch_id]
+        cached = await self.relationship_cache.get(batch_id)
+        if cached is not None:
+            return cached
         
         # Load from GCP
         index_path = f"batches/{batch_id}/batch_index.json"
         batch_index = await self._load_json_from_gcp(index_path)
         
         if batch_index:
-            self.relationship_cache[batch_id] = batch_index
+            await self.relationship_cache.set(batch_id, batch_index, scopes=[batch_scope(batch_id)])
         
         return batch_index
     
-    async def _store_batch_index(self, batch_id: str, batch_index: Dict[str, Any]) -> bool:
+    async def _cache_batch_index(self, batch_id: str, batch_index: Dict[str, Any]) -> None:
+        """Cache an index we just wrote, invalidating older copies on other replicas"""
+        await self.relationship_cache.invalidate(scopes=[batch_scope(batch_id)])
+        await self.relationship_cache.set(batch_id, batch_index, scopes=[batch_scope(batch_id)])
+    
+    @offload
+    def _store_batch_index(self, batch_id: str, batch_index: Dict[str, Any]) -> bool:
         """Store batch index to GCP"""
         
         index_path = f"batches/{batch_id}/batch_index.json"
@@ -416,7 +445,8 @@ class BatchRelationshipManager:
             )
         return False
     
-    async def _load_json_from_gcp(self, file_path: str) -> Optional[Dict[str, Any]]:
+    @offload
+    def _load_json_from_gcp(self, file_path: str) -> Optional[Dict[str, Any]]:
         """Load JSON file from GCP storage"""
         
         if not gcp_storage_service.storage.available:
@@ -431,8 +461,9 @@ class BatchRelationshipManager:
         
         return None
     
-    async def _store_child_results_at_path(self, base_path: str, job_id: str, 
-                                          results: Dict[str, Any], task_type: str) -> bool:
+    @offload
+    def _store_child_results_at_path(self, base_path: str, job_id: str, 
+                                    results: Dict[str, Any], task_type: str) -> bool:
         """Store child results at specific path"""
         
         if not gcp_storage_service.storage.available:
@@ -505,8 +536,8 @@ class BatchRelationshipManager:
             # Store aggregated results
             aggregated_path = f"batches/{batch_id}/results/aggregated.json"
             content = json.dumps(aggregated, indent=2).encode('utf-8')
-            success = gcp_storage_service.storage.upload_file(
-                aggregated_path, content, 'application/json'
+            success = await run_sync(
+                gcp_storage_service.storage.upload_file, aggregated_path, content, 'application/json'
             )
             
             # Also store summary
@@ -518,8 +549,8 @@ class BatchRelationshipManager:
                 'top_hits': sorted(individual_results, key=lambda x: x['affinity'])[:10] if individual_results else []
             }
             summary_content = json.dumps(summary, indent=2).encode('utf-8')
-            gcp_storage_service.storage.upload_file(
-                summary_path, summary_content, 'application/json'
+            await run_sync(
+                gcp_storage_service.storage.upload_file, summary_path, summary_content, 'application/json'
             )
             
             logger.info(f"✅ Created aggregated results for batch {batch_id}")
@@ -592,7 +623,7 @@ class BatchRelationshipManager:
             success = await self._store_batch_index(batch_id, batch_index)
             if success:
                 # Cache the index
-                self.relationship_cache[batch_id] = batch_index
+                await self._cache_batch_index(batch_id, batch_index)
                 logger.info(f"✅ Initialized batch relationships for {batch_id}")
             else:
                 logger.error(f"❌ Failed to store batch index for {batch_id}")
@@ -682,6 +713,14 @@ class BatchRelationshipManager:
             total_confidence = 0
             completed_count = 0
             
+            # Scores also go into the batch's columnar results table, which the
+            # summary statistics are computed from
+            positions = {job_id: position for position, job_id in enumerate(job_ids)}
+            table = BatchResultsTable.from_rows(batch_id, (
+                summary_row(job['job_id'], job.get('status'), job.get('metadata'), batch_index=positions[job['job_id']])
+                for job in individual_jobs
+            ))
+            
             # Process each job to get comprehensive results
             for job_id in job_ids:
                 try:
@@ -690,12 +729,12 @@ class BatchRelationshipManager:
                     metadata_path = f"batches/{batch_id}/jobs/{job_id}/metadata.json"
                     
                     try:
-                        results_data = gcp_storage_service.storage.download_file(results_path)
+                        results_data = await run_sync(gcp_storage_service.storage.download_file, results_path)
                         if isinstance(results_data, bytes):
                             results_data = results_data.decode('utf-8')
                         results = json.loads(results_data)
                         
-                        metadata_data = gcp_storage_service.storage.download_file(metadata_path)
+                        metadata_data = await run_sync(gcp_storage_service.storage.download_file, metadata_path)
                         if isinstance(metadata_data, bytes):
                             metadata_data = metadata_data.decode('utf-8')
                         metadata = json.loads(metadata_data)
@@ -746,6 +785,7 @@ class BatchRelationshipManager:
                     }
                     
                     aggregated_results['results'].append(job_summary)
+                    table.upsert(summary_row(job_id, 'completed', metadata, results, positions[job_id]))
                     total_affinity += actual_affinity
                     total_confidence += actual_confidence
                     
@@ -755,11 +795,10 @@ class BatchRelationshipManager:
             aggregated_results['completed_jobs'] = completed_count
             
             # Calculate comprehensive summary statistics
-            affinities = [r['affinity'] for r in aggregated_results['results'] if r['affinity']]
-            confidences = [r['confidence'] for r in aggregated_results['results'] if r['confidence']]
-            ptm_scores = [r['ptm_score'] for r in aggregated_results['results'] if r['ptm_score']]
-            plddt_scores = [r['plddt_score'] for r in aggregated_results['results'] if r['plddt_score']]
-            iptm_scores = [r['iptm_score'] for r in aggregated_results['results'] if r['iptm_score']]
+            affinity_stats = column_stats(table, 'affinity')
+            confidence_stats = column_stats(table, 'confidence')
+            affinities = [value for value in table.columns['affinity'] if value == value]
+            confidences = [value for value in table.columns['confidence'] if value == value]
             execution_times = [r['execution_time'] for r in aggregated_results['results'] if r['execution_time']]
             
             # Find best and worst performers
@@ -774,26 +813,26 @@ class BatchRelationshipManager:
                 
                 # Affinity analysis
                 'affinity_stats': {
-                    'average': sum(affinities) / len(affinities) if affinities else 0,
-                    'min': min(affinities) if affinities else 0,
-                    'max': max(affinities) if affinities else 0,
-                    'median': sorted(affinities)[len(affinities)//2] if affinities else 0,
-                    'std_dev': (sum([(x - sum(affinities)/len(affinities))**2 for x in affinities]) / len(affinities))**0.5 if len(affinities) > 1 else 0
+                    'average': affinity_stats['mean'] or 0,
+                    'min': affinity_stats['min'] or 0,
+                    'max': affinity_stats['max'] or 0,
+                    'median': affinity_stats['median'] or 0,
+                    'std_dev': affinity_stats['std'] or 0
                 },
                 
                 # Confidence analysis  
                 'confidence_stats': {
-                    'average': sum(confidences) / len(confidences) if confidences else 0,
-                    'min': min(confidences) if confidences else 0,
-                    'max': max(confidences) if confidences else 0,
-                    'median': sorted(confidences)[len(confidences)//2] if confidences else 0
+                    'average': confidence_stats['mean'] or 0,
+                    'min': confidence_stats['min'] or 0,
+                    'max': confidence_stats['max'] or 0,
+                    'median': confidence_stats['median'] or 0
                 },
                 
                 # Structure quality metrics
                 'structure_quality': {
-                    'avg_ptm': sum(ptm_scores) / len(ptm_scores) if ptm_scores else 0,
-                    'avg_plddt': sum(plddt_scores) / len(plddt_scores) if plddt_scores else 0,
-                    'avg_iptm': sum(iptm_scores) / len(iptm_scores) if iptm_scores else 0
+                    'avg_ptm': column_stats(table, 'ptm')['mean'] or 0,
+                    'avg_plddt': column_stats(table, 'plddt')['mean'] or 0,
+                    'avg_iptm': column_stats(table, 'iptm')['mean'] or 0
                 },
                 
                 # Performance metrics
@@ -831,19 +870,23 @@ class BatchRelationshipManager:
             # Store aggregated results
             aggregated_path = f"batches/{batch_id}/results/aggregated.json"
             aggregated_content = json.dumps(aggregated_results, indent=2).encode('utf-8')
-            gcp_storage_service.storage.upload_file(
-                aggregated_path, aggregated_content, 'application/json'
+            await run_sync(
+                gcp_storage_service.storage.upload_file, aggregated_path, aggregated_content, 'application/json'
             )
             logger.info(f"✅ Created enhanced aggregated.json for batch {batch_id}")
             
             # Create summary.json
             summary_path = f"batches/{batch_id}/results/summary.json"
             summary_content = json.dumps(aggregated_results['summary'], indent=2).encode('utf-8')
-            gcp_storage_service.storage.upload_file(
-                summary_path, summary_content, 'application/json'
+            await run_sync(
+                gcp_storage_service.storage.upload_file, summary_path, summary_content, 'application/json'
             )
             logger.info(f"✅ Created enhanced summary.json for batch {batch_id}")
             
+            # Final results table for paged queries and analytics
+            from services.batch_results_service import batch_results_service
+            await batch_results_service.store_results_table(table)
+            
             # Create comprehensive batch results (parent-level results)
             batch_results_path = f"batches/{batch_id}/batch_results.json"
             batch_results = {
@@ -875,13 +918,17 @@ class BatchRelationshipManager:
             }
             
             batch_results_content = json.dumps(batch_results, indent=2).encode('utf-8')
-            gcp_storage_service.storage.upload_file(
-                batch_results_path, batch_results_content, 'application/json'
+            await run_sync(
+                gcp_storage_service.storage.upload_file, batch_results_path, batch_results_content, 'application/json'
             )
             logger.info(f"✅ Created comprehensive batch_results.json for batch {batch_id}")
             
-            # Create CSV export
-            self._create_batch_csv_export(batch_id, aggregated_results['results'])
+            # Create CSV export; ligand descriptors are resolved before the blocking write
+            from services.service_registry import service_registry
+            features_by_smiles = await service_registry.get("ligand_feature_store").get_many_async(
+                self._result_smiles(r) for r in aggregated_results['results']
+            )
+            await run_sync(self._create_batch_csv_export, batch_id, aggregated_results['results'], features_by_smiles)
             
             logger.info(f"✅ Created complete enhanced aggregated results structure for batch {batch_id}")
                 
@@ -890,8 +937,9 @@ class BatchRelationshipManager:
             import traceback
             logger.error(f"❌ Traceback: {traceback.format_exc()}")
     
-    async def _create_batch_summary(self, batch_id: str, batch_index: Dict[str, Any], 
-                                  batch_results: Dict[str, Any]):
+    @offload
+    def _create_batch_summary(self, batch_id: str, batch_index: Dict[str, Any], 
+                            batch_results: Dict[str, Any]):
         """Create batch summary with key datapoints"""
         
         try:
@@ -1005,9 +1053,9 @@ class BatchRelationshipManager:
                         'plddt_score': results_data.get('plddt_score')
                     })
             
-            # Sort by affinity (lower is better) and confidence (higher is better)
-            top_by_affinity = sorted(scored_results, key=lambda x: x['affinity'])[:top_n]
-            top_by_confidence = sorted(scored_results, key=lambda x: x['confidence'], reverse=True)[:top_n]
+            # Affinity (lower is better) and confidence (higher is better) via bounded heaps
+            top_by_affinity = top_rows(scored_results, 'affinity', top_n)
+            top_by_confidence = top_rows(scored_results, 'confidence', top_n, descending=True)
             
             return {
                 'best_affinity': top_by_affinity,
@@ -1018,7 +1066,8 @@ class BatchRelationshipManager:
             logger.error(f"❌ Failed to get top predictions: {e}")
             return {'best_affinity': [], 'highest_confidence': []}
     
-    async def _create_job_index(self, batch_id: str, batch_results: Dict[str, Any]):
+    @offload
+    def _create_job_index(self, batch_id: str, batch_results: Dict[str, Any]):
         """Create individual job index for easy lookup"""
         
         try:
@@ -1055,7 +1104,8 @@ class BatchRelationshipManager:
         except Exception as e:
             logger.error(f"❌ Failed to create job index for {batch_id}: {e}")
     
-    async def _store_batch_metadata_copy(self, batch_id: str, batch_index: Dict[str, Any]):
+    @offload
+    def _store_batch_metadata_copy(self, batch_id: str, batch_index: Dict[str, Any]):
         """Store batch metadata copy in results folder"""
         
         try:
@@ -1077,8 +1127,14 @@ class BatchRelationshipManager:
         except Exception as e:
             logger.error(f"❌ Failed to store batch metadata copy for {batch_id}: {e}")
 
-    def _create_batch_csv_export(self, batch_id: str, results_list: List[Dict[str, Any]]):
-        """Create CSV export of batch results"""
+    @staticmethod
+    def _result_smiles(result: Dict[str, Any]) -> str:
+        """Ligand SMILES of one aggregated result"""
+        return (result.get('ligand_smiles') or result.get('metadata', {}).get('ligand_smiles') or '').strip()
+    
+    def _create_batch_csv_export(self, batch_id: str, results_list: List[Dict[str, Any]],
+                                 features_by_smiles: Dict[str, Any]):
+        """Create CSV export of batch results with ligand features from the shared feature store"""
         
         try:
             import io
@@ -1092,11 +1148,14 @@ class BatchRelationshipManager:
             writer.writerow([
                 'job_id', 'ligand_name', 'protein_name', 'affinity', 'confidence', 
                 'ptm_score', 'iptm_score', 'plddt_score', 'execution_time', 'has_structure',
-                'stored_at', 'affinity_probability', 'complex_plddt', 'ligand_iptm', 'protein_iptm'
+                'stored_at', 'affinity_probability', 'complex_plddt', 'ligand_iptm', 'protein_iptm',
+                'ligand_smiles', 'scaffold_smiles', 'heavy_atoms', 'molecular_weight'
             ])
             
             # Data rows
             for result in results_list:
+                smiles = self._result_smiles(result)
+                features = features_by_smiles.get(smiles)
                 writer.writerow([
                     result.get('job_id', ''),
                     result.get('ligand_name', 'Unknown'),
@@ -1113,6 +1172,10 @@ class BatchRelationshipManager:
                     result.get('raw_modal_result', {}).get('confidence_metrics', {}).get('complex_plddt', ''),
                     result.get('raw_modal_result', {}).get('ligand_iptm_score', ''),
                     result.get('raw_modal_result', {}).get('protein_iptm_score', ''),
+                    smiles,
+                    features.scaffold_smiles if features and features.valid else '',
+                    features.heavy_atoms if features and features.valid else '',
+                    features.molecular_weight if features and features.valid else '',
                 ])
             
             # Store CSV
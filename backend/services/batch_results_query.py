@@ -0,0 +1,376 @@
+"""
+Batch Results Query
+Compact per-batch results table plus the paged, sorted and filtered queries the
+results view runs against it.
+
+A batch's table holds one small row per child (identity, status and the handful
+of scores the UI sorts by) stored column by column, so a query never touches
+structure files or raw model output. Pages come from a heap over the matching
+rows (O(n log page) instead of a full sort) and continue from an opaque
+keyset cursor, so every response is O(page) regardless of the batch size.
+
+Tables are stored as one .npz per batch (numpy.savez) and updated as children
+complete, so statistics and histograms are numpy reductions over contiguous
+typed columns instead of re-parsing every child's JSON.
+"""
+
+import base64
+import heapq
+import io
+import json
+import os
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TABLE_FORMAT = "omtx-results-table"
+TABLE_VERSION = 2
+META_MEMBER = "meta"
+
+TEXT_COLUMNS = ('job_id', 'ligand_name', 'ligand_smiles', 'status')
+NUMERIC_COLUMNS = ('affinity', 'affinity_probability', 'confidence', 'ptm', 'iptm', 'plddt')
+TABLE_COLUMNS = TEXT_COLUMNS + ('batch_index', 'has_structure') + NUMERIC_COLUMNS
+
+# Sort keys and their natural direction (lower affinity is better binding)
+SORT_KEYS = {
+    'affinity': 'asc',
+    'affinity_probability': 'desc',
+    'confidence': 'desc',
+    'ptm': 'desc',
+    'iptm': 'desc',
+    'plddt': 'desc',
+    'batch_index': 'asc',
+}
+MAX_PAGE_SIZE = 500
+
+_NAN = float('nan')
+_MISSING_INDEX = -1
+_DTYPES = {'batch_index': np.int64, 'has_structure': np.bool_, **{name: np.float64 for name in NUMERIC_COLUMNS}}
+_TYPECODES = {'batch_index': 'q', 'has_structure': 'b', **{name: 'd' for name in NUMERIC_COLUMNS}}
+
+# Where each score may live in a stored results payload, in order of preference
+_SCORE_ALIASES = {
+    'affinity': ('affinity', 'binding_affinity', 'affinity_pred_value'),
+    'affinity_probability': ('affinity_probability', 'affinity_prob', 'affinity_probability_binary'),
+    'confidence': ('confidence', 'confidence_score', 'prediction_confidence'),
+    'ptm': ('ptm_score', 'ptm'),
+    'iptm': ('iptm_score', 'iptm'),
+    'plddt': ('plddt_score', 'plddt'),
+}
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+def extract_scores(results: Optional[Dict[str, Any]]) -> Dict[str, Optional[float]]:
+    """Scores from a child's results payload (raw model output wins over top-level copies)"""
+    sources: List[Dict[str, Any]] = []
+    if isinstance(results, dict):
+        raw = results.get('raw_modal_result')
+        for source in (raw, results):
+            if not isinstance(source, dict):
+                continue
+            sources.append(source)
+            for nested in ('affinity', 'affinity_ensemble', 'confidence_metrics'):
+                if isinstance(source.get(nested), dict):
+                    sources.append(source[nested])
+
+    scores: Dict[str, Optional[float]] = {}
+    for column in NUMERIC_COLUMNS:
+        scores[column] = None
+        for source in sources:
+            values = (_number(source.get(alias)) for alias in _SCORE_ALIASES[column])
+            value = next((v for v in values if v is not None), None)
+            if value is not None:
+                scores[column] = value
+                break
+    return scores
+
+def summary_row(job_id: str, status: Optional[str] = None, input_data: Optional[Dict[str, Any]] = None,
+                results: Optional[Dict[str, Any]] = None, batch_index: Optional[int] = None) -> Dict[str, Any]:
+    """One table row for a child job"""
+    input_data = input_data or {}
+    results = results if isinstance(results, dict) else {}
+    row = {
+        'job_id': job_id,
+        'ligand_name': input_data.get('ligand_name') or '',
+        'ligand_smiles': input_data.get('ligand_smiles') or '',
+        'status': status or ('completed' if results else 'pending'),
+        'batch_index': batch_index if batch_index is not None else input_data.get('batch_index'),
+        'has_structure': bool(results.get('structure_file_base64') or results.get('structure_file_content')
+                              or results.get('has_structure')),
+    }
+    row.update(extract_scores(results))
+    return row
+
+class BatchResultsTable:
+    """
+    Column-oriented summary of every child in a batch
+
+    Scores are float64 columns (NaN = missing), batch_index int64 (-1 =
+    missing) and has_structure bool; text columns are lists of str. Tables
+    built in process hold stdlib arrays; tables read from storage hold numpy
+    arrays (memory-mapped by load()) until the first upsert copies them.
+    """
+
+    def __init__(self, batch_id: str, columns: Optional[Dict[str, Any]] = None,
+                 generated_at: Optional[str] = None):
+        self.batch_id = batch_id
+        self.generated_at = generated_at or datetime.utcnow().isoformat()
+        columns = columns or {}
+        self.columns: Dict[str, Any] = {name: columns.get(name, []) for name in TEXT_COLUMNS}
+        self.columns['job_id'] = list(self.columns['job_id'])
+        self.columns['batch_index'] = columns.get('batch_index', array('q'))
+        self.columns['has_structure'] = columns.get('has_structure', array('b'))
+        for name in NUMERIC_COLUMNS:
+            self.columns[name] = columns.get(name, array('d'))
+        if any(len(values) != len(self.columns['job_id']) for values in self.columns.values()):
+            raise ValueError("Results table columns have different lengths")
+        self._positions = {job_id: i for i, job_id in enumerate(self.columns['job_id'])}
+
+    @classmethod
+    def from_rows(cls, batch_id: str, rows: Iterable[Dict[str, Any]]) -> 'BatchResultsTable':
+        table = cls(batch_id)
+        for row in rows:
+            table.upsert(row)
+        return table
+
+    @classmethod
+    def _from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'BatchResultsTable':
+        try:
+            meta = json.loads(arrays[META_MEMBER].item())
+        except (KeyError, ValueError):
+            meta = {}
+        if meta.get('format') != TABLE_FORMAT or meta.get('version') != TABLE_VERSION:
+            raise ValueError("Not a batch results table")
+        columns = {
+            name: np.char.decode(arrays[name], 'utf-8').tolist() if name in TEXT_COLUMNS else arrays[name]
+            for name in TABLE_COLUMNS
+        }
+        return cls(meta['batch_id'], columns, meta.get('generated_at'))
+
+    @classmethod
+    def from_npz(cls, source: Any) -> 'BatchResultsTable':
+        """Table from .npz bytes or a file object (columns are read into memory)"""
+        with np.load(io.BytesIO(source) if isinstance(source, bytes) else source, allow_pickle=False) as archive:
+            return cls._from_arrays({name: archive[name] for name in archive.files})
+
+    @classmethod
+    def load(cls, directory: str) -> 'BatchResultsTable':
+        """Table from a directory written by unpack_npz(); numeric columns are memory-mapped"""
+        return cls._from_arrays({
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r', allow_pickle=False)
+            for name in (META_MEMBER,) + TABLE_COLUMNS
+        })
+
+    def to_npz(self) -> bytes:
+        """Serialize as an .npz, one member per column plus a JSON meta member"""
+        meta = {'format': TABLE_FORMAT, 'version': TABLE_VERSION, 'batch_id': self.batch_id,
+                'generated_at': self.generated_at, 'row_count': len(self)}
+        arrays = {
+            name: np.array([value.encode('utf-8') for value in values], dtype=np.bytes_) if name in TEXT_COLUMNS
+            else np.asarray(values, dtype=_DTYPES[name])
+            for name, values in self.columns.items()
+        }
+        buffer = io.BytesIO()
+        np.savez(buffer, **{META_MEMBER: np.array(json.dumps(meta))}, **arrays)
+        return buffer.getvalue()
+
+    def __len__(self) -> int:
+        return len(self.columns['job_id'])
+
+    def _make_mutable(self) -> None:
+        for name, values in self.columns.items():
+            if isinstance(values, np.ndarray):
+                self.columns[name] = array(_TYPECODES[name], values.tolist())
+
+    def upsert(self, row: Dict[str, Any]) -> None:
+        """Add a child's row, or replace it if the child is already in the table"""
+        self._make_mutable()
+        batch_index = row.get('batch_index')
+        values = {name: row.get(name) or '' for name in TEXT_COLUMNS}
+        values['batch_index'] = int(batch_index) if isinstance(batch_index, (int, float)) else _MISSING_INDEX
+        values['has_structure'] = 1 if row.get('has_structure') else 0
+        for name in NUMERIC_COLUMNS:
+            number = _number(row.get(name))
+            values[name] = _NAN if number is None else number
+
+        position = self._positions.get(row['job_id'])
+        if position is None:
+            self._positions[row['job_id']] = len(self)
+            for name, value in values.items():
+                self.columns[name].append(value)
+        else:
+            for name, value in values.items():
+                self.columns[name][position] = value
+
+    def value(self, name: str, position: int) -> Any:
+        """One cell with missing numbers as None"""
+        value = self.columns[name][position]
+        if name == 'has_structure':
+            return bool(value)
+        if name == 'batch_index':
+            return None if value == _MISSING_INDEX else int(value)
+        if name in NUMERIC_COLUMNS:
+            return None if value != value else float(value)
+        return value
+
+    def row(self, position: int, columns: Sequence[str] = TABLE_COLUMNS) -> Dict[str, Any]:
+        return {name: self.value(name, position) for name in columns}
+
+    def status_counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for status in self.columns['status']:
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+def unpack_npz(content: bytes, directory: str) -> None:
+    """Write each member of a stored table to directory as <name>.npy, for load()"""
+    os.makedirs(directory, exist_ok=True)
+    with np.load(io.BytesIO(content), allow_pickle=False) as archive:
+        for name in archive.files:
+            np.save(os.path.join(directory, f"{name}.npy"), archive[name])
+
+def _present(table: BatchResultsTable, name: str) -> np.ndarray:
+    """A numeric column as float64 without its missing (NaN) values"""
+    values = np.asarray(table.columns[name], dtype=np.float64)
+    return values[~np.isnan(values)]
+
+def column_stats(table: BatchResultsTable, name: str) -> Dict[str, Any]:
+    """count/mean/min/max/median/std of a numeric column, ignoring missing values"""
+    if name not in NUMERIC_COLUMNS:
+        raise ValueError(f"Statistics apply to {', '.join(NUMERIC_COLUMNS)}, not {name}")
+    values = _present(table, name)
+    if not values.size:
+        return {'count': 0, 'mean': None, 'min': None, 'max': None, 'median': None, 'std': None}
+    return {
+        'count': int(values.size),
+        'mean': float(values.mean()),
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'median': float(np.median(values)),
+        'std': float(values.std()),
+    }
+
+def histogram(table: BatchResultsTable, name: str, bins: int = 20,
+              value_range: Optional[Tuple[float, float]] = None) -> Dict[str, Any]:
+    """Equal-width histogram of a numeric column (numpy.histogram: last bin is closed, outliers dropped)"""
+    if name not in NUMERIC_COLUMNS:
+        raise ValueError(f"Histograms apply to {', '.join(NUMERIC_COLUMNS)}, not {name}")
+    values = _present(table, name)
+    if value_range is None:
+        value_range = (float(values.min()), float(values.max())) if values.size else (0.0, 1.0)
+    low, high = value_range
+    if high <= low:
+        high = low + 1.0
+    counts, edges = np.histogram(values, bins=max(1, bins), range=(low, high))
+    return {'column': name, 'edges': edges.tolist(), 'counts': counts.tolist()}
+
+def encode_results_cursor(sort_by: str, order: str, key: Tuple[Any, ...]) -> str:
+    """Opaque page token: the sort it belongs to and the last row's sort key"""
+    payload = {'sort': sort_by, 'order': order, 'key': list(key)}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+def decode_results_cursor(token: str, sort_by: str, order: str) -> Tuple[Any, ...]:
+    """Sort key in a page token; raises ValueError if it is malformed or from another sort"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload['sort'] != sort_by or payload['order'] != order:
+            raise ValueError("Cursor belongs to a different sort order")
+        missing, value, job_id = payload['key']
+        return (int(missing), float(value), str(job_id))
+    except (KeyError, TypeError, json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+def query_results(table: BatchResultsTable, sort_by: str = 'affinity', order: Optional[str] = None,
+                  filters: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+                  status: Optional[str] = None, columns: Optional[Sequence[str]] = None,
+                  limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """
+    One page of a batch's rows
+
+    filters maps numeric columns to inclusive (min, max) bounds, either of
+    which may be None. Rows without a value for the sort key come last in
+    either direction; ties break on job_id so pages never overlap. Raises
+    ValueError for unknown sort keys, columns or filters and for bad cursors.
+    """
+    if sort_by not in SORT_KEYS:
+        raise ValueError(f"Unsupported sort key '{sort_by}' (use one of {', '.join(SORT_KEYS)})")
+    order = order or SORT_KEYS[sort_by]
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be 'asc' or 'desc'")
+    columns = list(columns) if columns else list(TABLE_COLUMNS)
+    unknown = [name for name in columns if name not in TABLE_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    filters = {name: bounds for name, bounds in (filters or {}).items() if bounds != (None, None)}
+    bad_filters = [name for name in filters if name not in NUMERIC_COLUMNS]
+    if bad_filters:
+        raise ValueError(f"Range filters apply to {', '.join(NUMERIC_COLUMNS)}, not {', '.join(bad_filters)}")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after = decode_results_cursor(cursor, sort_by, order) if cursor else None
+
+    data = table.columns
+    keys = data[sort_by]
+    job_ids = data['job_id']
+    sign = 1.0 if order == 'asc' else -1.0
+    bounded = [(data[name], low, high) for name, (low, high) in filters.items()]
+    statuses = data['status'] if status else None
+
+    def matching() -> Iterable[int]:
+        for i in range(len(job_ids)):
+            if statuses is not None and statuses[i] != status:
+                continue
+            in_range = True
+            for values, low, high in bounded:
+                value = values[i]
+                if value != value or (low is not None and value < low) or (high is not None and value > high):
+                    in_range = False
+                    break
+            if in_range:
+                yield i
+
+    missing = _MISSING_INDEX if sort_by == 'batch_index' else None
+
+    def sort_key(i: int) -> Tuple[int, float, str]:
+        value = keys[i]
+        if value != value or value == missing:
+            return (1, 0.0, job_ids[i])
+        return (0, sign * value, job_ids[i])
+
+    total_matches = 0
+
+    def candidates() -> Iterable[Tuple[Tuple[int, float, str], int]]:
+        nonlocal total_matches
+        for i in matching():
+            total_matches += 1
+            key = sort_key(i)
+            if after is None or key > after:
+                yield key, i
+
+    # Bounded heap: memory stays O(page) however many rows match
+    page = heapq.nsmallest(limit + 1, candidates())
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    return {
+        'batch_id': table.batch_id,
+        'results': [table.row(i, columns) for _, i in page],
+        'sort_by': sort_by,
+        'order': order,
+        'limit': limit,
+        'total_rows': len(table),
+        'total_matches': total_matches,
+        'has_more': has_more,
+        'next_cursor': encode_results_cursor(sort_by, order, page[-1][0]) if has_more else None,
+    }
+
+def top_rows(rows: Iterable[Dict[str, Any]], key: str, n: int, descending: bool = False) -> List[Dict[str, Any]]:
+    """The n best rows by a numeric key without sorting them all (rows lacking the key are skipped)"""
+    scored = (row for row in rows if _number(row.get(key)) is not None)
+    select = heapq.nlargest if descending else heapq.nsmallest
+    return select(n, scored, key=lambda row: row[key])
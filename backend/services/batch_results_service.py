@@ -3,11 +3,21 @@ Batch Results Service
 Handles batch job results aggregation and display
 """
 
+import asyncio
+import glob
 import json
 import logging
-from typing import Dict, Any, List, Optional
+import os
+import shutil
+import tempfile
+from typing import Dict, Any, List, Optional, Sequence, Tuple
 from datetime import datetime
 
+from services.batch_results_query import (
+    NUMERIC_COLUMNS, BatchResultsTable, column_stats, histogram, query_results, summary_row, unpack_npz
+)
+from services.near_cache import NearCache, batch_scope, spawn
+
 # Try to import services, handle gracefully if not available
 try:
     from services.batch_relationship_manager import batch_relationship_manager
@@ -38,19 +48,38 @@ except ImportError as e:
 
 logger = logging.getLogger(__name__)
 
+# Child fields the results table needs; output data comes from the results files
+RESULTS_TABLE_CHILD_FIELDS = ('status', 'input_data', 'batch_index')
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
+NPZ_CONTENT_TYPE = "application/x-npz"
+TABLE_WRITE_ATTEMPTS = 5
+
 class BatchResultsService:
     """Handles batch job results aggregation and display"""
     
     def __init__(self):
-        self.batch_cache = {}  # Cache for batch results
         self.cache_ttl = 600  # 10 minutes for batch results
+        # Local LRU in front of Redis, shared by replicas and invalidated per batch
+        self.batch_cache = NearCache("batch_results", max_entries=200, ttl=self.cache_ttl)
+        # Per-batch results tables (batches/{id}/results/results_table.npz): finished
+        # children are appended as they complete, readers map a local, unpacked copy
+        # of the stored generation, and running batches are rebuilt from the child index
+        # every table_rebuild_seconds to catch children no writer reported
+        self.table_ttl = int(os.getenv("BATCH_RESULTS_TABLE_TTL", "30"))
+        self.table_flush_seconds = float(os.getenv("BATCH_RESULTS_TABLE_FLUSH_SECONDS", "5"))
+        self.table_rebuild_seconds = float(os.getenv("BATCH_RESULTS_TABLE_REBUILD_SECONDS", "300"))
+        self.table_dir = os.getenv("BATCH_RESULTS_TABLE_DIR", os.path.join(tempfile.gettempdir(), "omtx-results-tables"))
+        self.table_local_files = int(os.getenv("BATCH_RESULTS_TABLE_LOCAL_FILES", "200"))
+        self.table_cache = NearCache("batch_results_table", max_entries=100, ttl=self.table_ttl, shared=False)
+        self._pending_rows: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._flush_tasks: Dict[str, asyncio.Task] = {}
     
     async def get_batch_with_children(self, batch_id: str) -> Dict[str, Any]:
         """Get batch job with all child results"""
         
         # Check cache first
         cache_key = f"batch_full:{batch_id}"
-        cached_result = self._get_from_cache(cache_key)
+        cached_result = await self.batch_cache.get(cache_key)
         if cached_result:
             logger.debug(f"Using cached batch results for {batch_id}")
             return cached_result
@@ -107,7 +136,7 @@ class BatchResultsService:
             }
             
             # Cache the result
-            self._set_cache(cache_key, batch_result)
+            await self.batch_cache.set(cache_key, batch_result, scopes=[batch_scope(batch_id)])
             
             logger.info(f"✅ Loaded batch {batch_id}: {len(child_results)} completed, {len(failed_children)} failed")
             return batch_result
@@ -206,39 +235,266 @@ class BatchResultsService:
         else:
             return 'partially_completed'
     
-    def _get_from_cache(self, key: str) -> Optional[Dict[str, Any]]:
-        """Get item from cache if not expired"""
+    async def query_batch_results(self, batch_id: str, sort_by: str = 'affinity', order: Optional[str] = None,
+                                  filters: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+                                  status: Optional[str] = None, columns: Optional[Sequence[str]] = None,
+                                  limit: int = 50, cursor: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        One sorted, filtered page of a batch's results (None if the batch has no children)
         
-        if key not in self.batch_cache:
+        Raises ValueError for invalid sort keys, columns, filters or cursors.
+        """
+        table = await self.get_results_table(batch_id)
+        if table is None:
             return None
-            
-        cached_item = self.batch_cache[key]
-        cache_time = cached_item.get('_cache_time', 0)
-        
-        if datetime.utcnow().timestamp() - cache_time > self.cache_ttl:
-            del self.batch_cache[key]
+        page = query_results(table, sort_by=sort_by, order=order, filters=filters, status=status,
+                             columns=columns, limit=limit, cursor=cursor)
+        page['status_counts'] = table.status_counts()
+        page['generated_at'] = table.generated_at
+        return page
+    
+    async def get_batch_statistics(self, batch_id: str, bins: int = 20) -> Optional[Dict[str, Any]]:
+        """Score statistics and histograms for a batch, computed from its results table"""
+        table = await self.get_results_table(batch_id)
+        if table is None:
             return None
-            
-        return cached_item.get('data')
+        return {
+            'batch_id': batch_id,
+            'total_rows': len(table),
+            'status_counts': table.status_counts(),
+            'statistics': {name: column_stats(table, name) for name in NUMERIC_COLUMNS},
+            'histograms': {name: histogram(table, name, bins) for name in NUMERIC_COLUMNS},
+            'top_by_affinity': query_results(table, 'affinity', limit=5, status='completed',
+                                             columns=('job_id', 'ligand_name', 'affinity', 'confidence'))['results'],
+            'generated_at': table.generated_at,
+        }
+    
+    async def get_results_table(self, batch_id: str) -> Optional[BatchResultsTable]:
+        """Compact per-batch results table (memory-mapped from the stored file, built on first use)"""
+        return await self.table_cache.get_or_load(
+            batch_id, lambda: self._load_results_table(batch_id), scopes=[batch_scope(batch_id)]
+        )
     
-    def _set_cache(self, key: str, data: Dict[str, Any]) -> None:
-        """Set item in cache with timestamp"""
+    def record_child_result(self, batch_id: str, job_id: str, status: str,
+                            input_data: Optional[Dict[str, Any]] = None, results: Optional[Dict[str, Any]] = None,
+                            batch_index: Optional[int] = None) -> None:
+        """
+        Append (or update) a finished child's row in its batch's results table
         
-        self.batch_cache[key] = {
-            'data': data,
-            '_cache_time': datetime.utcnow().timestamp()
-        }
+        Rows are applied to this pod's cached table at once and written to the
+        stored table in coalesced batches, at most once per flush interval per
+        batch. Must be called from the event loop.
+        """
+        row = summary_row(job_id, status, input_data, results, batch_index)
+        cached = self.table_cache.get_local(batch_id)
+        if cached is not None:
+            cached.upsert(row)
+        self._pending_rows.setdefault(batch_id, {})[job_id] = row
+        if batch_id not in self._flush_tasks:
+            self._flush_tasks[batch_id] = asyncio.get_running_loop().create_task(self._flush_later(batch_id))
+    
+    async def store_results_table(self, table: BatchResultsTable) -> bool:
+        """Replace a batch's stored table (e.g. with the final one built during aggregation)"""
+        if not GCP_AVAILABLE or not gcp_storage_service.storage.available:
+            return False
+        info = await asyncio.to_thread(gcp_storage_service.storage.get_object_info,
+                                       self._results_table_path(table.batch_id))
+        generation = int(info['generation']) if info else 0
+        if not await asyncio.to_thread(self._write_stored_table, table, generation):
+            return False
+        self.table_cache.set_local(table.batch_id, table, scopes=[batch_scope(table.batch_id)])
+        return True
+    
+    async def flush_results_tables(self) -> None:
+        """Write every pending row now (shutdown)"""
+        for task in list(self._flush_tasks.values()):
+            task.cancel()
+        self._flush_tasks.clear()
+        pending, self._pending_rows = self._pending_rows, {}
+        for batch_id, rows in pending.items():
+            await self._flush_rows(batch_id, rows)
+    
+    async def _flush_later(self, batch_id: str) -> None:
+        try:
+            await asyncio.sleep(self.table_flush_seconds)
+        finally:
+            self._flush_tasks.pop(batch_id, None)
+        rows = self._pending_rows.pop(batch_id, None)
+        if rows:
+            await self._flush_rows(batch_id, rows)
+    
+    async def _flush_rows(self, batch_id: str, rows: Dict[str, Dict[str, Any]]) -> bool:
+        """Read-modify-write of the stored table under a generation precondition"""
+        if not GCP_AVAILABLE or not gcp_storage_service.storage.available:
+            return False
+        
+        for attempt in range(TABLE_WRITE_ATTEMPTS):
+            table, generation = await asyncio.to_thread(self._read_stored_table, batch_id)
+            if table is None:
+                # First write for this batch: seed every child so the table is complete
+                table = await self._build_results_table(batch_id) or BatchResultsTable(batch_id)
+            for row in rows.values():
+                table.upsert(row)
+            if await asyncio.to_thread(self._write_stored_table, table, generation):
+                self.table_cache.set_local(batch_id, table, scopes=[batch_scope(batch_id)])
+                logger.debug(f"Appended {len(rows)} rows to results table for {batch_id}")
+                return True
+            await asyncio.sleep(0.05 * (attempt + 1))
+        
+        logger.warning(f"⚠️ Gave up appending {len(rows)} rows to results table for {batch_id}; it will be rebuilt on read")
+        return False
+    
+    def _results_table_path(self, batch_id: str) -> str:
+        return f"batches/{batch_id}/results/results_table.npz"
+    
+    def _is_final(self, table: BatchResultsTable) -> bool:
+        return len(table) > 0 and all(status in TERMINAL_STATUSES for status in table.columns['status'])
+    
+    def _is_stale(self, table: BatchResultsTable) -> bool:
+        """Running batches' tables are rebuilt now and then to pick up children no writer reported"""
+        if self._is_final(table):
+            return False
+        try:
+            age = (datetime.utcnow() - datetime.fromisoformat(table.generated_at)).total_seconds()
+        except ValueError:
+            return True
+        return age > self.table_rebuild_seconds
+    
+    async def _load_results_table(self, batch_id: str) -> Optional[BatchResultsTable]:
+        if not GCP_AVAILABLE:
+            raise RuntimeError("Batch services not available")
+        
+        stored, generation = await asyncio.to_thread(self._read_stored_table, batch_id)
+        if stored is not None and not self._is_stale(stored):
+            return stored
+        
+        table = await self._build_results_table(batch_id)
+        if table is None:
+            return stored
+        await asyncio.to_thread(self._write_stored_table, table, generation)
+        return table
+    
+    def _read_stored_table(self, batch_id: str) -> Tuple[Optional[BatchResultsTable], int]:
+        """
+        Stored table and its generation (0 if absent), memory-mapped from a local copy
+        
+        An unreadable table (e.g. an older format) still reports its generation,
+        so the rebuilt table replaces it.
+        """
+        storage = gcp_storage_service.storage
+        path = self._results_table_path(batch_id)
+        generation = 0
+        try:
+            info = storage.get_object_info(path)
+            if info is None:
+                return None, 0
+            generation = int(info['generation'])
+            local_path = os.path.join(self.table_dir, f"{batch_id}.{generation}")
+            if not os.path.isdir(local_path):
+                content = storage.read_object(path, generation)
+                if not content:
+                    return None, generation
+                self._save_local_copy(batch_id, local_path, content)
+            return BatchResultsTable.load(local_path), generation
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read results table for {batch_id}: {e}")
+            return None, generation
+    
+    def _save_local_copy(self, batch_id: str, local_path: str, content: bytes) -> None:
+        """Unpack the downloaded generation on local disk for mapping; older generations are dropped"""
+        os.makedirs(self.table_dir, exist_ok=True)
+        temp_path = tempfile.mkdtemp(dir=self.table_dir, suffix=".tmp")
+        try:
+            unpack_npz(content, temp_path)
+            os.replace(temp_path, local_path)
+        except OSError:
+            # Another worker unpacked the same generation first
+            shutil.rmtree(temp_path, ignore_errors=True)
+            if not os.path.isdir(local_path):
+                raise
+        
+        try:
+            copies = sorted((path for path in glob.glob(os.path.join(self.table_dir, "*"))
+                             if not path.endswith(".tmp")), key=os.path.getmtime)
+        except OSError:
+            return  # another worker pruned concurrently
+        for old in list(copies):
+            if old != local_path and (os.path.basename(old).startswith(f"{batch_id}.")
+                                      or len(copies) > self.table_local_files):
+                # Mapped readers keep their pages until they drop the table
+                if os.path.isdir(old):
+                    shutil.rmtree(old, ignore_errors=True)
+                else:
+                    try:
+                        os.remove(old)  # single-file copies from before tables were unpacked
+                    except OSError:
+                        pass
+                copies.remove(old)
+    
+    def _write_stored_table(self, table: BatchResultsTable, generation: int) -> bool:
+        """Write the table if the stored generation is still `generation` (0 = absent)"""
+        table.generated_at = datetime.utcnow().isoformat()
+        content = table.to_npz()
+        try:
+            gcp_storage_service.storage.write_object(
+                self._results_table_path(table.batch_id), content, NPZ_CONTENT_TYPE, if_generation_match=generation
+            )
+            logger.info(f"💾 Stored results table for batch {table.batch_id} ({len(table)} rows, {len(content)} bytes)")
+            return True
+        except Exception as e:
+            logger.debug(f"Results table write for {table.batch_id} not applied: {e}")
+            return False
+    
+    async def _build_results_table(self, batch_id: str) -> Optional[BatchResultsTable]:
+        """One row per child from the child index, with scores from its results file"""
+        from services.batch_file_scanner import batch_file_scanner
+        from services.service_registry import service_registry
+        unified_job_manager = service_registry.get("unified_job_manager")
+        
+        children = await asyncio.to_thread(
+            unified_job_manager.get_batch_children, batch_id, None, None, None, RESULTS_TABLE_CHILD_FIELDS
+        )
+        if not children:
+            # Batches tracked only by the relationship manager's index
+            batch_index = await batch_relationship_manager._get_batch_index(batch_id)
+            children = [
+                {'id': entry['job_id'], 'status': entry.get('status'), 'input_data': entry.get('metadata', {}),
+                 'batch_index': entry.get('batch_index', position)}
+                for position, entry in enumerate((batch_index or {}).get('individual_jobs', []))
+            ]
+        if not children:
+            return None
+        
+        started = datetime.utcnow()
+        by_id = {child['id']: child for child in children}
+        table = BatchResultsTable(batch_id)
+        for child in children:
+            table.upsert(summary_row(child['id'], child.get('status'), child.get('input_data'),
+                                     batch_index=child.get('batch_index')))
+        
+        completed = [child['id'] for child in children if child.get('status') == 'completed']
+        async for job_result in batch_file_scanner.iter_batch_files(batch_id, completed):
+            child = by_id.get(job_result['job_id'])
+            if child is not None:
+                table.upsert(summary_row(child['id'], child.get('status'), child.get('input_data'),
+                                         job_result.get('results'), child.get('batch_index')))
+        
+        elapsed_ms = (datetime.utcnow() - started).total_seconds() * 1000
+        logger.info(f"📊 Built results table for batch {batch_id}: {len(table)} rows in {elapsed_ms:.0f}ms")
+        return table
     
     def clear_cache(self, batch_id: Optional[str] = None) -> None:
-        """Clear batch cache (all or specific batch)"""
+        """Clear batch cache (a specific batch on every replica, or all of this pod's entries)"""
         
         if batch_id:
             cache_key = f"batch_full:{batch_id}"
-            if cache_key in self.batch_cache:
-                del self.batch_cache[cache_key]
-                logger.info(f"🧹 Cleared cache for batch {batch_id}")
+            self.batch_cache.invalidate_local(cache_key)
+            self.table_cache.invalidate_local(batch_id)
+            spawn(self.batch_cache.invalidate(cache_key, scopes=[batch_scope(batch_id)]))
+            logger.info(f"🧹 Cleared cache for batch {batch_id}")
         else:
-            self.batch_cache.clear()
+            self.batch_cache.clear_local()
+            self.table_cache.clear_local()
             logger.info("🧹 Cleared all batch cache")
 
 # Global instance
@@ -0,0 +1,123 @@
+"""
+Batch Status Reconciler
+Background, rate-limited reconciliation of running batch children against
+their execution backend.
+
+Status polls only ask for a reconcile; at most one pass per batch runs every
+min_interval seconds and at most max_concurrent passes run at once, so the
+cost of probing Cloud Run no longer scales with how often clients poll.
+
+CloudRunChildChecker is the reconcile pass for children dispatched to Cloud
+Run: it reads the per-ligand results the worker stored for each child's
+Cloud Run batch and finishes the children that have one.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Worker result fields too large (or too transient) to copy onto the child job
+OMITTED_RESULT_FIELDS = ('structure_base64',)
+
+class CloudRunChildChecker:
+    """Finishes running Cloud Run children whose ligand results the worker has stored"""
+
+    def __init__(self, fetch_results: Callable[[str, str], Awaitable[Dict[str, Dict[str, Any]]]],
+                 update_status: Callable[[str, str, Dict[str, Any]], bool],
+                 on_finished: Optional[Callable[[str, str], Awaitable[None]]] = None):
+        self.fetch_results = fetch_results
+        self.update_status = update_status
+        self.on_finished = on_finished
+
+    async def __call__(self, child_jobs_data: List[Dict[str, Any]]) -> int:
+        """Returns the number of children moved to completed or failed"""
+        by_batch: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for job in child_jobs_data:
+            cloud_run_batch_id = (job.get('input_data') or {}).get('cloud_run_batch_id')
+            if job.get('status') == 'running' and cloud_run_batch_id:
+                key = (job.get('user_id', 'current_user'), cloud_run_batch_id)
+                by_batch.setdefault(key, []).append(job)
+
+        finished = 0
+        for (user_id, cloud_run_batch_id), jobs in by_batch.items():
+            results = await self.fetch_results(user_id, cloud_run_batch_id)
+            for job in jobs:
+                result = results.get(job['id'])
+                if result is None:
+                    continue
+                status = 'completed' if result.get('status') == 'completed' else 'failed'
+                output_data = {key: value for key, value in result.items() if key not in OMITTED_RESULT_FIELDS}
+                if await asyncio.to_thread(self.update_status, job['id'], status, output_data):
+                    finished += 1
+                    if self.on_finished:
+                        await self.on_finished(job['id'], status)
+        return finished
+
+class RunningJobReconciler:
+    """Schedules per-batch reconcile passes off the request path"""
+
+    def __init__(self, fetch_running: Callable[[str], List[Dict[str, Any]]],
+                 reconcile: Callable[[List[Dict[str, Any]]], Awaitable[int]],
+                 on_reconciled: Optional[Callable[[str, int], None]] = None,
+                 min_interval: float = 30.0, max_concurrent: int = 2, max_batches: int = 1000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.fetch_running = fetch_running
+        self.reconcile = reconcile
+        self.on_reconciled = on_reconciled
+        self.min_interval = min_interval
+        self.max_concurrent = max_concurrent
+        self.max_batches = max_batches
+        self.clock = clock
+
+        self._last_run: Dict[str, float] = {}
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.stats = {'requested': 0, 'scheduled': 0, 'passes': 0, 'jobs_checked': 0, 'jobs_updated': 0, 'errors': 0}
+
+    def request(self, batch_id: str) -> bool:
+        """Ask for a reconcile pass; returns True if one was scheduled"""
+        self.stats['requested'] += 1
+        now = self.clock()
+        if batch_id in self._pending or now - self._last_run.get(batch_id, float('-inf')) < self.min_interval:
+            return False
+
+        self._last_run[batch_id] = now
+        while len(self._last_run) > self.max_batches:
+            self._last_run.pop(next(iter(self._last_run)))
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        task = asyncio.create_task(self._run(batch_id))
+        self._pending[batch_id] = task
+        task.add_done_callback(lambda _: self._pending.pop(batch_id, None))
+        self.stats['scheduled'] += 1
+        return True
+
+    async def _run(self, batch_id: str) -> None:
+        async with self._semaphore:
+            try:
+                running = await asyncio.to_thread(self.fetch_running, batch_id)
+                self.stats['passes'] += 1
+                if not running:
+                    return
+                self.stats['jobs_checked'] += len(running)
+                updated = await self.reconcile(running)
+                self.stats['jobs_updated'] += updated
+                if updated:
+                    logger.info(f"✅ Reconciled batch {batch_id}: {updated}/{len(running)} running jobs finished")
+                if self.on_reconciled:
+                    self.on_reconciled(batch_id, updated)
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"❌ Error reconciling running jobs for batch {batch_id}: {e}")
+
+    async def wait_idle(self) -> None:
+        """Wait for scheduled passes to finish (shutdown and tests)"""
+        while self._pending:
+            await asyncio.gather(*list(self._pending.values()), return_exceptions=True)
+
+    def status(self) -> Dict[str, Any]:
+        return {**self.stats, 'in_progress': len(self._pending)}
@@ -6,19 +6,24 @@ High-performance pipeline for extracting scientific metrics from predicted compl
 import asyncio
 import json
 import logging
+import os
+import time
 from pathlib import Path
 from typing import Dict, List, Set, Tuple, Optional, Any
 from collections import Counter
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import numpy as np
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import threading
 
+from services.ligand_feature_store import ligand_feature_store
+
 try:
     import MDAnalysis as mda
-    from sklearn.decomposition import PCA
-    from sklearn.cluster import KMeans
+    from scipy import sparse
+    from sklearn.cluster import MiniBatchKMeans
     from sklearn.metrics import silhouette_score
+    from sklearn.preprocessing import normalize
     from rdkit import Chem
     from rdkit.Chem.Scaffolds import MurckoScaffold
     DEPENDENCIES_AVAILABLE = True
@@ -28,6 +33,14 @@ except ImportError as e:
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on poses used to estimate the silhouette score (full score is O(n^2))
+SILHOUETTE_SAMPLE_SIZE = 2000
+
+# Number of binding-mode clusters fitted per batch
+BINDING_MODE_CLUSTERS = 6
+
+ResidueKey = Tuple[str, str, int]
+
 @dataclass
 class ContactResult:
     """Result from contact analysis of a single complex"""
@@ -47,6 +60,157 @@ class BatchAnalysis:
     cluster_summary: Dict[str, Any]
     total_jobs: int
     processed_jobs: int
+    stage_timings: Dict[str, float] = field(default_factory=dict)
+    cluster_assignments: Dict[str, int] = field(default_factory=dict)
+    cluster_state: Optional["BindingModeClusterState"] = None
+
+@dataclass
+class BindingModeClusterState:
+    """
+    Persisted binding-mode clustering for a batch.
+    
+    Holds the residue vocabulary and cluster centroids over L2-normalized
+    contact fingerprints, so children completing after the batch fit can be
+    assigned (and the centroids updated online) without re-clustering.
+    """
+    residues: List[ResidueKey]
+    centroids: np.ndarray  # (n_clusters, n_residues)
+    counts: List[int]
+    largest_cluster: int
+    
+    def label_for(self, cluster_id: int) -> str:
+        """Human-readable binding mode label for a cluster"""
+        return "Classical" if cluster_id == self.largest_cluster else "Novel"
+    
+    def assign(self, contacts: List[ResidueKey]) -> int:
+        """
+        Assign a new pose to its nearest centroid and update that centroid
+        with a running mean (online k-means step). Unseen residues extend
+        the vocabulary with zero-valued centroid columns.
+        """
+        residue_index = {res: i for i, res in enumerate(self.residues)}
+        for contact in contacts:
+            if contact not in residue_index:
+                residue_index[contact] = len(self.residues)
+                self.residues.append(contact)
+        
+        if self.centroids.shape[1] < len(self.residues):
+            padding = np.zeros((self.centroids.shape[0], len(self.residues) - self.centroids.shape[1]))
+            self.centroids = np.hstack([self.centroids, padding])
+        
+        fingerprint = np.zeros(len(self.residues))
+        for contact in contacts:
+            fingerprint[residue_index[contact]] = 1.0
+        norm = np.linalg.norm(fingerprint)
+        if norm > 0:
+            fingerprint /= norm
+        
+        cluster_id = int(np.argmin(((self.centroids - fingerprint) ** 2).sum(axis=1)))
+        self.counts[cluster_id] += 1
+        self.centroids[cluster_id] += (fingerprint - self.centroids[cluster_id]) / self.counts[cluster_id]
+        self.largest_cluster = int(np.argmax(self.counts))
+        return cluster_id
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable form for persistence"""
+        return {
+            "residues": [list(res) for res in self.residues],
+            "centroids": self.centroids.round(6).tolist(),
+            "counts": list(self.counts),
+            "largest_cluster": self.largest_cluster
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "BindingModeClusterState":
+        return cls(
+            residues=[tuple(res) for res in data["residues"]],
+            centroids=np.asarray(data["centroids"], dtype=np.float64),
+            counts=list(data["counts"]),
+            largest_cluster=int(data["largest_cluster"])
+        )
+
+def parse_contacts(contacts_json: Optional[str]) -> List[ResidueKey]:
+    """Parse a contacts_json payload into residue keys (segid, resname, resid)"""
+    if not contacts_json:
+        return []
+    try:
+        return [tuple(c) for c in json.loads(contacts_json) if len(c) == 3]
+    except (json.JSONDecodeError, TypeError, ValueError) as e:
+        logger.warning(f"Could not parse contacts: {e}")
+        return []
+
+def build_contact_fingerprints(contact_sets: List[List[ResidueKey]], residue_index: Dict[ResidueKey, int]):
+    """
+    Build L2-normalized sparse (CSR) contact fingerprints.
+    Euclidean distance between normalized binary rows is a monotone
+    function of their cosine (Tanimoto-like) overlap.
+    """
+    indptr = [0]
+    indices = []
+    for contacts in contact_sets:
+        indices.extend(sorted({residue_index[c] for c in contacts if c in residue_index}))
+        indptr.append(len(indices))
+    
+    data = np.ones(len(indices), dtype=np.float32)
+    fingerprints = sparse.csr_matrix(
+        (data, np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(contact_sets), len(residue_index))
+    )
+    return normalize(fingerprints, norm="l2", copy=False)
+
+def analyze_contacts(structure_path: str, contact_cutoff: float) -> ContactResult:
+    """
+    Analyze protein-ligand contacts using MDAnalysis.
+    Module-level so it can run in both thread and process pools.
+    """
+    try:
+        # Load structure
+        universe = mda.Universe(structure_path)
+        
+        # Define selections
+        protein = universe.select_atoms("protein and not name H*")
+        ligand = universe.select_atoms("not protein and not name HOH and not name H*")
+        
+        if len(ligand) == 0:
+            return ContactResult(set(), 0, 0, len(protein), False, "No ligand atoms found")
+        
+        if len(protein) == 0:
+            return ContactResult(set(), 0, len(ligand), 0, False, "No protein atoms found")
+        
+        # Calculate distance matrix
+        distances = mda.lib.distances.distance_array(
+            protein.positions, 
+            ligand.positions
+        )
+        
+        # Find contacts within cutoff
+        protein_indices, ligand_indices = np.where(distances <= contact_cutoff)
+        
+        # Get unique residue contacts
+        contacted_residues = set()
+        for pi in np.unique(protein_indices):
+            atom = protein.atoms[pi]
+            residue_key = (str(atom.segid), str(atom.resname), int(atom.resid))
+            contacted_residues.add(residue_key)
+        
+        return ContactResult(
+            residue_contacts=contacted_residues,
+            contact_count=len(contacted_residues),
+            ligand_atoms=len(ligand),
+            protein_atoms=len(protein),
+            success=True
+        )
+        
+    except Exception as e:
+        logger.error(f"Contact analysis failed for {structure_path}: {e}")
+        return ContactResult(set(), 0, 0, 0, False, str(e))
+
+def analyze_contacts_chunk(structure_paths: List[str], contact_cutoff: float) -> List[ContactResult]:
+    """
+    Process-pool work unit: analyze many structures per task so the
+    pickling/IPC cost is paid once per chunk instead of once per structure.
+    """
+    return [analyze_contacts(path, contact_cutoff) for path in structure_paths]
 
 class BoltzPostProcessor:
     """
@@ -54,16 +218,33 @@ class BoltzPostProcessor:
     
     Features:
     - Async contact analysis with thread pooling
-    - Efficient clustering with PCA preprocessing
+    - Process-pool mode with chunked work units for multi-thousand-structure batches
+    - Bounded in-flight work and per-stage timings
+    - Scalable clustering over sparse contact fingerprints
     - Batch-level hotspot aggregation
     - Chemical scaffold analysis
     - Performance monitoring and caching
     """
     
-    def __init__(self, max_workers: int = 4, contact_cutoff: float = 4.0):
+    def __init__(
+        self,
+        max_workers: int = 4,
+        contact_cutoff: float = 4.0,
+        execution_mode: str = "thread",
+        chunk_size: int = 32,
+        max_in_flight: Optional[int] = None
+    ):
+        if execution_mode not in ("thread", "process"):
+            raise ValueError(f"Unknown execution mode: {execution_mode}")
+        
         self.max_workers = max_workers
         self.contact_cutoff = contact_cutoff
+        self.execution_mode = execution_mode
+        self.chunk_size = max(1, chunk_size)
+        # Bound queued work so huge batches don't materialize every future at once
+        self.max_in_flight = max_in_flight or max_workers * 2
         self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._process_pool: Optional[ProcessPoolExecutor] = None
         self._residue_index_cache = {}
         self._lock = threading.Lock()
         
@@ -95,18 +276,7 @@ class BoltzPostProcessor:
                 structure_path
             )
             
-            # Calculate ensemble SD from affinity values
-            ensemble_sd = self._calculate_ensemble_sd(job_data)
-            
-            return {
-                "success": contact_result.success,
-                "contacts_json": json.dumps(list(contact_result.residue_contacts)) if contact_result.success else None,
-                "contact_count": contact_result.contact_count,
-                "ensemble_sd": ensemble_sd,
-                "ligand_atoms": contact_result.ligand_atoms,
-                "protein_atoms": contact_result.protein_atoms,
-                "error": contact_result.error
-            }
+            return self._build_job_result(contact_result, self._calculate_ensemble_sd(job_data))
             
         except Exception as e:
             logger.error(f"Error processing job {job_data.get('job_id', 'unknown')}: {e}")
@@ -124,9 +294,15 @@ class BoltzPostProcessor:
             Comprehensive batch analysis
         """
         try:
-            # Process all jobs concurrently
-            job_tasks = [self.process_job_async(job) for job in jobs]
-            job_results = await asyncio.gather(*job_tasks, return_exceptions=True)
+            stage_timings = {}
+            
+            # Contact analysis: chunked process pool or bounded thread pool
+            stage_start = time.perf_counter()
+            if self.execution_mode == "process":
+                job_results = await self._process_jobs_chunked(jobs)
+            else:
+                job_results = await self._process_jobs_bounded(jobs)
+            stage_timings["contacts"] = time.perf_counter() - stage_start
             
             # Filter successful results
             successful_jobs = []
@@ -142,13 +318,25 @@ class BoltzPostProcessor:
                 return self._empty_batch_analysis(len(jobs))
             
             # Aggregate hotspots across all jobs
+            stage_start = time.perf_counter()
             hotspots = await self._aggregate_hotspots_async(processed_results)
+            stage_timings["hotspots"] = time.perf_counter() - stage_start
             
             # Perform clustering analysis
+            stage_start = time.perf_counter()
             cluster_analysis = await self._cluster_binding_modes_async(successful_jobs, processed_results)
+            stage_timings["clustering"] = time.perf_counter() - stage_start
             
             # Analyze chemical diversity if SMILES available
+            stage_start = time.perf_counter()
             scaffold_diversity = await self._analyze_scaffolds_async(successful_jobs)
+            stage_timings["scaffolds"] = time.perf_counter() - stage_start
+            
+            logger.info(
+                f"Batch {batch_id} post-processed {len(successful_jobs)}/{len(jobs)} jobs "
+                f"({self.execution_mode} mode): "
+                + ", ".join(f"{stage}={seconds:.2f}s" for stage, seconds in stage_timings.items())
+            )
             
             return BatchAnalysis(
                 hotspot_residues=hotspots,
@@ -156,7 +344,10 @@ class BoltzPostProcessor:
                 scaffold_diversity=scaffold_diversity,
                 cluster_summary=cluster_analysis["summary"],
                 total_jobs=len(jobs),
-                processed_jobs=len(successful_jobs)
+                processed_jobs=len(successful_jobs),
+                stage_timings={stage: round(seconds, 3) for stage, seconds in stage_timings.items()},
+                cluster_assignments=cluster_analysis.get("assignments", {}),
+                cluster_state=cluster_analysis.get("state")
             )
             
         except Exception as e:
@@ -180,51 +371,83 @@ class BoltzPostProcessor:
         return None
     
     def _analyze_contacts(self, structure_path: str) -> ContactResult:
+        """Thread-safe contact analysis for a single structure"""
+        return analyze_contacts(structure_path, self.contact_cutoff)
+    
+    def _build_job_result(self, contact_result: ContactResult, ensemble_sd: float) -> Dict[str, Any]:
+        """Convert a contact analysis into the per-job result dictionary"""
+        return {
+            "success": contact_result.success,
+            "contacts_json": json.dumps(list(contact_result.residue_contacts)) if contact_result.success else None,
+            "contact_count": contact_result.contact_count,
+            "ensemble_sd": ensemble_sd,
+            "ligand_atoms": contact_result.ligand_atoms,
+            "protein_atoms": contact_result.protein_atoms,
+            "error": contact_result.error
+        }
+    
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """Lazily create the process pool (only paid for in process mode)"""
+        with self._lock:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._process_pool
+    
+    async def _process_jobs_bounded(self, jobs: List[Dict]) -> List[Any]:
+        """Thread-mode job processing with at most max_in_flight jobs outstanding"""
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        
+        async def process_one(job: Dict) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.process_job_async(job)
+        
+        return await asyncio.gather(*(process_one(job) for job in jobs), return_exceptions=True)
+    
+    async def _process_jobs_chunked(self, jobs: List[Dict]) -> List[Any]:
         """
-        Analyze protein-ligand contacts using MDAnalysis.
-        Thread-safe implementation for concurrent processing.
+        Process-mode job processing.
+        
+        Structures are grouped into chunks of chunk_size so each process-pool
+        task amortizes IPC over many structures, and at most max_in_flight
+        chunks are queued on the pool at any time.
         """
-        try:
-            # Load structure
-            universe = mda.Universe(structure_path)
-            
-            # Define selections
-            protein = universe.select_atoms("protein and not name H*")
-            ligand = universe.select_atoms("not protein and not name HOH and not name H*")
-            
-            if len(ligand) == 0:
-                return ContactResult(set(), 0, 0, len(protein), False, "No ligand atoms found")
-            
-            if len(protein) == 0:
-                return ContactResult(set(), 0, len(ligand), 0, False, "No protein atoms found")
-            
-            # Calculate distance matrix
-            distances = mda.lib.distances.distance_array(
-                protein.positions, 
-                ligand.positions
-            )
-            
-            # Find contacts within cutoff
-            protein_indices, ligand_indices = np.where(distances <= self.contact_cutoff)
-            
-            # Get unique residue contacts
-            contacted_residues = set()
-            for pi in protein_indices:
-                atom = protein.atoms[pi]
-                residue_key = (atom.segid, atom.resname, atom.resid)
-                contacted_residues.add(residue_key)
-            
-            return ContactResult(
-                residue_contacts=contacted_residues,
-                contact_count=len(contacted_residues),
-                ligand_atoms=len(ligand),
-                protein_atoms=len(protein),
-                success=True
-            )
-            
-        except Exception as e:
-            logger.error(f"Contact analysis failed for {structure_path}: {e}")
-            return ContactResult(set(), 0, 0, 0, False, str(e))
+        results: List[Any] = [None] * len(jobs)
+        pending: List[Tuple[int, str]] = []
+        
+        for index, job in enumerate(jobs):
+            structure_path = self._get_structure_path(job)
+            if structure_path:
+                pending.append((index, structure_path))
+            else:
+                results[index] = {"success": False, "error": "No structure file found"}
+        
+        chunks = [pending[i:i + self.chunk_size] for i in range(0, len(pending), self.chunk_size)]
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        loop = asyncio.get_event_loop()
+        pool = self._get_process_pool()
+        
+        async def run_chunk(chunk: List[Tuple[int, str]]) -> None:
+            async with semaphore:
+                try:
+                    contact_results = await loop.run_in_executor(
+                        pool,
+                        analyze_contacts_chunk,
+                        [path for _, path in chunk],
+                        self.contact_cutoff
+                    )
+                except Exception as e:
+                    logger.error(f"Contact analysis chunk failed: {e}")
+                    for index, _ in chunk:
+                        results[index] = {"success": False, "error": str(e)}
+                    return
+            
+            for (index, _), contact_result in zip(chunk, contact_results):
+                results[index] = self._build_job_result(
+                    contact_result, self._calculate_ensemble_sd(jobs[index])
+                )
+        
+        await asyncio.gather(*(run_chunk(chunk) for chunk in chunks))
+        return results
     
     def _calculate_ensemble_sd(self, job_data: Dict) -> float:
         """Calculate ensemble standard deviation from affinity values"""
@@ -260,15 +483,7 @@ class BoltzPostProcessor:
         total_jobs = len(job_results)
         
         for result in job_results:
-            contacts_json = result.get("contacts_json")
-            if contacts_json:
-                try:
-                    contacts = json.loads(contacts_json)
-                    for contact in contacts:
-                        if len(contact) == 3:  # (segid, resname, resid)
-                            residue_counter[tuple(contact)] += 1
-                except (json.JSONDecodeError, ValueError) as e:
-                    logger.warning(f"Could not parse contacts: {e}")
+            residue_counter.update(parse_contacts(result.get("contacts_json")))
         
         # Convert to percentage and format
         hotspots = []
@@ -295,126 +510,131 @@ class BoltzPostProcessor:
         )
     
     def _cluster_binding_modes(self, jobs: List[Dict], job_results: List[Dict]) -> Dict:
-        """Synchronous clustering implementation"""
+        """
+        Synchronous clustering implementation.
+        
+        Contacts are parsed once into sparse fingerprints, clustered with
+        MiniBatchKMeans, and scored with a sampled Jaccard silhouette.
+        """
         try:
-            # Build residue index
+            contact_sets = [parse_contacts(result.get("contacts_json")) for result in job_results]
             all_residues = set()
-            for result in job_results:
-                contacts_json = result.get("contacts_json")
-                if contacts_json:
-                    contacts = json.loads(contacts_json)
-                    all_residues.update(tuple(c) for c in contacts if len(c) == 3)
+            for contacts in contact_sets:
+                all_residues.update(contacts)
             
-            if len(all_residues) < 3:
+            if len(all_residues) < 3 or len(contact_sets) < 2:
                 return {"mode_counts": {"Novel": len(jobs)}, "summary": {"total_clusters": 1}}
             
-            residue_index = {res: i for i, res in enumerate(sorted(all_residues))}
+            residues = sorted(all_residues)
+            residue_index = {res: i for i, res in enumerate(residues)}
+            fingerprints = build_contact_fingerprints(contact_sets, residue_index)
             
-            # Build contact fingerprints
-            fingerprints = []
-            for result in job_results:
-                fp = np.zeros(len(residue_index), dtype=np.uint8)
-                contacts_json = result.get("contacts_json")
-                if contacts_json:
-                    contacts = json.loads(contacts_json)
-                    for contact in contacts:
-                        if len(contact) == 3:
-                            key = tuple(contact)
-                            if key in residue_index:
-                                fp[residue_index[key]] = 1
-                fingerprints.append(fp)
-            
-            fingerprints = np.array(fingerprints)
-            
-            if fingerprints.shape[0] < 2:
-                return {"mode_counts": {"Novel": len(jobs)}, "summary": {"total_clusters": 1}}
-            
-            # PCA + KMeans clustering
-            n_components = min(50, fingerprints.shape[1] - 1, fingerprints.shape[0] - 1)
-            if n_components > 0:
-                pca = PCA(n_components=n_components)
-                fingerprints_pca = pca.fit_transform(fingerprints)
-            else:
-                fingerprints_pca = fingerprints
-            
-            # Determine optimal k
-            k = min(6, len(fingerprints))
-            kmeans = KMeans(n_clusters=k, n_init="auto", random_state=42)
-            cluster_labels = kmeans.fit_predict(fingerprints_pca)
+            k = min(BINDING_MODE_CLUSTERS, fingerprints.shape[0])
+            kmeans = MiniBatchKMeans(n_clusters=k, n_init=3, batch_size=1024, random_state=42)
+            cluster_labels = kmeans.fit_predict(fingerprints)
             
             # Label clusters (simplified - largest is "Classical", others are "Novel")
-            cluster_counts = Counter(cluster_labels)
-            mode_counts = {"Classical": 0, "Allosteric": 0, "Novel": 0}
-            
-            # Assign largest cluster as Classical
+            cluster_counts = Counter(int(label) for label in cluster_labels)
             largest_cluster = cluster_counts.most_common(1)[0][0]
-            for i, label in enumerate(cluster_labels):
-                if label == largest_cluster:
-                    mode_counts["Classical"] += 1
-                else:
-                    mode_counts["Novel"] += 1
+            mode_counts = {
+                "Classical": cluster_counts[largest_cluster],
+                "Allosteric": 0,
+                "Novel": len(cluster_labels) - cluster_counts[largest_cluster]
+            }
+            
+            state = BindingModeClusterState(
+                residues=residues,
+                centroids=np.asarray(kmeans.cluster_centers_, dtype=np.float64),
+                counts=[cluster_counts.get(i, 0) for i in range(k)],
+                largest_cluster=largest_cluster
+            )
+            
+            assignments = {}
+            for job, label in zip(jobs, cluster_labels):
+                job_id = job.get("job_id") or job.get("id")
+                if job_id:
+                    assignments[job_id] = int(label)
             
             return {
                 "mode_counts": mode_counts,
                 "summary": {
                     "total_clusters": len(cluster_counts),
-                    "cluster_sizes": dict(cluster_counts),
-                    "silhouette_score": silhouette_score(fingerprints_pca, cluster_labels) if len(set(cluster_labels)) > 1 else 0.0
-                }
+                    "cluster_sizes": {str(cluster): size for cluster, size in cluster_counts.items()},
+                    "silhouette_score": self._sampled_silhouette(fingerprints, cluster_labels),
+                    "fingerprint_residues": len(residues)
+                },
+                "assignments": assignments,
+                "state": state
             }
             
         except Exception as e:
             logger.error(f"Clustering failed: {e}")
             return {"mode_counts": {"Novel": len(jobs)}, "summary": {"total_clusters": 1}}
     
+    def _sampled_silhouette(self, fingerprints, cluster_labels: np.ndarray) -> float:
+        """Jaccard silhouette over a fixed-size random sample of poses"""
+        n_samples = fingerprints.shape[0]
+        rng = np.random.default_rng(42)
+        sample = rng.choice(n_samples, size=min(n_samples, SILHOUETTE_SAMPLE_SIZE), replace=False)
+        sample_labels = cluster_labels[sample]
+        
+        if len(set(sample_labels)) < 2 or len(set(sample_labels)) >= len(sample):
+            return 0.0
+        
+        return float(silhouette_score(fingerprints[sample].toarray() > 0, sample_labels, metric="jaccard"))
+    
     async def _analyze_scaffolds_async(self, jobs: List[Dict]) -> Dict[str, Any]:
         """Analyze chemical scaffold diversity"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(self.executor, self._analyze_scaffolds, jobs)
-    
-    def _analyze_scaffolds(self, jobs: List[Dict]) -> Dict[str, Any]:
-        """Synchronous scaffold analysis"""
+        smiles_list = [smiles for smiles in (self.get_job_smiles(job) for job in jobs) if smiles]
+        if not smiles_list:
+            return {"total_compounds": len(jobs), "unique_scaffolds": 0, "note": "No SMILES data available"}
+        
         try:
-            smiles_list = []
-            for job in jobs:
-                # Try multiple SMILES locations
-                smiles = (
-                    job.get("input_data", {}).get("smiles") or
-                    job.get("smiles") or
-                    job.get("ligand_smiles")
-                )
-                if smiles:
-                    smiles_list.append(smiles)
-            
-            if not smiles_list:
-                return {"total_compounds": len(jobs), "unique_scaffolds": 0, "note": "No SMILES data available"}
-            
-            # Calculate Bemis-Murcko scaffolds
-            scaffolds = set()
-            valid_smiles = 0
-            
-            for smiles in smiles_list:
-                try:
-                    mol = Chem.MolFromSmiles(smiles)
-                    if mol:
-                        scaffold = MurckoScaffold.GetScaffoldForMol(mol)
-                        scaffold_smiles = Chem.MolToSmiles(scaffold)
-                        scaffolds.add(scaffold_smiles)
-                        valid_smiles += 1
-                except Exception as e:
-                    logger.warning(f"Could not process SMILES {smiles}: {e}")
-            
-            return {
-                "total_compounds": len(jobs),
-                "compounds_with_smiles": len(smiles_list),
-                "valid_smiles": valid_smiles,
-                "unique_scaffolds": len(scaffolds),
-                "scaffold_diversity": len(scaffolds) / max(valid_smiles, 1)
-            }
-            
+            # Bemis-Murcko scaffolds come from the shared feature store, so
+            # ligands seen in earlier batches are not re-parsed
+            features_by_smiles = await ligand_feature_store.get_many_async(smiles_list)
         except Exception as e:
             logger.error(f"Scaffold analysis failed: {e}")
             return {"total_compounds": len(jobs), "unique_scaffolds": 0, "error": str(e)}
+        
+        return self._analyze_scaffolds(jobs, smiles_list, features_by_smiles)
+    
+    @staticmethod
+    def get_job_smiles(job: Dict) -> Optional[str]:
+        """Extract the ligand SMILES from job data"""
+        # Try multiple SMILES locations
+        return (
+            job.get("input_data", {}).get("smiles") or
+            job.get("smiles") or
+            job.get("ligand_smiles")
+        )
+    
+    async def compute_scaffold(self, smiles: str) -> Optional[str]:
+        """Bemis-Murcko scaffold SMILES, or None if the SMILES is invalid"""
+        if not smiles:
+            return None
+        features = (await ligand_feature_store.get_many_async([smiles])).get(smiles.strip())
+        return features.scaffold_smiles if features and features.valid else None
+    
+    def _analyze_scaffolds(self, jobs: List[Dict], smiles_list: List[str],
+                           features_by_smiles: Dict[str, Any]) -> Dict[str, Any]:
+        """Scaffold diversity summary over already-resolved ligand features"""
+        scaffolds = set()
+        valid_smiles = 0
+        
+        for smiles in smiles_list:
+            features = features_by_smiles.get(smiles.strip())
+            if features and features.valid:
+                scaffolds.add(features.scaffold_smiles)
+                valid_smiles += 1
+        
+        return {
+            "total_compounds": len(jobs),
+            "compounds_with_smiles": len(smiles_list),
+            "valid_smiles": valid_smiles,
+            "unique_scaffolds": len(scaffolds),
+            "scaffold_diversity": len(scaffolds) / max(valid_smiles, 1)
+        }
     
     def _empty_batch_analysis(self, total_jobs: int) -> BatchAnalysis:
         """Return empty analysis when processing fails"""
@@ -428,9 +648,25 @@ class BoltzPostProcessor:
         )
     
     def __del__(self):
-        """Cleanup thread pool"""
+        """Cleanup thread and process pools"""
         if hasattr(self, 'executor'):
             self.executor.shutdown(wait=False)
+        if getattr(self, '_process_pool', None) is not None:
+            self._process_pool.shutdown(wait=False)
 
 # Global instance for reuse
-post_processor = BoltzPostProcessor(max_workers=4)
\ No newline at end of file
+post_processor = BoltzPostProcessor(max_workers=4)
+
+# Process-pool instance for large batches, created on first use
+_batch_post_processor: Optional[BoltzPostProcessor] = None
+
+def get_batch_post_processor() -> BoltzPostProcessor:
+    """Get the shared process-pool post-processor sized to the available cores"""
+    global _batch_post_processor
+    if _batch_post_processor is None:
+        _batch_post_processor = BoltzPostProcessor(
+            max_workers=int(os.getenv("POST_PROCESSING_WORKERS", os.cpu_count() or 4)),
+            execution_mode="process",
+            chunk_size=int(os.getenv("POST_PROCESSING_CHUNK_SIZE", "32"))
+        )
+    return _batch_post_processor
\ No newline at end of file
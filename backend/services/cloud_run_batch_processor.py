@@ -9,27 +9,92 @@ import uuid
 import logging
 import asyncio
 from typing import List, Dict, Any, Optional
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 from google.cloud import run_v2
 from google.cloud import firestore
 from google.cloud import storage
+from config.gcp_clients import SharedFirestoreClient, SharedStorageClient
+from services.ligand_feature_store import ligand_feature_store
+from services.offload import run_sync
+from services.runtime_estimator import runtime_estimator
+from services.shard_packer import DEFAULT_LANE, PendingLigand, packing_summary, pending_ligands, shard_packer
 
 logger = logging.getLogger(__name__)
 
+# Fleet packing: hold batches briefly so ligands against the same protein are
+# packed into shared shards across batches and users
+FLEET_PACKING_ENABLED = os.getenv("CLOUD_RUN_FLEET_PACKING", "false").lower() == "true"
+FLEET_PACK_WINDOW_SECONDS = float(os.getenv("CLOUD_RUN_FLEET_PACK_WINDOW", "30"))
+FLEET_PACK_FLUSH_LIGANDS = int(os.getenv("CLOUD_RUN_FLEET_PACK_FLUSH_LIGANDS", "500"))
+
+# Held ligands live in memory only; batches still 'queued' this long after
+# queueing (the holding replica restarted) are re-packed by recover_queued_batches
+FLEET_PACK_RECOVERY_SECONDS = float(os.getenv("CLOUD_RUN_FLEET_PACK_RECOVERY_SECONDS", str(FLEET_PACK_WINDOW_SECONDS * 4)))
+FLEET_PACK_RECOVERY_INTERVAL = float(os.getenv("CLOUD_RUN_FLEET_PACK_RECOVERY_INTERVAL", "60"))
+
+# Work stealing: tasks that finish their shard pull remaining ligands from a shared queue file
+WORK_STEALING_ENABLED = os.getenv("CLOUD_RUN_WORK_STEALING", "false").lower() == "true"
+
 class CloudRunBatchProcessor:
     """Complete replacement for Modal batch processing - CRITICAL SERVICE"""
     
+    db = SharedFirestoreClient()
+    storage_client = SharedStorageClient()
+    
     def __init__(self):
         self.jobs_client = run_v2.JobsClient()
-        self.db = firestore.Client()
-        self.storage_client = storage.Client()
         self.project_id = os.getenv("GCP_PROJECT_ID")
         self.region = os.getenv("GCP_REGION", "us-central1")
         self.bucket_name = os.getenv("GCS_BUCKET_NAME", "omtx-production")
+        self.packer = shard_packer
+        
+        # Ligands waiting for the next fleet pack
+        self._pending: List[PendingLigand] = []
+        self._pending_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
         
         logger.info("🔄 CloudRunBatchProcessor initialized - Modal replacement active")
     
+    def _job_resource(self) -> str:
+        return f"projects/{self.project_id}/locations/{self.region}/jobs/boltz2-l4"
+    
+    def _create_child_jobs(
+        self,
+        user_id: str,
+        batch_id: str,
+        protein_sequence: str,
+        ligands: List[Dict[str, Any]],
+        task_assignment: Dict[int, int]
+    ) -> List[str]:
+        """Create child jobs for tracking individual ligands"""
+        
+        child_job_ids = []
+        for i, ligand in enumerate(ligands):
+            child_job_id = str(uuid.uuid4())
+            child_ref = self.db.collection('users').document(user_id)\
+                .collection('jobs').document(child_job_id)
+            
+            child_ref.set({
+                'id': child_job_id,
+                'batch_id': batch_id,
+                'batch_parent_id': batch_id,
+                'job_type': 'BATCH_CHILD',
+                'ligand_index': i,
+                'ligand_name': ligand.get('name', f'Ligand_{i+1}'),
+                'ligand_smiles': ligand.get('smiles', ''),
+                'status': 'pending',
+                'protein_sequence': protein_sequence,
+                'task_assignment': task_assignment.get(i),  # Which Cloud Run task will process this
+                'created_at': firestore.SERVER_TIMESTAMP,
+                'processing_engine': 'cloud_run',
+                'gpu_type': 'L4'
+            })
+            
+            child_job_ids.append(child_job_id)
+        
+        return child_job_ids
+    
     async def submit_batch(
         self,
         user_id: str,
@@ -38,7 +103,8 @@ class CloudRunBatchProcessor:
         ligands: List[Dict[str, Any]],
         job_name: str,
         use_msa: bool = True,
-        use_potentials: bool = False
+        use_potentials: bool = False,
+        lane: str = DEFAULT_LANE
     ) -> Dict[str, Any]:
         """Submit batch to Cloud Run Jobs - REPLACES Modal spawn_map"""
         
@@ -60,11 +126,22 @@ class CloudRunBatchProcessor:
                 'created_at': firestore.SERVER_TIMESTAMP,
                 'user_id': user_id,
                 'processing_engine': 'cloud_run',
-                'gpu_type': 'L4'
+                'gpu_type': 'L4',
+                'lane': lane
             }
             batch_ref.set(batch_doc)
             
-            # 2. Upload batch input to GCS
+            # 2. Pack ligands into shards sized by time and L4 memory budgets,
+            #    costing each ligand by heavy atoms and rotatable bonds
+            descriptors = await ligand_feature_store.get_many_async(
+                ligand.get('smiles', '') for ligand in ligands
+            )
+            pending = pending_ligands(
+                user_id, batch_id, ligands, protein_sequence, use_msa, use_potentials, lane, descriptors
+            )
+            shards = [] if FLEET_PACKING_ENABLED else self.packer.pack(pending)
+            
+            # 3. Upload batch input to GCS
             bucket = self.storage_client.bucket(self.bucket_name)
             input_path = f"users/{user_id}/batches/{batch_id}/input.json"
             
@@ -78,6 +155,21 @@ class CloudRunBatchProcessor:
                 'job_name': job_name,
                 'created_at': datetime.utcnow().isoformat()
             }
+            if shards:
+                # Shard manifest: ligand indices per Cloud Run task, largest first
+                input_data['shards'] = [[item.ligand_index for item in shard.items] for shard in shards]
+            
+            if shards and WORK_STEALING_ENABLED and len(shards) > 1:
+                queue_path = f"users/{user_id}/batches/{batch_id}/work_queue.json"
+                costs = [0.0] * len(ligands)
+                for shard in shards:
+                    for item, seconds in zip(shard.items, shard.ligand_seconds):
+                        costs[item.ligand_index] = round(seconds, 1)
+                bucket.blob(queue_path).upload_from_string(json.dumps({
+                    'tasks': {str(task): ligand_indices for task, ligand_indices in enumerate(input_data['shards'])},
+                    'costs': costs
+                }), content_type='application/json')
+                input_data['work_queue'] = queue_path
             
             blob = bucket.blob(input_path)
             blob.upload_from_string(json.dumps(input_data, indent=2))
@@ -90,16 +182,25 @@ class CloudRunBatchProcessor:
             
             logger.info(f"📤 Uploaded batch input to gs://{self.bucket_name}/{input_path}")
             
-            # 3. Calculate optimal task configuration for L4 GPU
-            # L4 has 24GB VRAM, each ligand needs ~2GB for Boltz-2
-            ligands_per_task = min(10, len(ligands))  # Max 10 ligands per task
-            task_count = max(1, (len(ligands) + ligands_per_task - 1) // ligands_per_task)
+            runtime = runtime_estimator.estimate_ligands(
+                len(protein_sequence), ligands, use_msa, use_potentials, gpu_type='L4'
+            )
             
-            # 4. Submit to Cloud Run Job
-            job_name_resource = f"projects/{self.project_id}/locations/{self.region}/jobs/boltz2-l4"
+            if FLEET_PACKING_ENABLED:
+                return await self._queue_for_fleet_packing(
+                    user_id, batch_id, job_name, protein_sequence, ligands, pending, runtime
+                )
             
+            task_count = max(1, len(shards))
+            ligands_per_task = max((len(shard.items) for shard in shards), default=0)
+            task_assignment = {
+                item.ligand_index: task for task, shard in enumerate(shards) for item in shard.items
+            }
+            summary = packing_summary(shards)
+            
+            # 4. Submit to Cloud Run Job
             request = run_v2.RunJobRequest(
-                name=job_name_resource,
+                name=self._job_resource(),
                 overrides=run_v2.RunJobRequest.Overrides(
                     container_overrides=[
                         run_v2.RunJobRequest.Overrides.ContainerOverride(
@@ -132,33 +233,12 @@ class CloudRunBatchProcessor:
                 'cloud_run_execution': operation.name,
                 'task_count': task_count,
                 'ligands_per_task': ligands_per_task,
+                'packing': summary,
                 'started_at': firestore.SERVER_TIMESTAMP
             })
             
             # 6. Create child jobs for tracking individual ligands
-            child_job_ids = []
-            for i, ligand in enumerate(ligands):
-                child_job_id = str(uuid.uuid4())
-                child_ref = self.db.collection('users').document(user_id)\
-                    .collection('jobs').document(child_job_id)
-                
-                child_ref.set({
-                    'id': child_job_id,
-                    'batch_id': batch_id,
-                    'batch_parent_id': batch_id,
-                    'job_type': 'BATCH_CHILD',
-                    'ligand_index': i,
-                    'ligand_name': ligand.get('name', f'Ligand_{i+1}'),
-                    'ligand_smiles': ligand.get('smiles', ''),
-                    'status': 'pending',
-                    'protein_sequence': protein_sequence,
-                    'task_assignment': i // ligands_per_task,  # Which Cloud Run task will process this
-                    'created_at': firestore.SERVER_TIMESTAMP,
-                    'processing_engine': 'cloud_run',
-                    'gpu_type': 'L4'
-                })
-                
-                child_job_ids.append(child_job_id)
+            child_job_ids = self._create_child_jobs(user_id, batch_id, protein_sequence, ligands, task_assignment)
             
             batch_ref.update({'child_job_ids': child_job_ids})
             
@@ -172,7 +252,7 @@ class CloudRunBatchProcessor:
                 'task_count': task_count,
                 'status': 'running',
                 'cloud_run_execution': operation.name,
-                'estimated_cost_usd': self._estimate_batch_cost(len(ligands), task_count),
+                'estimated_cost_usd': round(runtime.cost_usd, 4),
                 'created_at': firestore.SERVER_TIMESTAMP
             })
             
@@ -183,8 +263,10 @@ class CloudRunBatchProcessor:
                 'total_ligands': len(ligands),
                 'ligands_per_task': ligands_per_task,
                 'execution_name': operation.name,
-                'estimated_cost_usd': self._estimate_batch_cost(len(ligands), task_count),
-                'estimated_completion_minutes': task_count * 3  # 3 minutes per task average
+                'estimated_cost_usd': round(runtime.cost_usd, 4),
+                # Tasks run in parallel, each working through its shard
+                'estimated_completion_minutes': round(summary['max_shard_seconds'] / 60, 1),
+                'runtime_model_version': runtime.model_version
             }
             
             logger.info(f"✅ Batch {batch_id} submitted successfully: {task_count} tasks processing {len(ligands)} ligands")
@@ -206,20 +288,248 @@ class CloudRunBatchProcessor:
             
             raise Exception(f"Batch submission failed: {str(e)}")
     
-    def _estimate_batch_cost(self, ligand_count: int, task_count: int) -> float:
-        """Estimate batch processing cost for L4 GPU"""
+    async def _queue_for_fleet_packing(
+        self,
+        user_id: str,
+        batch_id: str,
+        job_name: str,
+        protein_sequence: str,
+        ligands: List[Dict[str, Any]],
+        pending: List[PendingLigand],
+        runtime
+    ) -> Dict[str, Any]:
+        """Record a batch and hold its ligands for the next fleet pack"""
+        
+        batch_ref = self.db.collection('users').document(user_id)\
+            .collection('batches').document(batch_id)
+        
+        child_job_ids = self._create_child_jobs(user_id, batch_id, protein_sequence, ligands, {})
+        batch_ref.update({'status': 'queued', 'child_job_ids': child_job_ids})
+        
+        # queued_at doubles as the recovery lease for recover_queued_batches
+        self.db.collection('admin_batches').document(batch_id).set({
+            'batch_id': batch_id,
+            'user_id': user_id,
+            'job_name': job_name,
+            'total_ligands': len(ligands),
+            'status': 'queued',
+            'lane': pending[0].lane if pending else DEFAULT_LANE,
+            'estimated_cost_usd': round(runtime.cost_usd, 4),
+            'created_at': firestore.SERVER_TIMESTAMP,
+            'queued_at': firestore.SERVER_TIMESTAMP
+        })
+        
+        pending_count = await self._hold_for_packing(pending)
+        
+        logger.info(f"⏳ Batch {batch_id} queued for fleet packing ({pending_count} ligands pending)")
+        
+        return {
+            'batch_id': batch_id,
+            'status': 'queued',
+            'total_ligands': len(ligands),
+            'estimated_cost_usd': round(runtime.cost_usd, 4),
+            'pack_window_seconds': FLEET_PACK_WINDOW_SECONDS,
+            'runtime_model_version': runtime.model_version
+        }
+    
+    async def _hold_for_packing(self, pending: List[PendingLigand]) -> int:
+        """Add ligands to the next fleet pack, flushing early once enough are held"""
+        async with self._pending_lock:
+            self._pending.extend(pending)
+            pending_count = len(self._pending)
+        
+        if pending_count >= FLEET_PACK_FLUSH_LIGANDS:
+            await self.flush_packed()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_after_window())
+        return pending_count
+    
+    async def recover_queued_batches(self) -> List[str]:
+        """
+        Re-pack batches left 'queued' past FLEET_PACK_RECOVERY_SECONDS.
+        
+        Held ligands only exist in the memory of the replica that queued them,
+        so a restart before its flush would leave the batch queued forever.
+        Each stale batch is claimed in a transaction that renews its queued_at
+        lease, so one replica re-packs it; if that replica dies as well, the
+        lease lapses again and another replica picks the batch up.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=FLEET_PACK_RECOVERY_SECONDS)
+        async with self._pending_lock:
+            held = {item.batch_id for item in self._pending}
+        
+        recovered = []
+        for batch_id in await run_sync(self._stale_queued_batches, cutoff):
+            if batch_id in held:
+                continue
+            try:
+                batch = await run_sync(self._claim_queued_batch, batch_id, cutoff)
+                if batch is None:
+                    continue
+                await self._hold_for_packing(await self._load_queued_ligands(batch))
+                recovered.append(batch_id)
+            except Exception as e:
+                logger.error(f"❌ Failed to recover queued batch {batch_id}: {str(e)}")
+        
+        if recovered:
+            logger.info(f"♻️ Re-queued {len(recovered)} stranded batches for fleet packing")
+        return recovered
+    
+    def _stale_queued_batches(self, cutoff: datetime, limit: int = 50) -> List[str]:
+        query = self.db.collection('admin_batches')\
+            .where('status', '==', 'queued')\
+            .where('queued_at', '<', cutoff)\
+            .limit(limit)
+        return [doc.id for doc in query.stream()]
+    
+    def _claim_queued_batch(self, batch_id: str, cutoff: datetime) -> Optional[Dict[str, Any]]:
+        """Renew the queued_at lease if it is still stale; returns the batch record when claimed"""
+        batch_ref = self.db.collection('admin_batches').document(batch_id)
         
-        # L4 GPU cost: $0.65/hour
-        # Average processing time: 3 minutes per task
-        # Each task processes multiple ligands in parallel
+        @firestore.transactional
+        def claim(transaction) -> Optional[Dict[str, Any]]:
+            snapshot = batch_ref.get(transaction=transaction)
+            batch = snapshot.to_dict() if snapshot.exists else None
+            if not batch or batch.get('status') != 'queued' or batch.get('queued_at') is None \
+                    or batch['queued_at'] >= cutoff:
+                return None
+            transaction.update(batch_ref, {
+                'queued_at': firestore.SERVER_TIMESTAMP,
+                'recoveries': firestore.Increment(1)
+            })
+            return batch
+        
+        return claim(self.db.transaction())
+    
+    async def _load_queued_ligands(self, batch: Dict[str, Any]) -> List[PendingLigand]:
+        """Rebuild a queued batch's pending ligands from its uploaded input.json"""
+        user_id, batch_id = batch['user_id'], batch['batch_id']
+        blob = self.storage_client.bucket(self.bucket_name).blob(f"users/{user_id}/batches/{batch_id}/input.json")
+        input_data = json.loads(await run_sync(blob.download_as_text))
+        ligands = input_data['ligands']
+        descriptors = await ligand_feature_store.get_many_async(ligand.get('smiles', '') for ligand in ligands)
+        return pending_ligands(
+            user_id, batch_id, ligands, input_data['protein_sequence'],
+            input_data.get('use_msa', True), input_data.get('use_potentials', False),
+            batch.get('lane', DEFAULT_LANE), descriptors
+        )
+    
+    async def run_queue_recovery(self, interval: float = FLEET_PACK_RECOVERY_INTERVAL) -> None:
+        """Background loop re-packing stranded queued batches (started on app startup)"""
+        while True:
+            try:
+                await self.recover_queued_batches()
+            except Exception as e:
+                logger.error(f"❌ Queued batch recovery pass failed: {str(e)}")
+            await asyncio.sleep(interval)
+    
+    async def _flush_after_window(self):
+        await asyncio.sleep(FLEET_PACK_WINDOW_SECONDS)
+        try:
+            await self.flush_packed()
+        except Exception as e:
+            logger.error(f"❌ Fleet pack flush failed: {str(e)}")
+    
+    async def flush_packed(self) -> Optional[Dict[str, Any]]:
+        """
+        Pack every pending ligand across batches and users into one Cloud Run
+        execution, one task per shard in fair dispatch order.
+        """
         
-        l4_cost_per_hour = 0.65
-        average_minutes_per_task = 3
+        async with self._pending_lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return None
         
-        total_gpu_hours = (task_count * average_minutes_per_task) / 60
-        estimated_cost = total_gpu_hours * l4_cost_per_hour
+        shards = self.packer.pack(pending)
+        summary = packing_summary(shards)
+        pack_id = str(uuid.uuid4())
+        batches = {item.batch_id: item.user_id for item in pending}
         
-        return round(estimated_cost, 4)
+        try:
+            manifests = []
+            for shard in shards:
+                manifest = shard.to_manifest()
+                for entry in manifest['ligands']:
+                    entry['output_path'] = (
+                        f"gs://{self.bucket_name}/users/{entry['user_id']}/batches/{entry['batch_id']}/"
+                    )
+                manifests.append(manifest)
+            
+            input_path = f"packs/{pack_id}/input.json"
+            bucket = self.storage_client.bucket(self.bucket_name)
+            bucket.blob(input_path).upload_from_string(json.dumps({
+                'pack_id': pack_id,
+                'shards': manifests,
+                'created_at': datetime.utcnow().isoformat()
+            }, indent=2))
+            
+            request = run_v2.RunJobRequest(
+                name=self._job_resource(),
+                overrides=run_v2.RunJobRequest.Overrides(
+                    container_overrides=[
+                        run_v2.RunJobRequest.Overrides.ContainerOverride(
+                            env=[
+                                run_v2.EnvVar(name="PACK_ID", value=pack_id),
+                                run_v2.EnvVar(name="INPUT_PATH", value=f"gs://{self.bucket_name}/{input_path}"),
+                                run_v2.EnvVar(name="PROCESSING_MODE", value="packed"),
+                                run_v2.EnvVar(name="GPU_TYPE", value="L4"),
+                                run_v2.EnvVar(name="GCP_PROJECT_ID", value=self.project_id),
+                                run_v2.EnvVar(name="GCS_BUCKET_NAME", value=self.bucket_name)
+                            ]
+                        )
+                    ],
+                    task_count=len(shards),
+                    parallelism=min(len(shards), 5),
+                    task_timeout="1800s"
+                )
+            )
+            
+            operation = self.jobs_client.run_job(request=request)
+            
+            self.db.collection('shard_packs').document(pack_id).set({
+                'pack_id': pack_id,
+                'batch_ids': sorted(batches),
+                'user_ids': sorted(set(batches.values())),
+                'cloud_run_execution': operation.name,
+                'status': 'running',
+                'packing': summary,
+                'created_at': firestore.SERVER_TIMESTAMP
+            })
+            
+            for batch_id, user_id in batches.items():
+                tasks = [task for task, shard in enumerate(shards) if batch_id in shard.batch_ids]
+                self.db.collection('users').document(user_id).collection('batches').document(batch_id).update({
+                    'status': 'running',
+                    'cloud_run_execution': operation.name,
+                    'pack_id': pack_id,
+                    'task_count': len(tasks),
+                    'shard_tasks': tasks,
+                    'started_at': firestore.SERVER_TIMESTAMP
+                })
+                self.db.collection('admin_batches').document(batch_id).update({
+                    'status': 'running',
+                    'pack_id': pack_id
+                })
+            
+            logger.info(f"🚀 Fleet pack {pack_id} submitted: {len(batches)} batches, {summary['ligands']} ligands, "
+                        f"{len(shards)} tasks, ~{summary['estimated_gpu_seconds']:.0f} GPU-seconds")
+            
+            return {'pack_id': pack_id, 'execution_name': operation.name, 'batch_ids': sorted(batches), **summary}
+            
+        except Exception as e:
+            logger.error(f"❌ Fleet pack {pack_id} failed: {str(e)}")
+            for batch_id, user_id in batches.items():
+                try:
+                    self.db.collection('users').document(user_id).collection('batches').document(batch_id).update({
+                        'status': 'failed',
+                        'error': str(e),
+                        'failed_at': firestore.SERVER_TIMESTAMP
+                    })
+                    self.db.collection('admin_batches').document(batch_id).update({'status': 'failed'})
+                except Exception:
+                    pass
+            raise
     
     async def get_batch_status(self, user_id: str, batch_id: str) -> Dict[str, Any]:
         """Get comprehensive batch status"""
@@ -349,5 +659,25 @@ class CloudRunBatchProcessor:
             logger.error(f"❌ Failed to get batch results for {batch_id}: {str(e)}")
             return {"error": str(e)}
 
+    async def get_ligand_results(self, user_id: str, batch_id: str) -> Dict[str, Dict[str, Any]]:
+        """Per-ligand worker results stored so far for a batch, keyed by child job_id"""
+        return await run_sync(self._read_ligand_results, user_id, batch_id)
+    
+    def _read_ligand_results(self, user_id: str, batch_id: str) -> Dict[str, Dict[str, Any]]:
+        bucket = self.storage_client.bucket(self.bucket_name)
+        results: Dict[str, Dict[str, Any]] = {}
+        # Task and claimed-ligand result files sit directly under the batch
+        # output path; structures/ is skipped by the delimiter
+        for blob in bucket.list_blobs(prefix=f"users/{user_id}/batches/{batch_id}/", delimiter='/'):
+            if not blob.name.endswith('_results.json'):
+                continue
+            try:
+                for result in json.loads(blob.download_as_text()):
+                    if result.get('job_id'):
+                        results[result['job_id']] = result
+            except Exception as e:
+                logger.warning(f"⚠️ Could not parse result file {blob.name}: {str(e)}")
+        return results
+
 # Global instance to replace modal_batch_executor
 cloud_run_batch_processor = CloudRunBatchProcessor()
@@ -14,6 +14,7 @@ from google.cloud import run_v2
 from google.cloud import firestore
 from google.api_core import retry
 import google.auth
+from config.gcp_clients import get_firestore_client
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +30,7 @@ class CloudRunJobService:
         # Initialize clients
         self.jobs_client = run_v2.JobsClient()
         self.executions_client = run_v2.ExecutionsClient()
-        self.db = firestore.Client(project=self.project_id)
+        self.db = get_firestore_client(self.project_id)
         
         # Get credentials
         self.credentials, _ = google.auth.default()
@@ -16,6 +16,8 @@ from google.cloud import run_v2
 from google.cloud import storage
 from google.cloud import firestore
 from google.cloud import monitoring_v3
+from config.gcp_clients import get_firestore_client, get_storage_client
+from services.runtime_estimator import runtime_estimator
 import aiohttp
 import backoff
 
@@ -52,8 +54,8 @@ class CloudRunService:
         # GCP clients
         self.jobs_client = run_v2.JobsClient()
         self.services_client = run_v2.ServicesClient()
-        self.storage_client = storage.Client()
-        self.firestore_client = firestore.Client()
+        self.storage_client = get_storage_client()
+        self.firestore_client = get_firestore_client()
         self.monitoring_client = monitoring_v3.MetricServiceClient()
         
         # Configuration
@@ -115,7 +117,7 @@ class CloudRunService:
                 status="submitting",
                 created_at=start_time,
                 gpu_type="L4",
-                estimated_cost_usd=self._estimate_batch_cost(len(ligands), len(protein_sequence)),
+                estimated_cost_usd=self._estimate_batch_cost(protein_sequence, ligands),
                 shards_count=task_count,
                 total_ligands=len(ligands)
             )
@@ -345,19 +347,9 @@ class CloudRunService:
         except Exception as e:
             logger.error(f"❌ Failed to update job status: {str(e)}")
 
-    def _estimate_batch_cost(self, ligand_count: int, protein_length: int) -> float:
-        """Estimate batch processing cost for L4 GPU"""
-
-        # L4 cost: $0.65/hour
-        # Estimate: ~30 seconds per ligand + protein length factor
-        base_time_per_ligand = 30  # seconds
-        protein_factor = max(1.0, protein_length / 500)  # Scale with protein size
-
-        total_seconds = ligand_count * base_time_per_ligand * protein_factor
-        total_hours = total_seconds / 3600
-
-        l4_cost_per_hour = 0.65
-        return total_hours * l4_cost_per_hour
+    def _estimate_batch_cost(self, protein_sequence: str, ligands: List[Any]) -> float:
+        """Estimate batch processing cost for L4 GPU from the shared runtime model"""
+        return runtime_estimator.estimate_ligands(len(protein_sequence), ligands, gpu_type="L4").cost_usd
     
     async def _create_firestore_job_document(
         self, 
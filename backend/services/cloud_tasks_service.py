@@ -14,6 +14,8 @@ from google.cloud import tasks_v2
 from google.cloud import firestore
 from google.protobuf import timestamp_pb2, duration_pb2
 import google.auth
+from config.gcp_clients import get_firestore_client
+from services.io_budget import instrument_cloud_tasks_client
 
 logger = logging.getLogger(__name__)
 
@@ -31,8 +33,8 @@ class CloudTasksService:
         self.batch_queue = "boltz2-batch-predictions"
 
         # Initialize clients
-        self.tasks_client = tasks_v2.CloudTasksClient()
-        self.db = firestore.Client(project=self.project_id)
+        self.tasks_client = instrument_cloud_tasks_client(tasks_v2.CloudTasksClient())
+        self.db = get_firestore_client(self.project_id)
 
         # Get credentials for service account
         self.credentials, _ = google.auth.default()
@@ -317,6 +319,18 @@ class CloudTasksService:
                 "error": str(e)
             }
     
+    def get_queue_depth(self, queue_name: Optional[str] = None) -> Optional[int]:
+        """Number of tasks waiting in a queue (defaults to the batch queue)"""
+        try:
+            queue = self.tasks_client.get_queue(request={
+                "name": self._get_queue_path(queue_name or self.batch_queue),
+                "read_mask": {"paths": ["name", "stats"]}
+            })
+            return int(queue.stats.tasks_count)
+        except Exception as e:
+            logger.warning(f"Failed to get queue depth: {e}")
+            return None
+    
     def pause_queue(self, queue_name: str) -> bool:
         """Pause a queue"""
         try:
@@ -15,6 +15,7 @@ from google.cloud import firestore
 from google.cloud import storage
 from google.cloud import run_v2
 from google.cloud import eventarc_v1
+from config.gcp_clients import SharedFirestoreClient, SharedStorageClient
 import cloudevents.http
 
 from services.cloud_run_service import cloud_run_service
@@ -39,9 +40,10 @@ class EventarcEvent:
 class EventarcHandler:
     """Enterprise-grade Eventarc event handler with comprehensive processing"""
     
+    firestore_client = SharedFirestoreClient()
+    storage_client = SharedStorageClient()
+    
     def __init__(self):
-        self.firestore_client = firestore.Client()
-        self.storage_client = storage.Client()
         self.run_client = run_v2.JobsClient()
         
         # Event processing metrics
@@ -14,6 +14,7 @@ from collections import defaultdict
 import hashlib
 
 from services.gcp_storage_service import gcp_storage_service
+from services.offload import run_sync
 
 logger = logging.getLogger(__name__)
 
@@ -302,7 +303,7 @@ class GCPResultsIndexer:
             logger.warning(f"⚠️ Optimized query failed, falling back to legacy: {e}")
         
         # Fallback to legacy implementation
-        if not hasattr(self.storage, 'available') or not self.storage.available:
+        if not self.storage.storage.available:
             logger.error("❌ GCP Storage not available!")
             return {"results": [], "total": 0, "source": "error", "error": "GCP storage not configured"}
         
@@ -321,12 +322,14 @@ class GCPResultsIndexer:
             
             # Get all files in jobs/ directory and extract job IDs
             logger.debug(f"📂 Scanning GCP bucket for jobs with prefix: {jobs_prefix}")
-            blobs = self.storage.bucket.list_blobs(prefix=jobs_prefix)
+            blob_names = await run_sync(
+                lambda: [blob.name for blob in self.storage.storage.bucket.list_blobs(prefix=jobs_prefix)]
+            )
             
-            for blob in blobs:
+            for blob_name in blob_names:
                 # Extract job ID from blob path like "jobs/job_id/file.json"
-                if blob.name.startswith(jobs_prefix) and '/' in blob.name[len(jobs_prefix):]:
-                    relative_path = blob.name[len(jobs_prefix):]  # Remove "jobs/" prefix
+                if blob_name.startswith(jobs_prefix) and '/' in blob_name[len(jobs_prefix):]:
+                    relative_path = blob_name[len(jobs_prefix):]  # Remove "jobs/" prefix
                     job_id = relative_path.split('/')[0]  # Get first directory part
                     if job_id and job_id not in job_ids:
                         job_ids.add(job_id)
@@ -338,7 +341,7 @@ class GCPResultsIndexer:
             for job_id in sorted(job_ids, reverse=True)[:limit * 2]:  # Sort by ID (newer first)
                 # Try to read metadata.json
                 metadata_path = f"{jobs_prefix}{job_id}/metadata.json"
-                metadata_content = self.storage.download_file(metadata_path)
+                metadata_content = await self.storage.download_file(metadata_path)
                 
                 if not metadata_content:
                     continue
@@ -349,7 +352,7 @@ class GCPResultsIndexer:
                     continue
                 
                 # Get all files for this job
-                job_files = self.storage.list_job_files(job_id)
+                job_files = await self.storage.list_job_files(job_id)
                 
                 if job_files:
                     # Build result entry from metadata
@@ -387,7 +390,7 @@ class GCPResultsIndexer:
                     
                     # Try to load results.json
                     results_path = f"{jobs_prefix}{job_id}/results.json"
-                    results_content = self.storage.download_file(results_path)
+                    results_content = await self.storage.download_file(results_path)
                     if results_content:
                         try:
                             results_data = json.loads(results_content.decode('utf-8'))
@@ -459,7 +462,7 @@ class GCPResultsIndexer:
         results_file = next((f for f in job_files if f['name'] == 'results.json'), None)
         if results_file:
             try:
-                content = self.storage.download_file(f"jobs/{job_id}/results.json")
+                content = await self.storage.download_file(f"jobs/{job_id}/results.json")
                 if content:
                     data = json.loads(content.decode('utf-8'))
                     batch_results.update(data)
@@ -476,11 +479,11 @@ class GCPResultsIndexer:
     async def get_job_download_info(self, job_id: str) -> Dict[str, Any]:
         """Get download URLs for job files from GCP"""
         
-        if not self.storage.available:
+        if not self.storage.storage.available:
             return {"error": "GCP storage not available"}
         
         try:
-            job_files = self.storage.list_job_files(job_id)
+            job_files = await self.storage.list_job_files(job_id)
             
             if not job_files:
                 return {"error": "No files found for job"}
@@ -492,7 +495,7 @@ class GCPResultsIndexer:
             
             for file in job_files:
                 # Generate signed URL for each file
-                signed_url = self.storage.get_public_url(file['path'])
+                signed_url = await self.storage.get_public_url(file['path'])
                 if signed_url:
                     download_info["files"].append({
                         "name": file['name'],
@@ -3,15 +3,22 @@ GCP Storage Service for Modal Results
 Stores all Modal prediction outputs directly to GCP bucket
 """
 
+import asyncio
 import json
 import logging
 import base64
-from typing import Dict, Any, Optional
+import os
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime
 from config.gcp_storage import gcp_storage
+from services.offload import run_sync
 
 logger = logging.getLogger(__name__)
 
+# Concurrent artifact uploads per job, and batch children persisted at once
+RESULT_UPLOAD_CONCURRENCY = int(os.getenv("RESULT_UPLOAD_CONCURRENCY", "8"))
+BATCH_CHILD_PERSIST_CONCURRENCY = int(os.getenv("BATCH_CHILD_PERSIST_CONCURRENCY", "8"))
+
 class GCPStorageService:
     """Service to store Modal results directly to GCP"""
     
@@ -75,7 +82,13 @@ class GCPStorageService:
         return task_to_folder[task_type]
     
     async def store_job_results(self, job_id: str, results: Dict[str, Any], task_type: str, user_id: str = "anonymous") -> bool:
-        """Store job results to GCP bucket with user-based isolation"""
+        """
+        Store job results to GCP bucket with user-based isolation
+        
+        Each artifact is encoded and uploaded once under jobs/; the archive copy
+        is made server-side. Uploads run concurrently and metadata.json is
+        written last, so its presence means the job's files are complete.
+        """
         
         if not self.storage.available:
             logger.error("❌ GCP Storage not available!")
@@ -94,68 +107,20 @@ class GCPStorageService:
             # Directories are created automatically when files are uploaded
             logger.info(f"📁 Storing to: {jobs_path} and {archive_path}")
             
-            # Store main results JSON in both locations
-            results_json = json.dumps(results, indent=2)
+            artifacts = self._encode_result_artifacts(job_id, results)
             
-            # Store in jobs directory
-            success = self.storage.upload_file(
-                f"{jobs_path}/results.json",
-                results_json.encode('utf-8'),
-                "application/json"
-            )
+            # For batch jobs, persist individual results (same user_id) alongside the parent's files
+            child_tasks = []
+            if task_type == 'batch_protein_ligand_screening':
+                child_tasks.append(self._store_individual_results(job_id, results.get('individual_results', []), user_id))
             
-            # Also store in archive
-            self.storage.upload_file(
-                f"{archive_path}/results.json",
-                results_json.encode('utf-8'),
-                "application/json"
+            semaphore = asyncio.Semaphore(RESULT_UPLOAD_CONCURRENCY)
+            upload_results = await asyncio.gather(
+                *(self._persist_artifact(jobs_path, archive_path, name, content, content_type, semaphore)
+                  for name, content, content_type in artifacts),
+                *child_tasks
             )
-            
-            # Store structure files if present
-            if results.get('structure_file_base64'):
-                try:
-                    structure_content = base64.b64decode(results['structure_file_base64'])
-
-                    # Store in jobs directory
-                    self.storage.upload_file(
-                        f"{jobs_path}/structure.cif",
-                        structure_content,
-                        "chemical/x-cif"
-                    )
-
-                    # Store in archive
-                    self.storage.upload_file(
-                        f"{archive_path}/structure.cif",
-                        structure_content,
-                        "chemical/x-cif"
-                    )
-
-                except Exception as e:
-                    logger.error(f"❌ Failed to decode/store structure file for job {job_id}: {e}")
-                    # Continue without structure file rather than failing entire operation
-            
-            # Store confidence data in both locations
-            if results.get('confidence'):
-                confidence_json = json.dumps(results['confidence'], indent=2)
-                self.storage.upload_file(f"{jobs_path}/confidence.json", confidence_json.encode('utf-8'), "application/json")
-                self.storage.upload_file(f"{archive_path}/confidence.json", confidence_json.encode('utf-8'), "application/json")
-            
-            # Store affinity data in both locations
-            if results.get('affinity'):
-                affinity_data = {
-                    'affinity_pred_value': results.get('affinity'),
-                    'affinity_probability_binary': results.get('affinity_probability', 0.0)
-                }
-                affinity_json = json.dumps(affinity_data, indent=2)
-                self.storage.upload_file(f"{jobs_path}/affinity.json", affinity_json.encode('utf-8'), "application/json")
-                self.storage.upload_file(f"{archive_path}/affinity.json", affinity_json.encode('utf-8'), "application/json")
-            
-            # For batch jobs, store individual results with same user_id
-            if task_type == 'batch_protein_ligand_screening':
-                individual_results = results.get('individual_results', [])
-                for idx, ind_result in enumerate(individual_results):
-                    ind_job_id = ind_result.get('job_id', f"{job_id}_ligand_{idx}")
-                    await self.store_job_results(ind_job_id, ind_result, 'protein_ligand_binding', user_id)
+            success = upload_results[0]  # results.json
             
             # Store metadata with location info
             metadata = {
@@ -175,8 +140,8 @@ class GCPStorageService:
                 'status': 'completed'
             }
             metadata_json = json.dumps(metadata, indent=2)
-            self.storage.upload_file(f"{jobs_path}/metadata.json", metadata_json.encode('utf-8'), "application/json")
-            self.storage.upload_file(f"{archive_path}/metadata.json", metadata_json.encode('utf-8'), "application/json")
+            await self._persist_artifact(jobs_path, archive_path, "metadata.json",
+                                         metadata_json.encode('utf-8'), "application/json", semaphore)
             
             logger.info(f"✅ Stored job {job_id} to GCP: jobs/{job_id} and {archive_path}")
             return success
@@ -185,6 +150,62 @@ class GCPStorageService:
             logger.error(f"❌ Failed to store results to GCP: {str(e)}")
             return False
     
+    def _encode_result_artifacts(self, job_id: str, results: Dict[str, Any]) -> List[Tuple[str, bytes, str]]:
+        """Encode each result artifact exactly once; results.json is always first"""
+        
+        artifacts = [("results.json", json.dumps(results, indent=2).encode('utf-8'), "application/json")]
+        
+        # Store structure files if present
+        if results.get('structure_file_base64'):
+            try:
+                artifacts.append(("structure.cif", base64.b64decode(results['structure_file_base64']), "chemical/x-cif"))
+            except Exception as e:
+                logger.error(f"❌ Failed to decode/store structure file for job {job_id}: {e}")
+                # Continue without structure file rather than failing entire operation
+        
+        if results.get('confidence'):
+            confidence_json = json.dumps(results['confidence'], indent=2)
+            artifacts.append(("confidence.json", confidence_json.encode('utf-8'), "application/json"))
+        
+        if results.get('affinity'):
+            affinity_data = {
+                'affinity_pred_value': results.get('affinity'),
+                'affinity_probability_binary': results.get('affinity_probability', 0.0)
+            }
+            artifacts.append(("affinity.json", json.dumps(affinity_data, indent=2).encode('utf-8'), "application/json"))
+        
+        return artifacts
+    
+    async def _persist_artifact(self, jobs_path: str, archive_path: str, name: str,
+                                content: bytes, content_type: str, semaphore: asyncio.Semaphore) -> bool:
+        """Upload once to jobs/, then materialize the archive view by server-side copy"""
+        
+        async with semaphore:
+            uploaded = await run_sync(self.storage.upload_file, f"{jobs_path}/{name}", content, content_type)
+            if not uploaded:
+                return False
+            
+            copied = await run_sync(self.storage.copy_file, f"{jobs_path}/{name}", f"{archive_path}/{name}")
+            if not copied:
+                # Fall back to a direct upload so the archive stays complete
+                await run_sync(self.storage.upload_file, f"{archive_path}/{name}", content, content_type)
+            return True
+    
+    async def _store_individual_results(self, job_id: str, individual_results: List[Dict[str, Any]], user_id: str) -> bool:
+        """Persist batch children concurrently (bounded)"""
+        
+        semaphore = asyncio.Semaphore(BATCH_CHILD_PERSIST_CONCURRENCY)
+        
+        async def store_child(idx: int, ind_result: Dict[str, Any]) -> bool:
+            ind_job_id = ind_result.get('job_id', f"{job_id}_ligand_{idx}")
+            async with semaphore:
+                return await self.store_job_results(ind_job_id, ind_result, 'protein_ligand_binding', user_id)
+        
+        stored = await asyncio.gather(*(store_child(idx, r) for idx, r in enumerate(individual_results)))
+        if not all(stored):
+            logger.warning(f"⚠️ {stored.count(False)}/{len(stored)} individual results failed to store for batch {job_id}")
+        return all(stored)
+    
     async def store_modal_output(self, job_id: str, modal_output: Dict[str, Any], user_id: str = "anonymous") -> bool:
         """Store raw Modal output to GCP with user isolation"""
         
@@ -194,7 +215,8 @@ class GCPStorageService:
         try:
             # Store raw Modal output in user-isolated path
             modal_json = json.dumps(modal_output, indent=2)
-            success = self.storage.upload_file(
+            success = await run_sync(
+                self.storage.upload_file,
                 f"users/{user_id}/jobs/{job_id}/modal_output.json",
                 modal_json.encode('utf-8'),
                 "application/json"
@@ -231,7 +253,7 @@ class GCPStorageService:
                 raise Exception(f"Unsupported file type: {file_type}")
             
             # Download file content
-            file_content = self.storage.download_file(file_path)
+            file_content = await run_sync(self.storage.download_file, file_path)
             if not file_content:
                 # Fallback to legacy path for backward compatibility
                 legacy_path = f"jobs/{job_id}"
@@ -242,7 +264,7 @@ class GCPStorageService:
                 elif file_type == "json":
                     legacy_path += "/results.json"
                 
-                file_content = self.storage.download_file(legacy_path)
+                file_content = await run_sync(self.storage.download_file, legacy_path)
                 if not file_content:
                     raise Exception(f"File not found: {file_path}")
                 
@@ -258,6 +280,35 @@ class GCPStorageService:
         """Check if storage service is healthy"""
         return self.storage.available
     
+    # Object-level async API (used by AtomicStorageService); blocking calls run on the offload pool
+    
+    async def upload_file(self, path: str, data: bytes, content_type: str = "application/octet-stream",
+                          if_generation_match: Optional[int] = None,
+                          metadata: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Checksummed upload; returns object info including the new generation"""
+        return await run_sync(self.storage.write_object, path, data, content_type, if_generation_match, metadata)
+    
+    async def download_file(self, path: str, generation: Optional[int] = None) -> Optional[bytes]:
+        return await run_sync(self.storage.read_object, path, generation)
+    
+    async def get_file_info(self, path: str) -> Optional[Dict[str, Any]]:
+        return await run_sync(self.storage.get_object_info, path)
+    
+    async def file_exists(self, path: str) -> bool:
+        return await self.get_file_info(path) is not None
+    
+    async def delete_file(self, path: str, if_generation_match: Optional[int] = None) -> bool:
+        return await run_sync(self.storage.delete_object, path, if_generation_match)
+    
+    async def list_files(self, prefix: str) -> List[Dict[str, Any]]:
+        return await run_sync(self.storage.list_objects, prefix)
+    
+    async def list_job_files(self, job_id: str) -> List[Dict[str, Any]]:
+        return await run_sync(self.storage.list_job_files, job_id)
+    
+    async def get_public_url(self, path: str, expiry_hours: int = 24) -> Optional[str]:
+        return await run_sync(self.storage.get_public_url, path, expiry_hours)
+    
     async def export_batch(self, batch_id: str, format: str, user_id: str) -> tuple[bytes, str]:
         """Export batch results with user isolation"""
         
@@ -279,7 +330,7 @@ class GCPStorageService:
             else:
                 raise Exception(f"Unsupported export format: {format}")
             
-            file_content = self.storage.download_file(file_path)
+            file_content = await run_sync(self.storage.download_file, file_path)
             if not file_content:
                 # Try legacy path
                 legacy_path = f"batches/{batch_id}"
@@ -290,7 +341,7 @@ class GCPStorageService:
                 elif format == "zip":
                     legacy_path += "/batch_archive.zip"
                     
-                file_content = self.storage.download_file(legacy_path)
+                file_content = await run_sync(self.storage.download_file, legacy_path)
                 if not file_content:
                     raise Exception(f"Export file not found: {file_path}")
             
@@ -324,7 +375,7 @@ class GCPStorageService:
             success = True
             for file_path in files_to_delete:
                 try:
-                    self.storage.delete_file(file_path)
+                    await run_sync(self.storage.delete_file, file_path)
                 except Exception as e:
                     logger.warning(f"⚠️ Could not delete {file_path}: {e}")
                     # Don't fail if some files don't exist
@@ -18,6 +18,7 @@ from google.cloud import firestore
 from google.auth import jwt
 from google.auth.transport import requests as google_requests
 from auth.jwt_auth import JWTAuth
+from api.profiling_api import router as profiling_router
 
 # Configure logging
 logging.basicConfig(
@@ -437,9 +438,20 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Admin-only sampling profiles and event-loop lag for this worker
+app.include_router(profiling_router)
+
 # Initialize service
 gpu_service = GPUWorkerService()
 
+@app.on_event("startup")
+async def start_loop_lag_monitor():
+    """Track event-loop lag and stalls while jobs run"""
+    if os.getenv("ENABLE_LOOP_LAG_MONITOR", "true").lower() == "true":
+        from monitoring.profiler import loop_blocking_detector, loop_lag_monitor
+        loop_lag_monitor.start()
+        loop_blocking_detector.start()
+
 @app.post("/process")
 async def process_job(request: Request):
     """
@@ -0,0 +1,556 @@
+"""
+I/O Budget Tracing
+Request-scoped counts of Firestore, Cloud Storage, Redis and Cloud Tasks calls.
+
+MetricsMiddleware opens a RequestIO for every request in a context variable.
+The instrumented clients add their calls, documents/objects read and written,
+bytes transferred and time spent to whichever RequestIO is current. Tasks
+started with asyncio.gather/create_task and threads started with
+asyncio.to_thread or services.offload inherit the context, so fan-out is attributed to the
+endpoint that caused it. Outside a request each hook costs one ContextVar
+lookup (plus a running-loop check for the synchronous clients).
+
+Synchronous Firestore, GCS and Cloud Tasks calls made on an event-loop thread
+stall every request on the pod; they are also counted by backend and call
+site in loop_blocking_calls, whether or not a request is being traced.
+
+Instrumentation points:
+- Firestore: the public firestore_v1 document/collection/query/batch methods
+  (class level, so every client in the process is covered). Reads count
+  documents returned, writes count document mutations; bytes are not known
+  without re-serializing, so Firestore reports none.
+- Cloud Storage: a response hook on each shared client's HTTP session.
+- Redis: execute_command on a client instance (pipelines are not counted).
+- Cloud Tasks: named methods on a client instance.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import inspect
+import logging
+import functools
+import importlib
+import threading
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('firestore', 'gcs', 'redis', 'cloud_tasks')
+
+REDIS_READ_COMMANDS = frozenset({
+    'GET', 'MGET', 'GETRANGE', 'STRLEN', 'EXISTS', 'TTL', 'PTTL', 'TYPE', 'KEYS', 'SCAN',
+    'HGET', 'HMGET', 'HGETALL', 'HKEYS', 'HVALS', 'HLEN', 'HEXISTS',
+    'SMEMBERS', 'SISMEMBER', 'SCARD', 'LRANGE', 'LLEN', 'LINDEX',
+    'ZRANGE', 'ZRANGEBYSCORE', 'ZREVRANGE', 'ZCARD', 'ZSCORE', 'ZCOUNT', 'PING',
+})
+
+_current_io: ContextVar[Optional['RequestIO']] = ContextVar('request_io', default=None)
+_local = threading.local()
+_STDLIB_DIR = os.path.dirname(os.__file__)
+
+def _on_loop() -> bool:
+    """True on a thread that is running an event loop"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+class BackendIO:
+    """Counters for one backend within one request"""
+
+    __slots__ = ('calls', 'reads', 'writes', 'bytes', 'seconds')
+
+    def __init__(self):
+        self.calls = 0
+        self.reads = 0
+        self.writes = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+class RequestIO:
+    """All storage I/O attributed to one request"""
+
+    def __init__(self, endpoint: Optional[str] = None):
+        self.endpoint = endpoint
+        self.backends: Dict[str, BackendIO] = {}
+        self._lock = threading.Lock()
+
+    def add(self, backend: str, reads: int = 0, writes: int = 0, nbytes: int = 0,
+            seconds: float = 0.0, calls: int = 1):
+        with self._lock:
+            stats = self.backends.get(backend)
+            if stats is None:
+                stats = self.backends[backend] = BackendIO()
+            stats.calls += calls
+            stats.reads += reads
+            stats.writes += writes
+            stats.bytes += nbytes
+            stats.seconds += seconds
+
+    @property
+    def calls(self) -> int:
+        return sum(stats.calls for stats in self.backends.values())
+
+    @property
+    def bytes(self) -> int:
+        return sum(stats.bytes for stats in self.backends.values())
+
+    @property
+    def seconds(self) -> float:
+        return sum(stats.seconds for stats in self.backends.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'endpoint': self.endpoint,
+            'calls': self.calls,
+            'bytes': self.bytes,
+            'seconds': round(self.seconds, 6),
+            'backends': {name: stats.to_dict() for name, stats in self.backends.items()}
+        }
+
+    def server_timing(self) -> str:
+        """Server-Timing header value (shown per backend in browser dev tools)"""
+        return ", ".join(
+            f'{name};dur={stats.seconds * 1000:.1f};desc="calls={stats.calls} r={stats.reads} '
+            f'w={stats.writes} b={stats.bytes}"'
+            for name, stats in sorted(self.backends.items())
+        )
+
+def current_io() -> Optional[RequestIO]:
+    """RequestIO of the request running in this context, if any"""
+    return _current_io.get()
+
+def record(backend: str, reads: int = 0, writes: int = 0, nbytes: int = 0,
+           seconds: float = 0.0, calls: int = 1):
+    """Attribute I/O to the current request (no-op outside a request)"""
+    io = _current_io.get()
+    if io is not None:
+        io.add(backend, reads, writes, nbytes, seconds, calls)
+
+class IOBudget:
+    """Per-request I/O limits; None disables a limit"""
+
+    def __init__(self, max_calls: Optional[int] = None, max_seconds: Optional[float] = None,
+                 max_bytes: Optional[int] = None):
+        self.max_calls = max_calls
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], default: Optional['IOBudget'] = None) -> 'IOBudget':
+        default = default or cls()
+        return cls(
+            max_calls=data.get('max_calls', default.max_calls),
+            max_seconds=data.get('max_seconds', default.max_seconds),
+            max_bytes=data.get('max_bytes', default.max_bytes)
+        )
+
+    def violations(self, io: RequestIO) -> List[Tuple[str, float, float]]:
+        """(limit, value, threshold) for every limit the request went over"""
+        exceeded = []
+        for limit, value, threshold in (('calls', io.calls, self.max_calls),
+                                        ('seconds', io.seconds, self.max_seconds),
+                                        ('bytes', io.bytes, self.max_bytes)):
+            if threshold is not None and value > threshold:
+                exceeded.append((limit, value, threshold))
+        return exceeded
+
+def _default_budget() -> IOBudget:
+    return IOBudget(
+        max_calls=int(os.getenv('IO_BUDGET_MAX_CALLS', '200')),
+        max_seconds=float(os.getenv('IO_BUDGET_MAX_SECONDS', '5')),
+        max_bytes=int(os.getenv('IO_BUDGET_MAX_BYTES', str(64 * 1024 * 1024)))
+    )
+
+def _endpoint_budgets(default: IOBudget) -> Dict[str, IOBudget]:
+    """Overrides from IO_BUDGETS, a JSON object of endpoint pattern -> limits"""
+    raw = os.getenv('IO_BUDGETS')
+    if not raw:
+        return {}
+    try:
+        return {endpoint: IOBudget.from_dict(limits, default) for endpoint, limits in json.loads(raw).items()}
+    except (ValueError, AttributeError) as e:
+        logger.warning(f"⚠️ Ignoring invalid IO_BUDGETS: {e}")
+        return {}
+
+class IOBudgetTracker:
+    """Opens per-request traces and alerts on requests that exceed their budget"""
+
+    def __init__(self, default_budget: Optional[IOBudget] = None,
+                 endpoint_budgets: Optional[Dict[str, IOBudget]] = None,
+                 alert_cooldown: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.default_budget = default_budget or _default_budget()
+        self.endpoint_budgets = (endpoint_budgets if endpoint_budgets is not None
+                                 else _endpoint_budgets(self.default_budget))
+        self.alert_cooldown = alert_cooldown
+        self._clock = clock
+        self._last_alerts: Dict[str, float] = {}
+        self.suppressed_alerts = 0
+
+    def begin(self, endpoint: Optional[str] = None):
+        """Start attributing I/O in this context to a new RequestIO; returns (io, token)"""
+        io = RequestIO(endpoint)
+        return io, _current_io.set(io)
+
+    def end(self, token):
+        _current_io.reset(token)
+
+    def budget_for(self, endpoint: Optional[str]) -> IOBudget:
+        return self.endpoint_budgets.get(endpoint, self.default_budget)
+
+    def check(self, io: RequestIO) -> List[Tuple[str, float, float]]:
+        """Violations of the endpoint's budget; logs an alert at most once per cooldown per endpoint"""
+        exceeded = self.budget_for(io.endpoint).violations(io)
+        if exceeded:
+            now = self._clock()
+            last = self._last_alerts.get(io.endpoint)
+            if last is None or now - last >= self.alert_cooldown:
+                self._last_alerts[io.endpoint] = now
+                self._send_alert(io, exceeded)
+            else:
+                self.suppressed_alerts += 1
+        return exceeded
+
+    def _send_alert(self, io: RequestIO, exceeded: List[Tuple[str, float, float]]):
+        summary = ", ".join(f"{limit} {value:g} > {threshold:g}" for limit, value, threshold in exceeded)
+        logger.warning(f"🚨 ALERT FIRED: I/O budget exceeded on {io.endpoint} - {summary}")
+        alert_data = {
+            'timestamp': datetime.utcnow().isoformat(),
+            'alert_name': 'I/O Budget Exceeded',
+            'status': 'FIRED',
+            'severity': 'warning',
+            'endpoint': io.endpoint,
+            'exceeded': [{'limit': limit, 'value': value, 'threshold': threshold}
+                         for limit, value, threshold in exceeded],
+            'io': io.to_dict()
+        }
+        logger.warning("ALERT_FIRED", extra={'alert_data': alert_data})
+
+class LoopBlockingCalls:
+    """Synchronous storage calls made on an event-loop thread, by backend and call site"""
+
+    def __init__(self, max_sites: int = 500):
+        self.max_sites = max_sites
+        self.calls = 0
+        self.seconds = 0.0
+        self._sites: Dict[Tuple[str, str], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, backend: str, seconds: float, site: str):
+        with self._lock:
+            self.calls += 1
+            self.seconds += seconds
+            entry = self._sites.get((backend, site))
+            if entry is None:
+                if len(self._sites) >= self.max_sites:
+                    return
+                entry = self._sites[(backend, site)] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def snapshot(self, limit: int = 25) -> Dict[str, Any]:
+        with self._lock:
+            sites = sorted(self._sites.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+            return {
+                'calls': self.calls,
+                'seconds': round(self.seconds, 3),
+                'sites': [
+                    {'backend': backend, 'site': site, 'calls': int(calls),
+                     'seconds_total': round(total, 3), 'max_ms': round(longest * 1000, 1)}
+                    for (backend, site), (calls, total, longest) in sites
+                ]
+            }
+
+    def reset(self):
+        with self._lock:
+            self._sites.clear()
+            self.calls = 0
+            self.seconds = 0.0
+
+def call_site(skip: int = 1) -> str:
+    """
+    Nearest application frame outside this module, the stdlib and site-packages,
+    prefixed with the async function that called it ('coroutine -> facade')
+    """
+    return frame_site(sys._getframe(skip))
+
+def frame_site(frame) -> str:
+    """call_site for an arbitrary frame (e.g. another thread's, from sys._current_frames)"""
+    first = None
+    while frame is not None:
+        code = frame.f_code
+        filename = code.co_filename
+        if filename != __file__ and not filename.startswith((_STDLIB_DIR, '<')) and 'site-packages' not in filename:
+            index = filename.rfind('/backend/')
+            path = filename[index + 9:] if index >= 0 else os.path.basename(filename)
+            label = f"{path}:{frame.f_lineno} {code.co_name}"
+            if code.co_flags & inspect.CO_COROUTINE:
+                return label if first is None else f"{label} -> {first}"
+            if first is None:
+                first = label
+        frame = frame.f_back
+    return first or 'unknown'
+
+def _note_blocking(backend: str, seconds: float, site: Optional[str] = None):
+    loop_blocking_calls.record(backend, seconds, site or call_site(2))
+
+# Client instrumentation
+
+def _instrument_callable(backend: str, method: Callable, kind: str) -> Callable:
+    """Wrap a sync or async client method so each call counts as one read or write"""
+    reads, writes = (1, 0) if kind == 'read' else (0, 1)
+
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(*args, **kwargs):
+            io = _current_io.get()
+            if io is None:
+                return await method(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                io.add(backend, reads, writes, 0, time.perf_counter() - started)
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        io = _current_io.get()
+        on_loop = _on_loop()
+        if io is None and not on_loop:
+            return method(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - started
+            if io is not None:
+                io.add(backend, reads, writes, 0, seconds)
+            if on_loop:
+                _note_blocking(backend, seconds)
+    return wrapper
+
+def instrument_methods(client: Any, backend: str, reads: Iterable[str] = (), writes: Iterable[str] = ()) -> Any:
+    """Count calls to the named methods of one client instance"""
+    for names, kind in ((reads, 'read'), (writes, 'write')):
+        for name in names:
+            method = getattr(client, name, None)
+            if method is not None and not getattr(method, '__io_instrumented__', False):
+                wrapped = _instrument_callable(backend, method, kind)
+                wrapped.__io_instrumented__ = True
+                setattr(client, name, wrapped)
+    return client
+
+def instrument_cloud_tasks_client(client: Any) -> Any:
+    """Count Cloud Tasks API calls made through a CloudTasksClient"""
+    return instrument_methods(
+        client, 'cloud_tasks',
+        reads=('get_queue', 'list_queues', 'get_task', 'list_tasks'),
+        writes=('create_task', 'delete_task', 'update_queue', 'pause_queue', 'resume_queue', 'purge_queue')
+    )
+
+def _payload_size(value: Any) -> int:
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (list, tuple)):
+        return sum(_payload_size(item) for item in value)
+    if isinstance(value, dict):
+        return sum(_payload_size(key) + _payload_size(item) for key, item in value.items())
+    return 0
+
+def instrument_redis_client(client: Any) -> Any:
+    """Count commands (and their key/value bytes) sent through a redis.asyncio client"""
+    execute = client.execute_command
+    if getattr(execute, '__io_instrumented__', False):
+        return client
+
+    @functools.wraps(execute)
+    async def execute_command(*args, **options):
+        io = _current_io.get()
+        if io is None:
+            return await execute(*args, **options)
+        command = str(args[0]).upper() if args else ''
+        read = command in REDIS_READ_COMMANDS
+        started = time.perf_counter()
+        result = None
+        try:
+            result = await execute(*args, **options)
+            return result
+        finally:
+            io.add('redis', int(read), int(not read),
+                   _payload_size(args[1:]) + (_payload_size(result) if read else 0),
+                   time.perf_counter() - started)
+
+    execute_command.__io_instrumented__ = True
+    client.execute_command = execute_command
+    return client
+
+def _record_gcs_response(response, *args, **kwargs):
+    """requests response hook: one GCS JSON/XML API call"""
+    io = _current_io.get()
+    on_loop = _on_loop()
+    if io is None and not on_loop:
+        return
+    request = getattr(response, 'request', None)
+    method = getattr(request, 'method', 'GET') or 'GET'
+    body = getattr(request, 'body', None)
+    sent = len(body) if isinstance(body, (bytes, bytearray, str)) else 0
+    try:
+        received = int(response.headers.get('Content-Length') or 0)
+    except (TypeError, ValueError):
+        received = 0
+    elapsed = getattr(response, 'elapsed', None)
+    seconds = elapsed.total_seconds() if elapsed is not None else 0.0
+    write = method.upper() not in ('GET', 'HEAD')
+    if io is not None:
+        io.add('gcs', int(not write), int(write), sent + received, seconds)
+    if on_loop:
+        _note_blocking('gcs', seconds)
+
+def instrument_storage_client(client: Any) -> Any:
+    """Count HTTP calls made by a google.cloud.storage Client"""
+    try:
+        hooks = client._http.hooks
+    except Exception as e:
+        logger.warning(f"⚠️ Storage client I/O tracing unavailable: {e}")
+        return client
+    response_hooks = hooks.setdefault('response', [])
+    if _record_gcs_response not in response_hooks:
+        response_hooks.append(_record_gcs_response)
+    return client
+
+def _firestore_reads(kind: str, result: Any) -> int:
+    # Firestore bills at least one read per get/query even when nothing matches
+    if kind == 'list':
+        return max(len(result), 1) if isinstance(result, list) else 1
+    return 1
+
+def _instrument_firestore_method(backend: str, method: Callable, kind: str) -> Callable:
+    """
+    Wrap one Firestore method; kind is 'read', 'write', 'list' (returns a list
+    of documents), 'stream' (yields documents) or 'commit' (write batch)
+
+    Library methods call each other (CollectionReference.stream builds a Query
+    and streams it), so only the outermost instrumented call on a thread counts.
+    """
+    if kind == 'stream':
+        @functools.wraps(method)
+        def stream_wrapper(*args, **kwargs):
+            io = _current_io.get()
+            if (io is None and not _on_loop()) or getattr(_local, 'depth', 0):
+                return method(*args, **kwargs)
+            _local.depth = 1
+            try:
+                iterator = method(*args, **kwargs)
+            finally:
+                _local.depth = 0
+            return _counted_stream(io, backend, iterator)
+        return stream_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        io = _current_io.get()
+        on_loop = _on_loop()
+        if (io is None and not on_loop) or getattr(_local, 'depth', 0):
+            return method(self, *args, **kwargs)
+        writes = len(getattr(self, '_write_pbs', None) or ()) if kind == 'commit' else int(kind == 'write')
+        _local.depth = 1
+        started = time.perf_counter()
+        result = None
+        try:
+            result = method(self, *args, **kwargs)
+            return result
+        finally:
+            _local.depth = 0
+            seconds = time.perf_counter() - started
+            if io is not None:
+                reads = _firestore_reads(kind, result) if kind in ('read', 'list') else 0
+                io.add(backend, reads, writes, 0, seconds)
+            if on_loop:
+                _note_blocking(backend, seconds)
+    return wrapper
+
+def _counted_stream(io: Optional[RequestIO], backend: str, iterator):
+    """Yield from a document stream, timing only the fetches (not the consumer)"""
+    count = 0
+    seconds = 0.0
+    blocking, site = 0.0, None
+    iterator = iter(iterator)
+    try:
+        while True:
+            on_loop = _on_loop()
+            if on_loop and site is None:
+                site = call_site(2)
+            _local.depth = 1
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                fetch = time.perf_counter() - started
+                seconds += fetch
+                if on_loop:
+                    blocking += fetch
+                _local.depth = 0
+            count += 1
+            yield item
+    finally:
+        if io is not None:
+            io.add(backend, max(count, 1), 0, 0, seconds)
+        if site is not None:
+            _note_blocking(backend, blocking, site)
+
+def instrument_class(cls: type, methods: Dict[str, str], backend: str = 'firestore') -> type:
+    """Instrument methods of a Firestore class in place (idempotent)"""
+    for name, kind in methods.items():
+        method = cls.__dict__.get(name)
+        if method is None or getattr(method, '__io_instrumented__', False):
+            continue
+        wrapped = _instrument_firestore_method(backend, method, kind)
+        wrapped.__io_instrumented__ = True
+        setattr(cls, name, wrapped)
+    return cls
+
+FIRESTORE_METHODS = (
+    ('document', 'DocumentReference', {'get': 'read', 'set': 'write', 'create': 'write',
+                                       'update': 'write', 'delete': 'write'}),
+    ('collection', 'CollectionReference', {'stream': 'stream', 'get': 'list', 'add': 'write',
+                                           'list_documents': 'stream'}),
+    ('query', 'Query', {'stream': 'stream', 'get': 'list'}),
+    ('aggregation', 'AggregationQuery', {'get': 'read'}),
+    ('batch', 'WriteBatch', {'commit': 'commit'}),
+    ('client', 'Client', {'get_all': 'stream'}),
+)
+
+_firestore_instrumented = False
+
+def instrument_firestore():
+    """Instrument the firestore_v1 sync API for every client in the process"""
+    global _firestore_instrumented
+    if _firestore_instrumented:
+        return
+    _firestore_instrumented = True
+    for module_name, class_name, methods in FIRESTORE_METHODS:
+        try:
+            cls = getattr(importlib.import_module(f'google.cloud.firestore_v1.{module_name}'), class_name)
+        except (ImportError, AttributeError) as e:
+            logger.warning(f"⚠️ Firestore I/O tracing skipped for {class_name}: {e}")
+            continue
+        instrument_class(cls, methods)
+
+# Global instances
+io_budget = IOBudgetTracker()
+loop_blocking_calls = LoopBlockingCalls()
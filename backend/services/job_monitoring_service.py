@@ -10,6 +10,7 @@ from typing import Dict, Any, Optional, List
 from datetime import datetime, timedelta
 from google.cloud import firestore
 from google.cloud.firestore_v1.watch import DocumentChange
+from config.gcp_clients import SharedFirestoreClient
 
 from services.webhook_service import webhook_service
 
@@ -18,8 +19,9 @@ logger = logging.getLogger(__name__)
 class JobMonitoringService:
     """Service for monitoring job status changes and triggering actions"""
     
+    db = SharedFirestoreClient()
+    
     def __init__(self):
-        self.db = firestore.Client()
         self.monitoring_interval = 30  # seconds
         self.stale_job_threshold = 3600  # 1 hour in seconds
         self.watchers = {}
@@ -135,10 +137,27 @@ class JobMonitoringService:
             
             await asyncio.sleep(self.monitoring_interval * 4)  # Check every 2 minutes
     
+    def _record_batch_child(self, job_id: str, job_data: Dict[str, Any], status: str):
+        """Append a finished batch child to its batch's results table"""
+        
+        batch_id = job_data.get('batch_parent_id')
+        if not batch_id:
+            return
+        try:
+            from services.batch_results_service import batch_results_service
+            batch_results_service.record_child_result(
+                batch_id, job_id, status, job_data.get('input_data'),
+                job_data.get('output_data') or job_data.get('results'), job_data.get('batch_index')
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Could not record {job_id} in results table for batch {batch_id}: {e}")
+    
     async def _process_completed_job(self, job_id: str, job_data: Dict[str, Any]):
         """Process a completed job"""
         
         try:
+            self._record_batch_child(job_id, job_data, 'completed')
+            
             user_id = job_data.get('user_id')
             if not user_id:
                 logger.warning(f"No user_id for job {job_id}")
@@ -171,6 +190,8 @@ class JobMonitoringService:
         """Process a failed job"""
         
         try:
+            self._record_batch_child(job_id, job_data, 'failed')
+            
             user_id = job_data.get('user_id')
             if not user_id:
                 logger.warning(f"No user_id for job {job_id}")
@@ -12,6 +12,8 @@ from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 from google.cloud import tasks_v2, firestore
 from google.protobuf import timestamp_pb2, duration_pb2
+from config.gcp_clients import get_firestore_client
+from services.io_budget import instrument_cloud_tasks_client
 
 logger = logging.getLogger(__name__)
 
@@ -24,15 +26,10 @@ class JobSubmissionService:
         self.gpu_worker_url = os.getenv('GPU_WORKER_URL', 'https://boltz2-gpu-worker-338254269321.us-central1.run.app')
         
         # Initialize clients with proper credentials
-        self.tasks_client = tasks_v2.CloudTasksClient()
+        self.tasks_client = instrument_cloud_tasks_client(tasks_v2.CloudTasksClient())
         
-        # Use default credentials for Firestore in GKE environment
-        if os.getenv('KUBERNETES_SERVICE_HOST'):
-            logger.info("🔧 Job Submission Service using GKE default credentials")
-            self.db = firestore.Client(project=self.project_id)
-        else:
-            logger.info("🔧 Job Submission Service using local credentials")
-            self.db = firestore.Client(project=self.project_id)
+        # Firestore uses the shared process-wide client (GKE default or local credentials)
+        self.db = get_firestore_client(self.project_id)
         
         # Queue paths
         self.standard_queue = self.tasks_client.queue_path(
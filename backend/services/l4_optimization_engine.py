@@ -14,6 +14,8 @@ import gc
 from dataclasses import dataclass
 from contextlib import contextmanager
 
+from services.runtime_estimator import runtime_estimator
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -266,10 +268,9 @@ class L4BatchProcessor:
         with self.memory_manager.memory_efficient_context():
             # Mock processing with realistic timing
             protein_length = len(shard["protein_sequence"])
-            num_ligands = len(shard["ligands"])
             
             # L4 optimized timing calculation
-            base_time = self._calculate_l4_processing_time(protein_length, num_ligands)
+            base_time = self._calculate_l4_processing_time(protein_length, shard["ligands"])
             
             # Simulate processing
             import asyncio
@@ -290,25 +291,9 @@ class L4BatchProcessor:
                 ]
             }
     
-    def _calculate_l4_processing_time(self, protein_length: int, num_ligands: int) -> float:
-        """Calculate L4 processing time with optimizations"""
-        
-        # Base time for L4 (optimized)
-        if protein_length < 300:
-            base_time = 120  # 2 minutes for small proteins
-        elif protein_length < 500:
-            base_time = 180  # 3 minutes for medium proteins
-        else:
-            base_time = 300  # 5 minutes for large proteins
-        
-        # Batching efficiency on L4 (better than A100 due to optimizations)
-        if num_ligands > 1:
-            batch_efficiency = 0.6  # 40% efficiency gain
-            total_time = base_time * num_ligands * batch_efficiency
-        else:
-            total_time = base_time
-        
-        return total_time
+    def _calculate_l4_processing_time(self, protein_length: int, ligands: List[str]) -> float:
+        """Calculate L4 processing time from the shared runtime model"""
+        return runtime_estimator.estimate_ligands(protein_length, ligands, gpu_type="L4").wall_seconds
 
 # Global L4 optimization instance
 l4_config = L4OptimizationConfig()
@@ -0,0 +1,50 @@
+"""
+Ligand Cost
+Dependency-free per-ligand cost estimates and longest-processing-time-first
+assignment.
+
+Shared by the shard packer on the API server and by the Boltz-2 Cloud Run
+worker, whose image copies only this module (to /app/services/), so it must not
+import anything beyond the standard library.
+"""
+
+import heapq
+import re
+from typing import Any, List, Optional, Sequence
+
+# Per-ligand cost: heavy atoms plus rotatable bonds (each widens the pose
+# search), scaled onto the runtime model's SMILES-length ligand_size feature
+ROTATABLE_BOND_WEIGHT = 2.0
+SMILES_CHARS_PER_HEAVY_ATOM = 1.5
+
+_ATOM_TOKEN = re.compile(r"\[[^\]]*\]|Cl|Br|[BCNOPSFI]|[bcnops]")
+_HYDROGEN_TOKEN = re.compile(r"\[\d*H[+\-\d]*\]")
+
+def count_heavy_atoms(smiles: str) -> int:
+    """Heavy-atom count from SMILES atom tokens, for when RDKit features are unavailable"""
+    return sum(1 for token in _ATOM_TOKEN.findall(smiles or '') if not _HYDROGEN_TOKEN.fullmatch(token))
+
+def ligand_cost_size(ligand: Any, heavy_atoms: Optional[int] = None, rotatable_bonds: int = 0) -> float:
+    """Effective ligand size for the runtime model from heavy atoms and rotatable bonds"""
+    if isinstance(ligand, dict):
+        heavy_atoms = ligand.get('heavy_atoms', heavy_atoms)
+        rotatable_bonds = ligand.get('rotatable_bonds', rotatable_bonds) or 0
+        smiles = ligand.get('smiles') or ligand.get('ligand_smiles') or ''
+    else:
+        smiles = ligand or ''
+    if heavy_atoms is None:
+        heavy_atoms = count_heavy_atoms(smiles)
+    return max(1.0, (heavy_atoms + ROTATABLE_BOND_WEIGHT * rotatable_bonds) * SMILES_CHARS_PER_HEAVY_ATOM)
+
+def lpt_assign(costs: Sequence[float], bins: int) -> List[List[int]]:
+    """
+    Longest-processing-time-first: each item, largest first, goes to the
+    least-loaded bin. Returns item indices per bin in descending cost order.
+    """
+    heap = [(0.0, b) for b in range(max(1, bins))]
+    assignment: List[List[int]] = [[] for _ in heap]
+    for index in sorted(range(len(costs)), key=lambda i: (-costs[i], i)):
+        load, b = heapq.heappop(heap)
+        assignment[b].append(index)
+        heapq.heappush(heap, (load + costs[index], b))
+    return assignment
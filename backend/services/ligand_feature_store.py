@@ -0,0 +1,265 @@
+"""
+Ligand Feature Store
+Shared, persistent cache of RDKit-derived ligand features keyed by canonical SMILES.
+
+Ligand libraries repeat across many batches, so scaffold and descriptor
+computation is done once per unique ligand and reused by validation,
+scaffold analysis and export.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Any, Iterable
+
+from services.offload import run_sync
+
+try:
+    from rdkit import Chem, RDLogger
+    from rdkit.Chem import Descriptors, Lipinski, rdMolDescriptors
+    from rdkit.Chem.Scaffolds import MurckoScaffold
+    RDLogger.DisableLog("rdApp.*")
+    RDKIT_AVAILABLE = True
+except ImportError:
+    RDKIT_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Bump when the computed feature set changes so stale records are recomputed
+FEATURE_VERSION = 1
+
+# Documents per Firestore get_all call; large libraries are read in chunks
+LOAD_CHUNK_SIZE = 300
+
+@dataclass
+class LigandFeatures:
+    """RDKit-derived features for one ligand"""
+    smiles: str
+    canonical_smiles: Optional[str]
+    valid: bool
+    scaffold_smiles: Optional[str] = None
+    heavy_atoms: int = 0
+    rotatable_bonds: int = 0
+    ring_count: int = 0
+    molecular_weight: float = 0.0
+    logp: float = 0.0
+    hbd: int = 0
+    hba: int = 0
+    version: int = FEATURE_VERSION
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LigandFeatures":
+        fields = cls.__dataclass_fields__
+        return cls(**{k: v for k, v in data.items() if k in fields})
+
+def compute_ligand_features(smiles: str) -> LigandFeatures:
+    """Compute features for a single SMILES (module-level for process pools)"""
+    smiles = smiles.strip()
+    try:
+        mol = Chem.MolFromSmiles(smiles)
+        if mol is None:
+            return LigandFeatures(smiles=smiles, canonical_smiles=None, valid=False)
+
+        return LigandFeatures(
+            smiles=smiles,
+            canonical_smiles=Chem.MolToSmiles(mol),
+            valid=True,
+            scaffold_smiles=Chem.MolToSmiles(MurckoScaffold.GetScaffoldForMol(mol)),
+            heavy_atoms=mol.GetNumHeavyAtoms(),
+            rotatable_bonds=rdMolDescriptors.CalcNumRotatableBonds(mol),
+            ring_count=rdMolDescriptors.CalcNumRings(mol),
+            molecular_weight=round(Descriptors.MolWt(mol), 3),
+            logp=round(Descriptors.MolLogP(mol), 3),
+            hbd=Lipinski.NumHDonors(mol),
+            hba=Lipinski.NumHAcceptors(mol)
+        )
+    except Exception as e:
+        logger.warning(f"Could not compute features for SMILES {smiles}: {e}")
+        return LigandFeatures(smiles=smiles, canonical_smiles=None, valid=False)
+
+def compute_ligand_features_chunk(smiles_list: List[str]) -> List[LigandFeatures]:
+    """Process-pool work unit covering many ligands per task"""
+    return [compute_ligand_features(smiles) for smiles in smiles_list]
+
+def feature_key(smiles: str) -> str:
+    """Firestore-safe document ID for a SMILES string"""
+    return hashlib.sha256(smiles.strip().encode()).hexdigest()
+
+class LigandFeatureStore:
+    """
+    Two-level ligand feature cache.
+
+    Features:
+    - Bounded in-process LRU for hot ligands
+    - Firestore persistence shared across pods and batches
+    - Bulk computation of misses on a process pool
+    - Records stored under both the canonical and the submitted SMILES,
+      so repeat lookups never need an RDKit parse
+    """
+
+    def __init__(self, db_manager=None, max_local_entries: int = 50000,
+                 max_workers: Optional[int] = None, chunk_size: int = 256,
+                 process_pool_threshold: int = 64):
+        self._db_manager = db_manager
+        self.collection = "ligand_features"
+        self.max_local_entries = max_local_entries
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self.chunk_size = chunk_size
+        self.process_pool_threshold = process_pool_threshold
+        self._local: "OrderedDict[str, LigandFeatures]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self.stats = {"local_hits": 0, "persistent_hits": 0, "computed": 0}
+
+    @property
+    def available(self) -> bool:
+        return RDKIT_AVAILABLE
+
+    @property
+    def db(self):
+        """Firestore client, resolved on first use"""
+        if self._db_manager is None:
+            from services.service_registry import service_registry
+            self._db_manager = service_registry.get("gcp_database")
+        return self._db_manager.db if getattr(self._db_manager, "available", False) else None
+
+    def peek(self, smiles: str) -> Optional[LigandFeatures]:
+        """Local-only lookup; never performs I/O or computation"""
+        if not smiles:
+            return None
+        with self._lock:
+            features = self._local.get(smiles.strip())
+            if features is not None:
+                self._local.move_to_end(smiles.strip())
+            return features
+
+    def get(self, smiles: str) -> Optional[LigandFeatures]:
+        """Features for one SMILES, or None if RDKit is unavailable"""
+        if not smiles:
+            return None
+        return self.get_many([smiles]).get(smiles.strip())
+
+    def get_many(self, smiles_list: Iterable[str]) -> Dict[str, LigandFeatures]:
+        """
+        Bulk lookup keyed by the stripped input SMILES.
+        Resolution order: local LRU -> Firestore -> compute (and persist).
+        """
+        if not RDKIT_AVAILABLE:
+            return {}
+
+        unique = list(dict.fromkeys(s.strip() for s in smiles_list if s and s.strip()))
+        results: Dict[str, LigandFeatures] = {}
+
+        missing = []
+        for smiles in unique:
+            features = self.peek(smiles)
+            if features is not None:
+                results[smiles] = features
+                self.stats["local_hits"] += 1
+            else:
+                missing.append(smiles)
+
+        if missing:
+            persisted = self._load_persistent(missing)
+            self.stats["persistent_hits"] += len(persisted)
+            results.update(persisted)
+            missing = [smiles for smiles in missing if smiles not in persisted]
+
+        if missing:
+            computed = self._compute(missing)
+            self.stats["computed"] += len(computed)
+            results.update(computed)
+            self._store_persistent(computed.values())
+
+        self._remember(results)
+        return results
+
+    async def get_many_async(self, smiles_list: Iterable[str]) -> Dict[str, LigandFeatures]:
+        """Async wrapper that keeps Firestore I/O and RDKit work off the event loop"""
+        return await run_sync(self.get_many, list(smiles_list))
+
+    def _remember(self, features_by_smiles: Dict[str, LigandFeatures]) -> None:
+        """Insert into the local LRU, evicting the oldest entries"""
+        with self._lock:
+            for smiles, features in features_by_smiles.items():
+                self._local[smiles] = features
+                self._local.move_to_end(smiles)
+            while len(self._local) > self.max_local_entries:
+                self._local.popitem(last=False)
+
+    def _compute(self, smiles_list: List[str]) -> Dict[str, LigandFeatures]:
+        """Compute features, fanning out to a process pool for large sets"""
+        if len(smiles_list) < self.process_pool_threshold:
+            computed = compute_ligand_features_chunk(smiles_list)
+        else:
+            chunks = [smiles_list[i:i + self.chunk_size] for i in range(0, len(smiles_list), self.chunk_size)]
+            computed = []
+            for chunk_result in self._get_process_pool().map(compute_ligand_features_chunk, chunks):
+                computed.extend(chunk_result)
+        return {features.smiles: features for features in computed}
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._process_pool
+
+    def _load_persistent(self, smiles_list: List[str]) -> Dict[str, LigandFeatures]:
+        """Batch-read persisted features, LOAD_CHUNK_SIZE documents per call"""
+        db = self.db
+        if db is None:
+            return {}
+
+        try:
+            collection = db.collection(self.collection)
+            found = {}
+            for start in range(0, len(smiles_list), LOAD_CHUNK_SIZE):
+                chunk = smiles_list[start:start + LOAD_CHUNK_SIZE]
+                refs = [collection.document(feature_key(smiles)) for smiles in chunk]
+                for snapshot in db.get_all(refs):
+                    if snapshot.exists:
+                        features = LigandFeatures.from_dict(snapshot.to_dict())
+                        if features.version == FEATURE_VERSION:
+                            found[features.smiles] = features
+            return found
+        except Exception as e:
+            logger.warning(f"Could not load persisted ligand features: {e}")
+            return {}
+
+    def _store_persistent(self, features_list: Iterable[LigandFeatures]) -> None:
+        """Batch-write features under the submitted and canonical keys"""
+        db = self.db
+        if db is None:
+            return
+
+        try:
+            collection = db.collection(self.collection)
+            write_batch = db.batch()
+            pending = 0
+            for features in features_list:
+                keys = {features.smiles}
+                if features.canonical_smiles:
+                    keys.add(features.canonical_smiles)
+                for key in keys:
+                    record = features.to_dict()
+                    record["smiles"] = key
+                    write_batch.set(collection.document(feature_key(key)), record)
+                    pending += 1
+                    if pending == 500:  # Firestore batch write limit
+                        write_batch.commit()
+                        write_batch = db.batch()
+                        pending = 0
+            if pending:
+                write_batch.commit()
+        except Exception as e:
+            logger.warning(f"Could not persist ligand features: {e}")
+
+# Global instance for reuse
+ligand_feature_store = LigandFeatureStore()
@@ -0,0 +1,266 @@
+"""
+Log Pipeline
+Low-overhead structured logging for the API and workers.
+
+- StructuredFormatter encodes the static service fields once and reuses one
+  JSON encoder (orjson when installed).
+- LogRateLimiter applies per-logger token buckets and 1-in-N sampling to
+  DEBUG/INFO records from hot paths; warnings and errors always pass.
+- AsyncQueueHandler/QueueListener move formatting and handler I/O (console,
+  file, Cloud Logging) off the calling thread, which is usually the event
+  loop. The caller only renders the message and enqueues it; a full queue
+  drops the record instead of blocking.
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import logging.handlers
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+if ORJSON_AVAILABLE:
+    def _dumps(value: Any) -> str:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+else:
+    _dumps = json.JSONEncoder(default=str, ensure_ascii=False, separators=(',', ':')).encode
+
+# Loggers on per-request/per-file paths (downloads, uploads, job reads, batch progress)
+HOT_LOGGERS = (
+    'config.gcp_storage',
+    'config.gcp_database',
+    'database.unified_job_manager',
+    'services.gcp_storage_service',
+    'services.batch_relationship_manager',
+    'services.unified_batch_processor',
+)
+DEFAULT_HOT_RATE = (20.0, 100.0)  # lines/second, burst
+
+_CONTEXT_FIELDS = ('request_id', 'user_id', 'job_id')
+
+class StructuredFormatter(logging.Formatter):
+    """Custom formatter for structured JSON logging"""
+
+    def __init__(self, service: Optional[Dict[str, str]] = None):
+        super().__init__()
+        service = service or {
+            'name': os.getenv('SERVICE_NAME', 'omtx-hub-api'),
+            'version': os.getenv('SERVICE_VERSION', '1.0.0'),
+            'environment': os.getenv('ENVIRONMENT', 'development'),
+            'instance': os.getenv('HOSTNAME', 'unknown')
+        }
+        self.service = service
+        self._service_suffix = ',"service":' + _dumps(service) + '}'
+        self._second: Tuple[int, str] = (-1, '')
+
+    def _timestamp(self, created: float) -> str:
+        """Local ISO-8601 time; the date/time prefix is reused within a second"""
+        second = int(created)
+        cached = self._second
+        if cached[0] != second:
+            cached = self._second = (second, time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(second)))
+        return f"{cached[1]}.{int((created - second) * 1_000_000):06d}"
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format log record as structured JSON"""
+        data = record.__dict__
+        log_entry = {
+            'timestamp': self._timestamp(record.created),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'function': record.funcName,
+            'line': record.lineno
+        }
+
+        for field in _CONTEXT_FIELDS:
+            if field in data:
+                log_entry[field] = data[field]
+
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+            log_entry['exception'] = {
+                'type': record.exc_info[0].__name__ if record.exc_info[0] else None,
+                'message': str(record.exc_info[1]) if record.exc_info[1] else None,
+                'traceback': record.exc_text
+            }
+
+        if 'extra_data' in data:
+            log_entry.update(data['extra_data'])
+
+        if 'duration' in data:
+            log_entry['performance'] = {
+                'duration_ms': data['duration'],
+                'operation': data.get('operation', 'unknown')
+            }
+
+        if 'alert_data' in data:
+            log_entry['alert'] = data['alert_data']
+
+        if 'suppressed' in data:
+            log_entry['suppressed'] = data['suppressed']
+
+        if 'service' in log_entry:
+            return _dumps(log_entry)
+        return _dumps(log_entry)[:-1] + self._service_suffix
+
+_NO_RULE = object()
+
+class LogRateLimiter(logging.Filter):
+    """
+    Per-logger rate limiting and sampling for records at or below max_level
+
+    Rules apply to a logger and its children. sample_every keeps one record in
+    N; rates is a token bucket of (lines per second, burst). The next record a
+    rule lets through carries `suppressed`, the number dropped since the last one.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, Tuple[float, float]]] = None,
+                 sample_every: Optional[Dict[str, int]] = None, max_level: int = logging.INFO,
+                 clock: Callable[[], float] = time.monotonic):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self.sample_every = dict(sample_every or {})
+        self.max_level = max_level
+        self._clock = clock
+        self._rules: Dict[str, Any] = {}
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._seen: Dict[str, int] = {}
+        self._suppressed: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def _rule_for(self, name: str) -> Optional[str]:
+        rule = self._rules.get(name, _NO_RULE)
+        if rule is _NO_RULE:
+            rule, candidate = None, name
+            while candidate:
+                if candidate in self.rates or candidate in self.sample_every:
+                    rule = candidate
+                    break
+                candidate = candidate.rpartition('.')[0]
+            self._rules[name] = rule
+        return rule
+
+    def _drop(self, rule: str) -> bool:
+        self._suppressed[rule] = self._suppressed.get(rule, 0) + 1
+        self.dropped += 1
+        return False
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level:
+            return True
+        rule = self._rule_for(record.name)
+        if rule is None:
+            return True
+
+        with self._lock:
+            every = self.sample_every.get(rule)
+            if every and every > 1:
+                seen = self._seen.get(rule, 0)
+                self._seen[rule] = seen + 1
+                if seen % every:
+                    return self._drop(rule)
+
+            rate = self.rates.get(rule)
+            if rate:
+                per_second, burst = rate
+                now = self._clock()
+                tokens, last = self._buckets.get(rule, (burst, now))
+                tokens = min(burst, tokens + (now - last) * per_second)
+                if tokens < 1:
+                    self._buckets[rule] = (tokens, now)
+                    return self._drop(rule)
+                self._buckets[rule] = (tokens - 1, now)
+
+            suppressed = self._suppressed.pop(rule, 0)
+
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+def _env_json(name: str) -> Dict[str, Any]:
+    raw = os.getenv(name)
+    if not raw:
+        return {}
+    try:
+        value = json.loads(raw)
+        if not isinstance(value, dict):
+            raise ValueError("expected a JSON object")
+        return value
+    except ValueError as e:
+        logger.warning(f"⚠️ Ignoring invalid {name}: {e}")
+        return {}
+
+def rate_limiter_from_env() -> LogRateLimiter:
+    """
+    LogRateLimiter for HOT_LOGGERS plus overrides
+
+    LOG_RATE_LIMITS: {"logger": lines_per_second | [lines_per_second, burst]}, 0 disables
+    LOG_SAMPLING: {"logger": N} keeps one DEBUG/INFO record in N
+    """
+    rates: Dict[str, Tuple[float, float]] = {name: DEFAULT_HOT_RATE for name in HOT_LOGGERS}
+    for name, value in _env_json('LOG_RATE_LIMITS').items():
+        per_second, burst = (value if isinstance(value, (list, tuple)) else (value, float(value) * 5))
+        if float(per_second) > 0:
+            rates[name] = (float(per_second), max(float(burst), 1.0))
+        else:
+            rates.pop(name, None)
+    sample_every = {name: int(value) for name, value in _env_json('LOG_SAMPLING').items()}
+    return LogRateLimiter(rates, sample_every)
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks the caller and defers formatting to the listener"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message now since args may change after the call returns;
+        # JSON formatting and tracebacks are left to the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def _stop_listener(listener: logging.handlers.QueueListener):
+    try:
+        listener.stop()
+    except Exception:
+        pass
+
+def start_queue_logging(handlers: Iterable[logging.Handler], root: Optional[logging.Logger] = None,
+                        maxsize: Optional[int] = None,
+                        filters: Iterable[logging.Filter] = ()) -> Tuple[AsyncQueueHandler, logging.handlers.QueueListener]:
+    """Attach one AsyncQueueHandler to root and emit to handlers from a listener thread"""
+    log_queue: queue.Queue = queue.Queue(maxsize if maxsize is not None else int(os.getenv('LOG_QUEUE_SIZE', '10000')))
+    queue_handler = AsyncQueueHandler(log_queue)
+    for log_filter in filters:
+        queue_handler.addFilter(log_filter)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(_stop_listener, listener)
+
+    (root or logging.getLogger()).addHandler(queue_handler)
+    return queue_handler, listener
@@ -4,73 +4,14 @@ Structured logging configuration for GKE and Cloud Run
 """
 
 import os
-import json
 import logging
 import logging.handlers
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 from google.cloud import logging as gcp_logging
 from google.cloud.logging.handlers import CloudLoggingHandler
 
-class StructuredFormatter(logging.Formatter):
-    """Custom formatter for structured JSON logging"""
-    
-    def format(self, record: logging.LogRecord) -> str:
-        """Format log record as structured JSON"""
-        
-        # Base log entry
-        log_entry = {
-            'timestamp': datetime.fromtimestamp(record.created).isoformat(),
-            'level': record.levelname,
-            'logger': record.name,
-            'message': record.getMessage(),
-            'module': record.module,
-            'function': record.funcName,
-            'line': record.lineno
-        }
-        
-        # Add service information
-        log_entry['service'] = {
-            'name': os.getenv('SERVICE_NAME', 'omtx-hub-api'),
-            'version': os.getenv('SERVICE_VERSION', '1.0.0'),
-            'environment': os.getenv('ENVIRONMENT', 'development'),
-            'instance': os.getenv('HOSTNAME', 'unknown')
-        }
-        
-        # Add request context if available
-        if hasattr(record, 'request_id'):
-            log_entry['request_id'] = record.request_id
-        
-        if hasattr(record, 'user_id'):
-            log_entry['user_id'] = record.user_id
-        
-        if hasattr(record, 'job_id'):
-            log_entry['job_id'] = record.job_id
-        
-        # Add exception information
-        if record.exc_info:
-            log_entry['exception'] = {
-                'type': record.exc_info[0].__name__ if record.exc_info[0] else None,
-                'message': str(record.exc_info[1]) if record.exc_info[1] else None,
-                'traceback': self.formatException(record.exc_info)
-            }
-        
-        # Add extra fields
-        if hasattr(record, 'extra_data'):
-            log_entry.update(record.extra_data)
-        
-        # Add performance metrics
-        if hasattr(record, 'duration'):
-            log_entry['performance'] = {
-                'duration_ms': record.duration,
-                'operation': getattr(record, 'operation', 'unknown')
-            }
-        
-        # Add alert data for monitoring
-        if hasattr(record, 'alert_data'):
-            log_entry['alert'] = record.alert_data
-        
-        return json.dumps(log_entry, default=str)
+from services.log_pipeline import StructuredFormatter, rate_limiter_from_env, start_queue_logging
 
 class LoggingService:
     """Service for configuring application-wide logging"""
@@ -82,6 +23,11 @@ class LoggingService:
         
         self.log_level = self._get_log_level()
         self.use_cloud_logging = self.environment == 'production'
+        # Handlers run on a listener thread; callers only enqueue
+        self.use_async_logging = os.getenv('LOG_ASYNC', 'true').lower() == 'true'
+        self.rate_limiter = rate_limiter_from_env()
+        self.queue_handler = None
+        self.queue_listener = None
         
         self._setup_logging()
     
@@ -103,9 +49,18 @@ class LoggingService:
         root_logger.setLevel(self.log_level)
         
         if self.use_cloud_logging:
-            self._setup_cloud_logging()
+            handlers = self._setup_cloud_logging()
         else:
-            self._setup_local_logging()
+            handlers = self._setup_local_logging()
+        
+        if self.use_async_logging:
+            self.queue_handler, self.queue_listener = start_queue_logging(
+                handlers, root_logger, filters=[self.rate_limiter]
+            )
+        else:
+            for handler in handlers:
+                handler.addFilter(self.rate_limiter)
+                root_logger.addHandler(handler)
         
         # Configure specific loggers
         self._configure_specific_loggers()
@@ -119,12 +74,14 @@ class LoggingService:
                     'environment': self.environment,
                     'log_level': logging.getLevelName(self.log_level),
                     'cloud_logging': self.use_cloud_logging,
+                    'async': self.use_async_logging,
+                    'rate_limited_loggers': sorted(self.rate_limiter.rates),
                     'service': self.service_name
                 }
             }
         )
     
-    def _setup_cloud_logging(self):
+    def _setup_cloud_logging(self) -> List[logging.Handler]:
         """Setup Google Cloud Logging for production"""
         
         try:
@@ -142,29 +99,29 @@ class LoggingService:
                 }
             )
             
-            # Use structured formatter for Cloud Logging too
-            cloud_handler.setFormatter(StructuredFormatter())
-            
-            # Add to root logger
-            root_logger = logging.getLogger()
-            root_logger.addHandler(cloud_handler)
+            # Use structured formatter for Cloud Logging too (one instance shared by all handlers)
+            formatter = StructuredFormatter()
+            cloud_handler.setFormatter(formatter)
             
             # Also add console handler for local debugging
             console_handler = logging.StreamHandler()
-            console_handler.setFormatter(StructuredFormatter())
-            root_logger.addHandler(console_handler)
+            console_handler.setFormatter(formatter)
+            
+            return [cloud_handler, console_handler]
             
         except Exception as e:
             # Fallback to local logging if Cloud Logging fails
             print(f"Failed to setup Cloud Logging: {e}")
-            self._setup_local_logging()
+            return self._setup_local_logging()
     
-    def _setup_local_logging(self):
+    def _setup_local_logging(self) -> List[logging.Handler]:
         """Setup local file and console logging for development"""
         
+        formatter = StructuredFormatter()
+        
         # Console handler
         console_handler = logging.StreamHandler()
-        console_handler.setFormatter(StructuredFormatter())
+        console_handler.setFormatter(formatter)
         
         # File handler
         log_file = os.path.join(os.getcwd(), 'logs', f'{self.service_name}.log')
@@ -175,12 +132,9 @@ class LoggingService:
             maxBytes=50 * 1024 * 1024,  # 50MB
             backupCount=5
         )
-        file_handler.setFormatter(StructuredFormatter())
+        file_handler.setFormatter(formatter)
         
-        # Add handlers to root logger
-        root_logger = logging.getLogger()
-        root_logger.addHandler(console_handler)
-        root_logger.addHandler(file_handler)
+        return [console_handler, file_handler]
     
     def _configure_specific_loggers(self):
         """Configure specific logger behaviors"""
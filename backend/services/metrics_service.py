@@ -3,6 +3,7 @@ Metrics Service for OMTX-Hub
 Prometheus metrics collection and exposure
 """
 
+import os
 import time
 import logging
 from typing import Dict, Any
@@ -10,6 +11,8 @@ from prometheus_client import Counter, Histogram, Gauge, Info, generate_latest,
 from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 
+from services.io_budget import io_budget, RequestIO
+
 logger = logging.getLogger(__name__)
 
 # Prometheus Metrics
@@ -30,6 +33,36 @@ active_requests = Gauge(
     'Active HTTP requests'
 )
 
+# Per-request storage I/O (see services/io_budget.py)
+http_request_io_operations = Histogram(
+    'http_request_io_operations',
+    'Storage operations (documents/objects/commands) per HTTP request',
+    ['endpoint', 'backend', 'kind'],
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+)
+
+http_request_io_seconds = Histogram(
+    'http_request_io_seconds',
+    'Time per HTTP request spent waiting on a storage backend',
+    ['endpoint', 'backend']
+)
+
+http_request_io_bytes = Histogram(
+    'http_request_io_bytes',
+    'Bytes per HTTP request transferred to and from a storage backend',
+    ['endpoint', 'backend'],
+    buckets=(1024, 16384, 131072, 1048576, 8388608, 67108864, 268435456)
+)
+
+http_request_io_budget_exceeded_total = Counter(
+    'http_request_io_budget_exceeded_total',
+    'HTTP requests that exceeded their I/O budget',
+    ['endpoint', 'limit']
+)
+
+IO_TRACE_HEADER = os.getenv('IO_TRACE_HEADER', 'false').lower() == 'true'
+IO_TRACE_ON_REQUEST = os.getenv('ENVIRONMENT', 'development') != 'production'
+
 # Job Metrics
 jobs_total = Counter(
     'omtx_hub_jobs_total',
@@ -121,6 +154,7 @@ class MetricsMiddleware(BaseHTTPMiddleware):
         # Start timing
         start_time = time.time()
         active_requests.inc()
+        io, io_token = io_budget.begin()
         
         try:
             # Process request
@@ -143,6 +177,10 @@ class MetricsMiddleware(BaseHTTPMiddleware):
                 endpoint=endpoint
             ).observe(duration)
             
+            self._record_io(endpoint, io)
+            if io.backends and (IO_TRACE_HEADER or (IO_TRACE_ON_REQUEST and request.headers.get('x-debug-io'))):
+                response.headers['Server-Timing'] = io.server_timing()
+            
             return response
             
         except Exception as e:
@@ -162,14 +200,32 @@ class MetricsMiddleware(BaseHTTPMiddleware):
                 endpoint=endpoint
             ).observe(duration)
             
+            self._record_io(endpoint, io)
             raise
             
         finally:
+            io_budget.end(io_token)
             active_requests.dec()
     
+    def _record_io(self, endpoint: str, io: RequestIO):
+        """Export the request's storage I/O and check it against the endpoint's budget"""
+        io.endpoint = endpoint
+        for backend, stats in io.backends.items():
+            http_request_io_operations.labels(endpoint=endpoint, backend=backend, kind='read').observe(stats.reads)
+            http_request_io_operations.labels(endpoint=endpoint, backend=backend, kind='write').observe(stats.writes)
+            http_request_io_seconds.labels(endpoint=endpoint, backend=backend).observe(stats.seconds)
+            http_request_io_bytes.labels(endpoint=endpoint, backend=backend).observe(stats.bytes)
+        for limit, _, _ in io_budget.check(io):
+            http_request_io_budget_exceeded_total.labels(endpoint=endpoint, limit=limit).inc()
+    
     def _get_endpoint_pattern(self, request: Request) -> str:
         """Extract endpoint pattern from request"""
         
+        # Matched route template (e.g. /api/v1/batches/{batch_id}/results) once routing ran
+        route = request.scope.get("route")
+        if getattr(route, "path", None):
+            return route.path
+        
         path = request.url.path
         
         # Map common patterns
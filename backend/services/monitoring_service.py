@@ -14,6 +14,7 @@ from google.cloud import monitoring_v3
 from google.cloud import logging as gcp_logging
 from google.cloud import storage
 from google.cloud import firestore
+from config.gcp_clients import get_firestore_client, get_storage_client
 
 logger = logging.getLogger(__name__)
 
@@ -49,8 +50,8 @@ class MonitoringService:
         self.project_id = os.getenv('GCP_PROJECT_ID', 'om-models')
         self.monitoring_client = monitoring_v3.MetricServiceClient()
         self.logging_client = gcp_logging.Client()
-        self.storage_client = storage.Client()
-        self.db = firestore.Client()
+        self.storage_client = get_storage_client()
+        self.db = get_firestore_client()
         
         # Monitoring configuration
         self.metrics_interval = 60  # seconds
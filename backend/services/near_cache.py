@@ -0,0 +1,426 @@
+"""
+Near Cache
+Two-tier cache: a bounded in-process LRU in front of Redis, kept coherent
+across pods with version stamps and pub/sub invalidation.
+
+Entries are tagged with scopes (typically a batch or job id). Invalidating a
+scope bumps its version in Redis (INCR) and broadcasts the new version on one
+pub/sub channel, so every pod drops local copies written under an older
+version. Redis-tier reads are checked against the authoritative version
+counters, so a pod never adopts an entry from another pod that has since been
+invalidated. If a broadcast is missed the local copy still expires after
+local_ttl, which is the staleness bound reported in stats.
+
+When Redis is unavailable every cache degrades to its local tier only, which
+is how these caches behaved before.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+VERSION_PREFIX = "cache:ver:"
+MAX_STALENESS_SECONDS = float(os.getenv("CACHE_MAX_STALENESS_SECONDS", "30"))
+
+class RedisCoherenceBackend:
+    """Remote tier and invalidation transport on top of the shared Redis cache service"""
+
+    def __init__(self, cache_service=None):
+        self._cache_service = cache_service
+
+    @property
+    def cache_service(self):
+        if self._cache_service is None:
+            from services.redis_cache_service import cache_service
+            self._cache_service = cache_service
+        return self._cache_service
+
+    @property
+    def available(self) -> bool:
+        service = self.cache_service
+        return bool(service.connected and service.redis_client and not service._is_circuit_breaker_open())
+
+    async def connect(self) -> bool:
+        if not self.cache_service.connected:
+            await self.cache_service.initialize()
+        return self.available
+
+    async def get(self, key: str) -> Any:
+        return await self.cache_service.get(key, fallback=False)
+
+    async def set(self, key: str, value: Any, ttl: int) -> None:
+        await self.cache_service.set(key, value, ttl, fallback=False)
+
+    async def delete(self, key: str) -> None:
+        await self.cache_service.delete(key)
+
+    async def incr(self, name: str) -> int:
+        return int(await self.cache_service.redis_client.incr(name))
+
+    async def mget(self, names: List[str]) -> List[Optional[int]]:
+        values = await self.cache_service.redis_client.mget(names)
+        return [int(value) if value is not None else None for value in values]
+
+    async def publish(self, message: Dict[str, Any]) -> None:
+        await self.cache_service.redis_client.publish(INVALIDATION_CHANNEL, json.dumps(message))
+
+    async def listen(self, on_message: Callable[[Dict[str, Any]], None]) -> None:
+        pubsub = self.cache_service.redis_client.pubsub()
+        await pubsub.subscribe(INVALIDATION_CHANNEL)
+        try:
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message and message.get('type') == 'message':
+                    on_message(json.loads(message['data']))
+        finally:
+            await pubsub.unsubscribe(INVALIDATION_CHANNEL)
+            await pubsub.close()
+
+class CoherenceBus:
+    """Per-pod scope versions and the single invalidation subscription shared by all near caches"""
+
+    def __init__(self, backend=None, max_scopes: int = 50_000, clock: Callable[[], float] = time.time):
+        self.backend = backend or RedisCoherenceBackend()
+        self.max_scopes = max_scopes
+        self.clock = clock
+        self.node_id = uuid.uuid4().hex[:12]
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        self._caches: Dict[str, 'NearCache'] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self.stats = {'scope_bumps': 0, 'messages_sent': 0, 'messages_received': 0,
+                      'resyncs': 0, 'last_propagation_ms': None, 'max_propagation_ms': 0.0}
+
+    @property
+    def available(self) -> bool:
+        try:
+            return self.backend.available
+        except Exception:
+            return False
+
+    def register(self, cache: 'NearCache') -> None:
+        self._caches[cache.namespace] = cache
+
+    # === Versions ===
+
+    def version(self, scope: str) -> int:
+        return self._versions.get(scope, 0)
+
+    def observe(self, scope: str, version: int) -> bool:
+        """Record a version seen elsewhere; True if it was newer than ours"""
+        if version <= self._versions.get(scope, 0):
+            return False
+        self._versions[scope] = version
+        self._versions.move_to_end(scope)
+        while len(self._versions) > self.max_scopes:
+            self._versions.popitem(last=False)
+        return True
+
+    async def bump(self, scope: str) -> int:
+        """Start a new version of a scope here and on every other pod"""
+        self.stats['scope_bumps'] += 1
+        version = self.version(scope) + 1
+        if self.available:
+            try:
+                version = max(version, await self.backend.incr(VERSION_PREFIX + scope))
+                self.observe(scope, version)
+                await self._publish({'scope': scope, 'version': version})
+                return version
+            except Exception as e:
+                logger.warning(f"⚠️ Cache version bump failed for {scope}, local only: {e}")
+        self.observe(scope, version)
+        return version
+
+    async def current_versions(self, scopes: List[str]) -> Dict[str, int]:
+        """Authoritative versions from Redis (falls back to the local view)"""
+        if scopes and self.available:
+            try:
+                remote = await self.backend.mget([VERSION_PREFIX + scope for scope in scopes])
+                for scope, version in zip(scopes, remote):
+                    if version is not None:
+                        self.observe(scope, version)
+            except Exception as e:
+                logger.debug(f"Could not read cache versions: {e}")
+        return {scope: self.version(scope) for scope in scopes}
+
+    # === Pub/sub ===
+
+    async def publish_key(self, namespace: str, key: str) -> None:
+        await self._publish({'namespace': namespace, 'key': key})
+
+    async def _publish(self, message: Dict[str, Any]) -> None:
+        if not self.available:
+            return
+        try:
+            await self.backend.publish({**message, 'origin': self.node_id, 'sent_at': self.clock()})
+            self.stats['messages_sent'] += 1
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to broadcast cache invalidation: {e}")
+
+    def handle_message(self, message: Dict[str, Any]) -> None:
+        if message.get('origin') == self.node_id:
+            return
+        self.stats['messages_received'] += 1
+        if message.get('sent_at'):
+            lag_ms = max(0.0, (self.clock() - message['sent_at']) * 1000)
+            self.stats['last_propagation_ms'] = round(lag_ms, 2)
+            self.stats['max_propagation_ms'] = round(max(self.stats['max_propagation_ms'], lag_ms), 2)
+
+        if 'scope' in message:
+            self.observe(message['scope'], int(message['version']))
+        elif message.get('namespace') in self._caches:
+            self._caches[message['namespace']].invalidate_local(message['key'])
+
+    async def start(self) -> bool:
+        """Connect and subscribe once per pod; safe to call repeatedly"""
+        if self._listener is not None and not self._listener.done():
+            return True
+        try:
+            if not await self.backend.connect():
+                logger.info("ℹ️ Cache coherence disabled: Redis unavailable, near caches stay local")
+                return False
+        except Exception as e:
+            logger.warning(f"⚠️ Cache coherence disabled: {e}")
+            return False
+        self._listener = asyncio.create_task(self._listen())
+        logger.info(f"✅ Cache coherence bus started (node {self.node_id})")
+        return True
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                await self.backend.listen(self.handle_message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Cache invalidation listener dropped, resyncing: {e}")
+            # Anything published while we were not listening is lost: drop local tiers
+            self.stats['resyncs'] += 1
+            for cache in self._caches.values():
+                cache.clear_local()
+            await asyncio.sleep(1.0)
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'node_id': self.node_id,
+            'connected': self.available,
+            'listening': self._listener is not None and not self._listener.done(),
+            'tracked_scopes': len(self._versions),
+            'caches': {namespace: cache.stats() for namespace, cache in self._caches.items()},
+        }
+
+class NearCache:
+    """
+    Bounded LRU near-cache for one namespace, backed by Redis when shared=True.
+
+    Values in shared caches must be JSON-serializable; local-only caches
+    (shared=False) hold any object and still take part in invalidation.
+    """
+
+    def __init__(self, namespace: str, max_entries: int = 1000, ttl: float = 300,
+                 shared: bool = True, bus: Optional[CoherenceBus] = None,
+                 max_staleness: float = MAX_STALENESS_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        self.bus = bus or coherence_bus
+        self.local_ttl = min(ttl, max_staleness)
+        self.clock = clock
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self.counters = {'local_hits': 0, 'remote_hits': 0, 'misses': 0, 'loads': 0,
+                         'coalesced_loads': 0, 'stale_rejects': 0, 'evictions': 0, 'invalidations': 0}
+        self.bus.register(self)
+
+    def _remote_key(self, key: str) -> str:
+        return f"near:{self.namespace}:{key}"
+
+    def _is_current(self, versions: Dict[str, int]) -> bool:
+        return all(version >= self.bus.version(scope) for scope, version in versions.items())
+
+    # === Local tier ===
+
+    def get_local(self, key: str) -> Any:
+        """Local tier only; usable from synchronous code"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.clock() >= entry['expires_at'] or not self._is_current(entry['versions']):
+            if self.clock() < entry['expires_at']:
+                self.counters['stale_rejects'] += 1
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        self.counters['local_hits'] += 1
+        return entry['value']
+
+    def set_local(self, key: str, value: Any, scopes: Iterable[str] = (), ttl: Optional[float] = None,
+                  versions: Optional[Dict[str, int]] = None) -> None:
+        if versions is None:
+            versions = {scope: self.bus.version(scope) for scope in scopes}
+        self._entries[key] = {
+            'value': value,
+            'versions': versions,
+            'expires_at': self.clock() + min(ttl or self.ttl, self.local_ttl),
+        }
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def invalidate_local(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def invalidate_local_where(self, predicate: Callable[[str], bool]) -> int:
+        keys = [key for key in self._entries if predicate(key)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def purge_expired(self) -> int:
+        now = self.clock()
+        return self.invalidate_local_where(
+            lambda key: now >= self._entries[key]['expires_at'] or not self._is_current(self._entries[key]['versions'])
+        )
+
+    def clear_local(self) -> None:
+        self._entries.clear()
+
+    # === Both tiers ===
+
+    async def get(self, key: str) -> Any:
+        value = self.get_local(key)
+        if value is not None:
+            return value
+        if self.shared and self.bus.available:
+            try:
+                remote = await self.bus.backend.get(self._remote_key(key))
+            except Exception as e:
+                logger.debug(f"Near cache remote read failed for {self.namespace}:{key}: {e}")
+                remote = None
+            if remote is not None:
+                versions = remote.get('versions', {})
+                current = await self.bus.current_versions(list(versions))
+                if all(versions[scope] >= current[scope] for scope in versions):
+                    self.counters['remote_hits'] += 1
+                    self.set_local(key, remote['value'], versions=versions)
+                    return remote['value']
+                self.counters['stale_rejects'] += 1
+        self.counters['misses'] += 1
+        return None
+
+    async def set(self, key: str, value: Any, scopes: Iterable[str] = (), ttl: Optional[float] = None,
+                  versions: Optional[Dict[str, int]] = None) -> None:
+        """
+        Store in both tiers. Entries are tagged with the authoritative scope
+        versions, not this pod's view, which lags when a broadcast is missed;
+        pass versions read before computing the value to tag it with those.
+        """
+        if versions is None:
+            versions = await self.bus.current_versions(list(scopes))
+        self.set_local(key, value, ttl=ttl, versions=versions)
+        if self.shared and self.bus.available:
+            try:
+                await self.bus.backend.set(self._remote_key(key), {'value': value, 'versions': versions},
+                                           int(ttl or self.ttl))
+            except Exception as e:
+                logger.debug(f"Near cache remote write failed for {self.namespace}:{key}: {e}")
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]],
+                          scopes: Iterable[str] = (), ttl: Optional[float] = None) -> Any:
+        """
+        Cached value or the loader's result, with one load per key at a time.
+
+        Authoritative scope versions are captured before loading, so a value
+        loaded while an invalidation was in flight is stored as already stale.
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+        if key in self._loading:
+            self.counters['coalesced_loads'] += 1
+            return await asyncio.shield(self._loading[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            versions = await self.bus.current_versions(list(scopes))
+            self.counters['loads'] += 1
+            value = await loader()
+            if value is not None:
+                await self.set(key, value, ttl=ttl, versions=versions)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # consumed here; waiters re-raise it
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            self._loading.pop(key, None)
+
+    async def invalidate(self, key: Optional[str] = None, scopes: Iterable[str] = ()) -> None:
+        """Drop a key and/or bump scopes on every pod"""
+        self.counters['invalidations'] += 1
+        for scope in scopes:
+            await self.bus.bump(scope)
+        if key is not None:
+            self.invalidate_local(key)
+            if self.bus.available:
+                if self.shared:
+                    try:
+                        await self.bus.backend.delete(self._remote_key(key))
+                    except Exception as e:
+                        logger.debug(f"Near cache remote delete failed for {self.namespace}:{key}: {e}")
+                await self.bus.publish_key(self.namespace, key)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters['local_hits'] + self.counters['remote_hits'] + self.counters['misses']
+        hits = self.counters['local_hits'] + self.counters['remote_hits']
+        return {
+            **self.counters,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'shared': self.shared,
+            'hit_rate_percentage': round(hits / lookups * 100, 2) if lookups else 0.0,
+            'staleness_bound_seconds': self.local_ttl,
+        }
+
+def batch_scope(batch_id: str) -> str:
+    """Scope shared by every cached view of one batch"""
+    return f"batch:{batch_id}"
+
+def job_scope(job_id: str) -> str:
+    return f"job:{job_id}"
+
+def spawn(coro: Awaitable[Any]) -> None:
+    """Run a cache side effect from synchronous code when an event loop is available"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        coro.close()
+        return
+    loop.create_task(coro)
+
+# Global instance
+coherence_bus = CoherenceBus()
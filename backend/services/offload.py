@@ -0,0 +1,128 @@
+"""
+Offload
+Shared, bounded thread pool for the synchronous Google SDK calls made from
+async code (GCS, Firestore, Cloud Tasks).
+
+Calling a blocking client directly inside `async def` stalls every request on
+the pod for the length of the call. run_sync() and the @offload decorator run
+the call on one process-wide executor instead:
+
+- OFFLOAD_MAX_WORKERS threads in total, so fan-out (gather over 500 children)
+  cannot grow the pool or exhaust connection pools;
+- at most OFFLOAD_MAX_PENDING calls queued or running per event loop; further
+  callers wait on the loop (not a thread) until a slot frees up;
+- the caller's context is copied into the worker, so request I/O attribution
+  (services.io_budget) and logging context follow the call.
+
+    from services.offload import offload, run_sync
+
+    @offload
+    def _load_json(self, path):          # body stays synchronous
+        return json.loads(gcp_storage.download_file(path))
+
+    data = await self._load_json(path)   # awaitable, runs on the pool
+    job = await run_sync(unified_job_manager.get_job, job_id)
+"""
+
+import os
+import asyncio
+import logging
+import functools
+import threading
+import contextvars
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+OFFLOAD_MAX_WORKERS = int(os.getenv('OFFLOAD_MAX_WORKERS', '32'))
+OFFLOAD_MAX_PENDING = int(os.getenv('OFFLOAD_MAX_PENDING', '256'))
+
+class OffloadExecutor:
+    """Process-wide thread pool with a per-loop cap on queued work"""
+
+    def __init__(self, max_workers: int = OFFLOAD_MAX_WORKERS, max_pending: int = OFFLOAD_MAX_PENDING,
+                 thread_name_prefix: str = "offload"):
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, max_workers)
+        self.thread_name_prefix = thread_name_prefix
+        self.submitted = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.waited = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix=self.thread_name_prefix
+                    )
+        return self._executor
+
+    def _slot(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = asyncio.Semaphore(self.max_pending)
+        return slots
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """Run a blocking callable on the pool and await its result"""
+        loop = asyncio.get_running_loop()
+        call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+        slots = self._slot(loop)
+        if slots.locked():
+            self.waited += 1
+        async with slots:
+            self.submitted += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                return await loop.run_in_executor(self.executor, call)
+            finally:
+                self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'submitted': self.submitted,
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'waited_for_slot': self.waited,
+            'threads': len(self._executor._threads) if self._executor is not None else 0
+        }
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+async def run_sync(func: Callable[..., T], *args, **kwargs) -> T:
+    """Await a blocking call on the shared offload executor"""
+    return await offload_executor.run(func, *args, **kwargs)
+
+def offload(func: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+    """
+    Make a blocking function awaitable on the shared offload executor.
+
+    The original stays available as `.sync` for callers already running in a
+    worker thread.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await offload_executor.run(func, *args, **kwargs)
+
+    wrapper.sync = func
+    return wrapper
+
+# Global instance
+offload_executor = OffloadExecutor()
@@ -5,11 +5,18 @@ Integrates Boltz-2 post-processing into existing OMTX-Hub pipeline.
 
 import asyncio
 import logging
+import os
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 
-from services.boltz_post_processor import post_processor
+from services.boltz_post_processor import (
+    post_processor,
+    get_batch_post_processor,
+    parse_contacts,
+    BindingModeClusterState
+)
 from services.gcp_storage_service import gcp_storage_service
+from services.ligand_feature_store import ligand_feature_store
 from database.unified_job_manager import unified_job_manager
 try:
     from services.redis_cache_service import get_redis_client
@@ -19,6 +26,12 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Batches at or above this size are post-processed on the process pool
+PROCESS_POOL_BATCH_THRESHOLD = int(os.getenv("POST_PROCESSING_PROCESS_POOL_THRESHOLD", "200"))
+
+# Concurrent structure downloads while preparing a batch
+STRUCTURE_FETCH_CONCURRENCY = int(os.getenv("POST_PROCESSING_FETCH_CONCURRENCY", "16"))
+
 class PostProcessingIntegration:
     """
     Integrates post-processing into the existing OMTX-Hub pipeline.
@@ -26,6 +39,8 @@ class PostProcessingIntegration:
     Features:
     - Automatic trigger when jobs complete
     - Batch-level processing when all jobs finish
+    - Incremental batch analytics while children are still completing
+    - Process-pool execution for large batches
     - Performance monitoring and caching
     - Graceful fallback when dependencies unavailable
     """
@@ -71,6 +86,14 @@ class PostProcessingIntegration:
             # Cache processing status
             await self._cache_processing_status(job_id, success)
             
+            # Assign late children to the batch's existing binding-mode clusters
+            if success and results.get("success"):
+                await self._assign_incremental_cluster(job_id, job_data.get("batch_parent_id"), results)
+            
+            # Fold this child into the live batch analytics
+            if success:
+                await self._update_incremental_analytics(job_id, job_data, results)
+            
             # Check if batch is complete and trigger batch processing
             if success:
                 await self._check_and_process_batch(job_data.get("batch_parent_id"))
@@ -85,7 +108,8 @@ class PostProcessingIntegration:
     async def process_batch(self, batch_id: str, force: bool = False) -> bool:
         """
         Process entire batch for clustering and aggregation.
-        Called automatically when all jobs in batch complete.
+        Called automatically when all jobs in batch complete; hotspots, scaffolds
+        and metric summaries are already available incrementally before then.
         """
         try:
             # Check if already processed
@@ -101,27 +125,27 @@ class PostProcessingIntegration:
                 logger.warning(f"No completed jobs found for batch {batch_id}")
                 return False
             
-            # Ensure all jobs have structure files
-            jobs_with_structures = []
-            for job in completed_jobs:
-                structure_path = await self._ensure_structure_file(job)
-                if structure_path:
-                    job["structure_file"] = structure_path
-                    jobs_with_structures.append(job)
+            # Ensure all jobs have structure files (bounded concurrent downloads)
+            jobs_with_structures = await self._ensure_structure_files(completed_jobs)
             
             if not jobs_with_structures:
                 logger.warning(f"No jobs with structure files for batch {batch_id}")
                 return False
             
-            # Process batch
-            batch_analysis = await post_processor.process_batch_async(jobs_with_structures, batch_id)
+            # Large batches use every core; small ones stay on the shared thread pool
+            processor = (
+                get_batch_post_processor()
+                if len(jobs_with_structures) >= PROCESS_POOL_BATCH_THRESHOLD
+                else post_processor
+            )
+            batch_analysis = await processor.process_batch_async(jobs_with_structures, batch_id)
             
             # Store batch results
             success = await self._store_batch_results(batch_id, batch_analysis)
             
-            # Update individual job cluster assignments
-            if success and batch_analysis.cluster_summary.get("cluster_assignments"):
-                await self._update_job_clusters(jobs_with_structures, batch_analysis)
+            # Persist clustering state and individual job cluster assignments
+            if success and batch_analysis.cluster_assignments:
+                await self._update_job_clusters(batch_id, batch_analysis)
             
             # Cache batch processing status
             await self._cache_batch_status(batch_id, success)
@@ -136,9 +160,10 @@ class PostProcessingIntegration:
             logger.error(f"Error post-processing batch {batch_id}: {e}")
             return False
     
-    async def get_batch_analysis(self, batch_id: str) -> Optional[Dict[str, Any]]:
+    async def get_batch_analysis(self, batch_id: str, include_partial: bool = True) -> Optional[Dict[str, Any]]:
         """
         Retrieve batch analysis results with caching.
+        Falls back to live incremental analytics while the batch is still running.
         """
         try:
             # Check cache first
@@ -162,7 +187,8 @@ class PostProcessingIntegration:
                     "processing_stats": {
                         "total_jobs": batch_analysis.total_jobs,
                         "processed_jobs": batch_analysis.processed_jobs,
-                        "success_rate": batch_analysis.processed_jobs / max(batch_analysis.total_jobs, 1)
+                        "success_rate": batch_analysis.processed_jobs / max(batch_analysis.total_jobs, 1),
+                        "stage_timings": batch_analysis.stage_timings
                     }
                 }
                 
@@ -172,12 +198,52 @@ class PostProcessingIntegration:
                 
                 return result
             
+            if include_partial:
+                # Live analytics change with every child, so they are never cached
+                return await self._get_partial_batch_analysis(firestore_service, batch_id)
+            
             return None
             
         except Exception as e:
             logger.error(f"Error retrieving batch analysis for {batch_id}: {e}")
             return None
     
+    async def _get_partial_batch_analysis(self, firestore_service, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Build a partial analysis from the live incremental analytics"""
+        live = await firestore_service.get_incremental_analytics(batch_id)
+        if not live:
+            return None
+        
+        total_jobs = None
+        try:
+            batch_parent = await self.job_manager.get_job(batch_id)
+            if batch_parent:
+                total_jobs = batch_parent.get("batch_total_ligands")
+        except Exception as e:
+            logger.debug(f"Could not load batch parent {batch_id} for live analytics: {e}")
+        
+        return live.to_analysis_dict(total_jobs)
+    
+    async def _ensure_structure_files(self, jobs: List[Dict]) -> List[Dict]:
+        """
+        Ensure structure files for many jobs with bounded download concurrency.
+        Returns the jobs that have a local structure file, in input order.
+        """
+        semaphore = asyncio.Semaphore(STRUCTURE_FETCH_CONCURRENCY)
+        
+        async def ensure(job: Dict) -> Optional[str]:
+            async with semaphore:
+                return await self._ensure_structure_file(job)
+        
+        structure_paths = await asyncio.gather(*(ensure(job) for job in jobs))
+        
+        jobs_with_structures = []
+        for job, structure_path in zip(jobs, structure_paths):
+            if structure_path:
+                job["structure_file"] = structure_path
+                jobs_with_structures.append(job)
+        return jobs_with_structures
+    
     async def _ensure_structure_file(self, job_data: Dict) -> Optional[str]:
         """
         Ensure structure file is available locally.
@@ -199,7 +265,6 @@ class PostProcessingIntegration:
                 local_path = f"/tmp/structures/{job_id}.cif"
                 
                 # Ensure directory exists
-                import os
                 os.makedirs(os.path.dirname(local_path), exist_ok=True)
                 
                 # Decode and save
@@ -223,8 +288,11 @@ class PostProcessingIntegration:
                 local_path = f"/tmp/structures/{job_id}.cif"
                 
                 try:
-                    success = await self.storage_service.download_file(gcp_path, local_path)
-                    if success:
+                    content = await self.storage_service.download_file(gcp_path)
+                    if content:
+                        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                        with open(local_path, 'wb') as f:
+                            f.write(content)
                         return local_path
                 except Exception as e:
                     logger.debug(f"Could not download structure from GCP for job {job_id}: {e}")
@@ -254,7 +322,7 @@ class PostProcessingIntegration:
     async def _is_batch_processed(self, batch_id: str) -> bool:
         """Check if batch has been post-processed"""
         try:
-            analysis = await self.get_batch_analysis(batch_id)
+            analysis = await self.get_batch_analysis(batch_id, include_partial=False)
             return analysis is not None
         except Exception:
             return False
@@ -281,7 +349,8 @@ class PostProcessingIntegration:
                 "scaffold_diversity": analysis.scaffold_diversity,
                 "cluster_summary": analysis.cluster_summary,
                 "total_jobs": analysis.total_jobs,
-                "processed_jobs": analysis.processed_jobs
+                "processed_jobs": analysis.processed_jobs,
+                "stage_timings": analysis.stage_timings
             }
             
             return await firestore_service.store_batch_analysis(batch_id, results_dict)
@@ -289,17 +358,100 @@ class PostProcessingIntegration:
             logger.error(f"Error storing batch results for {batch_id}: {e}")
             return False
     
-    async def _update_job_clusters(self, jobs: List[Dict], batch_analysis) -> bool:
-        """Update individual jobs with cluster assignments"""
+    async def _update_job_clusters(self, batch_id: str, batch_analysis) -> bool:
+        """Update individual jobs with cluster assignments and persist clustering state"""
         try:
-            # This would update cluster_id and cluster_label for each job
-            # Implementation depends on how cluster assignments are stored
-            # For now, we'll skip this as it requires cluster assignment tracking
-            return True
+            from database.post_processing_schema import FirestorePostProcessingService
+            firestore_service = FirestorePostProcessingService(self.job_manager.db)
+            
+            state = batch_analysis.cluster_state
+            if state is not None:
+                await firestore_service.store_cluster_state(batch_id, state.to_dict())
+            
+            assignments = {
+                job_id: {
+                    "cluster_id": cluster_id,
+                    "cluster_label": state.label_for(cluster_id) if state else "Novel"
+                }
+                for job_id, cluster_id in batch_analysis.cluster_assignments.items()
+            }
+            return await firestore_service.update_job_clusters(assignments)
         except Exception as e:
             logger.error(f"Error updating job clusters: {e}")
             return False
     
+    async def _assign_incremental_cluster(self, job_id: str, batch_id: Optional[str], results: Dict[str, Any]) -> None:
+        """
+        Assign a newly completed child to the batch's persisted clusters.
+        No-op until the batch has been clustered once.
+        """
+        if not batch_id:
+            return
+        
+        try:
+            from database.post_processing_schema import FirestorePostProcessingService
+            firestore_service = FirestorePostProcessingService(self.job_manager.db)
+            
+            contacts = parse_contacts(results.get("contacts_json"))
+            
+            def assign(state_dict: Dict[str, Any]):
+                state = BindingModeClusterState.from_dict(state_dict)
+                cluster_id = state.assign(contacts)
+                return state.to_dict(), (cluster_id, state.label_for(cluster_id))
+            
+            # Transactional so concurrent children don't lose centroid/count updates
+            assignment = await firestore_service.update_cluster_state(batch_id, assign)
+            if assignment is None:
+                return
+            
+            cluster_id, cluster_label = assignment
+            await firestore_service.update_job_clusters({
+                job_id: {"cluster_id": cluster_id, "cluster_label": cluster_label}
+            })
+            
+        except Exception as e:
+            logger.error(f"Error assigning incremental cluster for job {job_id}: {e}")
+    
+    async def _update_incremental_analytics(self, job_id: str, job_data: Dict, results: Dict[str, Any]) -> None:
+        """Record hotspots, scaffold and metrics for one completed child"""
+        batch_id = job_data.get("batch_parent_id")
+        if not batch_id:
+            return
+        
+        try:
+            from database.post_processing_schema import FirestorePostProcessingService
+            firestore_service = FirestorePostProcessingService(self.job_manager.db)
+            
+            smiles = post_processor.get_job_smiles(job_data)
+            scaffold_smiles = None
+            if smiles:
+                features = (await ligand_feature_store.get_many_async([smiles])).get(smiles.strip())
+                if features and features.valid:
+                    scaffold_smiles = features.scaffold_smiles
+            
+            await firestore_service.record_incremental_analytics(
+                batch_id,
+                job_id,
+                parse_contacts(results.get("contacts_json")),
+                scaffold_smiles,
+                self._extract_job_metrics(job_data)
+            )
+        except Exception as e:
+            logger.error(f"Error updating incremental analytics for job {job_id}: {e}")
+    
+    def _extract_job_metrics(self, job_data: Dict) -> Dict[str, float]:
+        """Pull affinity/confidence from whichever result block carries them"""
+        metrics = {}
+        for source in ("output_data", "results", "raw_modal_result"):
+            block = job_data.get(source) or {}
+            for metric in ("affinity", "confidence"):
+                if metric not in metrics and block.get(metric) is not None:
+                    try:
+                        metrics[metric] = float(block[metric])
+                    except (TypeError, ValueError):
+                        pass
+        return metrics
+    
     async def _check_and_process_batch(self, batch_id: Optional[str]) -> None:
         """Check if batch is complete and trigger batch processing"""
         if not batch_id:
@@ -381,7 +533,8 @@ async def trigger_batch_post_processing(batch_id: str) -> bool:
 async def get_enhanced_batch_analysis(batch_id: str) -> Optional[Dict[str, Any]]:
     """
     Public API for retrieving enhanced batch analysis.
-    Returns post-processed scientific metrics.
+    Returns post-processed scientific metrics, or live partial analytics
+    (processing_stats.partial=True) while the batch is still running.
     """
     if integration_service:
         return await integration_service.get_batch_analysis(batch_id)
@@ -7,6 +7,7 @@ High-performance caching layer for the unified batch processing system
 with intelligent cache invalidation, compression, and distributed locking.
 """
 
+import os
 import json
 import gzip
 import logging
@@ -16,6 +17,8 @@ from typing import Any, Dict, List, Optional, Union, Callable
 from datetime import datetime, timedelta
 from contextlib import asynccontextmanager
 
+from services.io_budget import instrument_redis_client
+
 try:
     import redis.asyncio as redis
     REDIS_AVAILABLE = True
@@ -134,6 +137,7 @@ class ProductionCacheService:
                 retry_on_timeout=True,
                 health_check_interval=30
             )
+            instrument_redis_client(self.redis_client)
             
             # Test connection
             await self.redis_client.ping()
@@ -255,10 +259,12 @@ class ProductionCacheService:
         expiry = datetime.now() + timedelta(seconds=ttl)
         self.fallback_cache[key] = (value, expiry)
     
-    async def get(self, key: str, default: Any = None) -> Any:
-        """Get cached value with fallback support"""
+    async def get(self, key: str, default: Any = None, fallback: bool = True) -> Any:
+        """Get cached value with fallback support (fallback=False: Redis only)"""
         try:
             # Check circuit breaker
+            if not fallback and (self._is_circuit_breaker_open() or not self.connected):
+                return default
             if self._is_circuit_breaker_open():
                 logger.debug(f"🔴 Circuit breaker open, using fallback for key: {key}")
                 result = await self._fallback_get(key)
@@ -278,7 +284,7 @@ class ProductionCacheService:
                     return value
             
             # Try fallback cache
-            result = await self._fallback_get(key)
+            result = await self._fallback_get(key) if fallback else None
             if result is not None:
                 self.cache_hits += 1
                 return result
@@ -289,6 +295,8 @@ class ProductionCacheService:
         except Exception as e:
             logger.warning(f"Cache get error for key {key}: {e}")
             self._record_failure()
+            if not fallback:
+                return default
             
             # Try fallback
             result = await self._fallback_get(key)
@@ -299,11 +307,12 @@ class ProductionCacheService:
             self.cache_misses += 1
             return default
     
-    async def set(self, key: str, value: Any, ttl: int = 3600) -> bool:
-        """Set cached value with fallback support"""
+    async def set(self, key: str, value: Any, ttl: int = 3600, fallback: bool = True) -> bool:
+        """Set cached value with fallback support (fallback=False: callers with their own local tier)"""
         try:
-            # Always set in fallback cache for resilience
-            await self._fallback_set(key, value, ttl)
+            # Set in fallback cache for resilience
+            if fallback:
+                await self._fallback_set(key, value, ttl)
             
             # Check circuit breaker
             if self._is_circuit_breaker_open():
@@ -432,7 +441,7 @@ class ProductionCacheService:
         }
 
 # Global cache service instance
-cache_service = ProductionCacheService()
+cache_service = ProductionCacheService(os.getenv("REDIS_URL", "redis://localhost:6379"))
 
 # Decorators for easy cache integration
 def cached(ttl: int = 3600, key_prefix: str = "api"):
@@ -14,6 +14,8 @@ from dataclasses import dataclass, asdict
 import os
 
 from middleware.rate_limiter import UserTier
+from services.runtime_estimator import runtime_estimator
+from services.io_budget import instrument_redis_client
 
 logger = logging.getLogger(__name__)
 
@@ -271,6 +273,7 @@ class ResourceQuotaManager:
                     socket_connect_timeout=5,
                     socket_timeout=5
                 )
+                instrument_redis_client(self.redis_client)
                 
                 # Test connection
                 await self.redis_client.ping()
@@ -660,6 +663,20 @@ class ResourceQuotaManager:
             storage_gb = 0.005  # 5 MB
             concurrent_jobs = 1
         
+        # Boltz-2 GPU time comes from the shared runtime model when the protein is known
+        protein_sequence = job_params.get('protein_sequence')
+        if model_type.lower() == 'boltz2' and protein_sequence and task_type in (
+            'batch_protein_ligand_screening', 'protein_ligand_binding'
+        ):
+            ligands = job_params.get('ligands') or [job_params.get('ligand_smiles', '')]
+            runtime = runtime_estimator.estimate_ligands(
+                len(protein_sequence), ligands,
+                use_msa=job_params.get('use_msa', True),
+                use_potentials=job_params.get('use_potentials', False),
+                sampling_steps=job_params.get('sampling_steps', 200)
+            )
+            gpu_minutes = runtime.wall_seconds / 60
+        
         # Add safety margin
         gpu_minutes *= 1.2  # 20% margin for variability
         storage_gb *= 1.5   # 50% margin for additional files
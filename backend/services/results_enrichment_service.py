@@ -8,6 +8,8 @@ import logging
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 
+from services.near_cache import NearCache, job_scope
+
 # Try to import GCP storage service, handle gracefully if not available
 try:
     from services.gcp_storage_service import gcp_storage_service
@@ -35,8 +37,10 @@ class ResultsEnrichmentService:
     """Enriches lightweight Firestore metadata with full GCP storage data"""
     
     def __init__(self):
-        self.enrichment_cache = {}  # Simple in-memory cache
         self.cache_ttl = 300  # 5 minutes
+        # Stored results don't change once written, so local copies may live the full TTL
+        self.enrichment_cache = NearCache("enrichment", max_entries=100, ttl=self.cache_ttl,
+                                          max_staleness=self.cache_ttl)
     
     async def enrich_job_result(self, job: Dict[str, Any]) -> Dict[str, Any]:
         """Enrich job with full results from GCP storage"""
@@ -53,7 +57,7 @@ class ResultsEnrichmentService:
         
         # Check cache first
         cache_key = f"enriched:{job_id}"
-        cached_result = self._get_from_cache(cache_key)
+        cached_result = await self.enrichment_cache.get(cache_key)
         if cached_result:
             logger.debug(f"Using cached enrichment for {job_id}")
             return cached_result
@@ -74,7 +78,7 @@ class ResultsEnrichmentService:
                 }
                 
                 # Cache the enriched result
-                self._set_cache(cache_key, enriched)
+                await self.enrichment_cache.set(cache_key, enriched, scopes=[job_scope(job_id)])
                 
                 logger.info(f"✅ Successfully enriched job {job_id}")
                 return enriched
@@ -126,49 +130,17 @@ class ResultsEnrichmentService:
         logger.warning(f"No results found in GCP storage for job {job_id}")
         return None
     
-    def _get_from_cache(self, key: str) -> Optional[Dict[str, Any]]:
-        """Get item from cache if not expired"""
-        
-        if key not in self.enrichment_cache:
-            return None
-            
-        cached_item = self.enrichment_cache[key]
-        cache_time = cached_item.get('_cache_time', 0)
-        
-        if datetime.utcnow().timestamp() - cache_time > self.cache_ttl:
-            # Cache expired
-            del self.enrichment_cache[key]
-            return None
-            
-        return cached_item.get('data')
-    
-    def _set_cache(self, key: str, data: Dict[str, Any]) -> None:
-        """Set item in cache with timestamp"""
-        
-        self.enrichment_cache[key] = {
-            'data': data,
-            '_cache_time': datetime.utcnow().timestamp()
-        }
-        
-        # Simple cache cleanup - remove old entries if cache gets too large
-        if len(self.enrichment_cache) > 100:
-            # Remove oldest 20 entries
-            sorted_keys = sorted(
-                self.enrichment_cache.keys(),
-                key=lambda k: self.enrichment_cache[k]['_cache_time']
-            )
-            for old_key in sorted_keys[:20]:
-                del self.enrichment_cache[old_key]
-    
     def clear_cache(self) -> None:
         """Clear the enrichment cache"""
-        self.enrichment_cache.clear()
+        self.enrichment_cache.clear_local()
         logger.info("🧹 Cleared enrichment cache")
     
     def get_cache_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
+        cache_stats = self.enrichment_cache.stats()
         return {
-            'cache_size': len(self.enrichment_cache),
+            **cache_stats,
+            'cache_size': cache_stats['entries'],
             'cache_ttl_seconds': self.cache_ttl,
             'gcp_available': GCP_AVAILABLE,
             'storage_available': gcp_storage_service.storage.available if gcp_storage_service else False
@@ -0,0 +1,117 @@
+"""
+Service Registry
+Lazy, named access to the backend's module-level singletons.
+
+Services are registered by import path and only imported (and constructed) on
+first get(). Code that resolves a singleton at call time (request handlers,
+startup hooks, late imports that avoid cycles) looks it up here by name:
+
+    unified_job_manager = service_registry.get("unified_job_manager")
+
+After the server starts accepting traffic, warm_up_async() touches the
+registered services in a worker thread so the first real request does not pay
+for client creation, while cold start itself stays limited to route setup.
+"""
+
+import importlib
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional
+
+from services.offload import run_sync
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ServiceSpec:
+    """Where a service lives and how to warm it"""
+    name: str
+    target: str                      # "package.module:attribute"
+    warm_attr: Optional[str] = None  # Attribute touched to force lazy connections
+    warm: bool = True
+
+class ServiceRegistry:
+    """Registry of lazily imported service singletons"""
+
+    def __init__(self):
+        self._specs: Dict[str, ServiceSpec] = {}
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        self.load_times: Dict[str, float] = {}
+
+    def register(self, name: str, target: str, warm_attr: Optional[str] = None, warm: bool = True) -> None:
+        """Register a service by import path without importing it"""
+        if ":" not in target:
+            raise ValueError(f"Service target must be 'module:attribute', got '{target}'")
+        self._specs[name] = ServiceSpec(name=name, target=target, warm_attr=warm_attr, warm=warm)
+
+    def get(self, name: str) -> Any:
+        """Import and return a service, creating it on first use"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        spec = self._specs.get(name)
+        if spec is None:
+            raise KeyError(f"Unknown service: {name}")
+
+        with self._lock:
+            if name not in self._instances:
+                started = time.perf_counter()
+                module_name, attribute = spec.target.split(":", 1)
+                self._instances[name] = getattr(importlib.import_module(module_name), attribute)
+                self.load_times[name] = time.perf_counter() - started
+                logger.debug(f"Loaded service {name} in {self.load_times[name]*1000:.1f}ms")
+            return self._instances[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Load services (and their lazy connections); failures are logged, not raised"""
+        names = list(names) if names is not None else [n for n, s in self._specs.items() if s.warm]
+        report = {}
+        for name in names:
+            started = time.perf_counter()
+            try:
+                service = self.get(name)
+                spec = self._specs[name]
+                if spec.warm_attr:
+                    getattr(service, spec.warm_attr)
+                report[name] = {"ok": True, "seconds": round(time.perf_counter() - started, 4)}
+            except Exception as e:
+                logger.warning(f"⚠️ Service warm-up failed for {name}: {e}")
+                report[name] = {"ok": False, "error": str(e)}
+        return report
+
+    async def warm_up_async(self, names: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """warm_up() in a worker thread so imports and I/O never block the event loop"""
+        started = time.perf_counter()
+        report = await run_sync(self.warm_up, names)
+        logger.info(f"🔥 Warmed {sum(r['ok'] for r in report.values())}/{len(report)} services "
+                    f"in {time.perf_counter() - started:.2f}s")
+        return report
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "loaded": self.is_loaded(name),
+                "load_ms": round(self.load_times.get(name, 0.0) * 1000, 1)
+            }
+            for name in self._specs
+        }
+
+# Global registry
+service_registry = ServiceRegistry()
+
+service_registry.register("gcp_database", "config.gcp_database:gcp_database", warm_attr="available")
+service_registry.register("gcp_storage", "config.gcp_storage:gcp_storage", warm_attr="available")
+service_registry.register("unified_job_manager", "database.unified_job_manager:unified_job_manager")
+service_registry.register("gcp_storage_service", "services.gcp_storage_service:gcp_storage_service")
+service_registry.register("unified_batch_processor", "services.unified_batch_processor:unified_batch_processor")
+service_registry.register("ligand_feature_store", "services.ligand_feature_store:ligand_feature_store")
+service_registry.register("cloud_run_batch_processor", "services.cloud_run_batch_processor:cloud_run_batch_processor", warm=False)
+service_registry.register("job_monitoring_service", "services.job_monitoring_service:job_monitoring_service", warm=False)
+service_registry.register("monitoring_service", "services.monitoring_service:monitoring_service", warm=False)
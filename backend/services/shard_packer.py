@@ -0,0 +1,267 @@
+"""
+Shard Packer
+Packs pending ligand predictions into GPU task shards.
+
+Ligands that share a protein and model parameters are grouped across batches
+(and users), since a shard manifest carries a single protein and parameter
+set. The worker still runs one prediction (MSA included) per ligand, so every
+ligand is charged its full runtime. Each group is first-fit-decreasing bin-packed into shards bounded
+by the task time budget and L4 memory estimates, then rebalanced
+longest-processing-time-first over the same shard count so no task draws all
+the large ligands. Shards are ordered by weighted fair queuing over the
+SmartJobRouter QoS lanes so bulk screens cannot starve interactive users
+sharing the fleet.
+"""
+
+import hashlib
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from services.ligand_cost import count_heavy_atoms, ligand_cost_size, lpt_assign
+from services.runtime_estimator import JobFeatures, RuntimeEstimator, runtime_estimator
+
+logger = logging.getLogger(__name__)
+
+# Keyed by SmartJobRouter QoSLane values
+LANE_WEIGHTS: Dict[str, float] = {"interactive": 4.0, "bulk": 1.0}
+DEFAULT_LANE = "bulk"
+
+# Leave headroom under the 1800s Cloud Run task timeout
+DEFAULT_TASK_SECONDS = float(os.getenv("SHARD_TASK_SECONDS", "1440"))
+DEFAULT_MAX_LIGANDS = int(os.getenv("SHARD_MAX_LIGANDS", "25"))
+# L4OptimizationConfig.max_vram_gb: conservative limit for the 24GB L4
+DEFAULT_MEMORY_GB = 22.0
+
+GroupKey = Tuple[str, bool, bool, int]
+
+def protein_hash(protein_sequence: str) -> str:
+    return hashlib.sha256(protein_sequence.strip().upper().encode()).hexdigest()
+
+def l4_memory_estimator(estimator: Optional[RuntimeEstimator] = None) -> Callable[[int, int], float]:
+    """
+    Shard memory in GB for (protein_length, num_ligands).
+
+    Uses L4MemoryManager where torch is installed (GPU images); the API
+    server falls back to the runtime model's peak memory plus the same
+    per-ligand overhead L4MemoryManager applies.
+    """
+    try:
+        from services.l4_optimization_engine import L4MemoryManager, L4OptimizationConfig
+        manager = L4MemoryManager(L4OptimizationConfig())
+        return lambda length, count: manager.estimate_memory_usage(length, count)["total_gb"]
+    except ImportError:
+        estimator = estimator or runtime_estimator
+
+        def estimate(length: int, count: int) -> float:
+            overhead = 0.05 * count * (0.8 if count > 1 else 1.0)
+            return estimator.estimate(JobFeatures(length, gpu_type="L4")).peak_memory_gb + overhead
+
+        return estimate
+
+@dataclass
+class PendingLigand:
+    """One ligand prediction waiting for a GPU shard"""
+    user_id: str
+    batch_id: str
+    ligand_index: int
+    ligand: Dict[str, Any]
+    protein_sequence: str
+    use_msa: bool = True
+    use_potentials: bool = False
+    sampling_steps: int = 200
+    lane: str = DEFAULT_LANE
+    heavy_atoms: Optional[int] = None
+    rotatable_bonds: int = 0
+
+    @property
+    def group_key(self) -> GroupKey:
+        return (protein_hash(self.protein_sequence), self.use_msa, self.use_potentials, self.sampling_steps)
+
+    def manifest_entry(self) -> Dict[str, Any]:
+        return {
+            **self.ligand,
+            'name': self.ligand.get('name', f'Ligand_{self.ligand_index + 1}'),
+            'user_id': self.user_id,
+            'batch_id': self.batch_id,
+            'ligand_index': self.ligand_index,
+        }
+
+def pending_ligands(user_id: str, batch_id: str, ligands: Sequence[Dict[str, Any]], protein_sequence: str,
+                    use_msa: bool = True, use_potentials: bool = False, lane: str = DEFAULT_LANE,
+                    descriptors: Optional[Dict[str, Any]] = None) -> List[PendingLigand]:
+    """
+    PendingLigand per batch ligand, in ligand-index order. descriptors maps
+    stripped SMILES to ligand feature-store records; ligands RDKit could not
+    parse fall back to the SMILES token heavy-atom count.
+    """
+    descriptors = descriptors or {}
+    pending = []
+    for i, ligand in enumerate(ligands):
+        features = descriptors.get((ligand.get('smiles') or '').strip())
+        valid = features is not None and features.valid
+        pending.append(PendingLigand(
+            user_id, batch_id, i, ligand, protein_sequence, use_msa, use_potentials, lane=lane,
+            heavy_atoms=features.heavy_atoms if valid else None,
+            rotatable_bonds=features.rotatable_bonds if valid else 0
+        ))
+    return pending
+
+@dataclass
+class Shard:
+    """Ligands for one GPU task; all share a protein and model parameters"""
+    group_key: GroupKey
+    protein_sequence: str
+    items: List[PendingLigand] = field(default_factory=list)
+    ligand_seconds: List[float] = field(default_factory=list)
+    memory_gb: float = 0.0
+
+    @property
+    def seconds(self) -> float:
+        return sum(self.ligand_seconds)
+
+    @property
+    def lane(self) -> str:
+        return max((item.lane for item in self.items), key=lambda lane: LANE_WEIGHTS.get(lane, 1.0))
+
+    @property
+    def batch_ids(self) -> List[str]:
+        return sorted({item.batch_id for item in self.items})
+
+    def user_seconds(self) -> Dict[str, float]:
+        """Shard time charged to each user for their own ligands"""
+        charged: Dict[str, float] = {}
+        for item, seconds in zip(self.items, self.ligand_seconds):
+            charged[item.user_id] = charged.get(item.user_id, 0.0) + seconds
+        return charged
+
+    def to_manifest(self) -> Dict[str, Any]:
+        first = self.items[0]
+        return {
+            'protein_sequence': self.protein_sequence,
+            'use_msa': first.use_msa,
+            'use_potentials': first.use_potentials,
+            'sampling_steps': first.sampling_steps,
+            'lane': self.lane,
+            'estimated_seconds': round(self.seconds, 1),
+            'estimated_memory_gb': round(self.memory_gb, 2),
+            'ligands': [item.manifest_entry() for item in self.items],
+        }
+
+class ShardPacker:
+    """Groups pending ligands by (protein, parameters) and bin-packs them into fair-ordered shards"""
+
+    def __init__(self, task_seconds: float = DEFAULT_TASK_SECONDS, memory_gb: float = DEFAULT_MEMORY_GB,
+                 max_ligands: int = DEFAULT_MAX_LIGANDS, lane_weights: Optional[Dict[str, float]] = None,
+                 estimator: Optional[RuntimeEstimator] = None,
+                 memory_estimator: Optional[Callable[[int, int], float]] = None):
+        self.task_seconds = task_seconds
+        self.memory_gb = memory_gb
+        self.max_ligands = max_ligands
+        self.lane_weights = lane_weights or LANE_WEIGHTS
+        self.estimator = estimator or runtime_estimator
+        self._memory_estimator = memory_estimator
+
+    @property
+    def memory_estimator(self) -> Callable[[int, int], float]:
+        if self._memory_estimator is None:
+            self._memory_estimator = l4_memory_estimator(self.estimator)
+        return self._memory_estimator
+
+    def _cost(self, item: PendingLigand) -> float:
+        """Seconds for this ligand's prediction, MSA included, from the runtime model"""
+        size = ligand_cost_size(item.ligand, item.heavy_atoms, item.rotatable_bonds)
+        features = JobFeatures(len(item.protein_sequence), size, item.use_msa,
+                               item.use_potentials, item.sampling_steps, "L4")
+        return self.estimator.estimate(features).wall_seconds
+
+    def _fits(self, shard: Shard, seconds: float) -> bool:
+        if len(shard.items) >= self.max_ligands or shard.seconds + seconds > self.task_seconds:
+            return False
+        return self.memory_estimator(len(shard.protein_sequence), len(shard.items) + 1) <= self.memory_gb
+
+    def _pack_group(self, key: GroupKey, members: List[PendingLigand]) -> List[Shard]:
+        costed = sorted(((self._cost(item), item) for item in members),
+                        key=lambda pair: pair[0], reverse=True)
+
+        shards: List[Shard] = []
+        for seconds, item in costed:
+            target = next((shard for shard in shards if self._fits(shard, seconds)), None)
+            if target is None:
+                # Oversized ligands still get a shard of their own
+                target = Shard(key, item.protein_sequence)
+                shards.append(target)
+            target.items.append(item)
+            target.ligand_seconds.append(seconds)
+        shards = self._balance(key, costed, len(shards)) or shards
+        for shard in shards:
+            shard.memory_gb = self.memory_estimator(len(shard.protein_sequence), len(shard.items))
+        return shards
+
+    def _balance(self, key: GroupKey, costed: List[Tuple[float, PendingLigand]],
+                 count: int) -> Optional[List[Shard]]:
+        """LPT over the shard count FFD needed; None if a balanced shard would break a budget"""
+        if count < 2:
+            return None
+        shards = []
+        for indices in lpt_assign([seconds for seconds, _ in costed], count):
+            shard = Shard(key, costed[indices[0]][1].protein_sequence)
+            for i in indices:
+                shard.items.append(costed[i][1])
+                shard.ligand_seconds.append(costed[i][0])
+            if len(shard.items) > self.max_ligands or (
+                    shard.seconds > self.task_seconds and len(shard.items) > 1) or \
+                    self.memory_estimator(len(shard.protein_sequence), len(shard.items)) > self.memory_gb:
+                return None
+            shards.append(shard)
+        return shards
+
+    def _fair_order(self, shards: List[Shard]) -> List[Shard]:
+        """
+        Weighted fair queuing over users: each step dispatches the shard whose
+        users would have the least lane-weighted virtual time after it runs.
+        """
+        virtual: Dict[str, float] = {}
+        remaining = list(shards)
+        ordered: List[Shard] = []
+        while remaining:
+            def finish_tag(shard: Shard) -> float:
+                weight = self.lane_weights.get(shard.lane, 1.0)
+                return max(virtual.get(user, 0.0) + seconds / weight
+                           for user, seconds in shard.user_seconds().items())
+
+            best = min(remaining, key=finish_tag)
+            remaining.remove(best)
+            weight = self.lane_weights.get(best.lane, 1.0)
+            for user, seconds in best.user_seconds().items():
+                virtual[user] = virtual.get(user, 0.0) + seconds / weight
+            ordered.append(best)
+        return ordered
+
+    def pack(self, items: Sequence[PendingLigand]) -> List[Shard]:
+        groups: Dict[GroupKey, List[PendingLigand]] = {}
+        for item in items:
+            groups.setdefault(item.group_key, []).append(item)
+
+        shards: List[Shard] = []
+        for key, members in groups.items():
+            shards.extend(self._pack_group(key, members))
+
+        ordered = self._fair_order(shards)
+        if ordered:
+            logger.info(f"📦 Packed {len(items)} ligands from {len(groups)} protein groups into {len(ordered)} shards")
+        return ordered
+
+def packing_summary(shards: Sequence[Shard]) -> Dict[str, Any]:
+    """Shard counts and estimated GPU-seconds, for logging and batch records"""
+    ligands = sum(len(shard.items) for shard in shards)
+    return {
+        'shards': len(shards),
+        'ligands': ligands,
+        'estimated_gpu_seconds': round(sum(shard.seconds for shard in shards), 1),
+        'max_shard_seconds': round(max((shard.seconds for shard in shards), default=0.0), 1),
+    }
+
+# Global packer
+shard_packer = ShardPacker()
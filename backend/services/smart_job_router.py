@@ -13,6 +13,7 @@ from datetime import datetime, timedelta
 
 # QoS lane management for Cloud Run Job routing
 from database.unified_job_manager import unified_job_manager
+from services.runtime_estimator import runtime_estimator
 
 # Define QoSLane enum for Cloud Run Job routing
 class QoSLane(Enum):
@@ -148,7 +149,7 @@ class SmartJobRouter:
         """
         Estimate GPU resources needed for job
         
-        Based on empirical data from production runs
+        Based on the runtime model fitted to production telemetry
         """
         protein_sequences = job_request.get('protein_sequences', [])
         ligands = job_request.get('ligands', [])
@@ -162,21 +163,19 @@ class SmartJobRouter:
         if ligand_count == 0:
             raise ValueError("No ligands provided")
         
-        # Empirical coefficients (tune based on actual production data)
-        base_overhead = 30  # Model loading, setup
-        protein_factor = protein_length * 0.05  # ~0.05s per residue
-        ligand_factor = ligand_count * 12  # ~12s per ligand
-        msa_overhead = 120 if use_msa else 0  # MSA computation
-        potentials_overhead = ligand_count * 3 if use_potentials else 0  # Additional compute
-        
-        gpu_seconds = (base_overhead + protein_factor + 
-                      ligand_factor + msa_overhead + potentials_overhead)
-        
-        # Memory estimation (A100-40GB limit)
-        base_memory = 8  # Base memory for model
-        protein_memory = protein_length * 0.01  # Memory scales with protein size
-        ligand_memory = ligand_count * 0.2  # Memory per ligand
-        memory_gb = min(38, base_memory + protein_memory + ligand_memory)  # Cap at 38GB
+        # Shared runtime model trained on completed-job telemetry
+        sampling_steps = job_request.get('sampling_steps', 200)
+        runtime = runtime_estimator.estimate_ligands(
+            protein_length, ligands, use_msa, use_potentials, sampling_steps
+        )
+        gpu_seconds = runtime.wall_seconds
+        memory_gb = runtime.peak_memory_gb
+        msa_overhead = 0.0
+        if use_msa:
+            first = ligands[:1]
+            with_msa = runtime_estimator.estimate_ligands(protein_length, first, True, use_potentials, sampling_steps)
+            without_msa = runtime_estimator.estimate_ligands(protein_length, first, False, use_potentials, sampling_steps)
+            msa_overhead = max(0.0, with_msa.wall_seconds - without_msa.wall_seconds) * ligand_count
         
         # Shard planning for large jobs
         max_ligands_per_shard = 100  # Optimal for A100-40GB
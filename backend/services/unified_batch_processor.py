@@ -18,24 +18,40 @@ Features:
 import asyncio
 import json
 import logging
+import os
 import time
 import uuid
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, List, Optional, Set, Tuple, AsyncIterator, Awaitable, Callable
 from dataclasses import dataclass
 from enum import Enum
 from datetime import datetime, timedelta
 
 from models.enhanced_job_model import (
     EnhancedJobData, JobType, JobStatus, TaskType,
-    create_batch_parent_job, create_batch_child_job
+    create_batch_parent_job, create_batch_child_job, _to_timestamp
 )
 from database.unified_job_manager import unified_job_manager
 from services.gcp_storage_service import gcp_storage_service
 from services.cloud_run_batch_processor import cloud_run_batch_processor  # REPLACED: Cloud Run batch processing
+from services.batch_ingestion import LigandStreamStats, validate_ligand
+from services.adaptive_concurrency import AdaptiveConcurrencyController, DurationEstimator
+from services.runtime_estimator import JobFeatures, runtime_estimator
+from services.batch_status_reconciler import CloudRunChildChecker, RunningJobReconciler
+from database.job_query_planner import encode_cursor, decode_cursor
+from services.offload import run_sync
 # from tasks.task_handlers import task_handler_registry  # COMMENTED: Missing dependency
 
 logger = logging.getLogger(__name__)
 
+# Child fields a status read needs; output data stays out of the projection
+CHILD_STATUS_FIELDS = (
+    'name', 'status', 'input_data', 'batch_index', 'created_at', 'started_at',
+    'completed_at', 'error_message', 'user_id'
+)
+CHILD_STATUSES = ('completed', 'failed', 'running', 'pending', 'created')
+DEFAULT_CHILD_PAGE_SIZE = 100
+STATUS_COUNTS_TTL = 5.0  # seconds; absorbs bursts of polls for the same batch
+
 class BatchPriority(str, Enum):
     """Batch execution priority levels"""
     LOW = "low"
@@ -100,6 +116,22 @@ class UnifiedBatchProcessor:
         self.performance_metrics: Dict[str, Any] = {}
         self.resource_monitor = ResourceMonitor()
         
+        # Cloud Run probing for running children happens here, off the status path
+        self.running_reconciler = RunningJobReconciler(
+            fetch_running=lambda batch_id: unified_job_manager.get_batch_children(
+                batch_id, limit=200, status='running', fields=CHILD_STATUS_FIELDS
+            ),
+            reconcile=CloudRunChildChecker(
+                fetch_results=cloud_run_batch_processor.get_ligand_results,
+                update_status=unified_job_manager.update_job_status,
+                on_finished=self._on_child_finished
+            ),
+            on_reconciled=self._on_batch_reconciled,
+            min_interval=float(os.getenv("BATCH_RECONCILE_INTERVAL_SECONDS", "30"))
+        )
+        self._status_counts: Dict[str, Tuple[float, Dict[str, int]]] = {}
+        self._dispatch_tasks: Set[asyncio.Task] = set()
+        
         # Configuration defaults
         self.default_config = BatchConfiguration()
         
@@ -127,7 +159,7 @@ class UnifiedBatchProcessor:
                 raise ValueError(f"Batch validation failed: {validation_result['error']}")
             
             # Step 2: Create intelligent execution plan
-            execution_plan = await self._create_execution_plan(request)
+            execution_plan = await self._create_execution_plan(request, validation_result['ligand_stats'])
             logger.info(f"📊 Execution plan: {execution_plan.total_jobs} jobs, ~{execution_plan.estimated_duration:.1f}s estimated")
             
             # Step 3: Create batch parent with enhanced intelligence
@@ -178,6 +210,128 @@ class UnifiedBatchProcessor:
                 'error_type': type(e).__name__
             }
 
+    async def submit_batch_stream(self, request: BatchSubmissionRequest,
+                                  ligand_chunks: AsyncIterator[List[Dict[str, Any]]],
+                                  stats: LigandStreamStats,
+                                  on_batch_created: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        Submit a batch whose ligands arrive as a stream of validated chunks
+        
+        The parent is created from the first chunk. Each chunk's children are
+        then created, registered with one batch index write and dispatched as
+        their own Cloud Run sub-batch ({batch_id}-partNNNN) before the next
+        chunk is read, so the batch runs while the library is still uploading
+        and the upload is paced by dispatch. Only child IDs are kept once a
+        chunk is dispatched; children are also found through their
+        batch_parent_id. request.ligands is replaced by the first chunk.
+        """
+        
+        logger.info(f"🎯 UnifiedBatchProcessor: Streaming batch '{request.job_name}'")
+        
+        batch_parent: Optional[EnhancedJobData] = None
+        execution_plan: Optional[BatchExecutionPlan] = None
+        child_ids: List[str] = []
+        sub_batches: List[str] = []
+        started_jobs = 0
+        
+        try:
+            header_result = self._validate_batch_header(request)
+            if not header_result['valid']:
+                raise ValueError(f"Batch validation failed: {header_result['error']}")
+            
+            async for chunk in ligand_chunks:
+                if not chunk:
+                    continue
+                
+                if batch_parent is None:
+                    # Plan from the first chunk; refined once the stream ends
+                    request.ligands = chunk
+                    execution_plan = await self._create_execution_plan(request, stats)
+                    batch_parent = await self._create_batch_parent(request, execution_plan)
+                    await self._initialize_batch_storage(batch_parent, [])
+                    self.active_batches[batch_parent.id] = batch_parent
+                    self.execution_plans[batch_parent.id] = execution_plan
+                    if on_batch_created:
+                        on_batch_created(batch_parent.id)
+                
+                chunk_children = await self._create_child_jobs(
+                    batch_parent, request, execution_plan,
+                    ligands=chunk,
+                    index_offset=len(child_ids),
+                    consistency_delay=1.0 if not child_ids else 0.0,
+                    track_on_parent=False
+                )
+                await self._register_child_jobs(batch_parent.id, chunk_children)
+                child_ids.extend(child.id for child in chunk_children)
+                
+                sub_batch_id = f"{batch_parent.id}-part{len(sub_batches):04d}"
+                dispatch = await self._execute_batch_with_intelligence(
+                    batch_parent, chunk_children, execution_plan,
+                    cloud_run_batch_id=sub_batch_id, mark_running=False
+                )
+                started_jobs += dispatch['started_jobs']
+                if dispatch.get('cloud_run_batch'):
+                    sub_batches.append(sub_batch_id)
+                logger.info(f"📦 Batch {batch_parent.id}: dispatched {started_jobs}/{len(child_ids)} ligands so far")
+            
+            if batch_parent is None:
+                raise ValueError(f"No valid ligands found ({stats.rejected} rejected)")
+            
+            # Finalize totals now that the whole library has been seen
+            execution_plan = await self._create_execution_plan(request, stats)
+            self.execution_plans[batch_parent.id] = execution_plan
+            batch_parent.batch_total_ligands = stats.accepted
+            batch_parent.batch_estimated_completion = execution_plan.estimated_duration
+            batch_parent.input_data['total_ligands'] = stats.accepted
+            batch_parent.input_data['rejected_ligands'] = stats.rejected
+            batch_parent.input_data['cloud_run_sub_batches'] = sub_batches
+            batch_parent.update_status(JobStatus.RUNNING)
+            await run_sync(unified_job_manager.update_job_status, batch_parent.id, "running", batch_parent.to_firestore_dict())
+            await run_sync(self._store_batch_metadata, batch_parent, child_ids)
+            
+            logger.info(f"✅ Streamed batch {batch_parent.id}: {stats.accepted} accepted, {stats.rejected} rejected, "
+                        f"{len(sub_batches)} Cloud Run sub-batches")
+            
+            return {
+                'success': True,
+                'batch_id': batch_parent.id,
+                'total_jobs': len(child_ids),
+                'child_jobs_created': len(child_ids),
+                'rejected_ligands': stats.rejected,
+                'rejection_samples': stats.rejection_samples[:20],
+                'execution_plan': {
+                    'estimated_duration': execution_plan.estimated_duration,
+                    'scheduling_strategy': execution_plan.scheduling_timeline[0]['strategy'],
+                    'optimization_recommendations': execution_plan.optimization_recommendations
+                },
+                'execution_details': {
+                    'status': 'started',
+                    'message': 'Batch dispatched chunk by chunk during upload',
+                    'started_jobs': started_jobs,
+                    'queued_jobs': len(child_ids) - started_jobs,
+                    'cloud_run_sub_batches': len(sub_batches)
+                },
+                'risk_assessment': execution_plan.risk_assessment
+            }
+            
+        except Exception as e:
+            logger.error(f"❌ Streaming batch submission failed: {e}")
+            if batch_parent is not None:
+                try:
+                    batch_parent.batch_total_ligands = len(child_ids)
+                    batch_parent.update_status(JobStatus.FAILED, error_message=str(e))
+                    await run_sync(unified_job_manager.update_job_status, batch_parent.id, "failed", batch_parent.to_firestore_dict())
+                except Exception as update_error:
+                    logger.error(f"❌ Failed to update batch status after streaming error: {update_error}")
+            return {
+                'success': False,
+                'error': str(e),
+                'error_type': type(e).__name__,
+                'batch_id': batch_parent.id if batch_parent else None,
+                'child_jobs_created': len(child_ids),
+                'rejected_ligands': stats.rejected
+            }
+
     async def _execute_batch_in_background(self, batch_parent: EnhancedJobData,
                                          child_jobs: List[EnhancedJobData],
                                          execution_plan: BatchExecutionPlan) -> None:
@@ -199,13 +353,36 @@ class UnifiedBatchProcessor:
             # Update batch parent status to failed
             try:
                 batch_parent.update_status(JobStatus.FAILED, error_message=str(e))
-                unified_job_manager.update_job_status(batch_parent.id, "failed", batch_parent.to_firestore_dict())
+                await run_sync(unified_job_manager.update_job_status, batch_parent.id, "failed", batch_parent.to_firestore_dict())
             except Exception as update_error:
                 logger.error(f"❌ Failed to update batch status after background error: {update_error}")
     
     async def _validate_batch_request(self, request: BatchSubmissionRequest) -> Dict[str, Any]:
         """Enterprise-grade batch request validation"""
         
+        header_result = self._validate_batch_header(request)
+        if not header_result['valid']:
+            return header_result
+        
+        if not request.ligands or len(request.ligands) == 0:
+            return {'valid': False, 'error': 'At least one ligand is required'}
+        
+        if len(request.ligands) > 1500:
+            return {'valid': False, 'error': 'Too many ligands (max 1500 per batch)'}
+        
+        # Validate each ligand, gathering plan statistics in the same pass
+        ligand_stats = LigandStreamStats()
+        for i, ligand in enumerate(request.ligands):
+            error = validate_ligand(ligand, i)
+            if error:
+                return {'valid': False, 'error': error}
+            ligand_stats.accept(ligand)
+        
+        return {'valid': True, 'ligand_stats': ligand_stats}
+    
+    def _validate_batch_header(self, request: BatchSubmissionRequest) -> Dict[str, Any]:
+        """Validate everything except the ligand list (shared with streaming ingestion)"""
+        
         # Input validation
         if not request.job_name or not request.job_name.strip():
             return {'valid': False, 'error': 'Job name is required'}
@@ -219,47 +396,29 @@ class UnifiedBatchProcessor:
         if not request.protein_name or not request.protein_name.strip():
             return {'valid': False, 'error': 'Protein name is required'}
         
-        if not request.ligands or len(request.ligands) == 0:
-            return {'valid': False, 'error': 'At least one ligand is required'}
-        
-        if len(request.ligands) > 1500:
-            return {'valid': False, 'error': 'Too many ligands (max 1500 per batch)'}
-        
-        # Validate each ligand
-        for i, ligand in enumerate(request.ligands):
-            if not isinstance(ligand, dict):
-                return {'valid': False, 'error': f'Ligand {i+1} must be a dictionary'}
-            
-            if 'smiles' not in ligand:
-                return {'valid': False, 'error': f'Ligand {i+1} missing SMILES string'}
-            
-            smiles = ligand.get('smiles', '').strip()
-            if not smiles or len(smiles) < 3:
-                return {'valid': False, 'error': f'Ligand {i+1} has invalid SMILES string'}
-        
         return {'valid': True}
     
-    async def _create_execution_plan(self, request: BatchSubmissionRequest) -> BatchExecutionPlan:
+    async def _create_execution_plan(self, request: BatchSubmissionRequest,
+                                     ligand_stats: Optional[LigandStreamStats] = None) -> BatchExecutionPlan:
         """Create intelligent batch execution plan with resource optimization"""
         
         config = request.configuration or self.default_config
-        total_jobs = len(request.ligands)
-        
-        # Intelligent duration estimation
-        base_duration = 300.0  # 5 minutes per job baseline
+        if ligand_stats is None:
+            ligand_stats = LigandStreamStats()
+            for ligand in request.ligands:
+                ligand_stats.accept(ligand)
+        total_jobs = ligand_stats.accepted
         
-        # Protein complexity factor
-        protein_complexity = min(len(request.protein_sequence) / 500.0, 2.0)  # Max 2x multiplier
-        
-        # Ligand complexity estimation  
-        avg_ligand_complexity = sum(len(lig.get('smiles', '')) for lig in request.ligands) / len(request.ligands)
-        ligand_complexity = min(avg_ligand_complexity / 50.0, 1.5)  # Max 1.5x multiplier
-        
-        # Model-specific adjustments
-        model_factor = 1.2 if request.use_msa else 1.0
-        model_factor *= 1.1 if request.use_potentials else 1.0
-        
-        estimated_per_job = base_duration * protein_complexity * ligand_complexity * model_factor
+        # Per-job runtime from the shared model (average ligand gathered during validation),
+        # scaled by how recent children actually ran against that model
+        predicted = runtime_estimator.estimate(JobFeatures(
+            protein_length=len(request.protein_sequence),
+            ligand_size=ligand_stats.avg_smiles_length,
+            use_msa=request.use_msa,
+            use_potentials=request.use_potentials
+        ))
+        duration_key = self.resource_monitor.duration_key(request.model_name, request.use_msa, request.use_potentials)
+        estimated_per_job = predicted.wall_seconds * self.resource_monitor.runtime_calibration(duration_key)
         
         # Resource-aware scheduling
         if config.scheduling_strategy == BatchSchedulingStrategy.RESOURCE_AWARE:
@@ -374,7 +533,7 @@ class UnifiedBatchProcessor:
         }
         
         # Store in database and CAPTURE THE RETURNED ID!
-        parent_job_id = unified_job_manager.create_job(batch_parent.to_firestore_dict())
+        parent_job_id = await run_sync(unified_job_manager.create_job, batch_parent.to_firestore_dict())
         if not parent_job_id:
             raise ValueError(f"Failed to create batch parent job for {batch_parent.id}")
         
@@ -386,12 +545,29 @@ class UnifiedBatchProcessor:
     
     async def _create_child_jobs(self, batch_parent: EnhancedJobData, 
                                request: BatchSubmissionRequest,
-                               execution_plan: BatchExecutionPlan) -> List[EnhancedJobData]:
-        """Create optimized child jobs with intelligent naming and metadata"""
+                               execution_plan: BatchExecutionPlan,
+                               ligands: Optional[List[Dict[str, Any]]] = None,
+                               index_offset: int = 0,
+                               batch_total: Optional[int] = None,
+                               consistency_delay: float = 1.0,
+                               track_on_parent: bool = True) -> List[EnhancedJobData]:
+        """
+        Create optimized child jobs with intelligent naming and metadata
+        
+        Streaming ingestion passes one chunk of ligands at a time with its
+        position in the batch; batch_total is None until the stream ends, and
+        track_on_parent=False keeps the IDs off the parent document.
+        """
+        
+        if ligands is None:
+            ligands = request.ligands
+            batch_total = len(request.ligands)
         
         child_jobs = []
         
-        for index, ligand in enumerate(request.ligands):
+        for chunk_index, ligand in enumerate(ligands):
+            index = index_offset + chunk_index
+            
             # Generate intelligent child job name
             ligand_name = ligand.get('name', f'Ligand_{index+1}')
             child_name = f"{request.job_name} - {ligand_name}"
@@ -411,7 +587,7 @@ class UnifiedBatchProcessor:
                     'task_type': 'protein_ligand_binding',  # REQUIRED for Cloud Run monitor
                     'parent_batch_id': batch_parent.id,  # Explicit parent reference
                     'batch_metadata': {
-                        'batch_total': len(request.ligands),
+                        'batch_total': batch_total,
                         'batch_position': index + 1,
                         'execution_strategy': execution_plan.scheduling_timeline[0].get('strategy')
                     }
@@ -424,14 +600,16 @@ class UnifiedBatchProcessor:
             child_job.batch_parent_id = batch_parent.id
             
             child_jobs.append(child_job)
-            batch_parent.add_child_job(child_job.id)
+            if track_on_parent:
+                batch_parent.add_child_job(child_job.id)
         
         # Batch create all child jobs for efficiency
-        await self._batch_create_jobs(child_jobs)
+        await self._batch_create_jobs(child_jobs, consistency_delay)
         
         return child_jobs
     
-    async def _batch_create_jobs(self, jobs: List[EnhancedJobData]) -> None:
+    async def _batch_create_jobs(self, jobs: List[EnhancedJobData],
+                                 consistency_delay: float = 1.0) -> None:
         """Efficiently create multiple jobs in batch with proper IDs"""
         
         try:
@@ -446,7 +624,7 @@ class UnifiedBatchProcessor:
                 job_dict['input_data']['task_type'] = 'protein_ligand_binding'  # Required!
                 
                 # Create job and capture ID
-                created_id = unified_job_manager.create_job(job_dict)
+                created_id = await run_sync(unified_job_manager.create_job, job_dict)
                 if created_id:
                     job.id = created_id  # Update job with actual database ID
                     logger.debug(f"Created child job {created_id} for batch {job.batch_parent_id}")
@@ -460,8 +638,9 @@ class UnifiedBatchProcessor:
             # Continue even if some jobs fail
             
         # Add small delay to ensure database consistency
-        await asyncio.sleep(1)
-        logger.info(f"✅ Batch job creation complete, waiting for database consistency...")
+        if consistency_delay > 0:
+            await asyncio.sleep(consistency_delay)
+            logger.info(f"✅ Batch job creation complete, waiting for database consistency...")
     
     async def _initialize_batch_storage(self, batch_parent: EnhancedJobData, 
                                       child_jobs: List[EnhancedJobData]) -> None:
@@ -486,24 +665,43 @@ class UnifiedBatchProcessor:
                 return
             
             # Register all child jobs with the batch relationship manager
-            for child_job in child_jobs:
-                child_metadata = {
-                    'task_type': child_job.input_data.get('task_type', 'protein_ligand_binding'),
-                    'ligand_name': child_job.input_data.get('ligand_name', 'Unknown'),
-                    'ligand_smiles': child_job.input_data.get('ligand_smiles', ''),
-                    'protein_name': child_job.input_data.get('protein_name', 'Unknown'),
-                    'created_at': datetime.utcnow().isoformat()
-                }
-                
-                await batch_relationship_manager.register_child_job(
-                    batch_parent.id, 
-                    child_job.id, 
-                    child_metadata
-                )
-                
-                logger.info(f"✅ Registered child job {child_job.id} with batch {batch_parent.id}")
+            await self._register_child_jobs(batch_parent.id, child_jobs)
             
             # Also create legacy batch metadata for compatibility
+            self._store_batch_metadata(batch_parent, [child.id for child in child_jobs])
+            
+            logger.info(f"✅ Initialized complete batch storage structure for {batch_parent.id}")
+            
+        except Exception as e:
+            logger.error(f"❌ Batch storage initialization failed: {e}")
+            import traceback
+            logger.error(f"❌ Traceback: {traceback.format_exc()}")
+            # Continue processing - storage issues shouldn't stop job submission
+    
+    async def _register_child_jobs(self, batch_id: str, child_jobs: List[EnhancedJobData]) -> None:
+        """Register child jobs with the batch relationship manager (one index write)"""
+        
+        if not child_jobs:
+            return
+        
+        from services.batch_relationship_manager import batch_relationship_manager
+        
+        created_at = datetime.utcnow().isoformat()
+        await batch_relationship_manager.register_child_jobs(batch_id, {
+            child_job.id: {
+                'task_type': child_job.input_data.get('task_type', 'protein_ligand_binding'),
+                'ligand_name': child_job.input_data.get('ligand_name', 'Unknown'),
+                'ligand_smiles': child_job.input_data.get('ligand_smiles', ''),
+                'protein_name': child_job.input_data.get('protein_name', 'Unknown'),
+                'created_at': created_at
+            }
+            for child_job in child_jobs
+        })
+    
+    def _store_batch_metadata(self, batch_parent: EnhancedJobData, child_job_ids: List[str]) -> None:
+        """Write legacy batch_metadata.json to the batch root and archive"""
+        
+        try:
             batch_storage_paths = {
                 'batch_root': f"batches/{batch_parent.id}",
                 'batch_archive': f"archive/{batch_parent.id}", 
@@ -515,8 +713,8 @@ class UnifiedBatchProcessor:
                 'batch_id': batch_parent.id,
                 'batch_name': batch_parent.name,
                 'created_at': datetime.utcnow().isoformat(),
-                'total_children': len(child_jobs),
-                'child_job_ids': [child.id for child in child_jobs],
+                'total_children': len(child_job_ids),
+                'child_job_ids': child_job_ids,
                 'storage_structure': batch_storage_paths,
                 'batch_intelligence': batch_parent.batch_metadata
             }
@@ -536,18 +734,21 @@ class UnifiedBatchProcessor:
                 content_type='application/json'
             )
             
-            logger.info(f"✅ Initialized complete batch storage structure for {batch_parent.id}")
-            
         except Exception as e:
-            logger.error(f"❌ Batch storage initialization failed: {e}")
-            import traceback
-            logger.error(f"❌ Traceback: {traceback.format_exc()}")
-            # Continue processing - storage issues shouldn't stop job submission
+            logger.error(f"❌ Failed to store batch metadata for {batch_parent.id}: {e}")
     
     async def _execute_batch_with_intelligence(self, batch_parent: EnhancedJobData,
                                              child_jobs: List[EnhancedJobData],
-                                             execution_plan: BatchExecutionPlan) -> Dict[str, Any]:
-        """Execute batch with intelligent scheduling and monitoring"""
+                                             execution_plan: BatchExecutionPlan,
+                                             cloud_run_batch_id: Optional[str] = None,
+                                             mark_running: bool = True) -> Dict[str, Any]:
+        """
+        Execute batch with intelligent scheduling and monitoring
+        
+        Streaming submission calls this once per chunk, with the chunk's
+        sub-batch id for Cloud Run and mark_running=False (the parent is
+        marked running once the stream ends).
+        """
         
         config = self.default_config  # Could be extracted from execution_plan
         execution_results = {
@@ -577,15 +778,17 @@ class UnifiedBatchProcessor:
                 # Submit entire batch to Cloud Run at once
                 cloud_run_result = await cloud_run_batch_processor.submit_batch(
                     user_id=batch_parent.user_id,
-                    batch_id=batch_parent.id,
+                    batch_id=cloud_run_batch_id or batch_parent.id,
                     protein_sequence=child_jobs[0].input_data.get('protein_sequence'),
                     ligands=ligands,
-                    job_name=batch_parent.job_name,
+                    job_name=batch_parent.name,
                     use_msa=child_jobs[0].input_data.get('use_msa', True),
-                    use_potentials=child_jobs[0].input_data.get('use_potentials', False)
+                    use_potentials=child_jobs[0].input_data.get('use_potentials', False),
+                    lane='interactive' if config.priority in (BatchPriority.HIGH, BatchPriority.URGENT) else 'bulk'
                 )
 
-                if cloud_run_result.get('status') == 'running':
+                if cloud_run_result.get('status') in ('running', 'queued'):
+                    await self._mark_children_dispatched(child_jobs, cloud_run_batch_id or batch_parent.id)
                     execution_results['started_jobs'] = len(child_jobs)
                     execution_results['queued_jobs'] = 0
                     execution_results['cloud_run_batch'] = True
@@ -608,29 +811,85 @@ class UnifiedBatchProcessor:
                     await self._start_individual_job(child_jobs[0])
                     execution_results['started_jobs'] = 1
                     execution_results['queued_jobs'] = len(child_jobs) - 1
-            else:
-                # Parallel/Adaptive: Start ALL jobs - no limits!
-                # Cloud Run handles concurrency, we just submit everything
+            elif execution_plan.scheduling_timeline[0].get('strategy') == 'parallel':
+                # Parallel: Start ALL jobs at once - Cloud Run scales automatically
                 start_tasks = []
                 for job in child_jobs:
                     start_tasks.append(self._start_individual_job(job))
                 
-                # Start ALL jobs in parallel - Cloud Run scales automatically
                 start_results = await asyncio.gather(*start_tasks, return_exceptions=True)
                 successful_starts = sum(1 for result in start_results if not isinstance(result, Exception))
                 
                 execution_results['started_jobs'] = successful_starts
                 execution_results['queued_jobs'] = len(child_jobs) - successful_starts
+            else:
+                # Adaptive/resource-aware: start jobs under the feedback-driven in-flight limits
+                await self.resource_monitor.refresh_queue_depth()
+                
+                async def start_with_limit(job: EnhancedJobData) -> bool:
+                    # The slot stays held while the child runs; it is released here
+                    # if the child finishes inline, otherwise by running_reconciler
+                    await self.resource_monitor.acquire_job(batch_parent.id, job.id)
+                    try:
+                        started = await asyncio.wait_for(
+                            self._start_individual_job(job), timeout=config.timeout_per_job
+                        )
+                    except asyncio.TimeoutError:
+                        await self.resource_monitor.release_job(job.id, success=False, timed_out=True)
+                        raise
+                    except Exception:
+                        await self.resource_monitor.release_job(job.id, success=False)
+                        raise
+                    if not started or job.status in (JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED):
+                        await self.resource_monitor.release_job(job.id, success=started and job.status == JobStatus.COMPLETED)
+                    return started
+                
+                # Start what the current limit admits now; the rest wait for slots
+                # in the background instead of holding the submission open
+                first_wave = child_jobs[:self.resource_monitor.available_slots(batch_parent.id)]
+                remaining = child_jobs[len(first_wave):]
+                start_results = await asyncio.gather(
+                    *(start_with_limit(job) for job in first_wave), return_exceptions=True
+                )
+                if remaining:
+                    self._spawn_dispatch(batch_parent.id, remaining, start_with_limit)
+                else:
+                    self.resource_monitor.forget_batch(batch_parent.id)
+                successful_starts = sum(1 for result in start_results if result is True)
+                
+                execution_results['started_jobs'] = successful_starts
+                execution_results['queued_jobs'] = len(child_jobs) - successful_starts
                 
                 if successful_starts < len(child_jobs):
                     logger.warning(f"⚠️ Only {successful_starts}/{len(child_jobs)} jobs started successfully")
         
         # Update batch parent status to running
-        batch_parent.update_status(JobStatus.RUNNING)
-        unified_job_manager.update_job_status(batch_parent.id, "running", batch_parent.to_firestore_dict())
+        if mark_running:
+            batch_parent.update_status(JobStatus.RUNNING)
+            await run_sync(unified_job_manager.update_job_status, batch_parent.id, "running", batch_parent.to_firestore_dict())
         
         return execution_results
     
+    def _spawn_dispatch(self, batch_id: str, jobs: List[EnhancedJobData],
+                        start: Callable[[EnhancedJobData], Awaitable[bool]]) -> None:
+        """Start the rest of a batch as in-flight slots free up"""
+        
+        async def dispatch() -> None:
+            try:
+                results = await asyncio.gather(*(start(job) for job in jobs), return_exceptions=True)
+                started = sum(1 for result in results if result is True)
+                logger.info(f"📤 Batch {batch_id}: background dispatch started {started}/{len(jobs)} queued jobs")
+            finally:
+                self.resource_monitor.forget_batch(batch_id)
+        
+        task = asyncio.create_task(dispatch())
+        self._dispatch_tasks.add(task)
+        task.add_done_callback(self._dispatch_tasks.discard)
+    
+    async def _on_child_finished(self, job_id: str, status: str) -> None:
+        """Return a finished child's in-flight slot with its runtime as the sample"""
+        await self.resource_monitor.release_job(job_id, success=status == 'completed')
+    
     async def _start_individual_job(self, job: EnhancedJobData) -> bool:
         """Start an individual job within the batch"""
         
@@ -673,7 +932,7 @@ class UnifiedBatchProcessor:
             # Retry job status update with backoff
             for attempt in range(3):
                 try:
-                    unified_job_manager.update_job_status(job.id, job.status.value, job.to_firestore_dict())
+                    await run_sync(unified_job_manager.update_job_status, job.id, job.status.value, job.to_firestore_dict())
                     break
                 except Exception as update_error:
                     if attempt < 2:
@@ -694,7 +953,7 @@ class UnifiedBatchProcessor:
             # Retry job status update with backoff
             for attempt in range(3):
                 try:
-                    unified_job_manager.update_job_status(job.id, "failed", job.to_firestore_dict())
+                    await run_sync(unified_job_manager.update_job_status, job.id, "failed", job.to_firestore_dict())
                     break
                 except Exception as update_error:
                     if attempt < 2:
@@ -705,15 +964,49 @@ class UnifiedBatchProcessor:
             
             return False
     
-    async def get_batch_status(self, batch_id: str) -> Dict[str, Any]:
-        """Get comprehensive batch status with intelligence"""
+    def _on_batch_reconciled(self, batch_id: str, updated: int) -> None:
+        if updated:
+            self._status_counts.pop(batch_id, None)
+    
+    def _child_status_counts(self, batch_id: str) -> Dict[str, int]:
+        """Per-status child counts from index aggregations, cached briefly"""
+        
+        cached = self._status_counts.get(batch_id)
+        if cached and time.monotonic() - cached[0] < STATUS_COUNTS_TTL:
+            return cached[1]
+        
+        counts = unified_job_manager.count_batch_children(batch_id, CHILD_STATUSES)
+        if counts is None:
+            # Aggregations unavailable: count from a status-only projection of the index
+            counts = {'total': 0, **{status: 0 for status in CHILD_STATUSES}}
+            for child in unified_job_manager.get_batch_children(batch_id, fields=('status',)):
+                counts['total'] += 1
+                status = child.get('status')
+                if status in counts:
+                    counts[status] += 1
+        
+        self._status_counts[batch_id] = (time.monotonic(), counts)
+        while len(self._status_counts) > 1000:
+            self._status_counts.pop(next(iter(self._status_counts)))
+        return counts
+    
+    async def get_batch_status(self, batch_id: str, child_limit: int = DEFAULT_CHILD_PAGE_SIZE,
+                               child_cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get comprehensive batch status with intelligence.
+        
+        Counts come from the batch_parent_id index (independent of batch size
+        or the user's history) and child_jobs is one projected page of children
+        ordered by batch_index; pass pagination.next_cursor back as child_cursor
+        for the next page. Running children are reconciled in the background.
+        """
         
         try:
             logger.info(f"🔍 Getting batch status for {batch_id}")
             
             # Get batch parent - using a more robust approach
             try:
-                batch_parent_data = unified_job_manager.get_job(batch_id)
+                batch_parent_data = await run_sync(unified_job_manager.get_job, batch_id)
             except Exception as e:
                 logger.error(f"Failed to get batch parent from database: {e}")
                 return {'error': f'Failed to retrieve batch: {str(e)}'}
@@ -724,45 +1017,31 @@ class UnifiedBatchProcessor:
 
             logger.debug(f"Found batch parent data: {batch_parent_data.get('name', 'unnamed')}")
 
-            # Get all child jobs using simplified approach
-            child_jobs_data = []
-
-            try:
-                # Query all jobs and filter for batch children
-                all_jobs = unified_job_manager.primary_backend.get_user_jobs(
-                    batch_parent_data.get('user_id', 'current_user'), 
-                    limit=1000
-                )
-                
-                for job_data in all_jobs:
-                    # Check if this job is a child of our batch
-                    job_batch_parent = job_data.get('batch_parent_id')
-                    if job_batch_parent == batch_id:
-                        child_jobs_data.append(job_data)
-                        
-            except Exception as e:
-                logger.warning(f"Could not retrieve child jobs: {e}")
-                # Continue with empty child jobs list
-                
-            logger.info(f"Found {len(child_jobs_data)} child jobs for batch {batch_id}")
-            
-            # 🚀 NEW: Check Cloud Run status for running jobs and process any completions
-            await self._check_and_update_running_jobs(child_jobs_data)
-            
-            # Calculate progress from child jobs (after potential status updates)
-            total_jobs = len(child_jobs_data)
-            completed_jobs = len([job for job in child_jobs_data if job.get('status') == 'completed'])
-            failed_jobs = len([job for job in child_jobs_data if job.get('status') == 'failed'])
-            running_jobs = len([job for job in child_jobs_data if job.get('status') == 'running'])
-            pending_jobs = len([job for job in child_jobs_data if job.get('status') in ['pending', 'created']])
-            
-            # 🔍 DEBUG: Log status distribution to identify the issue
-            status_counts = {}
-            for job in child_jobs_data:
-                status = job.get('status', 'unknown')
-                status_counts[status] = status_counts.get(status, 0) + 1
-            logger.info(f"🔍 Batch {batch_id} status distribution: {status_counts}")
-            logger.info(f"🔍 Calculated: total={total_jobs}, completed={completed_jobs}, failed={failed_jobs}, running={running_jobs}, pending={pending_jobs}")
+            # Status counts and one page of children, both from the parent index
+            counts = await run_sync(self._child_status_counts, batch_id)
+            cursor_value = decode_cursor(child_cursor)
+            after_index = int(cursor_value) if cursor_value and cursor_value.lstrip('-').isdigit() else None
+            child_jobs_data = await run_sync(
+                unified_job_manager.get_batch_children,
+                batch_id, child_limit, after_index, None, CHILD_STATUS_FIELDS
+            )
+            next_cursor = None
+            if child_limit and len(child_jobs_data) == child_limit:
+                next_cursor = encode_cursor(str(child_jobs_data[-1].get('batch_index')))
+            
+            self.resource_monitor.observe_batch_children(batch_parent_data, child_jobs_data)
+            
+            # Probe Cloud Run for running children in the background (rate limited per batch)
+            if counts.get('running'):
+                self.running_reconciler.request(batch_id)
+            
+            total_jobs = counts.get('total', 0)
+            completed_jobs = counts.get('completed', 0)
+            failed_jobs = counts.get('failed', 0)
+            running_jobs = counts.get('running', 0)
+            pending_jobs = counts.get('pending', 0) + counts.get('created', 0)
+            
+            logger.debug(f"🔍 Batch {batch_id} status counts: {counts}")
             
             # Calculate batch status with improved logic
             if total_jobs == 0:
@@ -842,6 +1121,11 @@ class UnifiedBatchProcessor:
                     }
                     for job in child_jobs_data
                 ],
+                'child_pagination': {
+                    'limit': child_limit,
+                    'returned': len(child_jobs_data),
+                    'next_cursor': next_cursor
+                },
                 'progress': progress,
                 'insights': insights,
                 'execution_plan': self._serialize_execution_plan(self.execution_plans.get(batch_id, {}))
@@ -878,71 +1162,132 @@ class UnifiedBatchProcessor:
         # Fallback to empty dict
         return {}
     
-    async def _check_and_update_running_jobs(self, child_jobs_data: List[Dict[str, Any]]) -> None:
+    async def _mark_children_dispatched(self, child_jobs: List[EnhancedJobData], cloud_run_batch_id: str) -> None:
         """
-        🚀 NEW: Check Cloud Run status for running jobs and update any completed ones.
-        
-        This replaces the old polling modal_monitor with efficient, on-demand checking.
-        Senior Principal Engineering approach: Only check when needed, process immediately.
+        Mark children handed to a Cloud Run batch as running, recording the
+        batch whose results running_reconciler reads to finish them.
         """
-        try:
-            # Filter jobs that are marked as "running" in our database
-            running_jobs = [job for job in child_jobs_data if job.get('status') == 'running']
-            
-            if not running_jobs:
-                logger.debug("No running jobs to check")
-                return
-                
-            logger.info(f"🔍 Checking Cloud Run status for {len(running_jobs)} running jobs")
-            
-            # Check all running jobs concurrently using our new service
-            status_map = await modal_job_status_service.check_multiple_jobs(running_jobs)
-            
-            # Process any completed jobs immediately
-            completed_count = await modal_job_status_service.process_any_completed_jobs(status_map)
-            
-            if completed_count > 0:
-                logger.info(f"✅ Processed {completed_count} newly completed jobs")
-                
-                # Update the in-memory job data for immediate response
-                for job in child_jobs_data:
-                    job_id = job.get('id')
-                    if job_id in status_map:
-                        status, result = status_map[job_id]
-                        if status.value == 'completed':
-                            job['status'] = 'completed'
-                            if result:
-                                job['results'] = result
-                                job['files_stored_to_gcp'] = True
-                        elif status.value == 'failed':
-                            job['status'] = 'failed'
-                            if result and 'error' in result:
-                                job['error_message'] = result['error']
-            else:
-                logger.debug("No newly completed jobs found")
-                
-        except Exception as e:
-            logger.error(f"❌ Error checking running jobs: {e}")
-            # Don't fail the entire status request if Cloud Run checking fails
+        
+        async def mark(job: EnhancedJobData) -> None:
+            job.input_data['cloud_run_batch_id'] = cloud_run_batch_id
+            job.update_status(JobStatus.RUNNING)
+            await run_sync(unified_job_manager.update_job_status, job.id, "running", job.to_firestore_dict())
+        
+        results = await asyncio.gather(*(mark(job) for job in child_jobs), return_exceptions=True)
+        failed = sum(1 for result in results if isinstance(result, Exception))
+        if failed:
+            logger.warning(f"⚠️ Could not mark {failed}/{len(child_jobs)} children of Cloud Run batch {cloud_run_batch_id} running")
+
+
+def _cloud_tasks_queue_depth() -> Optional[int]:
+    """Batch queue depth from Cloud Tasks (client created on first use)"""
+    global _cloud_tasks_service
+    if _cloud_tasks_service is None:
+        from services.cloud_tasks_service import CloudTasksService
+        _cloud_tasks_service = CloudTasksService()
+    return _cloud_tasks_service.get_queue_depth()
+
+_cloud_tasks_service = None
 
 
 class ResourceMonitor:
-    """Monitor system resources for optimal batch scheduling"""
+    """
+    Monitor system resources for optimal batch scheduling.
     
-    async def get_optimal_concurrency(self) -> int:
-        """Determine optimal concurrent job capacity based on system resources"""
-        
-        # This would integrate with actual system monitoring
-        # For now, return conservative defaults
+    In-flight limits come from an AIMD controller fed by job latencies, errors
+    and timeouts, with Cloud Tasks queue depth as a backpressure signal. Child
+    durations seen by the batch status path calibrate the shared runtime model
+    for execution plan estimates.
+    """
+    
+    QUEUE_DEPTH_TTL = 30.0  # seconds between Cloud Tasks queue reads
+    
+    def __init__(self, queue_depth_provider: Optional[Callable[[], Optional[int]]] = _cloud_tasks_queue_depth):
+        self.controller = AdaptiveConcurrencyController(
+            initial_limit=int(os.getenv("BATCH_INITIAL_CONCURRENCY", "5")),
+            max_limit=int(os.getenv("BATCH_MAX_CONCURRENCY", "100")),
+            per_batch_max=int(os.getenv("BATCH_MAX_CONCURRENCY_PER_BATCH", "50")),
+            queue_depth_target=int(os.getenv("BATCH_QUEUE_DEPTH_TARGET", "200")),
+            held_timeout=float(os.getenv("BATCH_HELD_SLOT_TIMEOUT_SECONDS", "3600"))
+        )
+        self.durations = DurationEstimator()
+        self._queue_depth_provider = queue_depth_provider
+        self._queue_checked_at = 0.0
+        self._observed_children: Dict[str, set] = {}
+    
+    async def get_optimal_concurrency(self, batch_id: Optional[str] = None) -> int:
+        """Determine optimal concurrent job capacity from observed feedback"""
+        await self.refresh_queue_depth()
+        return self.controller.limit_for(batch_id)
+    
+    async def refresh_queue_depth(self) -> None:
+        """Read the dispatch queue depth at most once per QUEUE_DEPTH_TTL"""
+        if self._queue_depth_provider is None or time.monotonic() - self._queue_checked_at < self.QUEUE_DEPTH_TTL:
+            return
+        self._queue_checked_at = time.monotonic()
+        try:
+            depth = await asyncio.get_event_loop().run_in_executor(None, self._queue_depth_provider)
+            self.controller.update_queue_depth(depth)
+        except Exception as e:
+            logger.warning(f"⚠️ Queue depth unavailable, disabling queue backpressure: {e}")
+            self._queue_depth_provider = None
+    
+    def available_slots(self, batch_id: str) -> int:
+        """In-flight slots free for this batch right now"""
+        return self.controller.available(batch_id)
+    
+    async def acquire_job(self, batch_id: str, job_id: str) -> None:
+        """Take a per-batch and global in-flight slot, held until release_job"""
+        await self.controller.acquire_job(batch_id, job_id)
+    
+    async def release_job(self, job_id: str, success: bool = True, timed_out: bool = False) -> Optional[float]:
+        """Return a finished job's slots, feeding back its runtime"""
+        return await self.controller.release_job(job_id, success, timed_out)
+    
+    def forget_batch(self, batch_id: str) -> None:
+        """Drop a batch's in-flight limiter once all its dispatched jobs have finished"""
+        self.controller.forget_batch(batch_id)
+    
+    @staticmethod
+    def duration_key(model_name: str, use_msa: bool, use_potentials: bool) -> str:
+        return f"{model_name}:msa={bool(use_msa)}:potentials={bool(use_potentials)}"
+    
+    def runtime_calibration(self, key: str) -> float:
+        """Observed / predicted runtime ratio (1.0 until enough children are seen)"""
+        return self.durations.estimate(key, 1.0)
+    
+    def observe_batch_children(self, batch_parent_data: Dict[str, Any],
+                               child_jobs_data: List[Dict[str, Any]]) -> None:
+        """Learn runtime calibration from children that finished since the last status read"""
+        batch_id = batch_parent_data.get('id')
+        parent_input = batch_parent_data.get('input_data') or {}
+        use_msa = parent_input.get('use_msa', True)
+        use_potentials = parent_input.get('use_potentials', False)
+        key = self.duration_key(batch_parent_data.get('model_name', 'boltz2'), use_msa, use_potentials)
+        protein_length = len(parent_input.get('protein_sequence') or '')
         
-        # Could check:
-        # - Current Cloud Run job queue length
-        # - Available GPU resources  
-        # - Memory usage
-        # - Network bandwidth
+        seen = self._observed_children.setdefault(batch_id, set())
+        for child in child_jobs_data:
+            if child.get('status') != 'completed' or child.get('id') in seen:
+                continue
+            started_at = _to_timestamp(child.get('started_at'))
+            completed_at = _to_timestamp(child.get('completed_at'))
+            if started_at is None or completed_at is None:
+                continue
+            seen.add(child.get('id'))
+            smiles = (child.get('input_data') or {}).get('ligand_smiles') or ''
+            predicted = runtime_estimator.estimate(JobFeatures(protein_length, len(smiles), use_msa, use_potentials))
+            self.durations.observe(key, (completed_at - started_at) / predicted.wall_seconds)
         
-        # Conservative default
-        return 5
+        # Bound memory: keep dedup sets for recently polled batches only
+        while len(self._observed_children) > 200:
+            self._observed_children.pop(next(iter(self._observed_children)))
+    
+    def status(self) -> Dict[str, Any]:
+        return {
+            'concurrency': self.controller.status(),
+            'durations': self.durations.snapshot()
+        }
 
 
 # Global unified batch processor instance
@@ -9,21 +9,33 @@ from typing import Dict, Any, List, Optional, Tuple
 from models.enhanced_job_model import (
     EnhancedJobData, JobType, JobStatus, TaskType
 )
+from models.job_frame import JobFrame
 from database.unified_job_manager import unified_job_manager
+from database.job_query_planner import JobQueryPlan, plan_job_query, encode_cursor, decode_cursor
 from services.gcp_storage_service import gcp_storage_service
+from services.offload import run_sync
+from services.near_cache import NearCache, batch_scope, job_scope, spawn
 
 logger = logging.getLogger(__name__)
 
+def _enum_value(value: Any) -> Any:
+    """Firestore stores enum fields by value"""
+    return getattr(value, 'value', value)
+
 class UnifiedJobStorage:
     """Unified storage interface for all job types with enhanced querying"""
     
+    # Upper bound on query round trips when residual filters drop documents
+    MAX_SCAN_BATCHES = 5
+    
     def __init__(self):
         self.job_manager = unified_job_manager
         self.storage_service = gcp_storage_service
         
-        # Cache for frequently accessed data
-        self._cache = {}
+        # Cache for frequently accessed data; values are model objects, so it stays
+        # in-process but is invalidated across replicas by job/user/batch scope
         self._cache_ttl = 300  # 5 minutes
+        self._cache = NearCache("job_storage", max_entries=500, ttl=self._cache_ttl, shared=False)
         
     # === Core CRUD Operations ===
     
@@ -115,68 +127,95 @@ class UnifiedJobStorage:
         job_types: Optional[List[JobType]] = None,
         status: Optional[JobStatus] = None,
         task_types: Optional[List[str]] = None,
-        page: int = 1
+        page: int = 1,
+        cursor: Optional[str] = None
     ) -> Tuple[List[EnhancedJobData], Dict[str, Any]]:
-        """Get user jobs with filtering and pagination"""
+        """
+        Get user jobs with filtering and pagination.
+        
+        Filters covered by a composite index are pushed down to Firestore;
+        pages continue from `cursor` (the `next_cursor` of the previous page)
+        via start_after, falling back to an offset for page-number access.
+        An offset counts unfiltered documents, so when filters remain to be
+        applied in Python only cursor access is accepted (ValueError otherwise)
+        and the total is an estimate from the matches seen.
+        """
+        
+        plan = plan_job_query(
+            user_id=user_id,
+            job_types=[_enum_value(t) for t in job_types] if job_types else None,
+            status=_enum_value(status) if status else None,
+            task_types=[_enum_value(t) for t in task_types] if task_types else None
+        )
+        start_after = decode_cursor(cursor)
+        if page > 1 and start_after is None and not plan.exact:
+            raise ValueError(
+                f"Page {page} requested without a cursor, but filters {sorted(plan.residual)} "
+                f"cannot be served by an index; continue from next_cursor instead"
+            )
         
         try:
             logger.debug(f"Querying jobs for user {user_id}: types={job_types}, status={status}")
             
             # Build cache key
-            cache_key = f"user_jobs:{user_id}:{limit}:{job_types}:{status}:{task_types}:{page}"
+            cache_key = f"user_jobs:{user_id}:{limit}:{job_types}:{status}:{task_types}:{page}:{cursor}"
             cached = self._get_cached(cache_key)
             if cached:
                 return cached
             
-            # Get jobs from the jobs collection (new format only)
-            all_jobs = self.job_manager.get_recent_jobs(limit * 2)
-            
-            # Filter jobs
-            filtered_jobs = []
-            for job_data in all_jobs:
-                # Filter by user
-                if user_id != "all" and job_data.get('user_id', 'current_user') != user_id:
-                    continue
-                
-                # Convert to enhanced job ONLY if it's in the new format
-                # This will return None for legacy jobs
-                enhanced_job = EnhancedJobData.from_job_data(job_data)
-                if enhanced_job is None:
-                    # Skip legacy jobs completely
-                    continue
-                
-                # Filter by job types
-                if job_types and enhanced_job.job_type not in job_types:
-                    continue
-                
-                # Filter by status
-                if status and enhanced_job.status != status:
-                    continue
+            offset = 0 if start_after or page <= 1 else (page - 1) * limit
+            
+            # Fetch one extra match to know whether another page exists; residual
+            # filters need overfetching, bounded so sparse filters stay cheap
+            fetch_size = limit + 1 if plan.exact else min((limit + 1) * 3, 300)
+            matched: List[Tuple[str, EnhancedJobData]] = []
+            scanned = 0
+            last_scanned_id = None
+            
+            for _ in range(self.MAX_SCAN_BATCHES):
+                docs, start_after = self.job_manager.query_jobs(plan, fetch_size, start_after, offset)
+                offset = 0
+                scanned += len(docs)
+                if docs:
+                    last_scanned_id = docs[-1]['id']
                 
-                # Filter by task types
-                if task_types and enhanced_job.task_type not in task_types:
-                    continue
+                for job_data in docs:
+                    if not plan.matches(job_data):
+                        continue
+                    # Convert to enhanced job ONLY if it's in the new format
+                    enhanced_job = EnhancedJobData.from_job_data(job_data)
+                    if enhanced_job is None:
+                        # Skip legacy jobs completely
+                        continue
+                    matched.append((job_data['id'], enhanced_job))
                 
-                filtered_jobs.append(enhanced_job)
-            
-            # Sort by created_at descending
-            filtered_jobs.sort(key=lambda x: x.created_at, reverse=True)
-            
-            # Implement pagination
-            start_idx = (page - 1) * limit
-            end_idx = start_idx + limit
-            paginated_jobs = filtered_jobs[start_idx:end_idx]
+                if len(matched) > limit or len(docs) < fetch_size:
+                    break
+            
+            paginated = matched[:limit]
+            has_more = len(matched) > limit or len(docs) == fetch_size
+            # A short page means the scan budget ran out; resume after the last scanned doc
+            next_id = paginated[-1][0] if len(matched) > limit else last_scanned_id
+            # Residual filters run after counting, so the aggregation count would
+            # include other users' or types' jobs; report the matches seen instead
+            total = self._count_user_jobs(plan) if plan.exact else None
+            total_is_estimate = total is None
+            if total is None:
+                total = (page - 1) * limit + len(matched)
             
             # Build pagination info
             pagination = {
                 'page': page,
                 'per_page': limit,
-                'total': len(filtered_jobs),
-                'total_pages': (len(filtered_jobs) + limit - 1) // limit,
-                'has_more': end_idx < len(filtered_jobs)
+                'total': total,
+                'total_pages': (total + limit - 1) // limit,
+                'has_more': has_more,
+                'next_cursor': encode_cursor(next_id) if has_more and next_id else None,
+                'total_is_estimate': total_is_estimate
             }
+            logger.debug(f"User jobs query plan {plan.describe()}: scanned {scanned}, matched {len(matched)}")
             
-            result = (paginated_jobs, pagination)
+            result = ([job for _, job in paginated], pagination)
             
             # Cache result
             self._set_cached(cache_key, result, ttl=60)  # Shorter TTL for user lists
@@ -185,7 +224,18 @@ class UnifiedJobStorage:
             
         except Exception as e:
             logger.error(f"❌ Failed to get user jobs: {e}")
-            return [], {'page': page, 'per_page': limit, 'total': 0, 'total_pages': 0, 'has_more': False}
+            return [], {'page': page, 'per_page': limit, 'total': 0, 'total_pages': 0, 'has_more': False,
+                        'next_cursor': None, 'total_is_estimate': False}
+    
+    def _count_user_jobs(self, plan: JobQueryPlan) -> Optional[int]:
+        """Aggregation count for an exact plan, cached longer than the pages themselves"""
+        cache_key = f"user_jobs_count:{plan.equality}:{plan.membership}"
+        cached = self._get_cached(cache_key)
+        if cached is None:
+            cached = self.job_manager.count_jobs(plan)
+            if cached is not None:
+                self._set_cached(cache_key, cached, ttl=120)
+        return cached
     
     async def get_batch_children(
         self, 
@@ -257,19 +307,39 @@ class UnifiedJobStorage:
             if not parent or parent.job_type != JobType.BATCH_PARENT:
                 return None
             
-            # Get children
-            children = await self.get_batch_children(batch_id, include_results)
+            # Statistics come from the columnar frame; EnhancedJobData objects
+            # are only built for the children actually returned
+            frame = await self.get_batch_frame(batch_id)
+            parent.update_batch_progress_from_frame(frame)
             
-            # Calculate statistics
-            child_statuses = [child.status for child in children]
-            statistics = parent.calculate_batch_progress(child_statuses)
+            if include_results:
+                children = await self.get_batch_children(batch_id, include_results)
+            else:
+                children = frame.jobs()
             
-            return parent, children, statistics
+            return parent, children, parent.batch_progress
             
         except Exception as e:
             logger.error(f"❌ Failed to get batch with children {batch_id}: {e}")
             return None
     
+    async def get_batch_frame(self, batch_parent_id: str) -> JobFrame:
+        """Get batch children as a columnar JobFrame for status/progress reads"""
+        
+        try:
+            cache_key = f"batch_frame:{batch_parent_id}"
+            cached = self._get_cached(cache_key)
+            if cached is not None:
+                return cached
+            
+            frame = JobFrame.from_job_data(await run_sync(self.job_manager.get_batch_jobs, batch_parent_id))
+            self._set_cached(cache_key, frame, ttl=30)  # Short TTL for dynamic data
+            return frame
+            
+        except Exception as e:
+            logger.error(f"❌ Failed to get batch frame for {batch_parent_id}: {e}")
+            return JobFrame()
+    
     # === Search and Query Helpers ===
     
     async def search_jobs(
@@ -456,62 +526,50 @@ class UnifiedJobStorage:
     
     # === Cache Management ===
     
+    @staticmethod
+    def _cache_scopes(key: str) -> List[str]:
+        """Invalidation scopes for a cache key, derived from its prefix"""
+        kind, _, rest = key.partition(':')
+        subject = rest.split(':', 1)[0]
+        if kind == 'job':
+            return [job_scope(subject)]
+        if kind in ('user_jobs', 'user_stats'):
+            return [f"user:{subject}"]
+        if kind == 'user_jobs_count':
+            return ["user_jobs_count"]
+        if kind in ('batch_children', 'batch_frame'):
+            return [batch_scope(subject)]
+        return []
+    
     def _get_cached(self, key: str) -> Any:
         """Get item from cache if not expired"""
-        if key in self._cache:
-            entry = self._cache[key]
-            if time.time() - entry['timestamp'] < entry['ttl']:
-                return entry['data']
-            else:
-                del self._cache[key]
-        return None
+        return self._cache.get_local(key)
     
     def _set_cached(self, key: str, data: Any, ttl: int = None) -> None:
         """Set item in cache with TTL"""
-        if ttl is None:
-            ttl = self._cache_ttl
-        
-        self._cache[key] = {
-            'data': data,
-            'timestamp': time.time(),
-            'ttl': ttl
-        }
-        
-        # Simple cache cleanup
-        if len(self._cache) > 100:
-            # Remove oldest entries
-            oldest_keys = sorted(
-                self._cache.keys(),
-                key=lambda k: self._cache[k]['timestamp']
-            )[:20]
-            
-            for key in oldest_keys:
-                del self._cache[key]
+        self._cache.set_local(key, data, scopes=self._cache_scopes(key), ttl=ttl or self._cache_ttl)
     
     def _invalidate_job_cache(self, job_id: str) -> None:
-        """Invalidate cache entries for a specific job"""
-        keys_to_remove = [key for key in self._cache.keys() if f":{job_id}:" in key or key.endswith(f":{job_id}")]
-        for key in keys_to_remove:
-            del self._cache[key]
+        """Invalidate cache entries for a specific job (here now, other replicas via its scope)"""
+        self._cache.invalidate_local_where(lambda key: f":{job_id}:" in key or key.endswith(f":{job_id}"))
+        spawn(self._cache.invalidate(scopes=[job_scope(job_id)]))
     
     def _invalidate_user_cache(self, user_id: str) -> None:
         """Invalidate cache entries for a specific user"""
-        keys_to_remove = [key for key in self._cache.keys() if key.startswith(f"user_jobs:{user_id}:") or key.startswith(f"user_stats:{user_id}")]
-        for key in keys_to_remove:
-            del self._cache[key]
+        self._cache.invalidate_local_where(
+            lambda key: key.startswith(f"user_jobs:{user_id}:") or key.startswith(f"user_stats:{user_id}")
+            or key.startswith("user_jobs_count:")
+        )
+        spawn(self._cache.invalidate(scopes=[f"user:{user_id}", "user_jobs_count"]))
     
     def clear_cache(self) -> None:
         """Clear all cache entries"""
-        self._cache.clear()
+        self._cache.clear_local()
         logger.debug("Cache cleared")
     
     def get_cache_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
-        return {
-            'entries': len(self._cache),
-            'keys': list(self._cache.keys()),
-            'memory_usage_estimate': len(str(self._cache))
-        }
+        return self._cache.stats()
 
 # Global instance
 unified_job_storage = UnifiedJobStorage()
\ No newline at end of file
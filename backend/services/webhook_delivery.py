@@ -0,0 +1,347 @@
+"""
+Webhook Delivery Engine
+Batched, rate-bounded webhook delivery with scheduled retries and per-endpoint
+circuit breaking.
+
+Events are queued per endpoint and coalesced: each endpoint has at most one
+request in flight, carrying every event that arrived since its last send (up
+to max_batch_events). Failed deliveries are rescheduled with backoff in a
+retry store instead of sleeping in the caller, and an endpoint that keeps
+failing is skipped until its breaker half-opens. The HTTP transport is
+injected, so the engine itself has no network dependencies; store calls run
+on the offload pool so a Firestore-backed store never blocks the loop.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from services.offload import run_sync
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class WebhookEndpoint:
+    """
+    Where and how to deliver; one per registered webhook.
+
+    The signing secret is not part of the endpoint: the transport looks it up
+    by webhook_id when sending, so persisted retries never hold it.
+    """
+    webhook_id: str
+    user_id: str
+    url: str
+    timeout_seconds: float = 30.0
+    max_attempts: int = 3
+
+    @property
+    def key(self) -> str:
+        return f"{self.user_id}/{self.webhook_id}"
+
+@dataclass
+class WebhookDelivery:
+    """One HTTP request carrying one or more events for an endpoint"""
+    endpoint: WebhookEndpoint
+    events: List[Dict[str, Any]]
+    delivery_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    attempt: int = 0
+    next_attempt_at: float = 0.0
+    last_status: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'delivery_id': self.delivery_id,
+            'endpoint': self.endpoint.__dict__.copy(),
+            'events': self.events,
+            'attempt': self.attempt,
+            'next_attempt_at': self.next_attempt_at,
+            'last_status': self.last_status,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'WebhookDelivery':
+        return cls(
+            # Records written before secrets were dropped still carry one; ignore it
+            endpoint=WebhookEndpoint(**{k: v for k, v in data['endpoint'].items() if k != 'secret'}),
+            events=data['events'],
+            delivery_id=data['delivery_id'],
+            attempt=data.get('attempt', 0),
+            next_attempt_at=data.get('next_attempt_at', 0.0),
+            last_status=data.get('last_status'),
+        )
+
+class MemoryDeliveryStore:
+    """Retry store kept in process; WebhookService swaps in a Firestore-backed one"""
+
+    def __init__(self):
+        self._deliveries: Dict[str, Dict[str, Any]] = {}
+
+    def save(self, delivery: WebhookDelivery) -> None:
+        self._deliveries[delivery.delivery_id] = delivery.to_dict()
+
+    def remove(self, delivery_id: str) -> None:
+        self._deliveries.pop(delivery_id, None)
+
+    def load_pending(self) -> List[WebhookDelivery]:
+        return [WebhookDelivery.from_dict(data) for data in self._deliveries.values()]
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker for one endpoint.
+
+    Opens after failure_threshold failures in a row; once open_seconds have
+    passed it lets a single probe through (half-open). A successful probe
+    closes it, a failed one reopens it for twice as long (up to max_open_seconds).
+    """
+
+    def __init__(self, failure_threshold: int = 5, open_seconds: float = 60.0, max_open_seconds: float = 3600.0):
+        self.failure_threshold = failure_threshold
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.open_seconds = open_seconds
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.failure_threshold:
+            return "closed"
+        return "half_open" if self.probing else "open"
+
+    def allow(self, now: float) -> bool:
+        if self.failures < self.failure_threshold:
+            return True
+        if now < self.open_until or self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.probing = False
+        self.open_seconds = self.base_open_seconds
+
+    def record_failure(self, now: float) -> None:
+        if self.probing:
+            self.open_seconds = min(self.open_seconds * 2, self.max_open_seconds)
+        self.probing = False
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.open_until = now + self.open_seconds
+
+Transport = Callable[[WebhookDelivery], Awaitable[int]]
+EndpointCallback = Callable[[WebhookEndpoint, bool], Awaitable[None]]
+
+class WebhookDeliveryEngine:
+    """Background delivery loop over per-endpoint event queues and a retry store"""
+
+    def __init__(self, transport: Transport, store=None, batch_window: float = 1.0,
+                 max_batch_events: int = 100, max_in_flight: int = 50,
+                 retry_delays: Sequence[float] = (5, 15, 30, 120, 600),
+                 failure_threshold: int = 5, open_seconds: float = 60.0,
+                 on_result: Optional[EndpointCallback] = None,
+                 on_gone: Optional[Callable[[WebhookEndpoint], Awaitable[None]]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.transport = transport
+        self.store = store or MemoryDeliveryStore()
+        self.batch_window = batch_window
+        self.max_batch_events = max_batch_events
+        self.max_in_flight = max_in_flight
+        self.retry_delays = tuple(retry_delays)
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.on_result = on_result
+        self.on_gone = on_gone
+        self.clock = clock
+
+        self._endpoints: Dict[str, WebhookEndpoint] = {}
+        self._queued: Dict[str, List[Dict[str, Any]]] = {}
+        self._first_queued_at: Dict[str, float] = {}
+        self._retries: Dict[str, WebhookDelivery] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._busy: set = set()
+        self._tasks: set = set()
+        self._wake: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+        self.stats = {'events': 0, 'requests': 0, 'delivered_events': 0, 'retries_scheduled': 0,
+                      'dropped_events': 0, 'circuit_skips': 0}
+
+    # === Producer side ===
+
+    def enqueue(self, endpoint: WebhookEndpoint, event: Dict[str, Any]) -> None:
+        """Queue an event for an endpoint; never blocks on the network"""
+        key = endpoint.key
+        self._endpoints[key] = endpoint
+        self._queued.setdefault(key, []).append(event)
+        self._first_queued_at.setdefault(key, self.clock())
+        self.stats['events'] += 1
+        self._ensure_running()
+        if len(self._queued[key]) >= self.max_batch_events:
+            self._wake.set()
+
+    def _ensure_running(self) -> None:
+        if self._runner is not None and not self._runner.done():
+            return
+        self._wake = asyncio.Event()
+        self._runner = asyncio.create_task(self._run())
+
+    async def _load_pending(self) -> None:
+        """Pick up retries persisted by an earlier run (claimed by this replica)"""
+        for delivery in await run_sync(self.store.load_pending):
+            self._retries.setdefault(delivery.delivery_id, delivery)
+            self._endpoints.setdefault(delivery.endpoint.key, delivery.endpoint)
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker(self.failure_threshold, self.open_seconds)
+        return self._breakers[key]
+
+    # === Delivery loop ===
+
+    def _due(self, now: float) -> List[WebhookDelivery]:
+        """Deliveries ready to send now, at most one per idle endpoint"""
+        due: List[WebhookDelivery] = []
+        for delivery in sorted(self._retries.values(), key=lambda d: d.next_attempt_at):
+            key = delivery.endpoint.key
+            if delivery.next_attempt_at <= now and key not in self._busy:
+                due.append(self._retries.pop(delivery.delivery_id))
+                self._busy.add(key)
+
+        for key in list(self._queued):
+            events = self._queued[key]
+            ready = len(events) >= self.max_batch_events or now - self._first_queued_at[key] >= self.batch_window
+            if not ready or key in self._busy:
+                continue
+            batch, rest = events[:self.max_batch_events], events[self.max_batch_events:]
+            if rest:
+                self._queued[key] = rest
+                self._first_queued_at[key] = now
+            else:
+                del self._queued[key]
+                del self._first_queued_at[key]
+            due.append(WebhookDelivery(self._endpoints[key], batch))
+            self._busy.add(key)
+        return due
+
+    def _next_wakeup(self, now: float) -> float:
+        times = [d.next_attempt_at for d in self._retries.values()]
+        times += [t + self.batch_window for t in self._first_queued_at.values()]
+        return max(0.01, min(times) - now) if times else 3600.0
+
+    async def _run(self) -> None:
+        await self._load_pending()
+        while True:
+            now = self.clock()
+            for delivery in self._due(now):
+                if len(self._tasks) >= self.max_in_flight:
+                    # Over the global limit: put it back for the next pass
+                    self._busy.discard(delivery.endpoint.key)
+                    delivery.next_attempt_at = now
+                    self._retries[delivery.delivery_id] = delivery
+                    continue
+                task = asyncio.create_task(self._attempt(delivery))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self._next_wakeup(self.clock()))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _attempt(self, delivery: WebhookDelivery) -> None:
+        endpoint = delivery.endpoint
+        breaker = self.breaker(endpoint.key)
+        now = self.clock()
+        try:
+            if not breaker.allow(now):
+                self.stats['circuit_skips'] += 1
+                delivery.next_attempt_at = max(breaker.open_until, now + self.batch_window)
+                self._retries[delivery.delivery_id] = delivery
+                return
+
+            self.stats['requests'] += 1
+            try:
+                status = await self.transport(delivery)
+            except Exception as e:
+                logger.warning(f"⚠️ Webhook error (attempt {delivery.attempt + 1}/{endpoint.max_attempts}): {e}")
+                status = None
+            delivery.last_status = status
+            await self._settle(delivery, status, breaker)
+        finally:
+            self._busy.discard(endpoint.key)
+            if self._wake is not None:
+                self._wake.set()
+
+    async def _settle(self, delivery: WebhookDelivery, status: Optional[int], breaker: CircuitBreaker) -> None:
+        endpoint = delivery.endpoint
+        if status is not None and 200 <= status < 300:
+            breaker.record_success()
+            self.stats['delivered_events'] += len(delivery.events)
+            await run_sync(self.store.remove, delivery.delivery_id)
+            await self._notify(endpoint, True)
+            return
+
+        if status == 410:
+            logger.warning(f"⚠️ Webhook returned 410 Gone, disabling: {endpoint.url}")
+            await run_sync(self.store.remove, delivery.delivery_id)
+            self.stats['dropped_events'] += len(delivery.events)
+            if self.on_gone:
+                await self.on_gone(endpoint)
+            return
+
+        breaker.record_failure(self.clock())
+        delivery.attempt += 1
+        if delivery.attempt >= endpoint.max_attempts:
+            logger.error(f"❌ Webhook failed after {delivery.attempt} attempts: {endpoint.url}")
+            await run_sync(self.store.remove, delivery.delivery_id)
+            self.stats['dropped_events'] += len(delivery.events)
+            await self._notify(endpoint, False)
+            return
+
+        delay = self.retry_delays[min(delivery.attempt - 1, len(self.retry_delays) - 1)]
+        delivery.next_attempt_at = self.clock() + delay
+        await run_sync(self.store.save, delivery)
+        self._retries[delivery.delivery_id] = delivery
+        self.stats['retries_scheduled'] += 1
+
+    async def _notify(self, endpoint: WebhookEndpoint, success: bool) -> None:
+        if self.on_result:
+            try:
+                await self.on_result(endpoint, success)
+            except Exception as e:
+                logger.error(f"Failed to update webhook status: {e}")
+
+    # === Lifecycle ===
+
+    async def drain(self, timeout: float = 10.0) -> None:
+        """Send everything queued now (ignoring the batch window) and wait for in-flight requests"""
+        deadline = self.clock() + timeout
+        for key in list(self._first_queued_at):
+            self._first_queued_at[key] = float('-inf')
+        while (self._queued or self._tasks) and self.clock() < deadline:
+            if self._wake is not None:
+                self._wake.set()
+            await asyncio.sleep(0.01)
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'queued_events': sum(len(events) for events in self._queued.values()),
+            'scheduled_retries': len(self._retries),
+            'in_flight': len(self._tasks),
+            'open_circuits': [key for key, b in self._breakers.items() if b.state != "closed"],
+        }
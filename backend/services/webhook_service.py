@@ -5,18 +5,32 @@ Handles job completion callbacks and status updates
 
 import os
 import json
+import time
 import logging
 import hmac
 import hashlib
 import asyncio
+import uuid
 import aiohttp
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime, timedelta
 from google.cloud import firestore
+from config.gcp_clients import SharedFirestoreClient
 from pydantic import BaseModel, HttpUrl
+from services.offload import run_sync
+from services.webhook_delivery import WebhookDelivery, WebhookDeliveryEngine, WebhookEndpoint
 
 logger = logging.getLogger(__name__)
 
+# Delivery tuning: events for one endpoint are coalesced over the batch window
+WEBHOOK_BATCH_WINDOW_SECONDS = float(os.getenv("WEBHOOK_BATCH_WINDOW_SECONDS", "2"))
+WEBHOOK_MAX_BATCH_EVENTS = int(os.getenv("WEBHOOK_MAX_BATCH_EVENTS", "100"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "100"))
+WEBHOOK_CONNECTIONS_PER_HOST = int(os.getenv("WEBHOOK_CONNECTIONS_PER_HOST", "4"))
+WEBHOOK_CONFIG_CACHE_SECONDS = 30
+# How long a replica holds a persisted retry past its scheduled attempt
+WEBHOOK_DELIVERY_LEASE_SECONDS = float(os.getenv("WEBHOOK_DELIVERY_LEASE_SECONDS", "300"))
+
 class WebhookConfig(BaseModel):
     """Webhook configuration for a user"""
     url: HttpUrl
@@ -36,15 +50,102 @@ class WebhookPayload(BaseModel):
     data: Dict[str, Any]
     signature: Optional[str] = None
 
+class FirestoreDeliveryStore:
+    """
+    Scheduled webhook retries persisted in Firestore so they survive restarts.
+    
+    Each record is leased (lease_owner, lease_until) to the replica that
+    scheduled it. On startup a replica only takes records whose lease has
+    lapsed, claiming each in a transaction, so every retry is sent by one
+    replica rather than by all of them.
+    """
+    
+    db = SharedFirestoreClient()
+    
+    def __init__(self, collection: str = 'webhook_deliveries',
+                 lease_seconds: float = WEBHOOK_DELIVERY_LEASE_SECONDS):
+        self.collection = collection
+        self.lease_seconds = lease_seconds
+        self.owner = uuid.uuid4().hex
+    
+    def _leased(self, delivery: WebhookDelivery, now: float) -> Dict[str, Any]:
+        return {
+            **delivery.to_dict(),
+            'lease_owner': self.owner,
+            'lease_until': max(now, delivery.next_attempt_at) + self.lease_seconds
+        }
+    
+    def save(self, delivery: WebhookDelivery) -> None:
+        try:
+            self.db.collection(self.collection).document(delivery.delivery_id)\
+                .set(self._leased(delivery, time.time()))
+        except Exception as e:
+            logger.warning(f"⚠️ Could not persist webhook retry {delivery.delivery_id}: {e}")
+    
+    def remove(self, delivery_id: str) -> None:
+        try:
+            self.db.collection(self.collection).document(delivery_id).delete()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not remove webhook retry {delivery_id}: {e}")
+    
+    def load_pending(self) -> List[WebhookDelivery]:
+        now = time.time()
+        claimed = []
+        try:
+            for doc in self.db.collection(self.collection).stream():
+                if doc.to_dict().get('lease_until', 0) >= now:
+                    continue  # Held by a live replica
+                delivery = self._claim(doc.reference, now)
+                if delivery is not None:
+                    claimed.append(delivery)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load persisted webhook retries: {e}")
+        if claimed:
+            logger.info(f"♻️ Claimed {len(claimed)} persisted webhook retries")
+        return claimed
+    
+    def _claim(self, ref, now: float) -> Optional[WebhookDelivery]:
+        """Take over a retry whose lease lapsed; None if another replica got it first"""
+        
+        @firestore.transactional
+        def claim(transaction) -> Optional[WebhookDelivery]:
+            snapshot = ref.get(transaction=transaction)
+            data = snapshot.to_dict() if snapshot.exists else None
+            if not data or data.get('lease_until', 0) >= now:
+                return None
+            delivery = WebhookDelivery.from_dict(data)
+            # Rewrite the whole record so older ones lose their stored secret
+            transaction.set(ref, self._leased(delivery, now))
+            return delivery
+        
+        return claim(self.db.transaction())
+
 class WebhookService:
     """Service for managing and sending webhook notifications"""
     
+    db = SharedFirestoreClient()
+    
     def __init__(self):
-        self.db = firestore.Client()
         self.webhook_secret = os.getenv('WEBHOOK_SECRET', 'omtx-hub-webhook-secret')
         self.max_retries = 3
         self.retry_delay = [5, 15, 30]  # Seconds between retries
         
+        # One pooled session for every delivery, created on first use
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._webhook_cache: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+        
+        self.delivery = WebhookDeliveryEngine(
+            transport=self._post_delivery,
+            store=FirestoreDeliveryStore(),
+            batch_window=WEBHOOK_BATCH_WINDOW_SECONDS,
+            max_batch_events=WEBHOOK_MAX_BATCH_EVENTS,
+            max_in_flight=WEBHOOK_MAX_CONNECTIONS,
+            retry_delays=self.retry_delay,
+            on_result=self._update_webhook_status,
+            on_gone=self._disable_webhook,
+            clock=time.time  # Wall clock so persisted retry times survive restarts
+        )
+        
         logger.info("🔔 Webhook Service initialized")
     
     async def register_webhook(self, user_id: str, config: WebhookConfig) -> Dict[str, Any]:
@@ -90,16 +191,9 @@ class WebhookService:
         status: str, 
         results: Optional[Dict[str, Any]] = None
     ):
-        """Send webhook notification for job completion"""
+        """Queue webhook notification for job completion"""
         
         try:
-            # Get user's webhook configurations
-            webhooks = await self._get_user_webhooks(user_id)
-            
-            if not webhooks:
-                logger.debug(f"No webhooks configured for user {user_id}")
-                return
-            
             # Determine event type
             event = "job.completed" if status == "completed" else "job.failed"
             
@@ -117,15 +211,9 @@ class WebhookService:
                 }
             )
             
-            # Send to all active webhooks
-            tasks = []
-            for webhook in webhooks:
-                if event in webhook.get('events', []) and webhook.get('active', False):
-                    tasks.append(self._send_webhook(webhook, payload))
-            
-            if tasks:
-                await asyncio.gather(*tasks, return_exceptions=True)
-                logger.info(f"📤 Sent {len(tasks)} webhook notifications for job {job_id}")
+            queued = await self._queue_event(user_id, payload)
+            if queued:
+                logger.debug(f"📤 Queued {queued} webhook notifications for job {job_id}")
             
         except Exception as e:
             logger.error(f"❌ Failed to send job completion webhook: {e}")
@@ -139,16 +227,9 @@ class WebhookService:
         failed_jobs: int,
         summary: Optional[Dict[str, Any]] = None
     ):
-        """Send webhook notification for batch completion"""
+        """Queue webhook notification for batch completion"""
         
         try:
-            # Get user's webhook configurations
-            webhooks = await self._get_user_webhooks(user_id)
-            
-            if not webhooks:
-                logger.debug(f"No webhooks configured for user {user_id}")
-                return
-            
             # Create payload
             payload = WebhookPayload(
                 event="batch.completed",
@@ -168,94 +249,126 @@ class WebhookService:
                 }
             )
             
-            # Send to all active webhooks
-            tasks = []
-            for webhook in webhooks:
-                if "batch.completed" in webhook.get('events', []) and webhook.get('active', False):
-                    tasks.append(self._send_webhook(webhook, payload))
-            
-            if tasks:
-                await asyncio.gather(*tasks, return_exceptions=True)
-                logger.info(f"📤 Sent {len(tasks)} webhook notifications for batch {batch_id}")
+            queued = await self._queue_event(user_id, payload)
+            if queued:
+                logger.info(f"📤 Queued {queued} webhook notifications for batch {batch_id}")
             
         except Exception as e:
             logger.error(f"❌ Failed to send batch completion webhook: {e}")
     
+    async def _queue_event(self, user_id: str, payload: WebhookPayload) -> int:
+        """Hand the event to the delivery engine for every subscribed webhook"""
+        
+        webhooks = await self._get_user_webhooks(user_id)
+        if not webhooks:
+            logger.debug(f"No webhooks configured for user {user_id}")
+            return 0
+        
+        event = json.loads(payload.json())
+        queued = 0
+        for webhook in webhooks:
+            if payload.event in webhook.get('events', []) and webhook.get('active', False):
+                self.delivery.enqueue(WebhookEndpoint(
+                    webhook_id=webhook['webhook_id'],
+                    user_id=user_id,
+                    url=webhook['url'],
+                    timeout_seconds=webhook.get('timeout_seconds', 30),
+                    max_attempts=webhook.get('retry_count', self.max_retries)
+                ), event)
+                queued += 1
+        return queued
+    
     async def _get_user_webhooks(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get all active webhooks for a user"""
+        """Get all active webhooks for a user (cached briefly; completions arrive in bursts)"""
+        
+        cached = self._webhook_cache.get(user_id)
+        if cached and time.time() - cached[0] < WEBHOOK_CONFIG_CACHE_SECONDS:
+            return cached[1]
         
         try:
             webhooks_ref = self.db.collection('users').document(user_id)\
                 .collection('webhooks')
             
-            webhooks = []
-            for doc in webhooks_ref.where('active', '==', True).stream():
-                webhooks.append(doc.to_dict())
+            webhooks = await run_sync(
+                lambda: [doc.to_dict() for doc in webhooks_ref.where('active', '==', True).stream()]
+            )
             
+            self._webhook_cache[user_id] = (time.time(), webhooks)
             return webhooks
             
         except Exception as e:
             logger.error(f"Failed to get user webhooks: {e}")
             return []
     
-    async def _send_webhook(self, webhook_config: Dict[str, Any], payload: WebhookPayload):
-        """Send webhook with retries and signature verification"""
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Pooled session: connections, DNS and TLS sessions are reused across deliveries"""
         
-        url = webhook_config['url']
-        secret = webhook_config.get('secret', self.webhook_secret)
-        timeout = webhook_config.get('timeout_seconds', 30)
-        max_retries = webhook_config.get('retry_count', self.max_retries)
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=WEBHOOK_MAX_CONNECTIONS,
+                    limit_per_host=WEBHOOK_CONNECTIONS_PER_HOST,
+                    ttl_dns_cache=300,
+                    keepalive_timeout=60
+                )
+            )
+        return self._session
+    
+    async def _post_delivery(self, delivery: WebhookDelivery) -> int:
+        """
+        POST one delivery and return the HTTP status.
         
-        # Generate HMAC signature
-        payload_json = payload.json()
-        signature = self._generate_signature(payload_json, secret)
-        payload.signature = signature
+        A single event is sent in the standard payload format; coalesced
+        events are sent as an "events.batch" envelope listing each payload.
+        The signing secret is looked up by webhook id; a webhook that is no
+        longer active is reported as 410 so its delivery is dropped.
+        """
         
+        endpoint = delivery.endpoint
+        webhooks = await self._get_user_webhooks(endpoint.user_id)
+        webhook = next((w for w in webhooks if w.get('webhook_id') == endpoint.webhook_id), None)
+        if webhook is None:
+            logger.warning(f"⚠️ Webhook {endpoint.webhook_id} is no longer active, dropping delivery")
+            return 410
+        
+        if len(delivery.events) == 1:
+            event_name = delivery.events[0]['event']
+            body = json.dumps(delivery.events[0])
+        else:
+            event_name = "events.batch"
+            body = json.dumps({
+                'event': event_name,
+                'timestamp': datetime.utcnow().isoformat(),
+                'count': len(delivery.events),
+                'events': delivery.events
+            })
+        
+        signature = self._generate_signature(body, webhook.get('secret') or self.webhook_secret)
         headers = {
             'Content-Type': 'application/json',
             'X-OMTX-Signature': signature,
-            'X-OMTX-Event': payload.event,
-            'X-OMTX-Timestamp': payload.timestamp
+            'X-OMTX-Event': event_name,
+            'X-OMTX-Timestamp': datetime.utcnow().isoformat(),
+            'X-OMTX-Delivery': delivery.delivery_id
         }
         
-        # Send with retries
-        for attempt in range(max_retries):
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(
-                        url,
-                        data=payload_json,
-                        headers=headers,
-                        timeout=aiohttp.ClientTimeout(total=timeout)
-                    ) as response:
-                        if response.status == 200:
-                            logger.info(f"✅ Webhook sent successfully to {url}")
-                            await self._update_webhook_status(
-                                webhook_config['webhook_id'], 
-                                success=True
-                            )
-                            return
-                        elif response.status == 410:  # Gone - webhook should be disabled
-                            logger.warning(f"⚠️ Webhook returned 410 Gone, disabling: {url}")
-                            await self._disable_webhook(webhook_config['webhook_id'])
-                            return
-                        else:
-                            error_text = await response.text()
-                            logger.warning(f"Webhook returned {response.status}: {error_text}")
-                            
-            except asyncio.TimeoutError:
-                logger.warning(f"⏱️ Webhook timeout (attempt {attempt + 1}/{max_retries}): {url}")
-            except Exception as e:
-                logger.warning(f"⚠️ Webhook error (attempt {attempt + 1}/{max_retries}): {e}")
-            
-            # Wait before retry (if not last attempt)
-            if attempt < max_retries - 1:
-                delay = self.retry_delay[min(attempt, len(self.retry_delay) - 1)]
-                await asyncio.sleep(delay)
-        
-        # All retries failed
-        logger.error(f"❌ Webhook failed after {max_retries} attempts: {url}")
-        await self._update_webhook_status(webhook_config['webhook_id'], success=False)
+        try:
+            async with self._get_session().post(
+                endpoint.url,
+                data=body,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=endpoint.timeout_seconds)
+            ) as response:
+                if 200 <= response.status < 300:
+                    await response.read()
+                    logger.info(f"✅ Webhook sent successfully to {endpoint.url} ({len(delivery.events)} events)")
+                else:
+                    error_text = await response.text()
+                    logger.warning(f"Webhook returned {response.status}: {error_text[:500]}")
+                return response.status
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ Webhook timeout (attempt {delivery.attempt + 1}/{endpoint.max_attempts}): {endpoint.url}")
+            raise
     
     def _generate_signature(self, payload: str, secret: str) -> str:
         """Generate HMAC-SHA256 signature for webhook payload"""
@@ -268,12 +381,14 @@ class WebhookService:
         
         return f"sha256={signature}"
     
-    async def _update_webhook_status(self, webhook_id: str, success: bool):
-        """Update webhook status after send attempt"""
+    def _webhook_ref(self, endpoint: WebhookEndpoint):
+        return self.db.collection('users').document(endpoint.user_id)\
+            .collection('webhooks').document(endpoint.webhook_id)
+    
+    async def _update_webhook_status(self, endpoint: WebhookEndpoint, success: bool):
+        """Update webhook status after a delivery succeeds or exhausts its retries"""
         
         try:
-            # Note: This is a simplified version - you'd need user_id for the full path
-            # In production, you'd pass user_id or store it in the webhook config
             update_data = {
                 'last_triggered': firestore.SERVER_TIMESTAMP
             }
@@ -283,30 +398,40 @@ class WebhookService:
             else:
                 update_data['failure_count'] = 0
             
-            # This would need the full path with user_id in production
-            # self.db.collection('users').document(user_id)\
-            #     .collection('webhooks').document(webhook_id).update(update_data)
+            await run_sync(self._webhook_ref(endpoint).update, update_data)
             
         except Exception as e:
             logger.error(f"Failed to update webhook status: {e}")
     
-    async def _disable_webhook(self, webhook_id: str):
+    async def _disable_webhook(self, endpoint: WebhookEndpoint):
         """Disable a webhook after receiving 410 Gone"""
         
         try:
-            # This would need the full path with user_id in production
-            # self.db.collection('users').document(user_id)\
-            #     .collection('webhooks').document(webhook_id).update({
-            #         'active': False,
-            #         'disabled_at': firestore.SERVER_TIMESTAMP,
-            #         'disabled_reason': 'Received 410 Gone response'
-            #     })
+            await run_sync(self._webhook_ref(endpoint).update, {
+                'active': False,
+                'disabled_at': firestore.SERVER_TIMESTAMP,
+                'disabled_reason': 'Received 410 Gone response'
+            })
+            self._webhook_cache.pop(endpoint.user_id, None)
             
-            logger.info(f"🚫 Webhook disabled: {webhook_id}")
+            logger.info(f"🚫 Webhook disabled: {endpoint.webhook_id}")
             
         except Exception as e:
             logger.error(f"Failed to disable webhook: {e}")
     
+    async def close(self):
+        """Flush queued events, stop the delivery loop and close the pooled session"""
+        
+        await self.delivery.drain()
+        await self.delivery.close()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+    
+    def get_delivery_status(self) -> Dict[str, Any]:
+        """Delivery engine counters for health checks"""
+        
+        return self.delivery.status()
+    
     async def verify_webhook_signature(self, payload: str, signature: str, secret: str) -> bool:
         """Verify incoming webhook signature (for webhook receivers)"""
         
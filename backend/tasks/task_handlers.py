@@ -4,6 +4,7 @@ Handles all 6 prediction task types with proper routing and formatting
 """
 
 import logging
+import re
 import time
 import uuid
 from typing import Dict, Any, List, Optional
@@ -11,9 +12,15 @@ from enum import Enum
 
 from models.model_registry import PredictionTask, model_registry
 from database.unified_job_manager import unified_job_manager  # For job status/metadata using GCP
+from services.ligand_feature_store import ligand_feature_store
 
 logger = logging.getLogger(__name__)
 
+# Compiled once at import; validate_smiles runs for every ligand in a batch
+_SMILES_VALID_CHARS = re.compile(r'^[A-Za-z0-9\[\]()=#@+\-\\.\\/:]*$')
+_SMILES_HAS_LETTER = re.compile(r'[A-Za-z]')
+_SMILES_INVALID_WORDS = ('and', 'or', 'the', 'of', 'in', 'with', 'to', 'from', 'test', 'frontend', 'backend', 'example', 'carbonic', 'anhydrase', 'acetazolamide')
+
 def validate_smiles(smiles: str) -> bool:
     """Validate a SMILES string"""
     if not smiles or not smiles.strip():
@@ -26,26 +33,28 @@ def validate_smiles(smiles: str) -> bool:
         return False
     
     # Reject if it contains common English words that indicate it's not a SMILES
-    invalid_words = ['and', 'or', 'the', 'of', 'in', 'with', 'to', 'from', 'test', 'frontend', 'backend', 'example', 'carbonic', 'anhydrase', 'acetazolamide']
     lower_case = trimmed.lower()
-    for word in invalid_words:
+    for word in _SMILES_INVALID_WORDS:
         if word in lower_case:
             return False
     
     # Basic character validation
-    import re
-    valid_chars = re.compile(r'^[A-Za-z0-9\[\]()=#@+\-\\.\\/:]*$')
-    if not valid_chars.match(trimmed):
+    if not _SMILES_VALID_CHARS.match(trimmed):
         return False
     
     # Must contain at least one letter (element symbol)
-    if not re.search(r'[A-Za-z]', trimmed):
+    if not _SMILES_HAS_LETTER.search(trimmed):
         return False
     
     # Should not be too long (most SMILES are under 200 characters)
     if len(trimmed) > 300:
         return False
     
+    # Reuse RDKit parse results already in the ligand feature store (no I/O)
+    features = ligand_feature_store.peek(trimmed)
+    if features is not None and not features.valid:
+        return False
+    
     return True
 
 class TaskType(str, Enum):
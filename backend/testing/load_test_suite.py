@@ -48,6 +48,7 @@ class StressTestConfig:
     test_duration: int = 300    # seconds
     ramp_down_duration: int = 30
     think_time_range: Tuple[float, float] = (1.0, 3.0)  # seconds between requests
+    stream_status: bool = False  # hold one SSE progress stream per batch instead of polling
     
 class WorkloadScenario:
     """Base class for load testing scenarios"""
@@ -153,10 +154,13 @@ class BatchSubmissionScenario(WorkloadScenario):
             return False
 
 class BatchStatusScenario(WorkloadScenario):
-    """Simulate batch status polling (high frequency)"""
+    """Simulate batch status polling (high frequency), or one progress stream per batch"""
     
-    def __init__(self):
-        super().__init__("batch_status_check", weight=0.6)  # High weight - frequent operation
+    def __init__(self, use_stream: bool = False):
+        # High weight - frequent operation
+        super().__init__("batch_status_stream" if use_stream else "batch_status_check", weight=0.6)
+        self.use_stream = use_stream
+        self.stream_events = 0
         
     async def execute(self, session: aiohttp.ClientSession, user_context: Dict[str, Any]) -> bool:
         """Check status of a batch job"""
@@ -165,6 +169,9 @@ class BatchStatusScenario(WorkloadScenario):
         # Use last submitted batch or generate a random one
         batch_id = user_context.get('last_batch_id', f"test_batch_{random.randint(1000, 9999)}")
         
+        if self.use_stream:
+            return await self._ensure_stream(session, user_context, batch_id)
+        
         try:
             async with session.get(
                 f"{session._connector._base_url}/api/v3/batches/{batch_id}/status",
@@ -185,6 +192,51 @@ class BatchStatusScenario(WorkloadScenario):
             self.record_response(response_time, False, str(e))
             return False
 
+    async def _ensure_stream(self, session: aiohttp.ClientSession, user_context: Dict[str, Any], batch_id: str) -> bool:
+        """Keep one open progress stream per user; only (re)connects count as requests"""
+        stream = user_context.get('status_stream')
+        if stream and stream['batch_id'] == batch_id and not stream['task'].done():
+            return True
+        if stream:
+            stream['task'].cancel()
+        
+        first_event = asyncio.get_running_loop().create_future()
+        task = asyncio.create_task(self._consume_stream(session, batch_id, first_event))
+        user_context['status_stream'] = {'batch_id': batch_id, 'task': task}
+        return await first_event
+    
+    async def _consume_stream(self, session: aiohttp.ClientSession, batch_id: str, first_event: asyncio.Future):
+        """Read SSE events until the batch completes; response time is time to first event"""
+        start_time = time.time()
+        
+        def settle(success: bool, error: str = None):
+            if not first_event.done():
+                self.record_response((time.time() - start_time) * 1000, success, error)
+                first_event.set_result(success)
+        
+        try:
+            async with session.get(
+                f"{session._connector._base_url}/api/v1/batches/{batch_id}/events",
+                timeout=aiohttp.ClientTimeout(total=None, sock_read=60)
+            ) as response:
+                if response.status == 404:  # expected for non-existent batches
+                    settle(True)
+                    return
+                if response.status != 200:
+                    settle(False, f"HTTP {response.status}: {await response.text()}")
+                    return
+                
+                async for line in response.content:
+                    if line.startswith(b"event:"):
+                        self.stream_events += 1
+                        settle(True)
+                settle(True)
+        except asyncio.CancelledError:
+            settle(True)
+            raise
+        except Exception as e:
+            settle(False, str(e))
+
 class BatchListScenario(WorkloadScenario):
     """Simulate batch listing (moderate frequency)"""
     
@@ -427,6 +479,9 @@ class VirtualUser:
     def stop(self):
         """Stop the user simulation"""
         self.is_active = False
+        stream = self.context.pop('status_stream', None)
+        if stream:
+            stream['task'].cancel()
 
 class ProductionLoadTester:
     """
@@ -445,7 +500,7 @@ class ProductionLoadTester:
         self.config = config
         self.scenarios = [
             BatchSubmissionScenario(),
-            BatchStatusScenario(),
+            BatchStatusScenario(use_stream=config.stream_status),
             BatchListScenario(),
             BatchResultsScenario(),
             RateLimitTestScenario(),
@@ -904,6 +959,8 @@ async def main():
     parser.add_argument("--test-type", choices=["smoke", "load", "stress", "spike", "production"], 
                        default="load", help="Type of test to run")
     parser.add_argument("--output", help="Output file for results (JSON)")
+    parser.add_argument("--stream-status", action="store_true",
+                       help="Follow batch progress over SSE instead of polling status")
     
     args = parser.parse_args()
     
@@ -913,7 +970,8 @@ async def main():
         max_concurrent_users=args.users,
         test_duration=args.duration,
         ramp_up_duration=min(30, args.duration // 3),
-        ramp_down_duration=min(15, args.duration // 6)
+        ramp_down_duration=min(15, args.duration // 6),
+        stream_status=args.stream_status
     )
     
     tester = ProductionLoadTester(config)
@@ -0,0 +1,128 @@
+"""
+Test Adaptive Concurrency
+Tests the AIMD limiter, duration learning and the offline simulation harness
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.adaptive_concurrency import (
+    AIMDLimiter, AdaptiveConcurrencyController, DurationEstimator, simulate
+)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestAdaptiveConcurrency:
+    """Test suite for adaptive batch concurrency"""
+
+    def test_limiter_grows_on_success_and_backs_off_on_errors(self):
+        """Test additive increase under load and multiplicative decrease on failure"""
+        limiter = AIMDLimiter(initial_limit=4, max_limit=50)
+        for _ in range(40):
+            assert limiter.try_acquire()
+            limiter.in_flight = limiter.current
+            limiter.release_sample(1.0)
+        grown = limiter.current
+        assert grown > 4
+
+        for _ in range(grown):
+            limiter.on_sample(1.0, success=False)
+        assert limiter.current < grown
+
+    def test_simulation_converges_near_capacity(self):
+        """Test the controller settles around backend capacity and beats a fixed limit"""
+        adaptive = simulate(AdaptiveConcurrencyController(5, 100, 100), jobs=600, capacity=20)
+        fixed = simulate(AdaptiveConcurrencyController(5, 5, 5), jobs=600, capacity=20)
+
+        assert adaptive.completed == 600
+        assert 10 <= adaptive.final_limit <= 30
+        assert adaptive.makespan < fixed.makespan / 2
+
+    def test_slot_enforces_batch_limit_and_queue_backpressure(self):
+        """Test per-batch limits hold under gather and a deep queue shrinks the global limit"""
+        controller = AdaptiveConcurrencyController(initial_limit=3, per_batch_max=2)
+        peak = 0
+
+        async def job():
+            nonlocal peak
+            async with controller.slot("b1"):
+                peak = max(peak, controller.batch_limiter("b1").in_flight)
+                await asyncio.sleep(0)
+
+        async def run():
+            await asyncio.gather(*(job() for _ in range(10)))
+
+        asyncio.run(run())
+        assert peak <= 2
+        assert controller.stats['samples'] == 10
+
+        before = controller.global_limiter.current
+        controller.update_queue_depth(10_000)
+        assert controller.global_limiter.current < before or before == 1
+
+    def test_duration_estimator_needs_samples(self):
+        """Test learned durations replace the default only after enough observations"""
+        estimator = DurationEstimator(min_samples=3)
+        estimator.observe("boltz2", 100.0)
+        assert estimator.estimate("boltz2", 300.0) == 300.0
+        estimator.observe("boltz2", 100.0)
+        estimator.observe("boltz2", 100.0)
+        assert estimator.estimate("boltz2", 300.0) == 100.0
+
+    def test_job_slots_are_held_until_the_job_finishes(self):
+        """Test a dispatched job keeps its slot until release_job, which samples its runtime"""
+        clock = FakeClock()
+        controller = AdaptiveConcurrencyController(initial_limit=2, per_batch_max=2, clock=clock)
+
+        async def run():
+            await controller.acquire_job("b1", "j1")
+            await controller.acquire_job("b1", "j2")
+            assert controller.available("b1") == 0
+            waiting = asyncio.create_task(controller.acquire_job("b1", "j3"))
+            await asyncio.sleep(0)
+            assert not waiting.done()
+
+            controller.forget_batch("b1")
+            clock.now = 90.0
+            assert await controller.release_job("j1") == 90.0
+            await waiting
+            return controller.batch_limiter("b1").baseline_latency
+
+        assert asyncio.run(run()) == 90.0
+        assert controller.status()['held_jobs'] == 2
+        assert asyncio.run(controller.release_job("unknown")) is None
+
+    def test_retired_batch_is_dropped_after_its_last_job_and_stale_holds_expire(self):
+        """Test forget_batch waits for held jobs and holds past held_timeout count as timeouts"""
+        clock = FakeClock()
+        controller = AdaptiveConcurrencyController(initial_limit=4, held_timeout=100.0, clock=clock)
+
+        async def run():
+            await controller.acquire_job("b1", "j1")
+            controller.forget_batch("b1")
+            assert "b1" in controller.status()['batches']
+            clock.now = 101.0
+            assert await controller.expire_jobs() == 1
+
+        asyncio.run(run())
+        assert "b1" not in controller.status()['batches']
+        assert controller.stats['timeouts'] == 1
+
+    def test_slow_start_is_capped_at_the_initial_limit(self):
+        """Test the limiter grows additively from its initial limit unless slow start is configured"""
+        default = AIMDLimiter(initial_limit=5, max_limit=100)
+        probing = AIMDLimiter(initial_limit=5, max_limit=100, slow_start_limit=20)
+        for limiter in (default, probing):
+            for _ in range(5):
+                limiter.in_flight = limiter.current
+                limiter.on_sample(1.0)
+
+        assert default.current == 6
+        assert probing.current == 10
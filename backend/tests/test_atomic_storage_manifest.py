@@ -0,0 +1,179 @@
+"""
+Test Atomic Storage Manifest Commits
+Tests write-once files, manifest publication, pinned reads and orphan sweeping
+"""
+
+import sys
+import os
+import asyncio
+import json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.atomic_storage_service import AtomicStorageService
+
+class PreconditionFailed(Exception):
+    pass
+
+class FakeObjectStore:
+    """
+    Generation-aware in-memory stand-in for the GCPStorageService object API.
+
+    Like a bucket without object versioning, only the live generation of each
+    path can be read; overwritten and deleted generations are gone.
+    """
+
+    def __init__(self):
+        self.objects = {}   # path -> (generation, data, metadata, updated)
+        self.next_generation = 1
+        self.uploads = 0
+
+    async def upload_file(self, path, data, content_type="application/octet-stream",
+                          if_generation_match=None, metadata=None):
+        current = self.objects.get(path)
+        if if_generation_match is not None and (current[0] if current else 0) != if_generation_match:
+            raise PreconditionFailed(path)
+        generation = self.next_generation
+        self.next_generation += 1
+        self.objects[path] = (generation, data, metadata or {}, "2020-01-01T00:00:00")
+        self.uploads += 1
+        return {'path': path, 'generation': generation}
+
+    async def get_file_info(self, path):
+        current = self.objects.get(path)
+        return {'path': path, 'generation': current[0]} if current else None
+
+    async def download_file(self, path, generation=None):
+        current = self.objects.get(path)
+        if not current or (generation is not None and current[0] != generation):
+            return None
+        return current[1]
+
+    async def delete_file(self, path, if_generation_match=None):
+        current = self.objects.get(path)
+        if not current or (if_generation_match is not None and current[0] != if_generation_match):
+            return False
+        del self.objects[path]
+        return True
+
+    async def list_files(self, prefix):
+        return [
+            {'path': path, 'generation': gen, 'metadata': meta, 'updated': updated}
+            for path, (gen, _, meta, updated) in self.objects.items() if path.startswith(prefix)
+        ]
+
+def _service(store: FakeObjectStore) -> AtomicStorageService:
+    service = AtomicStorageService()
+    service.storage = store
+    return service
+
+class TestAtomicStorageManifest:
+    """Test suite for the manifest commit protocol"""
+
+    def test_single_write_per_file_and_manifest_commit(self):
+        """Test each file is created once under a version path and the manifest pins it"""
+        store = FakeObjectStore()
+        service = _service(store)
+
+        final_files = asyncio.run(service.store_job_result_atomic("job1", {"job_id": "job1", "affinity": -7.0}))
+
+        assert set(final_files) == {"results", "metadata"}
+        assert final_files["results"].startswith("jobs/job1/versions/txn_")
+        assert final_files["results"].endswith("/results.json")
+        # results + metadata + manifest + index entry
+        assert store.uploads == 4
+
+        manifest = json.loads(store.objects["jobs/job1/manifest.json"][1])
+        assert manifest["files"]["results"]["generation"] == store.objects[final_files["results"]][0]
+
+        content = asyncio.run(service.read_committed_file("jobs/job1/manifest.json", "results"))
+        assert json.loads(content)["affinity"] == -7.0
+
+    def test_first_writes_only_create_objects(self):
+        """Test a version path that already exists aborts the write instead of replacing it"""
+        store = FakeObjectStore()
+        service = _service(store)
+        service._generate_transaction_id = lambda job_id: "txn_fixed"
+        asyncio.run(store.upload_file("jobs/job1/versions/txn_fixed/results.json", b"{}"))
+
+        try:
+            asyncio.run(service.store_job_result_atomic("job1", {"job_id": "job1"}))
+            assert False, "Expected a precondition failure"
+        except PreconditionFailed:
+            pass
+
+        assert store.objects["jobs/job1/versions/txn_fixed/results.json"][1] == b"{}"
+        assert "jobs/job1/manifest.json" not in store.objects
+
+    def test_reads_stay_on_committed_version_and_sweep_orphans(self):
+        """Test uncommitted and superseded versions are invisible and get swept"""
+        store = FakeObjectStore()
+        service = _service(store)
+        first = asyncio.run(service.store_job_result_atomic("job1", {"job_id": "job1", "affinity": -7.0}))
+        service._generate_transaction_id = lambda job_id: "txn_second"
+        second = asyncio.run(service.store_job_result_atomic("job1", {"job_id": "job1", "affinity": -8.0}))
+
+        # A crashed writer left a version that never committed
+        asyncio.run(store.upload_file("jobs/job1/versions/txn_crashed/results.json", b'{"affinity": 1}',
+                                      metadata={'atomic_manifest': "jobs/job1/manifest.json"}))
+        asyncio.run(store.upload_file("jobs/legacy/results.json", b"{}"))
+
+        content = asyncio.run(service.read_committed_file("jobs/job1/manifest.json", "results"))
+        assert json.loads(content)["affinity"] == -8.0
+
+        report = asyncio.run(service.sweep_orphans("jobs/", older_than_seconds=0))
+        assert sorted(report["orphans"]) == sorted(
+            [first["results"], first["metadata"], "jobs/job1/versions/txn_crashed/results.json"]
+        )
+        assert report["inconsistent"] == []
+        assert second["results"] in store.objects and "jobs/legacy/results.json" in store.objects
+
+    def test_concurrent_commit_conflict_rolls_back(self):
+        """Test a stale manifest generation aborts the commit and removes only our writes"""
+        store = FakeObjectStore()
+        service = _service(store)
+        asyncio.run(service.store_job_result_atomic("job1", {"job_id": "job1"}))
+
+        stale = asyncio.run(service.resolve_manifest("jobs/job1/manifest.json"))
+        service._generate_transaction_id = lambda job_id: "txn_second"
+        committed = asyncio.run(service.store_job_result_atomic("job1", {"job_id": "job1", "run": 2}))
+
+        original_resolve = service.resolve_manifest
+
+        async def stale_resolve(path):
+            return stale if path == "jobs/job1/manifest.json" else await original_resolve(path)
+
+        service.resolve_manifest = stale_resolve
+        service._generate_transaction_id = lambda job_id: "txn_third"
+        try:
+            asyncio.run(service.store_job_result_atomic("job1", {"job_id": "job1", "run": 3}))
+            assert False, "Expected a precondition failure"
+        except PreconditionFailed:
+            pass
+
+        service.resolve_manifest = original_resolve
+        assert not any("/txn_third/" in path for path in store.objects)
+        assert committed["results"] in store.objects
+        content = asyncio.run(service.read_committed_file("jobs/job1/manifest.json", "results"))
+        assert json.loads(content)["run"] == 2
+
+    def test_rollback_after_an_ambiguous_commit_keeps_committed_files(self):
+        """Test a manifest write that landed but reported failure is not undone by rollback"""
+        store = FakeObjectStore()
+        service = _service(store)
+        original_upload = store.upload_file
+
+        async def upload_then_fail(path, data, **kwargs):
+            info = await original_upload(path, data, **kwargs)
+            if path.endswith("manifest.json"):
+                raise TimeoutError(path)
+            return info
+
+        store.upload_file = upload_then_fail
+        try:
+            asyncio.run(service.store_job_result_atomic("job1", {"job_id": "job1", "affinity": -7.0}))
+            assert False, "Expected the manifest write to report failure"
+        except TimeoutError:
+            pass
+
+        content = asyncio.run(service.read_committed_file("jobs/job1/manifest.json", "results"))
+        assert json.loads(content)["affinity"] == -7.0
@@ -0,0 +1,107 @@
+"""
+Test Batch File Scanner
+Tests prefix-listing scans, generation-pinned downloads, incremental rescans and legacy fallback
+"""
+
+import sys
+import os
+import asyncio
+import json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.batch_file_scanner import BatchFileScanner
+
+class FakeStorage:
+    """Bucket stand-in that counts list and read calls"""
+
+    def __init__(self):
+        self.objects = {}
+        self.generation = 0
+        self.lists = 0
+        self.reads = []
+
+    def put(self, path, payload):
+        self.generation += 1
+        self.objects[path] = (self.generation, json.dumps(payload).encode())
+
+    def list_object_index(self, prefix, page_size=1000):
+        self.lists += 1
+        return {path: (generation, len(data)) for path, (generation, data) in self.objects.items()
+                if path.startswith(prefix)}
+
+    def read_object(self, path, generation=None):
+        self.reads.append(path)
+        if path not in self.objects:
+            return None
+        current, data = self.objects[path]
+        return data if generation in (None, current) else None
+
+def _batch(storage, batch_id, count):
+    for i in range(count):
+        storage.put(f"batches/{batch_id}/jobs/job-{i}/results.json", {'affinity': -float(i)})
+    storage.put(f"batches/{batch_id}/jobs/job-0/metadata.json", {'model': 'boltz2'})
+
+class TestBatchFileScanner:
+    """Test suite for the prefix-listing batch scan"""
+
+    def test_scan_lists_once_and_downloads_only_present_files(self):
+        """Test one listing, one read per present result, none for absent metadata or missing jobs"""
+        storage = FakeStorage()
+        _batch(storage, "b1", 50)
+        scanner = BatchFileScanner(storage)
+        scanner.legacy_fallback = False
+
+        result = asyncio.run(scanner.scan_batch_files("b1", [f"job-{i}" for i in range(52)]))
+
+        assert storage.lists == 1
+        assert len(storage.reads) == 51  # 50 results + the one metadata file that exists
+        assert result['scan_summary']['files_found'] == 50
+        assert sorted(result['failed_jobs']) == ["job-50", "job-51"]
+        job_0 = next(job for job in result['completed_jobs'] if job['job_id'] == "job-0")
+        assert job_0['metadata'] == {'model': 'boltz2'} and 'generation' not in job_0
+
+    def test_rescan_downloads_only_changed_generations(self):
+        """Test an unchanged batch is served from memory and a rewritten result is refetched"""
+        storage = FakeStorage()
+        _batch(storage, "b1", 20)
+        scanner = BatchFileScanner(storage)
+        job_ids = [f"job-{i}" for i in range(20)]
+
+        async def run():
+            await scanner.scan_batch_files("b1", job_ids)
+            storage.reads.clear()
+            storage.put("batches/b1/jobs/job-7/results.json", {'affinity': -99.0})
+            return await scanner.scan_batch_files("b1", job_ids)
+
+        result = asyncio.run(run())
+        assert storage.reads == ["batches/b1/jobs/job-7/results.json"]
+        assert result['scan_summary']['reused'] == 19 and result['scan_summary']['downloaded'] == 1
+        job_7 = next(job for job in result['completed_jobs'] if job['job_id'] == "job-7")
+        assert job_7['results'] == {'affinity': -99.0}
+
+    def test_jobs_missing_from_listing_fall_back_to_legacy_paths(self):
+        """Test legacy jobs/ results are still found, without exists() round trips"""
+        storage = FakeStorage()
+        storage.put("jobs/old-1/results.json", {'affinity': -5.0})
+        scanner = BatchFileScanner(storage)
+
+        result = asyncio.run(scanner.scan_batch_files("b1", ["old-1", "old-2"]))
+
+        assert [job['job_id'] for job in result['completed_jobs']] == ["old-1"]
+        assert result['completed_jobs'][0]['storage_path'] == "jobs/old-1/results.json"
+        assert result['scan_summary']['legacy_probes'] == 2
+
+    def test_incremental_cache_respects_byte_budget(self):
+        """Test batches larger than the budget are not retained for rescans"""
+        storage = FakeStorage()
+        _batch(storage, "big", 10)
+        _batch(storage, "small", 1)
+        scanner = BatchFileScanner(storage)
+        scanner.cache_max_bytes = 100
+
+        async def run():
+            await scanner.scan_batch_files("big", [f"job-{i}" for i in range(10)])
+            await scanner.scan_batch_files("small", ["job-0"])
+
+        asyncio.run(run())
+        assert "big" not in scanner._scan_cache and "small" in scanner._scan_cache
@@ -0,0 +1,186 @@
+"""
+Test Batch Progress Hub
+Tests per-batch upstream sharing, event folding, slow-viewer resync and upstream lifetime
+"""
+
+import sys
+import os
+import asyncio
+import json
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.batch_progress_hub import BatchProgressHub, format_sse, relay_events, summarize_child
+
+class FakeUpstream:
+    def __init__(self):
+        self.callbacks = {}
+        self.opened = []
+        self.closed = []
+
+    def open(self, batch_id, on_children):
+        self.opened.append(batch_id)
+        self.callbacks[batch_id] = on_children
+        upstream = self
+
+        class Handle:
+            def unsubscribe(self):
+                upstream.closed.append(batch_id)
+        return Handle()
+
+def _children(statuses):
+    return [{'id': f'job-{i}', 'batch_index': i, 'status': status, 'input_data': {'ligand_name': f'lig{i}'},
+             'results': {'affinity': -7.5, 'structure_cif': 'x' * 1000}} for i, status in enumerate(statuses)]
+
+class FakeWebSocket:
+    """Client side of a relayed WebSocket: records sends, disconnects on demand"""
+
+    def __init__(self, stalled=False):
+        self.sent = []
+        self.stalled = stalled
+        self.disconnected = asyncio.Event()
+
+    async def send_json(self, event):
+        if self.stalled:
+            await asyncio.sleep(3600)
+        self.sent.append(event)
+
+    async def receive(self):
+        await self.disconnected.wait()
+        return {'type': 'websocket.disconnect'}
+
+async def _drain(subscription):
+    return [event async for event in subscription]
+
+class TestBatchProgressHub:
+    """Test suite for streaming batch progress"""
+
+    def test_viewers_share_one_upstream_and_receive_deltas(self):
+        """Test many viewers cause one upstream, get snapshot/progress/child/complete and then end"""
+        upstream = FakeUpstream()
+
+        async def run():
+            hub = BatchProgressHub(upstream.open)
+            viewers = [hub.subscribe("b1") for _ in range(50)]
+            hub.publish("b1", _children(['completed', 'running', 'pending']))
+            hub.publish("b1", _children(['completed', 'completed', 'running'])[1:])
+            hub.publish("b1", [_children(['pending', 'pending', 'failed'])[2]])
+            return hub, await asyncio.gather(*[_drain(viewer) for viewer in viewers])
+
+        hub, streams = asyncio.run(run())
+        assert upstream.opened == ["b1"] and upstream.closed == ["b1"]
+        events = streams[0]
+        assert [event['event'] for event in events] == ['snapshot', 'child', 'progress', 'child', 'progress', 'complete']
+        assert events[0]['data']['completed_jobs'] == 1
+        assert events[1]['data'] == {'job_id': 'job-1', 'batch_index': 1, 'ligand_name': 'lig1',
+                                     'status': 'completed', 'affinity': -7.5}
+        assert events[-1]['data']['completed_jobs'] == 2 and events[-1]['data']['failed_jobs'] == 1
+        assert all(stream == events for stream in streams)
+        assert hub.status()['active_batches'] == 0
+
+    def test_slow_viewer_is_resynced_with_a_snapshot(self):
+        """Test an overflowing viewer gets its backlog replaced by one snapshot"""
+        upstream = FakeUpstream()
+
+        async def run():
+            hub = BatchProgressHub(upstream.open, queue_size=4)
+            viewer = hub.subscribe("b1")
+            hub.publish("b1", _children(['pending'] * 20))
+            for i in range(10):
+                hub.publish("b1", [{'id': f'job-{i}', 'status': 'completed'}])
+            events = []
+            while not viewer.queue.empty():
+                events.append(viewer.queue.get_nowait())
+            return viewer, events
+
+        viewer, events = asyncio.run(run())
+        assert viewer.dropped > 0
+        assert len(events) <= 4
+        latest = [event for event in events if event['event'] in ('snapshot', 'progress')][-1]
+        assert latest['data']['completed_jobs'] == 10
+
+    def test_upstream_lingers_for_reconnects_then_closes(self):
+        """Test the last viewer leaving keeps the upstream for the linger window only"""
+        upstream = FakeUpstream()
+
+        async def run():
+            hub = BatchProgressHub(upstream.open, linger_seconds=0.05)
+            hub.subscribe("b1").close()
+            reconnect = hub.subscribe("b1")
+            reconnect.close()
+            closed_early = list(upstream.closed)
+            await asyncio.sleep(0.1)
+            return closed_early
+
+        closed_early = asyncio.run(run())
+        assert upstream.opened == ["b1"]
+        assert closed_early == [] and upstream.closed == ["b1"]
+
+    def test_listener_thread_updates_are_marshalled_to_the_loop(self):
+        """Test updates delivered on a listener thread reach async viewers"""
+        upstream = FakeUpstream()
+
+        async def run():
+            hub = BatchProgressHub(upstream.open)
+            viewer = hub.subscribe("b1")
+            thread = threading.Thread(target=upstream.callbacks["b1"], args=(_children(['running']),))
+            thread.start()
+            event = await viewer.get(timeout=1)
+            thread.join()
+            return event
+
+        assert asyncio.run(run())['event'] == 'snapshot'
+
+    def test_sse_frame_and_child_summary(self):
+        """Test SSE framing and that summaries omit bulky output"""
+        frame = format_sse({'event': 'progress', 'id': 7, 'data': {'completed_jobs': 3}})
+        assert frame.startswith("id: 7\nevent: progress\ndata: ") and frame.endswith("\n\n")
+        assert json.loads(frame.split("data: ")[1]) == {'completed_jobs': 3}
+        assert 'structure_cif' not in summarize_child(_children(['completed'])[0])
+
+    def test_websocket_relay_sends_keepalives_and_releases_gone_clients(self):
+        """Test idle streams get keepalives and a closed or stalled client drops its subscription"""
+        upstream = FakeUpstream()
+
+        async def run():
+            hub = BatchProgressHub(upstream.open, linger_seconds=0)
+            socket = FakeWebSocket()
+            subscription = hub.subscribe("b1")
+            relay = asyncio.ensure_future(relay_events(subscription, socket.send_json, socket.receive, 0.01))
+            await asyncio.sleep(0.05)
+            socket.disconnected.set()
+            ended = await relay
+            subscription.close()
+
+            stalled = FakeWebSocket(stalled=True)
+            subscription = hub.subscribe("b2")
+            try:
+                await relay_events(subscription, stalled.send_json, stalled.receive, 0.01)
+                timed_out = False
+            except asyncio.TimeoutError:
+                timed_out = True
+            subscription.close()
+            await asyncio.sleep(0)
+            return hub, socket, ended, timed_out
+
+        hub, socket, ended, timed_out = asyncio.run(run())
+        assert ended is False and timed_out
+        assert socket.sent and {event['event'] for event in socket.sent} == {'keepalive'}
+        assert hub.status()['viewers'] == 0
+
+    def test_websocket_relay_ends_with_the_stream(self):
+        """Test the relay returns True once the batch completes"""
+        upstream = FakeUpstream()
+
+        async def run():
+            hub = BatchProgressHub(upstream.open)
+            socket = FakeWebSocket()
+            subscription = hub.subscribe("b1")
+            hub.publish("b1", _children(['completed']))
+            ended = await relay_events(subscription, socket.send_json, socket.receive, 1.0)
+            subscription.close()
+            return socket, ended
+
+        socket, ended = asyncio.run(run())
+        assert ended is True
+        assert [event['event'] for event in socket.sent][-1] == 'complete'
@@ -0,0 +1,61 @@
+"""
+Test Batch Relationship Manager
+Tests bulk child registration against the batch index
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.batch_relationship_manager import BatchRelationshipManager
+
+class FakeIndexStore:
+    """Batch index kept in memory, counting reads and writes"""
+
+    def __init__(self, batch_id):
+        self.index = {'batch_id': batch_id, 'individual_jobs': []}
+        self.reads = 0
+        self.writes = 0
+
+    async def get(self, batch_id):
+        self.reads += 1
+        return self.index
+
+    async def store(self, batch_id, batch_index):
+        self.writes += 1
+        self.index = batch_index
+        return True
+
+    async def cache(self, batch_id, batch_index):
+        pass
+
+def _manager(store):
+    manager = BatchRelationshipManager()
+    manager._get_batch_index = store.get
+    manager._store_batch_index = store.store
+    manager._cache_batch_index = store.cache
+    return manager
+
+class TestBatchRelationshipManager:
+    """Test suite for batch child registration"""
+
+    def test_chunk_of_children_is_registered_with_one_index_write(self):
+        """Test a chunk of children costs one index read and one write, not one per child"""
+        store = FakeIndexStore("b1")
+        manager = _manager(store)
+        children = {f"job-{i}": {'ligand_name': f"L{i}"} for i in range(500)}
+
+        assert asyncio.run(manager.register_child_jobs("b1", children))
+
+        assert store.reads == 1 and store.writes == 1
+        jobs = store.index['individual_jobs']
+        assert [job['job_id'] for job in jobs] == list(children)
+        assert jobs[3]['storage_paths']['results'] == "batches/b1/jobs/job-3/results.json"
+
+    def test_single_registration_uses_the_same_path(self):
+        """Test register_child_job appends one entry through the bulk write"""
+        store = FakeIndexStore("b1")
+
+        assert asyncio.run(_manager(store).register_child_job("b1", "job-1", {'task_type': 'x'}))
+        assert store.writes == 1 and store.index['individual_jobs'][0]['metadata'] == {'task_type': 'x'}
@@ -0,0 +1,146 @@
+"""
+Test Batch Results Query
+Tests score extraction, the columnar results table, its .npz file and paged top-K queries
+"""
+
+import sys
+import os
+import io
+import tempfile
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip("numpy")
+
+from services.batch_results_query import (
+    BatchResultsTable, column_stats, extract_scores, histogram, query_results, summary_row, top_rows, unpack_npz
+)
+
+def _table(n=1000):
+    rows = []
+    for i in range(n):
+        results = None if i % 10 == 9 else {
+            'raw_modal_result': {'affinity': float((i * 37) % 101), 'confidence': (i % 50) / 50,
+                                 'iptm_score': (i % 7) / 7, 'plddt_score': (i % 13) / 13},
+            'structure_file_base64': 'Q0lG' if i % 2 else ''
+        }
+        status = 'pending' if results is None else 'completed'
+        rows.append(summary_row(f"job-{i:04d}", status, {'ligand_name': f"L{i}", 'ligand_smiles': 'CCO'},
+                                results, batch_index=i))
+    return BatchResultsTable.from_rows("batch-1", rows)
+
+class TestBatchResultsQuery:
+    """Test suite for batch results queries"""
+
+    def test_scores_come_from_raw_output_and_nested_sections(self):
+        """Test raw model output wins and nested affinity/confidence sections are read"""
+        scores = extract_scores({
+            'affinity': 9.0,
+            'raw_modal_result': {'affinity': 1.5, 'confidence_metrics': {'iptm': 0.4, 'complex_plddt': 0.2},
+                                 'affinity_ensemble': {'affinity_probability_binary': 0.7}},
+            'plddt_score': 0.9,
+        })
+
+        assert scores['affinity'] == 1.5 and scores['iptm'] == 0.4
+        assert scores['affinity_probability'] == 0.7 and scores['plddt'] == 0.9
+        assert scores['confidence'] is None
+        assert extract_scores(None)['affinity'] is None
+
+    def test_cursor_pages_match_a_full_sort(self):
+        """Test walking every page returns exactly the fully sorted order with no overlap"""
+        table = _table()
+        rows = [table.row(i) for i in range(len(table))]
+        expected = [row['job_id'] for row in sorted(
+            (row for row in rows if row['affinity'] is not None), key=lambda row: (row['affinity'], row['job_id'])
+        )]
+        expected += sorted(row['job_id'] for row in rows if row['affinity'] is None)
+
+        seen, cursor = [], None
+        while True:
+            page = query_results(table, 'affinity', limit=64, cursor=cursor, columns=['job_id', 'affinity'])
+            assert len(page['results']) <= 64
+            assert set(page['results'][0]) == {'job_id', 'affinity'}
+            seen += [row['job_id'] for row in page['results']]
+            cursor = page['next_cursor']
+            if not page['has_more']:
+                break
+
+        assert seen == expected
+        assert page['total_matches'] == len(table) == 1000
+
+    def test_filters_and_descending_top_k(self):
+        """Test range and status filters combine with a descending sort"""
+        table = _table()
+        page = query_results(table, 'confidence', filters={'affinity': (None, 20.0), 'iptm': (0.5, None)},
+                             status='completed', limit=5)
+
+        matching = [row for row in (table.row(i) for i in range(len(table)))
+                    if row['status'] == 'completed' and row['affinity'] <= 20.0 and row['iptm'] >= 0.5]
+        best = sorted(matching, key=lambda row: (-row['confidence'], row['job_id']))[:5]
+
+        assert page['order'] == 'desc'
+        assert page['total_matches'] == len(matching)
+        assert [row['job_id'] for row in page['results']] == [row['job_id'] for row in best]
+
+    def test_invalid_requests_raise_value_error(self):
+        """Test unknown sorts, columns, filters and cursors from another sort are rejected"""
+        table = _table(50)
+        cursor = query_results(table, 'affinity', limit=5)['next_cursor']
+
+        for kwargs in ({'sort_by': 'name'}, {'columns': ['raw_modal_result']},
+                       {'filters': {'ligand_name': (1, 2)}}, {'sort_by': 'iptm', 'cursor': cursor},
+                       {'cursor': 'not-a-cursor'}):
+            with pytest.raises(ValueError):
+                query_results(table, **kwargs)
+
+    def test_table_round_trips_through_npz_and_upserts_in_place(self):
+        """Test stored tables restore (memory-mapped once unpacked) and a re-reported child replaces its row"""
+        table = _table(20)
+        in_memory = BatchResultsTable.from_npz(table.to_npz())
+        assert [in_memory.row(i) for i in range(20)] == [table.row(i) for i in range(20)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            unpack_npz(table.to_npz(), directory)
+            restored = BatchResultsTable.load(directory)
+
+            assert isinstance(restored.columns['affinity'], np.memmap)
+            assert [restored.row(i) for i in range(20)] == [table.row(i) for i in range(20)]
+
+            restored.upsert(summary_row("job-0009", "completed", {'ligand_name': "L9"}, {'affinity': -3.0}))
+
+        assert len(restored) == 20 and restored.batch_id == "batch-1"
+        assert query_results(restored, 'affinity', limit=1)['results'][0]['job_id'] == "job-0009"
+        assert restored.status_counts() == {'completed': 19, 'pending': 1}
+        assert [row['n'] for row in top_rows([{'n': 3}, {'n': 1}, {}, {'n': 2}], 'n', 2)] == [1, 2]
+
+    def test_statistics_and_histograms_skip_missing_values(self):
+        """Test column statistics and histogram counts over the typed columns"""
+        table = BatchResultsTable.from_rows("b", [
+            summary_row(f"j{i}", "completed", results={'affinity': value})
+            for i, value in enumerate([1.0, 2.0, 3.0, 4.0, None])
+        ])
+
+        stats = column_stats(table, 'affinity')
+        assert stats['count'] == 4 and stats['mean'] == 2.5 and stats['median'] == 2.5
+        assert stats['min'] == 1.0 and stats['max'] == 4.0
+        assert abs(stats['std'] - 1.118033988749895) < 1e-12
+        assert column_stats(table, 'iptm')['count'] == 0
+
+        assert histogram(table, 'affinity', bins=3) == {
+            'column': 'affinity', 'edges': [1.0, 2.0, 3.0, 4.0], 'counts': [1, 1, 2]
+        }
+
+    def test_npz_files_load_with_numpy(self):
+        """Test the stored format is a standard .npz and other archives are rejected"""
+        table = _table(30)
+        archive = np.load(io.BytesIO(table.to_npz()))
+
+        assert archive['affinity'].dtype == np.float64 and archive['batch_index'].dtype == np.int64
+        assert archive['has_structure'].dtype == np.bool_
+        assert archive['job_id'][3].decode() == "job-0003"
+        assert np.isnan(archive['affinity'][9])
+
+        other = io.BytesIO()
+        np.savez(other, affinity=np.zeros(3))
+        with pytest.raises(ValueError):
+            BatchResultsTable.from_npz(other.getvalue())
@@ -0,0 +1,120 @@
+"""
+Test Batch Status Reconciler
+Tests that status polls schedule rate-limited background reconciliation of running children
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.batch_status_reconciler import CloudRunChildChecker, RunningJobReconciler
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestBatchStatusReconciler:
+    """Test suite for the running-job reconciler"""
+
+    def test_polls_are_coalesced_per_batch_interval(self):
+        """Test hundreds of polls trigger one backend probe per batch per interval"""
+        clock = FakeClock()
+        fetched = []
+        reconciled = []
+
+        def fetch_running(batch_id):
+            fetched.append(batch_id)
+            return [{'id': f'{batch_id}-child', 'status': 'running'}]
+
+        async def reconcile(jobs):
+            reconciled.append(len(jobs))
+            return 1
+
+        async def run():
+            reconciler = RunningJobReconciler(fetch_running, reconcile, min_interval=30, clock=clock)
+            scheduled = [reconciler.request("b1") for _ in range(500)] + [reconciler.request("b2")]
+            await reconciler.wait_idle()
+            clock.now = 31
+            scheduled.append(reconciler.request("b1"))
+            await reconciler.wait_idle()
+            return reconciler, scheduled
+
+        reconciler, scheduled = asyncio.run(run())
+        assert scheduled.count(True) == 3
+        assert sorted(fetched) == ["b1", "b1", "b2"]
+        assert reconciler.stats['jobs_updated'] == 3
+
+    def test_concurrency_is_bounded_and_errors_are_contained(self):
+        """Test at most max_concurrent passes run at once and a failing pass is counted, not raised"""
+        active = 0
+        peak = 0
+
+        def fetch_running(batch_id):
+            if batch_id == "bad":
+                raise RuntimeError("firestore unavailable")
+            return [{'id': batch_id}]
+
+        async def reconcile(jobs):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return 0
+
+        notified = []
+
+        async def run():
+            reconciler = RunningJobReconciler(fetch_running, reconcile, max_concurrent=2,
+                                              on_reconciled=lambda batch_id, updated: notified.append(batch_id))
+            for i in range(6):
+                reconciler.request(f"b{i}")
+            reconciler.request("bad")
+            await reconciler.wait_idle()
+            return reconciler
+
+        reconciler = asyncio.run(run())
+        assert peak <= 2
+        assert reconciler.stats['errors'] == 1
+        assert len(notified) == 6
+
+    def test_cloud_run_checker_finishes_children_with_stored_results(self):
+        """Test a reconcile pass finishes running children from their Cloud Run batch's stored results"""
+        children = [
+            {'id': "c1", 'status': 'running', 'user_id': "u1", 'input_data': {'cloud_run_batch_id': "b1-part0000"}},
+            {'id': "c2", 'status': 'running', 'user_id': "u1", 'input_data': {'cloud_run_batch_id': "b1-part0000"}},
+            {'id': "c3", 'status': 'running', 'user_id': "u1", 'input_data': {'cloud_run_batch_id': "b1-part0001"}},
+            {'id': "c4", 'status': 'running', 'user_id': "u1", 'input_data': {}}
+        ]
+        stored = {
+            "b1-part0000": {'c1': {'job_id': "c1", 'status': 'completed', 'structure_base64': "QQ==",
+                                   'binding_affinity': -7.2}},
+            "b1-part0001": {'c3': {'job_id': "c3", 'status': 'timeout', 'error': "Processing timeout"}}
+        }
+        fetched = []
+        updates = {}
+
+        async def fetch_results(user_id, cloud_run_batch_id):
+            fetched.append((user_id, cloud_run_batch_id))
+            return stored.get(cloud_run_batch_id, {})
+
+        def update_status(job_id, status, output_data):
+            updates[job_id] = (status, output_data)
+            return True
+
+        async def run():
+            reconciler = RunningJobReconciler(lambda batch_id: children,
+                                              CloudRunChildChecker(fetch_results, update_status))
+            reconciler.request("b1")
+            await reconciler.wait_idle()
+            return reconciler
+
+        reconciler = asyncio.run(run())
+        assert sorted(fetched) == [("u1", "b1-part0000"), ("u1", "b1-part0001")]
+        assert updates['c1'] == ('completed', {'job_id': "c1", 'status': 'completed', 'binding_affinity': -7.2})
+        assert updates['c3'][0] == 'failed' and set(updates) == {"c1", "c3"}
+        assert reconciler.stats['jobs_updated'] == 2
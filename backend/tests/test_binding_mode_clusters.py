@@ -0,0 +1,181 @@
+"""
+Test Binding Mode Clusters
+Tests online assignment of late children to persisted binding-mode clusters
+"""
+
+import sys
+import os
+import json
+import asyncio
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("MDAnalysis")
+pytest.importorskip("sklearn")
+pytest.importorskip("rdkit")
+from google.api_core.exceptions import Aborted
+
+from services.boltz_post_processor import BindingModeClusterState
+from services.post_processing_integration import PostProcessingIntegration
+
+POCKET_A = [("A", "ALA", 10), ("A", "GLY", 11)]
+POCKET_B = [("A", "TYR", 42)]
+
+def _state():
+    return BindingModeClusterState(
+        residues=POCKET_A + POCKET_B,
+        centroids=np.array([[0.7071, 0.7071, 0.0], [0.0, 0.0, 1.0]]),
+        counts=[3, 1],
+        largest_cluster=0
+    )
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+class FakeDocument:
+    def __init__(self, db, key):
+        self.db = db
+        self.key = key
+
+    async def get(self, transaction=None):
+        if transaction is not None:
+            transaction.reads[self.key] = self.db.versions.get(self.key, 0)
+        await asyncio.sleep(0)  # let concurrent transactions interleave
+        return FakeSnapshot(self.db.docs.get(self.key))
+
+class FakeCollection:
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+
+    def document(self, doc_id):
+        return FakeDocument(self.db, f"{self.name}/{doc_id}")
+
+class FakeTransaction:
+    """The surface firestore.async_transactional drives, with optimistic concurrency"""
+
+    _read_only = False
+
+    def __init__(self, db, max_attempts=5):
+        self.db = db
+        self._max_attempts = max_attempts
+        self._id = None
+        self._clean_up()
+
+    def _clean_up(self):
+        self.reads, self.writes = {}, []
+
+    async def _begin(self, retry_id=None):
+        self._id = b"txn"
+
+    def set(self, ref, data):
+        self.writes.append((ref.key, data))
+
+    async def _commit(self):
+        if any(self.db.versions.get(key, 0) != version for key, version in self.reads.items()):
+            self.db.aborts += 1
+            raise Aborted("contention")
+        for key, data in self.writes:
+            self.db.docs[key] = data
+            self.db.versions[key] = self.db.versions.get(key, 0) + 1
+
+    async def _rollback(self):
+        pass
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.updates = []
+
+    def update(self, ref, data):
+        self.updates.append((ref.key, data))
+
+    async def commit(self):
+        for key, data in self.updates:
+            self.db.docs.setdefault(key, {}).update(data)
+
+class FakeFirestore:
+    def __init__(self):
+        self.docs, self.versions = {}, {}
+        self.aborts = 0
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def transaction(self, max_attempts=5):
+        return FakeTransaction(self, max_attempts)
+
+    def batch(self):
+        return FakeBatch(self)
+
+class FakeJobManager:
+    def __init__(self, db):
+        self.db = db
+
+class TestBindingModeClusters:
+    """Test suite for incremental binding-mode clustering"""
+
+    def test_assign_moves_the_nearest_centroid_by_running_mean(self):
+        """Test a pose joins its nearest cluster and that centroid moves by 1/count"""
+        state = _state()
+        cluster_id = state.assign(POCKET_B)
+
+        assert cluster_id == 1 and state.counts == [3, 2]
+        assert state.centroids[1].tolist() == [0.0, 0.0, 1.0]
+        assert state.label_for(0) == "Classical" and state.label_for(1) == "Novel"
+
+    def test_unseen_residues_extend_the_vocabulary(self):
+        """Test new contacts add zero-valued centroid columns before assignment"""
+        state = _state()
+        cluster_id = state.assign(POCKET_A + [("B", "LEU", 7)])
+
+        assert state.residues[-1] == ("B", "LEU", 7) and state.centroids.shape == (2, 4)
+        assert cluster_id == 0 and state.counts == [4, 1]
+        assert state.centroids[0, 3] == pytest.approx(3 ** -0.5 / 4)
+
+    def test_largest_cluster_label_follows_counts(self):
+        """Test the Classical label moves to whichever cluster grows largest"""
+        state = _state()
+        for _ in range(3):
+            state.assign(POCKET_B)
+
+        assert state.largest_cluster == 1 and state.label_for(1) == "Classical"
+        restored = BindingModeClusterState.from_dict(json.loads(json.dumps(state.to_dict())))
+        assert restored.counts == [3, 4] and restored.residues == state.residues
+
+    def test_concurrent_children_do_not_lose_updates(self):
+        """Test concurrent assignments are serialized by the transaction instead of overwriting each other"""
+        db = FakeFirestore()
+        db.docs["binding_mode_clusters/batch-1"] = {"batch_id": "batch-1", "state": json.dumps(_state().to_dict())}
+        integration = PostProcessingIntegration(job_manager=FakeJobManager(db), storage_service=object())
+
+        async def main():
+            await asyncio.gather(*(
+                integration._assign_incremental_cluster(
+                    f"child-{i}", "batch-1", {"contacts_json": json.dumps(POCKET_B if i % 2 else POCKET_A)}
+                )
+                for i in range(6)
+            ))
+
+        asyncio.run(main())
+        state = json.loads(db.docs["binding_mode_clusters/batch-1"]["state"])
+
+        assert state["counts"] == [6, 4]
+        assert db.aborts > 0
+        assert db.docs["jobs/child-1"] == {"cluster_id": 1, "cluster_label": "Novel"}
+        assert db.docs["jobs/child-0"]["cluster_id"] == 0
+
+    def test_unclustered_batch_is_left_alone(self):
+        """Test children of a batch without cluster state get no assignment"""
+        db = FakeFirestore()
+        integration = PostProcessingIntegration(job_manager=FakeJobManager(db), storage_service=object())
+
+        asyncio.run(integration._assign_incremental_cluster("child-1", "batch-2", {"contacts_json": "[]"}))
+
+        assert db.docs == {}
@@ -0,0 +1,121 @@
+"""
+Test Boltz Post Processor
+Tests chunked process-pool and bounded thread-pool contact analysis, and structure staging
+"""
+
+import sys
+import os
+import base64
+import asyncio
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("MDAnalysis")
+pytest.importorskip("sklearn")
+pytest.importorskip("rdkit")
+
+from services.boltz_post_processor import BoltzPostProcessor
+from services.post_processing_integration import PostProcessingIntegration
+
+# ALA 1 sits next to the ligand, GLY 2 is ~7 Å away
+STRUCTURE = """\
+ATOM      1  N   ALA A   1       0.000   0.000   0.000  1.00  0.00           N
+ATOM      2  CA  ALA A   1       1.458   0.000   0.000  1.00  0.00           C
+ATOM      3  C   ALA A   1       2.009   1.420   0.000  1.00  0.00           C
+ATOM      4  N   GLY A   2      10.000   0.000   0.000  1.00  0.00           N
+ATOM      5  CA  GLY A   2      11.458   0.000   0.000  1.00  0.00           C
+HETATM    6  C1  LIG B   3       3.000   1.500   0.000  1.00  0.00           C
+HETATM    7  O1  LIG B   3       3.500   2.500   0.000  1.00  0.00           O
+END
+"""
+
+def _jobs(tmp_path, count):
+    jobs = []
+    for index in range(count):
+        path = tmp_path / f"pose_{index}.pdb"
+        path.write_text(STRUCTURE)
+        jobs.append({
+            'job_id': f"child-{index}",
+            'structure_file': str(path),
+            'raw_modal_result': {'affinity': -6.0, 'affinity_ensemble1': -5.0 - index}
+        })
+    jobs.insert(2, {'job_id': "missing", 'structure_file': str(tmp_path / "missing.pdb")})
+    return jobs
+
+class CountingPostProcessor(BoltzPostProcessor):
+    """Thread-mode processor that records how many jobs run at once"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.active = 0
+        self.max_active = 0
+
+    async def process_job_async(self, job_data):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.005)
+        self.active -= 1
+        return {'success': True, 'job_id': job_data['job_id']}
+
+class FakeStorage:
+    def __init__(self, files):
+        self.files = files
+
+    async def download_file(self, path):
+        return self.files.get(path)
+
+class TestBoltzPostProcessor:
+    """Test suite for post-processing execution modes"""
+
+    def test_process_mode_chunks_match_thread_mode(self, tmp_path):
+        """Test chunked process-pool results line up with the jobs and match thread mode"""
+        jobs = _jobs(tmp_path, 5)
+        process_mode = BoltzPostProcessor(max_workers=2, execution_mode="process", chunk_size=2)
+        thread_mode = BoltzPostProcessor(max_workers=2)
+        try:
+            chunked = asyncio.run(process_mode._process_jobs_chunked(jobs))
+            threaded = asyncio.run(thread_mode._process_jobs_bounded(jobs))
+        finally:
+            process_mode.__del__()
+            thread_mode.__del__()
+
+        assert len(chunked) == len(jobs)
+        assert chunked[2] == {'success': False, 'error': "No structure file found"}
+        assert all(result['success'] and result['contact_count'] == 1 for i, result in enumerate(chunked) if i != 2)
+        assert chunked[0]['ensemble_sd'] == 0.5 and chunked[5]['ensemble_sd'] == 1.5
+        assert [r.get('contacts_json') for r in chunked] == [r.get('contacts_json') for r in threaded]
+
+    def test_thread_mode_bounds_in_flight_jobs(self):
+        """Test thread mode never has more than max_in_flight jobs outstanding"""
+        processor = CountingPostProcessor(max_workers=2, max_in_flight=3)
+        results = asyncio.run(processor._process_jobs_bounded([{'job_id': str(i)} for i in range(20)]))
+
+        assert processor.max_active == 3
+        assert [result['job_id'] for result in results] == [str(i) for i in range(20)]
+
+    def test_unknown_execution_mode_is_rejected(self):
+        """Test only thread and process modes are accepted"""
+        with pytest.raises(ValueError):
+            BoltzPostProcessor(execution_mode="gpu")
+
+    def test_structure_file_is_staged_from_content_or_storage(self):
+        """Test inline base64 structures and GCS structures are written to local files"""
+        integration = PostProcessingIntegration(
+            job_manager=object(),
+            storage_service=FakeStorage({'jobs/stored-job/structure.cif': b"data_stored"})
+        )
+
+        inline = asyncio.run(integration._ensure_structure_file({
+            'job_id': "inline-job",
+            'output_data': {'structure_file_content': base64.b64encode(b"data_inline").decode()}
+        }))
+        stored = asyncio.run(integration._ensure_structure_file({'job_id': "stored-job"}))
+        missing = asyncio.run(integration._ensure_structure_file({'job_id': "absent-job"}))
+
+        try:
+            assert open(inline, 'rb').read() == b"data_inline"
+            assert open(stored, 'rb').read() == b"data_stored"
+            assert missing is None
+        finally:
+            os.remove(inline)
+            os.remove(stored)
@@ -0,0 +1,175 @@
+"""
+Test Incremental Batch Analytics
+Tests shard merging and summaries for live batch analytics
+"""
+
+import sys
+import os
+import asyncio
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.post_processing_schema import (
+    FirestorePostProcessingService,
+    IncrementalBatchAnalyticsModel,
+    INCREMENTAL_ANALYTICS_SHARDS
+)
+
+def _apply(current, update):
+    """Merge a Firestore update with Increment/ArrayUnion/Minimum/Maximum transforms"""
+    from google.cloud import firestore
+    for key, value in update.items():
+        existing = current.get(key)
+        if isinstance(value, dict):
+            current[key] = _apply(dict(existing or {}), value)
+        elif isinstance(value, firestore.Increment):
+            current[key] = (existing or 0) + value.value
+        elif isinstance(value, firestore.ArrayUnion):
+            current[key] = list(existing or []) + [v for v in value.values if v not in (existing or [])]
+        elif isinstance(value, firestore.Minimum):
+            current[key] = value.value if existing is None else min(existing, value.value)
+        elif isinstance(value, firestore.Maximum):
+            current[key] = value.value if existing is None else max(existing, value.value)
+        else:
+            current[key] = value
+    return current
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+class FakeDocument:
+    def __init__(self, db, key):
+        self.db = db
+        self.key = key
+
+    async def get(self, transaction=None):
+        return FakeSnapshot(self.db.docs.get(self.key))
+
+class FakeCollection:
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+
+    def document(self, doc_id):
+        return FakeDocument(self.db, f"{self.name}/{doc_id}")
+
+class FakeTransaction:
+    """The surface firestore.async_transactional drives"""
+
+    _max_attempts = 5
+    _read_only = False
+
+    def __init__(self, db):
+        self.db = db
+        self._id = None
+        self.writes = []
+
+    def _clean_up(self):
+        self.writes = []
+
+    async def _begin(self, retry_id=None):
+        self._id = b"txn"
+
+    def set(self, ref, data, merge=False):
+        self.writes.append((ref.key, data, merge))
+
+    async def _commit(self):
+        for key, data, merge in self.writes:
+            self.db.docs[key] = _apply(dict(self.db.docs.get(key, {})) if merge else {}, data)
+
+    async def _rollback(self):
+        pass
+
+class FakeFirestore:
+    def __init__(self):
+        self.docs = {}
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+class TestIncrementalBatchAnalytics:
+    """Test suite for IncrementalBatchAnalyticsModel"""
+    
+    def test_shard_is_stable_and_in_range(self):
+        """Test that jobs map to a stable shard"""
+        shard = IncrementalBatchAnalyticsModel.shard_for("job-123")
+        assert shard == IncrementalBatchAnalyticsModel.shard_for("job-123")
+        assert 0 <= shard < INCREMENTAL_ANALYTICS_SHARDS
+    
+    def test_merge_shards(self):
+        """Test merging hotspot counters, scaffolds and metric stats"""
+        model = IncrementalBatchAnalyticsModel("batch-1")
+        model.merge_shard({
+            "completed_jobs": 2,
+            "contact_jobs": 2,
+            "scaffold_compounds": 2,
+            "hotspots": {"A:ALA:10": 2, "A:GLY:11": 1},
+            "scaffolds": ["aaa", "bbb"],
+            "stats": {"affinity": {"count": 2, "sum": -10.0, "sum_sq": 52.0, "min": -6.0, "max": -4.0}}
+        })
+        model.merge_shard({
+            "completed_jobs": 1,
+            "contact_jobs": 1,
+            "scaffold_compounds": 1,
+            "hotspots": {"A:ALA:10": 1},
+            "scaffolds": ["aaa"],
+            "stats": {"affinity": {"count": 1, "sum": -5.0, "sum_sq": 25.0, "min": -5.0, "max": -5.0}}
+        })
+        
+        assert model.completed_jobs == 3
+        assert model.hotspot_counts["A:ALA:10"] == 3
+        assert model.scaffold_hashes == {"aaa", "bbb"}
+        
+        affinity = model.summarize_metrics()["affinity"]
+        assert affinity["count"] == 3
+        assert affinity["mean"] == -5.0
+        assert affinity["min"] == -6.0
+        assert affinity["max"] == -4.0
+    
+    def test_analysis_dict_matches_final_shape(self):
+        """Test partial analysis uses the final analysis keys"""
+        model = IncrementalBatchAnalyticsModel("batch-1")
+        model.merge_shard({
+            "completed_jobs": 4,
+            "contact_jobs": 4,
+            "hotspots": {"B:TYR:42": 3}
+        })
+        
+        analysis = model.to_analysis_dict(total_jobs=10)
+        
+        assert analysis["hotspot_residues"][0]["residue"] == "TYR42"
+        assert analysis["hotspot_residues"][0]["chain"] == "B"
+        assert analysis["hotspot_residues"][0]["percentage"] == 75.0
+        assert analysis["processing_stats"] == {"total_jobs": 10, "processed_jobs": 4, "partial": True}
+    
+    def test_redelivered_completion_is_counted_once(self):
+        """Test a retried child completion does not double-count the live analytics"""
+        pytest.importorskip("google.cloud.firestore")
+        service = FirestorePostProcessingService(FakeFirestore())
+        
+        async def record(job_id, affinity):
+            return await service.record_incremental_analytics(
+                "batch-1", job_id, [("A", "ALA", 10)], "c1ccccc1", {"affinity": affinity}
+            )
+        
+        async def main():
+            first = await record("job-1", -6.0)
+            again = await record("job-1", -6.0)
+            other = await record("job-2", -4.0)
+            return first, again, other, await service.get_incremental_analytics("batch-1")
+        
+        first, again, other, model = asyncio.run(main())
+        
+        assert (first, again, other) == (True, False, True)
+        assert model.completed_jobs == 2
+        assert model.hotspot_counts["A:ALA:10"] == 2
+        affinity = model.summarize_metrics()["affinity"]
+        assert affinity["count"] == 2 and affinity["mean"] == -5.0
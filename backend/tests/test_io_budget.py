@@ -0,0 +1,174 @@
+"""
+Test I/O Budget Tracing
+Tests request-scoped attribution, client instrumentation and budget alerts
+"""
+
+import sys
+import os
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.io_budget import (
+    IOBudget, IOBudgetTracker, current_io, instrument_class, instrument_methods,
+    instrument_redis_client, instrument_storage_client, record
+)
+
+class FakeRedis:
+    """Minimal redis.asyncio client: named commands go through execute_command"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def execute_command(self, *args, **options):
+        if args[0] == 'SET':
+            self.data[args[1]] = args[2]
+            return True
+        return self.data.get(args[1])
+
+    async def get(self, key):
+        return await self.execute_command('GET', key)
+
+    async def set(self, key, value):
+        return await self.execute_command('SET', key, value)
+
+class FakeQuery:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def stream(self):
+        for doc in self.docs:
+            yield doc
+
+    def get(self):
+        return list(self.stream())
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def stream(self):
+        # Like firestore_v1, the collection delegates to a query
+        return FakeQuery(self.docs).stream()
+
+class FakeBatch:
+    def __init__(self):
+        self._write_pbs = []
+
+    def set(self, doc):
+        self._write_pbs.append(doc)
+
+    def commit(self):
+        self._write_pbs = []
+
+instrument_class(FakeQuery, {'stream': 'stream', 'get': 'list'})
+instrument_class(FakeCollection, {'stream': 'stream'})
+instrument_class(FakeBatch, {'commit': 'commit'})
+
+class TestIOBudget:
+    """Test suite for per-request I/O tracing"""
+
+    def test_concurrent_requests_are_attributed_separately(self):
+        """Test gathered tasks and to_thread calls count toward the request that started them"""
+        tracker = IOBudgetTracker(IOBudget(), {})
+
+        async def request(n):
+            io, token = tracker.begin("/api/v1/batches/{batch_id}")
+            try:
+                await asyncio.gather(*(asyncio.to_thread(record, 'firestore', 1) for _ in range(n)))
+                await asyncio.sleep(0)
+                record('gcs', writes=1, nbytes=100)
+                return io
+            finally:
+                tracker.end(token)
+
+        async def main():
+            return await asyncio.gather(request(3), request(7))
+
+        first, second = asyncio.run(main())
+        assert first.backends['firestore'].reads == 3 and second.backends['firestore'].reads == 7
+        assert first.calls == 4 and second.bytes == 100
+        assert current_io() is None
+        record('firestore', 1)  # outside a request: ignored
+
+    def test_firestore_streams_count_documents_once(self):
+        """Test nested library calls are not double counted and empty queries bill one read"""
+        tracker = IOBudgetTracker(IOBudget(), {})
+        io, token = tracker.begin()
+        try:
+            docs = list(FakeCollection(['a', 'b', 'c']).stream())
+            FakeQuery([]).get()
+            FakeQuery(['d', 'e']).get()
+            batch = FakeBatch()
+            for doc in docs:
+                batch.set(doc)
+            batch.commit()
+        finally:
+            tracker.end(token)
+
+        stats = io.backends['firestore']
+        assert docs == ['a', 'b', 'c']
+        assert (stats.calls, stats.reads, stats.writes) == (4, 6, 3)
+        assert list(FakeCollection(['x']).stream()) == ['x']  # untraced path still works
+
+    def test_redis_storage_and_method_instrumentation(self):
+        """Test Redis commands, GCS HTTP responses and Cloud Tasks-style methods are counted"""
+        tracker = IOBudgetTracker(IOBudget(), {})
+        redis_client = instrument_redis_client(FakeRedis())
+        assert instrument_redis_client(redis_client) is redis_client
+
+        session = SimpleNamespace(hooks={'response': []})
+        instrument_storage_client(SimpleNamespace(_http=session))
+        instrument_storage_client(SimpleNamespace(_http=session))
+        assert len(session.hooks['response']) == 1
+
+        tasks_client = instrument_methods(SimpleNamespace(create_task=lambda request: request,
+                                                          get_queue=lambda name: name),
+                                          'cloud_tasks', reads=['get_queue'], writes=['create_task'])
+
+        async def main():
+            io, token = tracker.begin()
+            try:
+                await redis_client.set('k', b'12345')
+                assert await redis_client.get('k') == b'12345'
+                for method, body, length in (('GET', None, '2048'), ('POST', b'x' * 10, '0')):
+                    response = SimpleNamespace(request=SimpleNamespace(method=method, body=body),
+                                               headers={'Content-Length': length},
+                                               elapsed=timedelta(milliseconds=5))
+                    session.hooks['response'][0](response)
+                tasks_client.create_task({})
+                tasks_client.get_queue('q')
+                return io
+            finally:
+                tracker.end(token)
+
+        io = asyncio.run(main())
+        redis_stats, gcs, tasks = io.backends['redis'], io.backends['gcs'], io.backends['cloud_tasks']
+        assert (redis_stats.reads, redis_stats.writes, redis_stats.bytes) == (1, 1, 1 + 5 + 1 + 5)
+        assert (gcs.reads, gcs.writes, gcs.bytes) == (1, 1, 2058)
+        assert abs(gcs.seconds - 0.01) < 1e-9
+        assert (tasks.reads, tasks.writes) == (1, 1)
+        assert io.server_timing().startswith('cloud_tasks;dur=')
+
+    def test_budget_violations_alert_once_per_cooldown(self):
+        """Test per-endpoint budgets override the default and alerts are rate limited"""
+        now = [0.0]
+        tracker = IOBudgetTracker(IOBudget(max_calls=5), {'/api/v1/batches': IOBudget(max_calls=50, max_bytes=10)},
+                                  alert_cooldown=60, clock=lambda: now[0])
+
+        io, token = tracker.begin('/api/v1/jobs')
+        for _ in range(6):
+            record('firestore', 1)
+        tracker.end(token)
+
+        assert tracker.check(io) == [('calls', 6, 5)]
+        assert tracker.check(io) == [('calls', 6, 5)] and tracker.suppressed_alerts == 1
+        now[0] = 61
+        tracker.check(io)
+        assert tracker.suppressed_alerts == 1
+
+        io.endpoint = '/api/v1/batches'
+        assert tracker.check(io) == []
+        io.add('gcs', nbytes=11)
+        assert [limit for limit, _, _ in tracker.check(io)] == ['bytes']
@@ -0,0 +1,82 @@
+"""
+Test Job Frame
+Tests the slotted job model and columnar batch child progress
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.enhanced_job_model import (
+    EnhancedJobData, JobStatus, create_batch_parent_job, create_batch_child_job
+)
+from models.job_frame import JobFrame
+
+def _child_docs(parent_id: str, statuses):
+    docs = []
+    for index, status in enumerate(statuses):
+        child = create_batch_child_job(f"child-{index}", parent_id, index, {'ligand_smiles': 'CCO'})
+        child.status = status
+        child.started_at = 100.0
+        child.completed_at = 100.0 + 10 * (index + 1) if status == JobStatus.COMPLETED else None
+        docs.append(child.to_firestore_dict())
+    return docs
+
+class TestJobFrame:
+    """Test suite for EnhancedJobData and JobFrame"""
+
+    def test_firestore_dict_is_shallow_and_slotted(self):
+        """Test instances have no __dict__ and conversion skips output_data without copying"""
+        child = create_batch_child_job("c", "p", 0, {'ligand_smiles': 'CCO'})
+        child.output_data = {'affinity': -7.0}
+
+        data = child.to_firestore_dict()
+
+        assert not hasattr(child, '__dict__')
+        assert 'output_data' not in data
+        assert data['input_data'] is child.input_data
+        assert data['status'] == "pending" and data['job_type'] == "batch_child"
+        assert EnhancedJobData.from_job_data(data).batch_parent_id == "p"
+
+    def test_frame_progress_matches_object_path(self):
+        """Test columnar progress equals calculate_batch_progress and skips legacy rows"""
+        parent = create_batch_parent_job("batch", "batch_protein_ligand_screening", {})
+        statuses = [JobStatus.COMPLETED, JobStatus.COMPLETED, JobStatus.FAILED,
+                    JobStatus.RUNNING, JobStatus.PENDING, JobStatus.CANCELLED]
+        docs = _child_docs(parent.id, statuses) + [{'id': 'legacy', 'status': 'completed'}]
+
+        frame = JobFrame.from_job_data(docs)
+
+        assert len(frame) == len(statuses)
+        assert frame.progress() == parent.calculate_batch_progress(statuses)
+        assert frame.durations(JobStatus.COMPLETED) == [10.0, 20.0]
+        assert [job.status for job in frame.jobs(frame.indices(JobStatus.FAILED))] == [JobStatus.FAILED]
+
+        parent.update_batch_progress_from_frame(frame)
+        assert parent.batch_progress['completed'] == 2
+        assert parent.batch_estimated_completion == 2 * 15.0 * 1.2
+
+    def test_batch_with_children_reads_progress_from_the_frame(self):
+        """Test batch statistics come from the frame and parent progress is updated"""
+        from services.unified_job_storage import UnifiedJobStorage
+
+        parent = create_batch_parent_job("batch", "batch_protein_ligand_screening", {})
+        statuses = [JobStatus.COMPLETED, JobStatus.RUNNING, JobStatus.PENDING]
+        docs = {parent.id: parent.to_firestore_dict()}
+
+        class FakeJobManager:
+            def get_job(self, job_id):
+                return docs.get(job_id)
+
+            def get_batch_jobs(self, batch_id):
+                return _child_docs(batch_id, statuses)
+
+        storage = UnifiedJobStorage()
+        storage.job_manager = FakeJobManager()
+
+        batch, children, statistics = asyncio.run(storage.get_batch_with_children(parent.id))
+
+        assert statistics == parent.calculate_batch_progress(statuses)
+        assert batch.batch_progress is statistics and batch.batch_estimated_completion > 0
+        assert [child.batch_index for child in children] == [0, 1, 2]
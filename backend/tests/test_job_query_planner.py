@@ -0,0 +1,54 @@
+"""
+Test Job Query Planner
+Tests index-aware filter pushdown and pagination cursors
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.job_query_planner import plan_job_query, encode_cursor, decode_cursor
+
+class TestJobQueryPlanner:
+    """Test suite for plan_job_query"""
+
+    def test_indexed_filters_are_pushed_down(self):
+        """Test user, type and status filters run in Firestore when an index covers them"""
+        plan = plan_job_query(user_id="u1", job_types=["individual"], status="completed")
+
+        assert plan.equality == [("user_id", "u1"), ("status", "completed"), ("job_type", "individual")]
+        assert plan.exact
+
+    def test_uncovered_filters_become_residual(self):
+        """Test filters without an index or a second `in` clause are applied in Python"""
+        plan = plan_job_query(
+            user_id="u1",
+            job_types=["individual", "batch_parent"],
+            task_types=["protein_structure", "protein_complex"]
+        )
+
+        assert plan.equality == [("user_id", "u1")]
+        assert plan.membership == ("job_type", ["individual", "batch_parent"])
+        assert plan.residual == {"task_type": {"protein_structure", "protein_complex"}}
+        assert not plan.exact
+        assert plan.matches({"task_type": "protein_complex"})
+        assert not plan.matches({"task_type": "drug_discovery"})
+
+    def test_all_users_skips_user_filter(self):
+        """Test the 'all' user does not add a user_id clause"""
+        plan = plan_job_query(user_id="all", status="running")
+
+        assert plan.equality == [("status", "running")]
+
+    def test_cursor_round_trip(self):
+        """Test page tokens decode to the document ID and bad tokens are ignored"""
+        assert decode_cursor(encode_cursor("job-123")) == "job-123"
+        assert decode_cursor("not-a-cursor") is None
+        assert decode_cursor(None) is None
+
+    def test_default_user_is_pushed_down(self):
+        """Test 'current_user' is an equality clause like any other user once legacy jobs are backfilled"""
+        plan = plan_job_query(user_id="current_user", status="completed")
+
+        assert plan.equality == [("user_id", "current_user"), ("status", "completed")]
+        assert plan.exact
@@ -0,0 +1,171 @@
+"""
+Test Ligand Feature Store
+Tests LRU, persisted and computed feature lookups, chunked Firestore reads and scaffold analysis
+"""
+
+import sys
+import os
+import asyncio
+import threading
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("rdkit")
+
+from services import ligand_feature_store as feature_store_module
+from services.ligand_feature_store import (
+    FEATURE_VERSION, LOAD_CHUNK_SIZE, LigandFeatureStore, compute_ligand_features, feature_key
+)
+
+BENZAMIDE = "NC(=O)c1ccccc1"
+PHENOL = "Oc1ccccc1"
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+class FakeDocument:
+    def __init__(self, key):
+        self.key = key
+
+class FakeCollection:
+    def document(self, doc_id):
+        return FakeDocument(doc_id)
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, ref, data):
+        self.writes.append((ref.key, data))
+
+    def commit(self):
+        self.db.commits.append(len(self.writes))
+        self.db.docs.update(self.writes)
+
+class FakeFirestore:
+    """Synchronous client recording get_all sizes and the thread that served them"""
+
+    def __init__(self):
+        self.docs = {}
+        self.reads = []
+        self.commits = []
+        self.threads = set()
+
+    def collection(self, name):
+        return FakeCollection()
+
+    def get_all(self, refs):
+        refs = list(refs)
+        self.reads.append(len(refs))
+        self.threads.add(threading.get_ident())
+        return [FakeSnapshot(self.docs.get(ref.key)) for ref in refs]
+
+    def batch(self):
+        return FakeBatch(self)
+
+class FakeDatabaseManager:
+    def __init__(self, db):
+        self.db = db
+        self.available = True
+
+class TestLigandFeatureStore:
+    """Test suite for the shared ligand feature store"""
+
+    def test_lookup_order_is_local_then_persisted_then_computed(self):
+        """Test misses are computed and persisted once, then served locally or from Firestore"""
+        db = FakeFirestore()
+        store = LigandFeatureStore(db_manager=FakeDatabaseManager(db))
+
+        first = store.get_many([BENZAMIDE, " " + BENZAMIDE, "not-a-smiles"])
+        assert store.stats == {"local_hits": 0, "persistent_hits": 0, "computed": 2}
+        assert first[BENZAMIDE].valid and first[BENZAMIDE].scaffold_smiles == "c1ccccc1"
+        assert not first["not-a-smiles"].valid
+        assert db.docs[feature_key(BENZAMIDE)]["version"] == FEATURE_VERSION
+
+        store.get(BENZAMIDE)
+        assert store.stats["local_hits"] == 1
+
+        other_pod = LigandFeatureStore(db_manager=FakeDatabaseManager(db))
+        assert other_pod.get(BENZAMIDE).heavy_atoms == 9
+        assert other_pod.stats == {"local_hits": 0, "persistent_hits": 1, "computed": 0}
+
+    def test_stale_feature_version_is_recomputed(self):
+        """Test persisted records from an older feature set are ignored"""
+        db = FakeFirestore()
+        stale = compute_ligand_features(PHENOL).to_dict()
+        stale.update(version=FEATURE_VERSION - 1, heavy_atoms=0)
+        db.docs[feature_key(PHENOL)] = stale
+        store = LigandFeatureStore(db_manager=FakeDatabaseManager(db))
+
+        assert store.get(PHENOL).heavy_atoms == 7
+        assert store.stats["computed"] == 1 and db.docs[feature_key(PHENOL)]["version"] == FEATURE_VERSION
+
+    def test_persisted_reads_are_chunked(self):
+        """Test large lookups never send more than LOAD_CHUNK_SIZE documents per get_all"""
+        db = FakeFirestore()
+        smiles = [f"C{i}" for i in range(LOAD_CHUNK_SIZE * 2 + 5)]
+        for key in smiles:
+            db.docs[feature_key(key)] = {"smiles": key, "canonical_smiles": key, "valid": True}
+        store = LigandFeatureStore(db_manager=FakeDatabaseManager(db))
+
+        found = store.get_many(smiles)
+
+        assert db.reads == [LOAD_CHUNK_SIZE, LOAD_CHUNK_SIZE, 5]
+        assert len(found) == len(smiles) and store.stats["computed"] == 0 and db.commits == []
+
+    def test_local_cache_is_bounded(self):
+        """Test the in-process LRU evicts the least recently used ligand"""
+        store = LigandFeatureStore(db_manager=FakeDatabaseManager(None), max_local_entries=2)
+        store.get_many(["C", "CC"])
+        store.peek("C")
+        store.get("CCC")
+
+        assert store.peek("CC") is None
+        assert store.peek("C") is not None and store.peek("CCC") is not None
+
+    def test_async_lookup_runs_off_the_loop(self):
+        """Test get_many_async performs the Firestore read in a worker thread"""
+        db = FakeFirestore()
+        store = LigandFeatureStore(db_manager=FakeDatabaseManager(db))
+
+        features = asyncio.run(store.get_many_async([PHENOL]))
+
+        assert features[PHENOL].valid
+        assert db.threads and threading.get_ident() not in db.threads
+
+    def test_scaffold_analysis_uses_the_store(self, monkeypatch):
+        """Test scaffold diversity and compute_scaffold resolve features through the store"""
+        pytest.importorskip("MDAnalysis")
+        pytest.importorskip("sklearn")
+        from services import boltz_post_processor
+        from services.boltz_post_processor import BoltzPostProcessor
+
+        db = FakeFirestore()
+        store = LigandFeatureStore(db_manager=FakeDatabaseManager(db))
+        monkeypatch.setattr(feature_store_module, "ligand_feature_store", store)
+        monkeypatch.setattr(boltz_post_processor, "ligand_feature_store", store)
+        processor = BoltzPostProcessor(max_workers=1)
+        jobs = [
+            {"input_data": {"smiles": BENZAMIDE}},
+            {"smiles": PHENOL},
+            {"ligand_smiles": "not-a-smiles"},
+            {"job_id": "no-smiles"}
+        ]
+
+        try:
+            summary = asyncio.run(processor._analyze_scaffolds_async(jobs))
+            scaffold = asyncio.run(processor.compute_scaffold(PHENOL))
+            empty = asyncio.run(processor._analyze_scaffolds_async([{"job_id": "no-smiles"}]))
+        finally:
+            processor.__del__()
+
+        assert summary["compounds_with_smiles"] == 3 and summary["valid_smiles"] == 2
+        assert summary["unique_scaffolds"] == 1 and summary["scaffold_diversity"] == 0.5
+        assert scaffold == "c1ccccc1" and store.stats["local_hits"] == 1
+        assert empty["unique_scaffolds"] == 0 and "note" in empty
@@ -0,0 +1,99 @@
+"""
+Test Log Pipeline
+Tests the structured formatter, per-logger rate limiting/sampling and queued emission
+"""
+
+import sys
+import os
+import json
+import queue
+import logging
+import logging.handlers
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.log_pipeline import AsyncQueueHandler, LogRateLimiter, StructuredFormatter
+
+def _record(name="config.gcp_storage", level=logging.INFO, msg="✅ Downloaded %s", args=("a.json",), **extra):
+    record = logging.LogRecord(name, level, __file__, 10, msg, args, None, func="download_file")
+    record.__dict__.update(extra)
+    return record
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+class TestLogPipeline:
+    """Test suite for the logging pipeline"""
+
+    def test_formatter_emits_the_structured_schema(self):
+        """Test context, extra data, exceptions and the cached service block are all encoded"""
+        formatter = StructuredFormatter({'name': 'api', 'version': '1', 'environment': 'test', 'instance': 'pod-1'})
+        entry = json.loads(formatter.format(_record(job_id="job-1", duration=12.5, operation="download",
+                                                    extra_data={'bytes': 10, 'path': object})))
+
+        assert entry['message'] == "✅ Downloaded a.json" and entry['level'] == "INFO"
+        assert entry['logger'] == "config.gcp_storage" and entry['function'] == "download_file"
+        assert entry['job_id'] == "job-1" and entry['bytes'] == 10 and entry['path'].startswith("<class")
+        assert entry['performance'] == {'duration_ms': 12.5, 'operation': "download"}
+        assert entry['service'] == {'name': 'api', 'version': '1', 'environment': 'test', 'instance': 'pod-1'}
+        assert len(entry['timestamp']) == 26 and entry['timestamp'][10] == "T"
+
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = _record(level=logging.ERROR, exc_info=sys.exc_info())
+        failure = json.loads(formatter.format(record))
+        assert failure['exception']['type'] == "ValueError" and "boom" in failure['exception']['traceback']
+
+    def test_rate_limit_applies_per_logger_and_reports_suppressed(self):
+        """Test the token bucket drops excess info lines, lets warnings through and counts drops"""
+        now = [0.0]
+        limiter = LogRateLimiter({'config': (1.0, 2.0)}, clock=lambda: now[0])
+
+        passed = [limiter.filter(_record()) for _ in range(5)]
+        assert passed == [True, True, False, False, False]
+        assert limiter.filter(_record(level=logging.WARNING))
+        assert limiter.filter(_record(name="services.other"))
+
+        now[0] = 1.0
+        record = _record()
+        assert limiter.filter(record) and record.suppressed == 3
+        assert limiter.dropped == 3
+
+    def test_sampling_keeps_one_in_n(self):
+        """Test 1-in-N sampling of debug records"""
+        limiter = LogRateLimiter(sample_every={'database.unified_job_manager': 4}, max_level=logging.DEBUG)
+        kept = [limiter.filter(_record(name="database.unified_job_manager", level=logging.DEBUG))
+                for _ in range(9)]
+
+        assert kept == [True, False, False, False, True, False, False, False, True]
+        assert limiter.filter(_record(name="database.unified_job_manager", level=logging.INFO))
+
+    def test_queue_handler_renders_args_and_never_blocks(self):
+        """Test records are rendered at call time, formatted by the listener and dropped when the queue is full"""
+        log_queue = queue.Queue(maxsize=2)
+        queue_handler = AsyncQueueHandler(log_queue)
+        output = ListHandler()
+        output.setFormatter(StructuredFormatter())
+
+        log = logging.getLogger("test.log_pipeline")
+        log.handlers[:] = [queue_handler]
+        log.propagate = False
+        log.setLevel(logging.INFO)
+
+        args = ["first"]
+        log.info("value %s", args)
+        args.append("mutated")
+        log.info("second")
+        log.info("dropped")
+        assert queue_handler.dropped == 1
+
+        listener = logging.handlers.QueueListener(log_queue, output)
+        listener.start()
+        listener.stop()
+
+        assert [json.loads(line)['message'] for line in output.lines] == ["value ['first']", "second"]
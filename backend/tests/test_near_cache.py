@@ -0,0 +1,216 @@
+"""
+Test Near Cache
+Tests the two-tier cache: cross-replica sharing, versioned invalidation, single-flight loads and bounds
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.near_cache import CoherenceBus, NearCache, batch_scope
+
+class FakeRedis:
+    """Shared Redis stand-in: key/value store, counters and one pub/sub channel"""
+
+    def __init__(self):
+        self.values = {}
+        self.counters = {}
+        self.subscribers = []
+
+    def backend(self):
+        redis = self
+
+        class Backend:
+            available = True
+
+            async def connect(self):
+                return True
+
+            async def get(self, key):
+                return redis.values.get(key)
+
+            async def set(self, key, value, ttl):
+                redis.values[key] = value
+
+            async def delete(self, key):
+                redis.values.pop(key, None)
+
+            async def incr(self, name):
+                redis.counters[name] = redis.counters.get(name, 0) + 1
+                return redis.counters[name]
+
+            async def mget(self, names):
+                return [redis.counters.get(name) for name in names]
+
+            async def publish(self, message):
+                loop = asyncio.get_running_loop()
+                for callback in list(redis.subscribers):
+                    loop.call_soon(callback, message)
+
+            async def listen(self, on_message):
+                redis.subscribers.append(on_message)
+                try:
+                    await asyncio.Event().wait()
+                finally:
+                    redis.subscribers.remove(on_message)
+        return Backend()
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def _pod(redis, namespace="batch_status", **kwargs):
+    bus = CoherenceBus(redis.backend())
+    return bus, NearCache(namespace, bus=bus, **kwargs)
+
+class TestNearCache:
+    """Test suite for the coherent near cache"""
+
+    def test_replicas_share_entries_through_the_remote_tier(self):
+        """Test a value computed on one pod is a remote hit, then a local hit, on another"""
+        redis = FakeRedis()
+
+        async def run():
+            _, pod_a = _pod(redis)
+            _, pod_b = _pod(redis)
+            await pod_a.set("b1", {'total_jobs': 10}, scopes=[batch_scope("b1")])
+            first = await pod_b.get("b1")
+            second = await pod_b.get("b1")
+            return pod_b, first, second
+
+        pod_b, first, second = asyncio.run(run())
+        assert first == second == {'total_jobs': 10}
+        stats = pod_b.stats()
+        assert stats['remote_hits'] == 1 and stats['local_hits'] == 1 and stats['hit_rate_percentage'] == 100.0
+
+    def test_scope_invalidation_reaches_other_replicas(self):
+        """Test invalidating a batch on one pod drops local copies elsewhere and is observable"""
+        redis = FakeRedis()
+
+        async def run():
+            bus_a, pod_a = _pod(redis)
+            bus_b, pod_b = _pod(redis)
+            await bus_a.start()
+            await bus_b.start()
+            await asyncio.sleep(0)
+            await pod_a.set("b1", {'status': 'running'}, scopes=[batch_scope("b1")])
+            assert await pod_b.get("b1") == {'status': 'running'}
+
+            await pod_a.invalidate("b1", scopes=[batch_scope("b1")])
+            await asyncio.sleep(0.01)
+            result = pod_b.get_local("b1"), await pod_b.get("b1")
+            await bus_a.stop()
+            await bus_b.stop()
+            return result, bus_b.status()
+
+        (local, remote), status = asyncio.run(run())
+        assert local is None and remote is None
+        assert status['messages_received'] >= 1 and status['last_propagation_ms'] is not None
+
+    def test_remote_entries_are_checked_against_authoritative_versions(self):
+        """Test a replica that missed the broadcast still rejects a superseded remote entry"""
+        redis = FakeRedis()
+
+        async def run():
+            bus_a, pod_a = _pod(redis)
+            _, pod_b = _pod(redis)
+            _, pod_c = _pod(redis)
+            await pod_a.set("b1", {'status': 'running'}, scopes=[batch_scope("b1")])
+            # pod_c wrote a stale copy before the bump; nobody is listening
+            stale_versions = {batch_scope("b1"): 0}
+            await bus_a.bump(batch_scope("b1"))
+            await pod_c.set("b1", {'status': 'running'}, versions=stale_versions)
+            return await pod_b.get("b1"), pod_b.stats()['stale_rejects']
+
+        value, rejects = asyncio.run(run())
+        assert value is None and rejects == 1
+
+    def test_loads_are_single_flight_and_racing_invalidations_win(self):
+        """Test concurrent misses share one load and a value loaded across an invalidation is not served"""
+        redis = FakeRedis()
+        loads = 0
+
+        async def run():
+            nonlocal loads
+            bus, cache = _pod(redis)
+            release = asyncio.Event()
+
+            async def loader():
+                nonlocal loads
+                loads += 1
+                await release.wait()
+                return {'status': 'old'}
+
+            waiters = [asyncio.create_task(cache.get_or_load("b1", loader, scopes=[batch_scope("b1")]))
+                       for _ in range(20)]
+            await asyncio.sleep(0)
+            await bus.bump(batch_scope("b1"))
+            release.set()
+            values = await asyncio.gather(*waiters)
+            return values, cache.get_local("b1"), cache.stats()
+
+        values, after, stats = asyncio.run(run())
+        assert loads == 1 and stats['coalesced_loads'] == 19
+        assert all(value == {'status': 'old'} for value in values)
+        assert after is None
+
+    def test_local_tier_is_bounded_in_size_and_staleness(self):
+        """Test LRU eviction and that local copies expire at the staleness bound, not the full TTL"""
+        clock = FakeClock()
+        bus = CoherenceBus(FakeRedis().backend())
+        cache = NearCache("bounded", bus=bus, max_entries=3, ttl=600, max_staleness=30, clock=clock)
+        for key in "abcd":
+            cache.set_local(key, key.upper())
+
+        assert cache.get_local("a") is None and cache.get_local("d") == "D"
+        assert cache.stats()['evictions'] == 1 and cache.stats()['staleness_bound_seconds'] == 30
+        clock.now = 31
+        assert cache.get_local("d") is None
+
+    def test_writes_are_tagged_with_authoritative_versions(self):
+        """Test a pod that missed a bump still tags loads and sets with the current version, so they are shared"""
+        redis = FakeRedis()
+
+        async def run():
+            bus_a, _ = _pod(redis)
+            bus_b, pod_b = _pod(redis)
+            _, pod_c = _pod(redis)
+            await bus_a.bump(batch_scope("b1"))
+            await bus_a.bump(batch_scope("b2"))
+
+            async def loader():
+                return {'status': 'fresh'}
+
+            await pod_b.get_or_load("b1", loader, scopes=[batch_scope("b1")])
+            await pod_b.set("b2", {'status': 'fresh'}, scopes=[batch_scope("b2")])
+            return bus_b.version(batch_scope("b1")), await pod_c.get("b1"), await pod_c.get("b2"), pod_c.stats()
+
+        seen, b1, b2, stats = asyncio.run(run())
+        assert seen == 1
+        assert b1 == b2 == {'status': 'fresh'}
+        assert stats['remote_hits'] == 2 and stats['stale_rejects'] == 0
+
+    def test_batch_status_cached_across_an_invalidation_is_stale(self, monkeypatch):
+        """Test a status computed before a bump is not served, one computed after it is"""
+        from services import near_cache
+        from services.batch_status_cache import BatchStatusCache
+        redis = FakeRedis()
+        monkeypatch.setattr(near_cache, "coherence_bus", CoherenceBus(redis.backend()))
+
+        async def run():
+            status_cache = BatchStatusCache()
+            bus = status_cache.cache.bus
+            versions = await status_cache.status_versions("b1")
+            await bus.bump(batch_scope("b1"))
+            await status_cache.cache_batch_status("b1", {'total_jobs': 5}, versions=versions)
+            stale = status_cache.get_cached_batch_status("b1")
+
+            await status_cache.cache_batch_status("b1", {'total_jobs': 6})
+            return stale, await status_cache.get_batch_status("b1")
+
+        stale, fresh = asyncio.run(run())
+        assert stale is None and fresh == {'total_jobs': 6}
@@ -0,0 +1,118 @@
+"""
+Test Offload
+Tests the shared offload executor, the @offload helper and event-loop stall attribution
+"""
+
+import sys
+import os
+import time
+import asyncio
+import threading
+import pytest
+from contextvars import ContextVar
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from monitoring.profiler import LoopBlockingDetector
+from services.io_budget import RequestIO, _current_io, record
+from services.offload import OffloadExecutor, offload, run_sync
+
+request_id: ContextVar = ContextVar('request_id', default=None)
+
+class FakeStorage:
+    """Blocking client that remembers which thread served each call and how many overlapped"""
+
+    def __init__(self):
+        self.threads = set()
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def download_file(self, path):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        self.threads.add(threading.get_ident())
+        time.sleep(0.02)
+        record('gcs', reads=1, nbytes=len(path))
+        with self._lock:
+            self.active -= 1
+        return f"{request_id.get()}:{path}".encode()
+
+class TestOffload:
+    """Test suite for offloading blocking SDK calls"""
+
+    def test_offloaded_calls_run_bounded_off_the_loop_with_context(self):
+        """Test calls leave the loop thread, never exceed the pool size and keep request context"""
+        storage = FakeStorage()
+        executor = OffloadExecutor(max_workers=4, max_pending=4)
+        io = RequestIO('/api/v1/batches/{batch_id}')
+
+        async def main():
+            request_id.set("req-1")
+            _current_io.set(io)
+            return await asyncio.gather(*(executor.run(storage.download_file, f"jobs/{i}") for i in range(12)))
+
+        try:
+            results = asyncio.run(main())
+        finally:
+            executor.shutdown()
+
+        assert results[3] == b"req-1:jobs/3"
+        assert threading.get_ident() not in storage.threads and storage.max_active <= 4
+        assert io.backends['gcs'].reads == 12
+        stats = executor.stats()
+        assert stats['submitted'] == 12 and stats['max_in_flight'] == 4 and stats['waited_for_slot'] > 0
+
+    def test_offload_decorator_keeps_a_sync_entry_point(self):
+        """Test decorated methods are awaitable, propagate errors and expose the blocking original"""
+
+        class Manager:
+            @offload
+            def load(self, path):
+                if path is None:
+                    raise ValueError("no path")
+                return threading.get_ident(), path
+
+        manager = Manager()
+
+        async def main():
+            thread, path = await manager.load("a.json")
+            with pytest.raises(ValueError):
+                await manager.load(None)
+            return thread, path, await run_sync(len, "abc")
+
+        thread, path, length = asyncio.run(main())
+        assert thread != threading.get_ident() and path == "a.json" and length == 3
+        assert Manager.load.sync(manager, "b.json") == (threading.get_ident(), "b.json")
+        assert asyncio.iscoroutinefunction(Manager.load)
+
+    def test_blocking_detector_attributes_stalls_to_the_coroutine(self):
+        """Test a sync sleep on the loop is caught with its call site and an offloaded one is not"""
+        detector = LoopBlockingDetector(threshold=0.05)
+
+        async def blocking_handler():
+            time.sleep(0.2)
+
+        async def offloaded_handler():
+            await run_sync(time.sleep, 0.2)
+
+        async def main():
+            detector.start()
+            await asyncio.sleep(0.05)
+            await blocking_handler()
+            await asyncio.sleep(0.05)
+            await offloaded_handler()
+            await asyncio.sleep(0.05)
+            detector.stop()
+
+        asyncio.run(main())
+        snapshot = detector.snapshot()
+
+        assert snapshot['stalls'] == 1 and not snapshot['running'] and snapshot['blocked_now'] is None
+        site = snapshot['sites'][0]
+        assert site['site'].startswith("tests/test_offload.py:") and site['site'].endswith("blocking_handler")
+        assert site['blocked_in'].endswith("test_offload") and "blocking_handler" in site['stack']
+        assert 150 <= site['max_ms'] < 400
+
+        detector.reset()
+        assert detector.snapshot()['sites'] == []
@@ -0,0 +1,128 @@
+"""
+Test Profiler
+Tests sampling profiles, event-loop lag, per-function attribution and loop-blocking call sites
+"""
+
+import sys
+import os
+import time
+import asyncio
+import threading
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from monitoring.profiler import FunctionProfiler, LoopLagMonitor, ProfilerBusyError, SamplingProfiler
+from services.io_budget import LoopBlockingCalls, instrument_methods, loop_blocking_calls
+
+def _spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+def _burn(cpu_seconds):
+    deadline = time.thread_time() + cpu_seconds
+    while time.thread_time() < deadline:
+        pass
+
+def busy_worker(stop):
+    while not stop.is_set():
+        _spin(0.001)
+
+class TestProfiler:
+    """Test suite for the profiling surface"""
+
+    def test_sampling_profile_collapses_busy_thread_stacks(self):
+        """Test a busy thread shows up root-first in collapsed output and idle threads are skipped"""
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_worker, args=(stop,), name="busy")
+        idle = threading.Thread(target=stop.wait, name="idle")
+        worker.start()
+        idle.start()
+        profiler = SamplingProfiler()
+        try:
+            profile = profiler.profile(0.2, interval=0.002)
+        finally:
+            stop.set()
+            worker.join()
+            idle.join()
+
+        lines = profile['collapsed'].splitlines()
+        busy = [line for line in lines if line.startswith("busy;")]
+        assert busy and "busy_worker (tests/test_profiler.py);_spin (tests/test_profiler.py)" in busy[0]
+        assert not any(line.startswith("idle;") for line in lines)
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+        assert profile['samples'] > 10 and profile['top_functions'][0]['samples'] > 0
+
+    def test_only_one_profile_runs_at_a_time(self):
+        """Test a concurrent profile request is rejected instead of doubling overhead"""
+        profiler = SamplingProfiler()
+        runner = threading.Thread(target=profiler.profile, args=(0.2, 0.01))
+        runner.start()
+        time.sleep(0.05)
+        with pytest.raises(ProfilerBusyError):
+            profiler.profile(0.1)
+        runner.join()
+
+    def test_loop_lag_monitor_records_stalls(self):
+        """Test a blocking call on the loop is measured as lag above the threshold"""
+        monitor = LoopLagMonitor(interval=0.01, threshold=0.05)
+
+        async def main():
+            monitor.start()
+            await asyncio.sleep(0.03)
+            time.sleep(0.08)
+            await asyncio.sleep(0.03)
+            await monitor.stop()
+
+        asyncio.run(main())
+        snapshot = monitor.snapshot()
+        assert snapshot['stalls'] >= 1 and snapshot['max_ms'] >= 50
+        assert monitor.loop_thread_id == threading.get_ident() and not snapshot['running']
+
+    def test_function_attribution_separates_loop_time_from_awaits(self):
+        """Test coroutine CPU/loop time covers only its own steps while wall time includes awaits"""
+        profiler = FunctionProfiler()
+
+        async def traced():
+            _burn(0.02)
+            await asyncio.sleep(0.05)
+            time.sleep(0.02)
+            return "done"
+
+        async def main():
+            return await profiler.run("traced", traced())
+
+        assert asyncio.run(main()) == "done"
+        with pytest.raises(ValueError):
+            profiler.call("failing", int, "x")
+
+        traced_stats, failing = profiler.snapshot()
+        assert traced_stats['function'] == "traced" and traced_stats['calls'] == 1
+        assert traced_stats['wall_ms_total'] >= 90
+        assert 35 <= traced_stats['loop_ms_total'] <= traced_stats['wall_ms_total'] - 45
+        assert 18 <= traced_stats['cpu_ms_total'] < traced_stats['loop_ms_total']
+        assert failing['errors'] == 1
+
+    def test_sync_storage_calls_on_the_loop_are_attributed_to_the_coroutine(self):
+        """Test blocking client calls made from async code are counted by call site; threaded ones are not"""
+        client = instrument_methods(type("Client", (), {'create_task': lambda self, request: request})(),
+                                    'cloud_tasks', writes=['create_task'])
+        loop_blocking_calls.reset()
+
+        async def submit_from_async():
+            client.create_task({})
+            await asyncio.to_thread(client.create_task, {})
+
+        asyncio.run(submit_from_async())
+        client.create_task({})
+
+        snapshot = loop_blocking_calls.snapshot()
+        assert snapshot['calls'] == 1
+        site = snapshot['sites'][0]
+        assert site['backend'] == "cloud_tasks"
+        assert site['site'].startswith("tests/test_profiler.py:") and site['site'].endswith("submit_from_async")
+
+        limited = LoopBlockingCalls(max_sites=1)
+        limited.record('gcs', 0.1, 'a')
+        limited.record('gcs', 0.2, 'b')
+        assert limited.calls == 2 and len(limited.snapshot()['sites']) == 1
@@ -0,0 +1,79 @@
+"""
+Test Runtime Estimator
+Tests the shared runtime model, its artifact round trip and telemetry fitting
+"""
+
+import sys
+import os
+import random
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.runtime_estimator import (
+    JobFeatures, RuntimeEstimator, RuntimeModel, PRIOR_ARTIFACT, fit_runtime_model, telemetry_row
+)
+
+def _synthetic_rows(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        length = rng.randint(100, 1200)
+        size = rng.randint(10, 90)
+        msa = rng.random() < 0.5
+        features = JobFeatures(length, size, msa, False, 200, "L4").vector()
+        truth = [10.0, 30.0, 2.0, 3.0, 45.0, 0.0, 50.0]
+        rows.append({
+            'protein_length': length, 'ligand_size': size, 'use_msa': msa,
+            'use_potentials': False, 'sampling_steps': 200, 'gpu_type': "L4",
+            'wall_seconds': sum(c * v for c, v in zip(truth, features)) * rng.uniform(0.97, 1.03),
+        })
+    return rows
+
+class TestRuntimeEstimator:
+    """Test suite for the shared runtime model"""
+
+    def test_prior_predictions_scale_with_inputs(self):
+        """Test the prior grows with protein length and MSA and prices by GPU"""
+        model = RuntimeModel(PRIOR_ARTIFACT)
+        small = model.predict(JobFeatures(200, 40, use_msa=False))
+        large = model.predict(JobFeatures(800, 40, use_msa=True))
+
+        assert large.wall_seconds > small.wall_seconds
+        assert large.peak_memory_gb > small.peak_memory_gb
+        assert model.predict(JobFeatures(400, gpu_type="A100")).wall_seconds < model.predict(JobFeatures(400)).wall_seconds
+
+    def test_fit_recovers_runtime_and_keeps_prior_for_missing_targets(self):
+        """Test fitted wall time tracks telemetry and memory falls back to the prior"""
+        model = fit_runtime_model(_synthetic_rows(300), version="test-1")
+        truth = 10 + 30 * 5 + 2 * 25 + 3 * 4 + 45 + 50
+
+        estimate = model.predict(JobFeatures(500, 40, True, False, 200, "L4"))
+        assert abs(estimate.wall_seconds - truth) / truth < 0.05
+        assert model.artifact["metrics"]["L4"]["peak_memory_gb"]["fitted"] is False
+        assert model.gpus["L4"]["peak_memory_gb"] == PRIOR_ARTIFACT["gpus"]["L4"]["peak_memory_gb"]
+
+    def test_artifact_round_trip_and_batch_totals(self):
+        """Test a saved artifact is picked up by the estimator and totals add up per ligand"""
+        model = fit_runtime_model(_synthetic_rows(100), version="test-2")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "runtime_model.json")
+            model.save(path)
+            estimator = RuntimeEstimator(path)
+
+            total = estimator.estimate_ligands(500, ["CCO", {'smiles': "c1ccccc1"}])
+            single = estimator.estimate(JobFeatures(500, 3))
+
+        assert total.model_version == "test-2"
+        assert total.wall_seconds > single.wall_seconds
+
+    def test_telemetry_row_from_job_document(self):
+        """Test completed jobs become training rows and incomplete ones are skipped"""
+        job = {
+            'status': 'completed', 'started_at': 100.0, 'completed_at': 400.0,
+            'input_data': {'protein_sequence': "M" * 250, 'ligand_smiles': "CCO", 'use_msa': False},
+            'output_data': {'metadata': {'gpu_type': "A100", 'peak_memory_gb': 12.5}}
+        }
+
+        row = telemetry_row(job)
+        assert row['wall_seconds'] == 300.0 and row['gpu_type'] == "A100" and row['peak_memory_gb'] == 12.5
+        assert telemetry_row({**job, 'status': 'running'}) is None
@@ -0,0 +1,71 @@
+"""
+Test Service Registry
+Tests lazy loading and warm-up of registered services
+"""
+
+import sys
+import os
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import gcp_clients
+from services.service_registry import ServiceRegistry
+
+class TestServiceRegistry:
+    """Test suite for ServiceRegistry"""
+
+    def test_services_load_on_first_use(self):
+        """Test that registering does not import and get() caches the instance"""
+        registry = ServiceRegistry()
+        registry.register("decoder", "json:JSONDecoder")
+
+        assert not registry.is_loaded("decoder")
+        decoder = registry.get("decoder")
+        assert registry.is_loaded("decoder")
+        assert registry.get("decoder") is decoder
+
+    def test_warm_up_reports_failures(self):
+        """Test that warm-up logs failures instead of raising"""
+        registry = ServiceRegistry()
+        registry.register("ok", "json:dumps")
+        registry.register("missing", "json:does_not_exist")
+        registry.register("cold", "json:loads", warm=False)
+
+        report = registry.warm_up()
+
+        assert report["ok"]["ok"] is True
+        assert report["missing"]["ok"] is False
+        assert "cold" not in report
+        assert not registry.is_loaded("cold")
+
+    def test_credentials_keep_the_per_client_order(self, monkeypatch):
+        """Test Storage honours GCP_CREDENTIALS_JSON on GKE while Firestore uses the node account"""
+        service_account = pytest.importorskip("google.oauth2.service_account")
+        monkeypatch.setattr(service_account.Credentials, "from_service_account_info", staticmethod(lambda info: info))
+        monkeypatch.setenv("GCP_CREDENTIALS_JSON", '{"client_email": "svc@example.com"}')
+        monkeypatch.setenv("KUBERNETES_SERVICE_HOST", "10.0.0.1")
+
+        assert gcp_clients._credentials() == {"client_email": "svc@example.com"}
+        assert gcp_clients._credentials(prefer_workload_identity=True) is None
+
+        monkeypatch.delenv("KUBERNETES_SERVICE_HOST")
+        assert gcp_clients._credentials(prefer_workload_identity=True) == {"client_email": "svc@example.com"}
+
+        monkeypatch.delenv("GCP_CREDENTIALS_JSON")
+        assert gcp_clients._credentials() is None
+
+    def test_shared_client_descriptor_must_define_create(self):
+        """Test the descriptor base is abstract and subclasses cache the client per instance"""
+        with pytest.raises(TypeError):
+            gcp_clients._SharedClient()
+
+        class SharedDecoder(gcp_clients._SharedClient):
+            def _create(self, project):
+                return ("client", project)
+
+        class Service:
+            project_id = "om-models"
+            client = SharedDecoder(project_attr="project_id")
+
+        service = Service()
+        assert service.client == ("client", "om-models") and "client" in service.__dict__
@@ -0,0 +1,131 @@
+"""
+Test Shard Packer
+Tests protein grouping across batches, budgeted LPT bin-packing and lane-weighted fair ordering
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.shard_packer import (
+    PendingLigand, ShardPacker, count_heavy_atoms, ligand_cost_size, lpt_assign, packing_summary, pending_ligands
+)
+
+PROTEIN_A = "MKTAYIAKQRQISFVKSHFSRQ" * 10
+PROTEIN_B = "GSHMSLFDFFKNKGSAAATPED" * 10
+
+def _pending(user_id, batch_id, protein, count, lane="bulk", use_msa=True):
+    return [
+        PendingLigand(user_id, batch_id, i, {'name': f'{batch_id}_{i}', 'smiles': "CCO" * (1 + i % 5)},
+                      protein, use_msa=use_msa, lane=lane)
+        for i in range(count)
+    ]
+
+def _packer(**kwargs):
+    return ShardPacker(memory_estimator=lambda length, count: 8.0 + 0.05 * count, **kwargs)
+
+class Descriptor:
+    def __init__(self, valid, heavy_atoms=0, rotatable_bonds=0):
+        self.valid = valid
+        self.heavy_atoms = heavy_atoms
+        self.rotatable_bonds = rotatable_bonds
+
+class TestShardPacker:
+    """Test suite for GPU shard packing"""
+
+    def test_same_protein_is_shared_across_users_and_parameters_split(self):
+        """Test batches on one protein share shards while other proteins and MSA settings do not"""
+        items = (_pending("alice", "a1", PROTEIN_A, 3) + _pending("bob", "b1", PROTEIN_A, 3)
+                 + _pending("carol", "c1", PROTEIN_B, 2) + _pending("dave", "d1", PROTEIN_A, 2, use_msa=False))
+        shards = _packer(task_seconds=10_000).pack(items)
+
+        assert len(shards) == 3
+        shared = next(shard for shard in shards if len(shard.batch_ids) > 1)
+        assert shared.batch_ids == ["a1", "b1"]
+        assert sum(len(shard.items) for shard in shards) == len(items)
+        summary = packing_summary(shards)
+        assert summary['ligands'] == len(items)
+        assert summary['estimated_gpu_seconds'] == round(sum(shard.seconds for shard in shards), 1)
+
+    def test_shards_respect_time_memory_and_size_budgets(self):
+        """Test every shard fits the task budget and memory-bound shards stay small"""
+        items = _pending("alice", "a1", PROTEIN_A, 40)
+        packer = _packer(task_seconds=900, max_ligands=8)
+        shards = packer.pack(items)
+
+        assert all(shard.seconds <= 900 and len(shard.items) <= 8 for shard in shards)
+        assert sorted(item.ligand_index for shard in shards for item in shard.items) == list(range(40))
+
+        tight = ShardPacker(task_seconds=10_000, memory_gb=10.0,
+                            memory_estimator=lambda length, count: 9.0 + 0.5 * count)
+        assert all(len(shard.items) <= 2 for shard in tight.pack(items))
+
+    def test_interactive_lane_is_dispatched_before_bulk_backlog(self):
+        """Test weighted fair ordering lets an interactive user jump a large bulk screen"""
+        items = _pending("bulk_user", "big", PROTEIN_A, 60) + _pending("vip", "small", PROTEIN_B, 2, lane="interactive")
+        shards = _packer(task_seconds=900).pack(items)
+
+        position = next(i for i, shard in enumerate(shards) if shard.batch_ids == ["small"])
+        assert shards[position].lane == "interactive"
+        assert position == 0
+
+    def test_fair_order_interleaves_equal_weight_users(self):
+        """Test two bulk users on different proteins alternate instead of running back to back"""
+        items = _pending("u1", "x", PROTEIN_A, 30) + _pending("u2", "y", PROTEIN_B, 30)
+        owners = [shard.batch_ids[0] for shard in _packer(task_seconds=600).pack(items)]
+
+        half = len(owners) // 2
+        assert 0 < owners[:half].count("x") < half
+
+    def test_lpt_balances_large_ligands_better_than_round_robin(self):
+        """Test LPT spreads heavy ligands so the slowest task finishes well before round-robin's"""
+        tasks = 4
+        # Every task-th ligand is a macrocycle, so round-robin hands them all to task 0
+        costs = [ligand_cost_size(smiles) for smiles in (["C1CCCCCCCCCCCCCCCCCCCCC1"] + ["CCO"] * (tasks - 1)) * 8]
+
+        lpt = max(sum(costs[i] for i in indices) for indices in lpt_assign(costs, tasks))
+        round_robin = max(sum(costs[i::tasks]) for i in range(tasks))
+        assert lpt < round_robin / 2
+        assert sorted(i for indices in lpt_assign(costs, tasks) for i in indices) == list(range(len(costs)))
+
+    def test_ligand_cost_uses_heavy_atoms_and_rotatable_bonds(self):
+        """Test descriptor-based cost, with a SMILES heavy-atom fallback"""
+        assert count_heavy_atoms("c1ccccc1Cl") == 7
+        assert count_heavy_atoms("[H][C@@H](Br)O") == 3
+        rigid = ligand_cost_size({'smiles': "CCCCCC", 'heavy_atoms': 6, 'rotatable_bonds': 0})
+        flexible = ligand_cost_size({'smiles': "CCCCCC", 'heavy_atoms': 6, 'rotatable_bonds': 3})
+        assert flexible > rigid == ligand_cost_size("CCCCCC")
+
+    def test_packed_shards_are_balanced(self):
+        """Test a group's shards end up with similar estimated times, not one light leftover"""
+        items = [PendingLigand("u", "b", i, {'smiles': "CCO" * (1 + i % 9)}, PROTEIN_A) for i in range(100)]
+        seconds = [shard.seconds for shard in _packer(task_seconds=1440).pack(items)]
+
+        assert max(seconds) <= 1440
+        assert min(seconds) > 0.75 * max(seconds)
+
+    def test_pending_ligands_rebuild_a_batch_in_index_order(self):
+        """Test queued-batch ligands are rebuilt with descriptor costs and token fallback"""
+        ligands = [{'name': 'a', 'smiles': ' CCO '}, {'name': 'b', 'smiles': 'bad'}, {'name': 'c', 'smiles': 'CCN'}]
+        descriptors = {'CCO': Descriptor(True, 3, 1), 'bad': Descriptor(False)}
+
+        pending = pending_ligands("alice", "a1", ligands, PROTEIN_A, use_msa=False, lane="interactive",
+                                  descriptors=descriptors)
+
+        assert [item.ligand_index for item in pending] == [0, 1, 2]
+        assert (pending[0].heavy_atoms, pending[0].rotatable_bonds) == (3, 1)
+        assert pending[1].heavy_atoms is None and pending[2].heavy_atoms is None
+        assert all(item.lane == "interactive" and not item.use_msa for item in pending)
+        assert pending[0].group_key == pending[2].group_key
+
+    def test_msa_is_charged_to_every_ligand(self):
+        """Test a shard's estimate includes each ligand's own MSA, since the worker shares nothing"""
+        packer = _packer(task_seconds=10_000)
+        with_msa = packer.pack(_pending("alice", "a1", PROTEIN_A, 4))
+        without_msa = packer.pack(_pending("alice", "a1", PROTEIN_A, 4, use_msa=False))
+
+        assert len(with_msa) == len(without_msa) == 1
+        assert with_msa[0].seconds == sum(packer._cost(item) for item in with_msa[0].items)
+        msa_seconds = with_msa[0].seconds - without_msa[0].seconds
+        first_msa = with_msa[0].ligand_seconds[-1] - without_msa[0].ligand_seconds[-1]
+        assert msa_seconds > 3 * first_msa > 0
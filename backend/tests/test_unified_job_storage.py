@@ -0,0 +1,68 @@
+"""
+Test Unified Job Storage
+Tests job list pagination and totals for pushed-down and residual filters
+"""
+
+import sys
+import os
+import asyncio
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.unified_job_storage import UnifiedJobStorage
+from database.job_query_planner import encode_cursor
+
+class FakeJobManager:
+    """Jobs query backend returning canned documents and counting count calls"""
+
+    def __init__(self, docs, count=1000):
+        self.docs = docs
+        self.count = count
+        self.count_calls = 0
+
+    def query_jobs(self, plan, limit, start_after=None, offset=0):
+        return self.docs[offset:offset + limit], None
+
+    def count_jobs(self, plan):
+        self.count_calls += 1
+        return self.count
+
+def _job(i, task_type="protein_ligand_binding"):
+    return {'id': f"job-{i}", 'name': f"Job {i}", 'job_type': "individual", 'task_type': task_type,
+            'status': "completed", 'user_id': "current_user"}
+
+def _storage(manager):
+    storage = UnifiedJobStorage()
+    storage.job_manager = manager
+    return storage
+
+class TestUnifiedJobStorage:
+    """Test suite for get_user_jobs pagination"""
+
+    def test_exact_plan_reports_the_aggregation_count(self):
+        """Test the default user's list is fully pushed down and its count is the real total"""
+        manager = FakeJobManager([_job(i) for i in range(3)], count=42)
+
+        jobs, pagination = asyncio.run(_storage(manager).get_user_jobs("current_user", limit=2))
+
+        assert len(jobs) == 2 and manager.count_calls == 1
+        assert pagination['total'] == 42 and not pagination['total_is_estimate']
+
+    def test_residual_filters_skip_the_count_and_require_a_cursor(self):
+        """Test residual filters report an estimate and reject offset paging"""
+        manager = FakeJobManager([_job(0), _job(1, "protein_structure"), _job(2)])
+        storage = _storage(manager)
+        task_types = ["protein_ligand_binding", "protein_structure"]
+
+        jobs, pagination = asyncio.run(storage.get_user_jobs("current_user", limit=5, task_types=task_types,
+                                                             job_types=["individual", "batch_parent"]))
+
+        assert len(jobs) == 3 and manager.count_calls == 0
+        assert pagination['total'] == 3 and pagination['total_is_estimate']
+
+        with pytest.raises(ValueError):
+            asyncio.run(storage.get_user_jobs("current_user", limit=5, task_types=task_types,
+                                              job_types=["individual", "batch_parent"], page=2))
+        asyncio.run(storage.get_user_jobs("current_user", limit=5, task_types=task_types,
+                                          job_types=["individual", "batch_parent"], page=2,
+                                          cursor=encode_cursor("job-0")))
@@ -0,0 +1,222 @@
+"""
+Test Webhook Delivery
+Tests event coalescing, scheduled retries, persistence and per-endpoint circuit breaking
+"""
+
+import sys
+import os
+import asyncio
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.api_core.exceptions import Aborted
+
+from services.webhook_delivery import (
+    CircuitBreaker, MemoryDeliveryStore, WebhookDelivery, WebhookDeliveryEngine, WebhookEndpoint
+)
+
+ENDPOINT = WebhookEndpoint("wh1", "user1", "https://example.test/hook", max_attempts=3)
+
+def _event(i):
+    return {'event': 'job.completed', 'job_id': f'job-{i}'}
+
+class FakeSnapshot:
+    def __init__(self, ref, data):
+        self.reference = ref
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+class FakeDocument:
+    def __init__(self, db, key):
+        self.db = db
+        self.key = key
+
+    def get(self, transaction=None):
+        if transaction is not None:
+            transaction.reads[self.key] = self.db.versions.get(self.key, 0)
+        return FakeSnapshot(self, self.db.docs.get(self.key))
+
+    def set(self, data):
+        self.db.docs[self.key] = data
+
+class FakeCollection:
+    def __init__(self, db):
+        self.db = db
+
+    def document(self, doc_id):
+        return FakeDocument(self.db, doc_id)
+
+    def stream(self):
+        return [FakeSnapshot(FakeDocument(self.db, key), data) for key, data in list(self.db.docs.items())]
+
+class FakeTransaction:
+    """The surface firestore.transactional drives, with optimistic concurrency"""
+
+    _read_only = False
+    _max_attempts = 5
+    _id = None
+
+    def __init__(self, db):
+        self.db = db
+        self._clean_up()
+
+    def _clean_up(self):
+        self.reads, self.writes = {}, []
+
+    def _begin(self, retry_id=None):
+        self._id = b"txn"
+
+    def set(self, ref, data):
+        self.writes.append((ref.key, data))
+
+    def _commit(self):
+        if any(self.db.versions.get(key, 0) != version for key, version in self.reads.items()):
+            raise Aborted("contention")
+        for key, data in self.writes:
+            self.db.docs[key] = data
+            self.db.versions[key] = self.db.versions.get(key, 0) + 1
+
+    def _rollback(self):
+        pass
+
+class FakeFirestore:
+    def __init__(self):
+        self.docs, self.versions = {}, {}
+
+    def collection(self, name):
+        return FakeCollection(self)
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+class TestWebhookDelivery:
+    """Test suite for the webhook delivery engine"""
+
+    def test_burst_of_completions_is_coalesced_per_endpoint(self):
+        """Test 10k events become a bounded number of requests with one in flight per endpoint"""
+        requests = []
+        in_flight = 0
+        peak = 0
+
+        async def transport(delivery):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            requests.append(len(delivery.events))
+            await asyncio.sleep(0.001)
+            in_flight -= 1
+            return 200
+
+        async def run():
+            engine = WebhookDeliveryEngine(transport, batch_window=0.01, max_batch_events=500)
+            for i in range(10_000):
+                engine.enqueue(ENDPOINT, _event(i))
+            await engine.drain()
+            await engine.close()
+            return engine
+
+        engine = asyncio.run(run())
+        assert sum(requests) == 10_000
+        assert len(requests) == 20
+        assert peak == 1
+        assert engine.stats['delivered_events'] == 10_000
+
+    def test_failures_are_rescheduled_not_slept_and_persisted(self):
+        """Test a failed delivery goes to the retry store and succeeds on a later attempt"""
+        statuses = [500, 200]
+        store = MemoryDeliveryStore()
+        results = []
+
+        async def transport(delivery):
+            return statuses.pop(0)
+
+        async def on_result(endpoint, success):
+            results.append(success)
+
+        async def run():
+            engine = WebhookDeliveryEngine(transport, store=store, batch_window=0.001,
+                                           retry_delays=(0.1,), on_result=on_result)
+            engine.enqueue(ENDPOINT, _event(1))
+            await asyncio.sleep(0.04)
+            persisted = [d.attempt for d in store.load_pending()]
+            await asyncio.sleep(0.15)
+            await engine.close()
+            return engine, persisted
+
+        engine, persisted = asyncio.run(run())
+        assert persisted == [1]
+        assert results == [True]
+        assert store.load_pending() == []
+        assert engine.stats['requests'] == 2
+
+    def test_gone_endpoint_is_disabled_and_exhausted_retries_dropped(self):
+        """Test 410 triggers the disable hook and max_attempts bounds redelivery"""
+        gone = []
+
+        async def on_gone(endpoint):
+            gone.append(endpoint.webhook_id)
+
+        async def run(status):
+            async def transport(delivery):
+                return status
+            engine = WebhookDeliveryEngine(transport, batch_window=0.001, retry_delays=(0.001,),
+                                           failure_threshold=100, on_gone=on_gone)
+            engine.enqueue(ENDPOINT, _event(1))
+            await asyncio.sleep(0.1)
+            await engine.close()
+            return engine
+
+        assert asyncio.run(run(410)).stats['requests'] == 1 and gone == ["wh1"]
+        exhausted = asyncio.run(run(503))
+        assert exhausted.stats['requests'] == 3
+        assert exhausted.stats['dropped_events'] == 1
+
+    def test_circuit_breaker_opens_and_half_opens(self):
+        """Test consecutive failures open the breaker and a single probe is allowed after the cool-down"""
+        breaker = CircuitBreaker(failure_threshold=3, open_seconds=10)
+        for _ in range(3):
+            assert breaker.allow(0)
+            breaker.record_failure(0)
+
+        assert breaker.state == "open" and not breaker.allow(5)
+        assert breaker.allow(11) and not breaker.allow(11)
+        breaker.record_failure(11)
+        assert not breaker.allow(25) and breaker.allow(32)
+        breaker.record_success()
+        assert breaker.state == "closed"
+
+    def test_delivery_round_trips_through_store_format(self):
+        """Test persisted deliveries restore their endpoint, events and schedule, and older secrets are dropped"""
+        delivery = WebhookDelivery(ENDPOINT, [_event(1), _event(2)], attempt=2, next_attempt_at=123.0)
+        restored = WebhookDelivery.from_dict(delivery.to_dict())
+
+        assert restored.endpoint == ENDPOINT
+        assert restored.events == delivery.events and restored.attempt == 2 and restored.next_attempt_at == 123.0
+
+        legacy = delivery.to_dict()
+        legacy['endpoint']['secret'] = "s3cret"
+        assert WebhookDelivery.from_dict(legacy).endpoint == ENDPOINT
+
+    def test_firestore_store_claims_each_retry_once(self, monkeypatch):
+        """Test replicas only take lapsed leases, in a transaction, and rewrite records without secrets"""
+        pytest.importorskip("aiohttp")
+        from services import webhook_service
+        from services.webhook_service import FirestoreDeliveryStore
+
+        db = FakeFirestore()
+        monkeypatch.setattr(FirestoreDeliveryStore, "db", db)
+        monkeypatch.setattr(webhook_service.time, "time", lambda: 1_000.0)
+        owner, replica = FirestoreDeliveryStore(lease_seconds=60), FirestoreDeliveryStore(lease_seconds=60)
+
+        owner.save(WebhookDelivery(ENDPOINT, [_event(1)], delivery_id="held", next_attempt_at=1_010.0))
+        lapsed = WebhookDelivery(ENDPOINT, [_event(2)], delivery_id="lapsed").to_dict()
+        lapsed['endpoint']['secret'] = "s3cret"
+        db.docs["lapsed"] = {**lapsed, 'lease_owner': "dead", 'lease_until': 900.0}
+
+        assert [d.delivery_id for d in replica.load_pending()] == ["lapsed"]
+        assert db.docs["held"]['lease_until'] == 1_070.0 and db.docs["held"]['lease_owner'] == owner.owner
+        assert db.docs["lapsed"]['lease_owner'] == replica.owner and 'secret' not in db.docs["lapsed"]['endpoint']
+        assert owner.load_pending() == []
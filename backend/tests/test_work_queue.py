@@ -0,0 +1,116 @@
+"""
+Test Work Queue
+Tests claiming, stealing and lease-based requeueing on the Cloud Run worker's GCS work queue
+"""
+
+import sys
+import os
+import json
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("torch")
+pytest.importorskip("jwt")
+
+from models import boltz2_cloud_run
+from models.boltz2_cloud_run import Boltz2CloudRunner
+
+class FakeBlob:
+    """Work queue object with generation-matched reads and writes"""
+
+    def __init__(self, queue):
+        self.data = json.dumps(queue)
+        self.generation = 1
+
+    def reload(self):
+        pass
+
+    def download_as_text(self, if_generation_match=None):
+        return self.data
+
+    def upload_from_string(self, data, content_type=None, if_generation_match=None):
+        self.data = data
+        self.generation += 1
+
+    @property
+    def queue(self):
+        return json.loads(self.data)
+
+class FakeStorageClient:
+    """Storage client handing out the same work queue blob for every path"""
+
+    def __init__(self, blob):
+        self.work_queue = blob
+
+    def bucket(self, name):
+        return self
+
+    def blob(self, path):
+        return self.work_queue
+
+def _runner(task_index):
+    runner = object.__new__(Boltz2CloudRunner)
+    runner.task_index = task_index
+    return runner
+
+class TestWorkQueue:
+    """Test suite for Boltz2CloudRunner work stealing"""
+
+    def test_claims_are_leased_and_released_with_the_next_claim(self):
+        """Test a claim is recorded until the task moves on, then stealing takes the victim's tail"""
+        blob = FakeBlob({'tasks': {'0': [0], '1': [1, 2, 3]}, 'costs': [5, 4, 2, 1]})
+        runner = _runner(0)
+
+        assert runner._claim_from_queue(blob) == 0
+        assert blob.queue['claims']['0']['task'] == "0"
+
+        assert runner._claim_from_queue(blob, release=0) == 3
+        assert list(blob.queue['claims']) == ["3"] and blob.queue['tasks']['1'] == [1, 2]
+
+    def test_expired_and_own_stale_claims_are_requeued(self, monkeypatch):
+        """Test lapsed leases return to the queue and a retried task takes back its own claim"""
+        monkeypatch.setattr(boltz2_cloud_run.time, "time", lambda: 10_000.0)
+        blob = FakeBlob({
+            'tasks': {'0': [], '1': [], '2': []},
+            'costs': [1, 1, 1],
+            'claims': {
+                '0': {'task': '1', 'claimed_at': 10_000.0 - boltz2_cloud_run.WORK_QUEUE_LEASE_SECONDS - 1},
+                '1': {'task': '2', 'claimed_at': 9_990.0},
+                '2': {'task': '0', 'claimed_at': 9_990.0}
+            }
+        })
+
+        assert _runner(0)._claim_from_queue(blob) == 2
+        assert blob.queue['tasks']['0'] == [0]
+        assert set(blob.queue['claims']) == {"1", "2"}
+
+    def test_empty_queue_still_writes_the_final_release(self):
+        """Test the last claim is released even when there is nothing left to claim"""
+        blob = FakeBlob({'tasks': {'0': []}, 'costs': [1], 'claims': {'0': {'task': '0', 'claimed_at': 0}}})
+
+        assert _runner(0)._claim_from_queue(blob, release=0) is None
+        assert blob.queue['claims'] == {} and blob.queue['tasks']['0'] == []
+
+    def test_results_are_stored_before_their_claim_is_released(self):
+        """Test each claimed ligand's result is in GCS while its claim is still held"""
+        blob = FakeBlob({'tasks': {'0': [0, 1]}, 'costs': [1, 1]})
+        input_data = {'work_queue': "batches/b1/work_queue.json", 'ligands': [{'name': "L0"}, {'name': "L1"}]}
+        runner = _runner(0)
+        runner.input_path = "gs://bucket/batches/b1/input.json"
+        runner.storage_client = FakeStorageClient(blob)
+        runner.processing_mode = "shared"
+        runner.gpu_type = "L4"
+        runner._load_input_data = lambda: input_data
+        runner._get_task_shard = lambda data: ("SEQ", [])
+        runner._process_ligand = lambda sequence, ligand: {'ligand_name': ligand['name'], 'status': 'completed'}
+        runner._update_progress = lambda *args: None
+        runner._update_task_status = lambda *args: None
+        saved = []
+        runner._save_results = lambda results, results_name=None: saved.append(
+            (results_name, sorted(blob.queue['claims']))
+        )
+
+        runner.run()
+
+        assert saved == [("queue_0", ["0"]), ("queue_1", ["1"])]
+        assert blob.queue['claims'] == {}
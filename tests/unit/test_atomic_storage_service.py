@@ -1,6 +1,6 @@
 """
 Unit tests for AtomicStorageService
-Tests the atomic storage operations with temp→finalize pattern
+Tests the atomic storage operations with the manifest commit protocol
 """
 
 import pytest
@@ -60,7 +60,8 @@ class TestAtomicStorageService:
     def mock_gcp_storage(self):
         """Mock GCP storage service"""
         mock_storage = Mock()
-        mock_storage.upload_file = AsyncMock(return_value=True)
+        mock_storage.upload_file = AsyncMock(return_value={'generation': 1})
+        mock_storage.get_file_info = AsyncMock(return_value=None)
         mock_storage.download_file = AsyncMock(return_value=b'{"test": "data"}')
         mock_storage.delete_file = AsyncMock(return_value=True)
         mock_storage.move_file = AsyncMock(return_value=True)
@@ -80,7 +81,7 @@ class TestAtomicStorageService:
         assert service.storage is not None
         assert 'jobs' in service.storage_hierarchy
         assert 'batches' in service.storage_hierarchy
-        assert 'temp' in service.storage_hierarchy
+        assert 'manifest' in service.storage_hierarchy
     
     def test_generate_transaction_id(self, service):
         """Test transaction ID generation"""
@@ -141,78 +142,52 @@ class TestAtomicStorageService:
         assert paths['batch_index_file'] == "batches/batch456/batch_index.json"
         assert paths['batch_metadata_file'] == "batches/batch456/batch_metadata.json"
     
-    @pytest.mark.asyncio
-    async def test_write_temp_files(self, service):
-        """Test writing files to temporary location"""
-        transaction = StorageTransaction("test-transaction-123")
-        
+    def test_prepare_job_files(self, service):
+        """Test that each job file is encoded once with its final path"""
+        storage_paths = service._determine_storage_paths("job123", None, "individual")
         result_data = {
             "job_id": "job123",
             "results": {"affinity": -0.5, "confidence": 0.8},
-            "structure_data": "base64encodeddata",
             "metadata": {"execution_time": 120.5}
         }
         
-        storage_paths = {
-            'base_path': 'jobs/job123/',
-            'results_file': 'jobs/job123/results.json',
-            'metadata_file': 'jobs/job123/metadata.json',
-            'structure_file': 'jobs/job123/structure.cif'
-        }
-        
-        temp_files = await service._write_temp_files(transaction, result_data, storage_paths)
-        
-        assert len(temp_files) >= 2  # At least results and metadata
-        assert any('results.json' in path for path in temp_files.values())
-        assert any('metadata.json' in path for path in temp_files.values())
+        files = service._prepare_job_files(result_data, storage_paths)
         
-        # Verify transaction operations were recorded
-        assert len(transaction.operations) > 0
-        assert all(op['type'] == 'write' for op in transaction.operations)
+        assert files['results'][0] == "jobs/job123/results.json"
+        assert files['metadata'][0] == "jobs/job123/metadata.json"
+        assert json.loads(files['results'][1]) == result_data
     
     @pytest.mark.asyncio
-    async def test_validate_temp_files(self, service):
-        """Test temporary file validation"""
-        temp_files = {
-            'results': 'temp/transaction123/results.json',
-            'metadata': 'temp/transaction123/metadata.json'
+    async def test_write_files_direct_to_final_paths(self, service):
+        """Test files are written once to final paths with generations tracked"""
+        transaction = StorageTransaction("test-transaction-123")
+        files = {
+            'results': ('jobs/job123/results.json', b'{}', 'application/json'),
+            'metadata': ('jobs/job123/metadata.json', b'{}', 'application/json')
         }
         
-        # Should pass validation when files exist
-        with patch.object(service.storage, 'file_exists', return_value=True):
-            await service._validate_temp_files(temp_files)  # Should not raise
+        final_files = await service._write_files(transaction, files, 'jobs/job123/manifest.json', None)
         
-        # Should fail validation when files don't exist
-        with patch.object(service.storage, 'file_exists', return_value=False):
-            with pytest.raises(Exception, match="Temporary file validation failed"):
-                await service._validate_temp_files(temp_files)
+        assert final_files == {
+            'results': 'jobs/job123/results.json',
+            'metadata': 'jobs/job123/metadata.json'
+        }
+        assert transaction.temp_files == []
+        assert transaction.generations == {'jobs/job123/results.json': 1, 'jobs/job123/metadata.json': 1}
+        assert all(op['type'] == 'write' for op in transaction.operations)
     
     @pytest.mark.asyncio
-    async def test_finalize_files(self, service):
-        """Test atomic file finalization"""
+    async def test_publish_manifest_is_compare_and_swap(self, service):
+        """Test the manifest is published only if absent (or at the previous generation)"""
         transaction = StorageTransaction("test-transaction-123")
+        transaction.generations = {'jobs/job123/results.json': 7}
         
-        temp_files = {
-            'results': 'temp/transaction123/results.json',
-            'metadata': 'temp/transaction123/metadata.json'
-        }
-        
-        storage_paths = {
-            'results_file': 'jobs/job123/results.json',
-            'metadata_file': 'jobs/job123/metadata.json'
-        }
-        
-        final_files = await service._finalize_files(transaction, temp_files, storage_paths)
-        
-        assert len(final_files) == len(temp_files)
-        assert 'results' in final_files
-        assert 'metadata' in final_files
-        assert final_files['results'] == 'jobs/job123/results.json'
-        assert final_files['metadata'] == 'jobs/job123/metadata.json'
+        manifest = await service._publish_manifest(
+            transaction, 'jobs/job123/manifest.json', {'results': 'jobs/job123/results.json'}, None
+        )
         
-        # Verify move operations were recorded
-        move_operations = [op for op in transaction.operations if op['type'] == 'move']
-        assert len(move_operations) == len(temp_files)
+        assert manifest['files']['results'] == {'path': 'jobs/job123/results.json', 'generation': 7}
+        assert service.storage.upload_file.call_args.kwargs['if_generation_match'] == 0
     
     @pytest.mark.asyncio
     async def test_commit_transaction(self, service):
@@ -294,8 +269,8 @@ class TestAtomicStorageService:
         job_id = "test-job-123"
         result_data = {"job_id": job_id}
         
-        # Mock a failure during finalization
-        with patch.object(service, '_finalize_files', side_effect=Exception("Storage failure")):
+        # Mock a failure while publishing the manifest
+        with patch.object(service, '_publish_manifest', side_effect=Exception("Storage failure")):
             with patch.object(service, '_rollback_transaction') as mock_rollback:
                 with pytest.raises(Exception, match="Storage failure"):
                     await service.store_job_result_atomic(